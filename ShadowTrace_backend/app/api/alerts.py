@@ -1,6 +1,54 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException, Query
+from pydantic import BaseModel, Field
+from typing import Optional
+
+from app.database.elastic import search_docs
+from app.database.alerts_mapping import ALERT_INDEX
+from app.utils.alerts import dispatcher, raise_alert
+
 router = APIRouter(prefix="/alerts", tags=["Alerts"])
 
+
+class AlertRequest(BaseModel):
+    title: str
+    severity: str = Field("medium", example="high")
+    description: Optional[str] = ""
+    raw: Optional[dict] = None
+
+
 @router.get("/")
-def get_alerts():
-    return {"alerts": []}  # soon we add webhook + email alerts
+def get_alerts(page: int = Query(1, ge=1), size: int = Query(20, ge=1, le=100),
+               severity: Optional[str] = None):
+    """Most recent alerts first, paginated from the alerts index."""
+    query = {"match_all": {}}
+    if severity:
+        query = {"bool": {"filter": [{"term": {"severity": severity}}]}}
+    body = {
+        "query": query,
+        "sort": [{"timestamp": {"order": "desc"}}],
+        "from": (page - 1) * size,
+        "track_total_hits": True,
+    }
+    try:
+        resp = search_docs(ALERT_INDEX, body, size=size)
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"alerts index unavailable: {e}")
+
+    hits = resp["hits"]
+    return {
+        "page": page,
+        "size": size,
+        "total": hits["total"]["value"],
+        "alerts": [{"id": h["_id"], **h["_source"]} for h in hits["hits"]],
+    }
+
+
+@router.post("/")
+def create_alert(req: AlertRequest):
+    alert = raise_alert(req.title, req.severity, req.description or "", req.raw)
+    return {"status": "accepted", "alert": alert}
+
+
+@router.get("/dispatcher")
+def dispatcher_stats():
+    return dispatcher.stats()
@@ -0,0 +1,38 @@
+# app/api/breaches.py
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel, Field
+from typing import List
+
+from app.services.breach_index import breach_index
+
+router = APIRouter(prefix="/breaches", tags=["breaches"])
+
+
+class BreachLookupRequest(BaseModel):
+    kind: str = Field("email", pattern="^(email|password|sha1)$")
+    values: List[str] = Field(..., max_length=100000)
+
+
+@router.post("/lookup")
+def bulk_lookup(req: BreachLookupRequest):
+    """Local breach index results for a batch of IOCs, in request order (null when not found)."""
+    results = breach_index.lookup_many(req.values, req.kind)
+    return {"kind": req.kind, "count": len(results), "found": sum(r is not None for r in results),
+            "results": results}
+
+
+@router.get("/range/{prefix}", response_class=PlainTextResponse)
+def hash_range(prefix: str, kind: str = "password"):
+    """Pwned Passwords style range: every SHA-1 suffix (and count) under a 5-hex-digit prefix."""
+    try:
+        rows = breach_index.range(prefix, kind)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return PlainTextResponse("\r\n".join(f"{suffix}:{count}" for suffix, count in rows))
+
+
+@router.get("/stats")
+def index_stats():
+    breach_index.ready()
+    return breach_index.stats()
@@ -1,9 +1,64 @@
-from fastapi import APIRouter
-from app.database.mongo import scans_collection
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from app.database.mongo import db, scans_collection
+from app.services import analytics_export
+from app.utils import responses
 
 router = APIRouter(prefix="/history", tags=["History"])
 
+_indexes_ready = False
+
+
+def _ensure_indexes():
+    # the ETag check sorts on updated_at; without an index that is a collection scan per poll
+    global _indexes_ready
+    if not _indexes_ready:
+        scans_collection.create_index("updated_at")
+        _indexes_ready = True
+
+
 @router.get("/")
-async def get_history():
-    data = list(scans_collection.find({}, {"_id": 0}).sort("_id", -1))
-    return {"count": len(data), "data": data}
+def get_history(request: Request):
+    """
+    Every scan record, newest first. The ETag covers the record count, the
+    newest record and the latest updated_at, so an unchanged history is
+    answered with 304 before the records are read.
+    """
+    if request.headers.get("if-none-match"):
+        _ensure_indexes()
+        newest = scans_collection.find_one({}, {"_id": 1}, sort=[("_id", -1)])
+        changed = scans_collection.find_one({"updated_at": {"$exists": True}}, {"updated_at": 1},
+                                            sort=[("updated_at", -1)])
+        tag = responses.etag(scans_collection.count_documents({}), newest and newest["_id"],
+                             changed and changed["updated_at"])
+        if responses.fresh(request, tag):
+            return responses.not_modified(tag)
+    data = list(scans_collection.find({}).sort("_id", -1))
+    changed = max((d["updated_at"] for d in data if "updated_at" in d), default=None)
+    tag = responses.etag(len(data), data[0]["_id"] if data else None, changed)
+    for d in data:
+        del d["_id"]
+    return responses.json_response({"count": len(data), "data": data}, tag)
+
+
+@router.get("/export/{table}")
+def export_table(table: str, since: Optional[datetime] = None, until: Optional[datetime] = None):
+    """
+    One analytics table (scans, scan_platforms, case_entities) as an Arrow IPC
+    stream, read from Mongo in batches. since/until bound the source's
+    watermark field (updated_at for scans, timestamp for cases).
+    """
+    if table not in analytics_export.TABLES:
+        raise HTTPException(status_code=404, detail=f"table must be one of {sorted(analytics_export.TABLES)}")
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise HTTPException(status_code=501, detail="pyarrow is not installed")
+    return StreamingResponse(
+        analytics_export.arrow_stream(db, table, since, until),
+        media_type="application/vnd.apache.arrow.stream",
+        headers={"Content-Disposition": f'attachment; filename="shadowtrace-{table}.arrows"'},
+    )
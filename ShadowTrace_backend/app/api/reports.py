@@ -0,0 +1,48 @@
+# app/api/reports.py
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import Response, JSONResponse
+
+from app.services.reports import reports
+from app.utils.pdf_export import FORMATS
+
+router = APIRouter(prefix="/reports", tags=["reports"])
+
+
+@router.post("/{case_id}")
+def request_report(case_id: str, format: str = "pdf"):
+    """
+    Render a case report in the background. Returns the job; it is already
+    done when this version of the case was rendered before.
+    """
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {sorted(FORMATS)}")
+    job = reports.submit(case_id, format)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Case not found")
+    return JSONResponse(_public(job), status_code=200 if job["status"] == "done" else 202)
+
+
+@router.get("/jobs/{job_id}")
+def report_job(job_id: str):
+    job = reports.job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return _public(job)
+
+
+@router.get("/jobs/{job_id}/download")
+def download_report(job_id: str):
+    job = reports.job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Report is {job['status']}")
+    filename = f"shadowtrace-{job['case_id']}-{job['version'][:12]}.{job['format']}"
+    return Response(reports.read(job), media_type=FORMATS[job["format"]],
+                    headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+
+def _public(job):
+    out = {k: (v.isoformat() if hasattr(v, "isoformat") else v) for k, v in job.items()}
+    out["download"] = f"/reports/jobs/{job['id']}/download" if job["status"] == "done" else None
+    return out
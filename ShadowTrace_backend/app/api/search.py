@@ -1,19 +1,33 @@
-from fastapi import APIRouter, HTTPException, BackgroundTasks
+from fastapi import APIRouter, HTTPException, BackgroundTasks, Query, Request
 from pydantic import BaseModel, Field
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 from bson import ObjectId
-import os, re, json, time, requests, traceback, whois, shodan, dns.resolver, concurrent.futures, difflib, io
-from ipwhois import IPWhois
-from bs4 import BeautifulSoup
+from pymongo import ReturnDocument
+import os, re, json, traceback, concurrent.futures, io
 from urllib.parse import urlparse
-from PIL import Image
-import imagehash
-import numpy as np 
 
-from app.main import db
+from app.database.mongo import db
+from app.database.write_behind import writer, progress_concern
 from app.database.elastic import index_doc
-from app.database.es_mapping import SCAN_INDEX
+from app.database.es_mapping import SCAN_WRITE_ALIAS
+from app.database.blobs import store as blob_store, SCAN_BLOB_FIELDS
+from app.utils.alerts import raise_alert
+from app.utils.indicators import classify, hash_algorithm
+from app.services.subdomains import enumerate_subdomains, known_subdomains
+from app.services.dns_stage import dns_stage
+from app.services.ip_asn import ip_index
+from app.services.domain_rdap import domain_registration
+from app.scrapers.breach_check import check_breaches
+from app.utils.profile_html import parse_profile_html, read_head
+from app.services.identity_match import score_platforms
+from app.services.scoring import assess, rescore, model as scoring_model
+from app.services import scan_search
+from app.services.scan_scheduler import scheduler, tenant_of
+from app.utils.metrics import span, timed, submit, ScanTimings, SCAN_SECONDS, SCANS_TOTAL
+from app.utils import resilience, responses
+from app.utils.http import session
+from models.subject_model import Profile
 
 router = APIRouter(prefix="/search", tags=["search"])
 
@@ -25,140 +39,125 @@ class SearchRequest(BaseModel):
     source: Optional[str] = Field("auto", example="auto")
     meta: Optional[dict] = None
 
+class BulkSearchRequest(BaseModel):
+    queries: List[str] = Field(..., max_length=100000)
+    source: Optional[str] = Field("bulk", example="bulk")
+    meta: Optional[dict] = None
+
 ############################################
 # Entity Detection
 ############################################
-IPV4 = re.compile(r"^\s*(?:\d{1,3}\.){3}\d{1,3}\s*$")
-DOMAIN = re.compile(r"^(?!-)(?:[a-zA-Z0-9-]{1,63}\.)+[a-zA-Z]{2,63}$")
-EMAIL = re.compile(r"^[^@]+@[^@]+\.[^@]+$")
-PHONE = re.compile(r"^\+?\d[\d\s\-()]{5,}$")
-USERNAME = re.compile(r"^[a-zA-Z0-9_.-]{3,}$")
-
 def detect_entity(q: str) -> str:
-    q = q.strip()
-    if IPV4.match(q):
-        parts = list(map(int, q.split(".")))
-        if (parts[0]==10) or (parts[0]==172 and 16<=parts[1]<=31) or (parts[0]==192 and parts[1]==168):
-            return "private_ip"
-        return "ip"
-    if EMAIL.match(q): return "email"
-    if DOMAIN.match(q): return "domain"
-    if PHONE.match(q): return "phone"
-    if USERNAME.match(q): return "username"
-    return "unknown"
+    return classify(q)[1]
 
 ############################################
 # Helper Functions
 ############################################
+@timed("probe", "dns")
 def safe_dns(name, rec="A"):
-    try:
-        ans = dns.resolver.resolve(name, rec, lifetime=4)
-        return [i.to_text() for i in ans]
-    except Exception as e:
-        return {"error": str(e)}
+    return dns_stage.resolve_sync(name, rec)
+
+@timed("probe", "dns")
+def dns_batch(names, rec="A"):
+    """Resolve many names for one record type through the shared DNS stage."""
+    if not names:
+        return {}
+    return {n: r[rec] for n, r in dns_stage.resolve_many_sync(names, (rec,)).items()}
+
+@timed("probe", "dns")
+def dns_records(name, types):
+    return dns_stage.resolve_many_sync([name], types)[name]
 
+@timed("probe", "whois")
 def whois_domain(domain):
+    """Registration data: RDAP via the IANA bootstrap, port-43 whois only as the fallback."""
     try:
-        w = whois.whois(domain)
-        return {"ok": True, "data": {k:(list(v) if isinstance(v,(list,set,tuple)) else str(v)) for k,v in w.items()}}
+        return domain_registration.lookup(domain)
     except Exception as e:
         return {"ok": False, "error": str(e)}
 
-def ip_rir(ip):
+@timed("probe", "rdap")
+def rdap_ip(ip):
     try:
-        return {"ok": True, "rir": IPWhois(ip).lookup_rdap(depth=1)}
+        from ipwhois import IPWhois
+        return {"ok": True, "source": "rdap", "rir": IPWhois(ip).lookup_rdap(depth=1)}
     except Exception as e:
         return {"ok": False, "error": str(e)}
 
+def ip_rir(ip, live=False):
+    """ASN, prefix and registry from the local tables; live RDAP only on a miss or when asked for."""
+    if not live:
+        with span("probe", "ipintel"):
+            rec = ip_index.lookup(ip)
+        if rec is not None:
+            return {"ok": True, "source": "local", "rir": rec}
+    return rdap_ip(ip)
+
+@timed("probe", "http")
 def http_head(target):
+    if ":" in target:
+        target = f"[{target}]"  # IPv6 literal
     try:
-        r = requests.head(f"http://{target}", timeout=3, allow_redirects=True)
+        # the scan target, not a provider: no breaker, only the scan's budget
+        r = session.head(f"http://{target}", timeout=resilience.bounded(3), allow_redirects=True)
         return {"status": r.status_code, "headers": dict(r.headers)}
     except Exception as e:
         return {"error": str(e)}
 
+GRAVATAR_BASE = os.getenv("GRAVATAR_BASE", "https://www.gravatar.com")
+
+@timed("probe", "gravatar")
 def email_gravatar(email):
     import hashlib
     h = hashlib.md5(email.strip().lower().encode()).hexdigest()
-    url = f"https://www.gravatar.com/avatar/{h}?d=404"
+    url = f"{GRAVATAR_BASE}/avatar/{h}?d=404"
     try:
-        r = requests.head(url, timeout=3)
+        r = resilience.head("gravatar", url, timeout=3)
         return {"exists": r.status_code == 200, "url": url}
     except Exception as e:
         return {"error": str(e)}
 
+SHODAN_API_URL = os.getenv("SHODAN_API_URL", "https://api.shodan.io")
+
+@timed("probe", "shodan")
 def shodan_search(q):
     key = os.getenv("SHODAN_API_KEY","")
     if not key:
         return {"ok": False, "error": "Shodan key missing"}
+    # the REST API directly: the shodan client sends its requests without a timeout
     try:
-        s = shodan.Shodan(key)
-        try:
-            info = s.host(q)
-            return {"ok": True, "host": info}
-        except:
-            r = s.search(q, limit=3)
-            return {"ok": True, "matches": r.get("matches")}
+        if classify(q)[1] in ("ip", "private_ip"):
+            r = resilience.get("shodan", f"{SHODAN_API_URL}/shodan/host/{q}", params={"key": key}, timeout=6)
+            if r.ok:
+                return {"ok": True, "host": r.json()}
+        r = resilience.get("shodan", f"{SHODAN_API_URL}/shodan/host/search", params={"key": key, "query": q}, timeout=6)
+        if r.ok:
+            return {"ok": True, "matches": (r.json().get("matches") or [])[:3]}
+        return {"ok": False, "status": r.status_code, "error": r.text}
     except Exception as e:
         return {"ok": False, "error": str(e)}
 
 ############################################
 # HTTP GET helper for OSINT scraping
 ############################################
-def http_get(url, timeout=6, retries=1):
+def http_get(url, timeout=6, retries=1, stream=False, provider=None):
+    """GET through the provider's breaker and budget (see app.utils.resilience); None when it fails."""
     headers = {
         "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
                       "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120 Safari/537.36",
         "Accept-Language": "en-US,en;q=0.9",
         "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
     }
-    for attempt in range(retries + 1):
-        try:
-            r = requests.get(url, headers=headers, timeout=timeout, allow_redirects=True)
-            return r
-        except Exception:
-            if attempt == retries:
-                return None
-            time.sleep(0.5)
-    return None
+    try:
+        return resilience.get(provider or urlparse(url).hostname, url, headers=headers, timeout=timeout,
+                              retries=retries, allow_redirects=True, stream=stream)
+    except Exception:
+        return None
 
 ############################################
 # Profile Parsing and Avatar Analysis
 ############################################
-def parse_profile_html(html_text):
-    soup = BeautifulSoup(html_text, "html.parser")
-    result = {"display_name": None, "bio": None, "location": None, "avatar": None, "evidence": []}
-
-    # JSON-LD
-    for script in soup.select('script[type="application/ld+json"]'):
-        try:
-            data = json.loads(script.string or "{}")
-            if isinstance(data, list):
-                data = data[0]
-            if data.get("name"):
-                result["display_name"] = data["name"]
-            if data.get("description"):
-                result["bio"] = data["description"]
-            if data.get("image"):
-                result["avatar"] = data["image"]
-        except Exception:
-            continue
-
-    # Meta
-    og_title = soup.find("meta", property="og:title") or soup.find("meta", attrs={"name":"twitter:title"})
-    if og_title and og_title.get("content"):
-        result["display_name"] = result["display_name"] or og_title["content"]
-
-    og_desc = soup.find("meta", property="og:description") or soup.find("meta", attrs={"name":"description"})
-    if og_desc and og_desc.get("content"):
-        result["bio"] = result["bio"] or og_desc["content"]
-
-    og_img = soup.find("meta", property="og:image") or soup.find("meta", attrs={"name":"twitter:image"})
-    if og_img and og_img.get("content"):
-        result["avatar"] = result["avatar"] or og_img["content"]
-
-    return result
-
+@timed("avatar", "image")
 def analyze_avatar(url: str):
     """
     Fetch avatar, return:
@@ -169,8 +168,12 @@ def analyze_avatar(url: str):
     This function never stores the image on disk; it only returns metadata.
     """
     try:
-        r = requests.get(url, timeout=5, stream=True)
-        r.raw.decode_content = True
+        # image stack is only loaded once a profile with an avatar shows up
+        from PIL import Image
+        import imagehash
+        import numpy as np
+
+        r = resilience.get("avatar", url, timeout=5)
         img = Image.open(io.BytesIO(r.content)).convert("RGB")
 
         # perceptual hash
@@ -207,104 +210,67 @@ def analyze_avatar(url: str):
         return None
 
 
-def similarity_score(a: str, b: str) -> int:
-    if not a or not b:
-        return 0
-    return int(difflib.SequenceMatcher(None, a.lower(), b.lower()).ratio() * 100)
-
-def extract_domains_from_text(text: str):
-    if not text:
-        return set()
-    import re
-    domains = set()
-    for m in re.findall(r"https?://[^\s\"'>]+", text):
-        try:
-            d = urlparse(m).netloc
-            if d:
-                domains.add(d.lower().lstrip("www."))
-        except:
-            continue
-    return domains
-
-def compute_platform_match_score(username: str, platform_entry: dict, all_platforms: dict):
-    score = 0
-    evidence = platform_entry.get("evidence", [])[:]
-    display = platform_entry.get("display_name") or ""
-    bio = platform_entry.get("bio") or ""
-    avatar = platform_entry.get("avatar")
-
-    # fuzzy match
-    sim = similarity_score(display, username)
-    if sim >= 80:
-        score += 40; evidence.append("display_name_similar")
-    elif sim >= 50:
-        score += 20; evidence.append("display_name_partial")
-
-    # avatar
-    if avatar:
-        score += 20; evidence.append("avatar_present")
-
-    # username in bio
-    if username.lower() in (display.lower() + " " + bio.lower()):
-        score += 15; evidence.append("username_in_bio")
-
-    # domain overlap
-    domains_here = extract_domains_from_text((bio or "") + " " + (platform_entry.get("url") or ""))
-    for other in all_platforms.values():
-        if other is platform_entry: continue
-        other_text = (other.get("bio") or "") + " " + (other.get("url") or "")
-        if domains_here & extract_domains_from_text(other_text):
-            score += 25; evidence.append("shared_website")
-            break
-    return {"score": min(score, 95), "evidence": list(dict.fromkeys(evidence))}
-
 ############################################
 # Social Probe — Enhanced
 ############################################
+SOCIAL_URLS = {
+    "github": "https://github.com/{username}",
+    "twitter": "https://twitter.com/{username}",
+    "reddit": "https://www.reddit.com/user/{username}",
+    "instagram": "https://www.instagram.com/{username}",
+}
+
+@timed("probe", "social")
 def social_probe(username):
-    socials = {
-        "github": f"https://github.com/{username}",
-        "twitter": f"https://twitter.com/{username}",
-        "reddit": f"https://www.reddit.com/user/{username}",
-        "instagram": f"https://www.instagram.com/{username}"
-    }
+    socials = {site: tpl.format(username=username) for site, tpl in SOCIAL_URLS.items()}
 
     platforms = {}
     avatar_summary = []
 
     for site, url in socials.items():
-        entry = {"exists": False, "status": None, "url": url}
+        entry = Profile(url)
+        if resilience.expired():
+            entry.error = "scan deadline exceeded"
+            platforms[site] = entry
+            continue
         try:
-            r = http_get(url, timeout=6, retries=1)
-            if r:
-                entry["status"] = r.status_code
-                entry["exists"] = (r.status_code == 200)
+            with span("social", site):
+                # only the <head> is downloaded; see app.utils.profile_html
+                r = http_get(url, timeout=6, retries=1, stream=True, provider=site)
+                html = read_head(r) if r is not None and r.status_code == 200 else None
+            if r is not None:
+                r.close()
+                entry.status = r.status_code
+                entry.exists = (r.status_code == 200)
                 if r.status_code == 200:
-                    parsed = parse_profile_html(r.text)
+                    with span("parse", "profile_html"):
+                        parsed = parse_profile_html(html)
                     entry.update(parsed)
-                    if entry.get("avatar"):
-                        avinfo = analyze_avatar(entry["avatar"])
+                    if entry.avatar:
+                        avinfo = analyze_avatar(entry.avatar)
                         if avinfo:
                             entry.update(avinfo)
                             avatar_summary.append({"platform": site, **avinfo})
         except Exception as e:
-            entry["error"] = str(e)
+            entry.error = str(e)
         platforms[site] = entry
 
     # compute match scores
+    with span("score", "identity_match"):
+        match = score_platforms(username, platforms)
     for name, entry in platforms.items():
-        ms = compute_platform_match_score(username, entry, platforms)
-        entry["match_score"] = ms["score"]
-        entry["match_evidence"] = ms["evidence"]
+        entry.match_score = match["scores"][name]["score"]
+        entry.match_evidence = match["scores"][name]["evidence"]
 
-    scores = [v["match_score"] for v in platforms.values() if v.get("exists")]
+    scores = [v.match_score for v in platforms.values() if v.exists]
     confidence = int(sum(scores)/len(scores)) if scores else 0
 
     return {
-        "links_found": [k for k,v in platforms.items() if v.get("exists")],
+        "links_found": [k for k,v in platforms.items() if v.exists],
         "avatar_summary": avatar_summary,
+        "avatar_matches": match["avatar_matches"],
         "confidence": confidence,
-        "platforms": platforms
+        "platforms": {k: v.to_doc() for k, v in platforms.items()}
     }
 
 ############################################
@@ -312,51 +278,52 @@ def social_probe(username):
 ############################################
 VT_KEY = os.getenv("VT_API_KEY","")
 ABUSE_KEY = os.getenv("ABUSEIPDB_KEY","")
-HIBP_KEY = os.getenv("HIBP_API_KEY","00000000000000000000000000000000")
 
+VT_BASE = os.getenv("VT_BASE", "https://www.virustotal.com/api/v3")
+ABUSEIPDB_BASE = os.getenv("ABUSEIPDB_BASE", "https://api.abuseipdb.com/api/v2")
+
+@timed("probe", "virustotal")
 def vt_ip_lookup(ip):
     if not VT_KEY:
         return {"ok": False, "error": "VT key missing"}
     try:
-        r = requests.get(f"https://www.virustotal.com/api/v3/ip_addresses/{ip}",
-                         headers={"x-apikey": VT_KEY}, timeout=6)
+        r = resilience.get("virustotal", f"{VT_BASE}/ip_addresses/{ip}",
+                           headers={"x-apikey": VT_KEY}, timeout=6)
         return {"ok": r.ok, "data": r.json() if r.ok else r.text}
     except Exception as e:
         return {"ok": False, "error": str(e)}
 
+@timed("probe", "virustotal")
 def vt_domain_lookup(domain):
     if not VT_KEY:
         return {"ok": False, "error": "VT key missing"}
     try:
-        r = requests.get(f"https://www.virustotal.com/api/v3/domains/{domain}",
-                         headers={"x-apikey": VT_KEY}, timeout=6)
+        r = resilience.get("virustotal", f"{VT_BASE}/domains/{domain}",
+                           headers={"x-apikey": VT_KEY}, timeout=6)
         return {"ok": r.ok, "data": r.json() if r.ok else r.text}
     except Exception as e:
         return {"ok": False, "error": str(e)}
 
-def abuseipdb_check(ip):
-    if not ABUSE_KEY:
-        return {"ok": False, "error": "AbuseIPDB key missing"}
+@timed("probe", "virustotal")
+def vt_file_lookup(file_hash):
+    if not VT_KEY:
+        return {"ok": False, "error": "VT key missing"}
     try:
-        r = requests.get("https://api.abuseipdb.com/api/v2/check",
-                         params={"ipAddress": ip, "maxAgeInDays": 90},
-                         headers={"Key": ABUSE_KEY, "Accept": "application/json"}, timeout=6)
-        return {"ok": r.ok, "data": r.json().get("data") if r.ok else r.text}
+        r = resilience.get("virustotal", f"{VT_BASE}/files/{file_hash}",
+                           headers={"x-apikey": VT_KEY}, timeout=6)
+        return {"ok": r.ok, "data": r.json() if r.ok else r.text}
     except Exception as e:
         return {"ok": False, "error": str(e)}
 
-def hibp_check(email):
+@timed("probe", "abuseipdb")
+def abuseipdb_check(ip):
+    if not ABUSE_KEY:
+        return {"ok": False, "error": "AbuseIPDB key missing"}
     try:
-        encoded = requests.utils.quote(email)
-        url = f"https://haveibeenpwned.com/api/v3/breachedaccount/{encoded}?truncateResponse=false"
-        headers = {"hibp-api-key": HIBP_KEY, "User-Agent": "ShadowTrace OSINT Engine"}
-        r = requests.get(url, headers=headers, timeout=6)
-        if r.status_code == 200:
-            return {"ok": True, "data": r.json()}
-        elif r.status_code == 404:
-            return {"ok": False, "message": "No breaches found"}
-        else:
-            return {"ok": False, "status": r.status_code, "error": r.text}
+        r = resilience.get("abuseipdb", f"{ABUSEIPDB_BASE}/check",
+                           params={"ipAddress": ip, "maxAgeInDays": 90},
+                           headers={"Key": ABUSE_KEY, "Accept": "application/json"}, timeout=6)
+        return {"ok": r.ok, "data": r.json().get("data") if r.ok else r.text}
     except Exception as e:
         return {"ok": False, "error": str(e)}
 
@@ -365,80 +332,138 @@ def hibp_check(email):
 ############################################
 def index_scan_to_elastic(scan_id: str, scan_record: dict):
     try:
+        results = scan_record.get("results") or {}
+        threat = results.get("threat_score") or {}
         safe_doc = {
+            "scan_id": scan_id,
             "query": scan_record.get("query"),
+            "type": (results.get("meta") or {}).get("entity"),
             "source": scan_record.get("source"),
             "status": scan_record.get("status"),
+            "risk_level": threat.get("risk_level"),
+            "score": threat.get("score"),
+            "summary": results.get("note"),
             "created_at": scan_record.get("created_at").isoformat() if scan_record.get("created_at") else None,
             "updated_at": datetime.utcnow().isoformat(),
             "results": json.loads(json.dumps(scan_record.get("results"), default=str)),
             "raw": json.loads(json.dumps(scan_record, default=str))
         }
-        index_doc(SCAN_INDEX, safe_doc, doc_id=scan_id)
-        print(f"[+] Indexed scan {scan_id} into Elasticsearch.")
+        index_doc(SCAN_WRITE_ALIAS, safe_doc, doc_id=scan_id, require_alias=True)
     except Exception as e:
         print(f"[!] Failed to index scan {scan_id}: {e}")
 
+SUBDOMAIN_RESOLVE_LIMIT = int(os.getenv("SUBDOMAIN_RESOLVE_LIMIT", "200"))
+DOMAIN_RECORD_TYPES = ("A", "AAAA", "MX", "NS", "TXT", "CNAME")
+# budget for one scan; sections still waiting on an upstream when it runs out
+# are stored as partial instead of holding the scan (0 = wait for everything)
+SCAN_DEADLINE_SECONDS = float(os.getenv("SCAN_DEADLINE_SECONDS", "10"))
+# how long a scan waits for its buffered final write before writing it directly
+FINAL_WRITE_TIMEOUT = float(os.getenv("FINAL_WRITE_TIMEOUT", "30"))
+
 ############################################
 # Background Scan Worker
 ############################################
+def write_final(oid, fields: dict):
+    """
+    Final scan state ($set `fields`) through the write-behind buffer, confirmed:
+    a scan must not stay `running` because a flush failed, so this waits for
+    the ticket and writes directly when the buffered write failed or is late.
+    """
+    ticket = writer.update(db.search_logs, {"_id": oid}, {"$set": fields})
+    try:
+        if ticket.wait(FINAL_WRITE_TIMEOUT):
+            return
+        print(f"[!] Final write for scan {oid} still buffered after {FINAL_WRITE_TIMEOUT}s, writing directly")
+    except Exception as e:
+        print(f"[!] Buffered final write for scan {oid} failed, writing directly: {e}")
+    with span("mongo", "search_logs.update_one"):
+        db.search_logs.update_one({"_id": oid}, {"$set": fields})
+
+def fan_out(calls: dict, res: dict):
+    """Run {section: (fn, *args)} concurrently into `res`, no longer than the scan's budget."""
+    executor = concurrent.futures.ThreadPoolExecutor(len(calls))
+    futures = {k: submit(executor, fn, *args) for k, (fn, *args) in calls.items()}
+    results, late = resilience.gather(futures)
+    # late sections finish (bounded by their own timeouts) without the scan waiting
+    executor.shutdown(wait=not late, cancel_futures=True)
+    res.update(results)
+    if late:
+        res.setdefault("partial", []).extend(late)
+
 def run_scan(id):
+    timings = ScanTimings()
+    token = timings.activate()
+    budget = resilience.set_deadline(SCAN_DEADLINE_SECONDS)
     try:
         oid = ObjectId(id)
-        doc = db.search_logs.find_one({"_id": oid})
+        # read the scan and mark it running in one round trip; nobody waits on
+        # the intermediate state, so it goes out at the lower progress write concern
+        with span("mongo", "search_logs.find_one_and_update"):
+            doc = db.search_logs.with_options(write_concern=progress_concern()).find_one_and_update(
+                {"_id": oid}, {"$set": {"status": "running", "updated_at": datetime.utcnow()}},
+                return_document=ReturnDocument.AFTER)
         if not doc:
             return
 
-        q = doc["query"].strip()
-        etype = detect_entity(q)
-        db.search_logs.update_one({"_id": oid}, {"$set": {"status": "running"}})
+        q, etype = classify(doc["query"])
+        timings.entity = etype
 
         res = {"meta": {"query": q, "entity": etype, "time": str(datetime.utcnow())}}
 
         if etype == "ip":
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                futures = {
-                    "ip_rir": executor.submit(ip_rir, q),
-                    "shodan": executor.submit(shodan_search, q),
-                    "http": executor.submit(http_head, q),
-                    "vt": executor.submit(vt_ip_lookup, q),
-                    "abuseipdb": executor.submit(abuseipdb_check, q),
-                }
-                for k, f in futures.items():
-                    res[k] = f.result()
-            vt_score = res.get("vt", {}).get("data", {}).get("data", {}).get("attributes", {}).get("last_analysis_stats", {}).get("malicious", 0)
-            abuse_score = res.get("abuseipdb", {}).get("data", {}).get("abuseConfidenceScore", 0)
-            level = "low"
-            if vt_score >= 3 or abuse_score >= 30: level = "medium"
-            if vt_score >= 10 or abuse_score >= 75: level = "high"
-            res["threat_score"] = {"vt_malicious": vt_score, "abuse_confidence": abuse_score, "risk_level": level}
+            fan_out({
+                "ip_rir": (ip_rir, q, bool((doc.get("meta") or {}).get("rdap"))),
+                "shodan": (shodan_search, q),
+                "http": (http_head, q),
+                "vt": (vt_ip_lookup, q),
+                "abuseipdb": (abuseipdb_check, q),
+            }, res)
 
         elif etype == "private_ip":
             res["note"] = "Private IP; internal scan required."
 
         elif etype == "domain":
-            with concurrent.futures.ThreadPoolExecutor() as executor:
-                futures = {
-                    "whois": executor.submit(whois_domain, q),
-                    "A": executor.submit(safe_dns, q, "A"),
-                    "MX": executor.submit(safe_dns, q, "MX"),
-                    "http": executor.submit(http_head, q),
-                    "shodan": executor.submit(shodan_search, q),
-                    "vt": executor.submit(vt_domain_lookup, q),
-                }
-                for k, f in futures.items():
-                    res[k] = f.result()
-            try:
-                res["crtsh"] = requests.get(f"https://crt.sh/?q=%25.{q}&output=json", timeout=5).json()[:5]
-            except:
-                res["crtsh"] = "N/A"
+            fan_out({
+                "whois": (whois_domain, q),
+                "dns": (dns_records, q, DOMAIN_RECORD_TYPES),
+                "http": (http_head, q),
+                "shodan": (shodan_search, q),
+                "vt": (vt_domain_lookup, q),
+                "crtsh": (enumerate_subdomains, q, db),
+            }, res)
+            res["A"], res["MX"] = res["dns"].get("A", []), res["dns"].get("MX", [])
+            # newly discovered subdomains go through DNS as one batch
+            new_names = [n for n in res["crtsh"].get("names", []) if n != q][:SUBDOMAIN_RESOLVE_LIMIT]
+            if resilience.expired():
+                res["subdomains"] = {"count": len(new_names), "A": {}, "partial": True}
+            else:
+                res["subdomains"] = {"count": len(new_names), "A": dns_batch(new_names, "A")}
 
         elif etype == "email":
             domain = q.split("@")[-1]
             res["MX"] = safe_dns(domain, "MX")
             res["gravatar"] = email_gravatar(q)
-            res["hibp"] = hibp_check(q)
-            res["threat_score"] = {"risk_level": "low"}
+            res["hibp"] = check_breaches(q)
+
+        elif etype == "cidr":
+            res["note"] = "Network range; scan individual hosts."
+
+        elif etype == "url":
+            u = urlparse(q)
+            host, host_type = classify(u.hostname or "")
+            res["host"] = {"value": host, "entity": host_type}
+            res["http"] = http_head(u.netloc)
+            if host_type == "domain":
+                res["vt"] = vt_domain_lookup(host)
+            elif host_type == "ip":
+                res["vt"] = vt_ip_lookup(host)
+
+        elif etype == "hash":
+            res["algorithm"] = hash_algorithm(q)
+            res["vt"] = vt_file_lookup(q)
+
+        elif etype == "wallet":
+            res["note"] = "Crypto wallet; chain analysis requires an external data source."
 
         elif etype == "phone":
             res["note"] = "Phone OSINT requires external paid data source."
@@ -447,53 +472,181 @@ def run_scan(id):
             profile = social_probe(q)
             res["social_profile"] = profile
             res["social"] = profile.get("platforms", {})
-            res["threat_score"] = {"risk_level": "low", "confidence": profile.get("confidence", 0)}
 
         else:
-            res["note"] = "Unknown input. Try domain/ip/email/username/phone."
-
-        db.search_logs.update_one({"_id": oid}, {"$set": {"status": "done", "results": res, "updated_at": datetime.utcnow()}})
-        updated_doc = db.search_logs.find_one({"_id": oid})
-        index_scan_to_elastic(str(oid), updated_doc)
+            res["note"] = "Unknown input. Try domain/ip/cidr/url/email/hash/wallet/username/phone."
+
+        res["threat_score"] = assess(res)
+        # full upstream payloads go to the blob store; the scan keeps refs
+        with span("blobs", "put"):
+            blob_store.externalize(res, SCAN_BLOB_FIELDS)
+
+        final = {"status": "done", "results": res, "threat_model": res["threat_score"]["model"],
+                 "timings": timings.as_dict(), "updated_at": datetime.utcnow()}
+        # batched with other scans' writes, but confirmed before the scan is indexed as done
+        write_final(oid, final)
+        index_scan_to_elastic(str(oid), {**doc, **final})
+        SCANS_TOTAL.inc(etype, "done")
+
+        level = (res.get("threat_score") or {}).get("risk_level")
+        if level in ("medium", "high"):
+            raise_alert(
+                title=f"{level.capitalize()} risk {etype}: {q}",
+                severity=level,
+                description=f"Scan {oid} finished with risk level {level}.",
+                raw={"scan_id": str(oid), "query": q, "entity": etype, "threat_score": res["threat_score"]},
+            )
 
     except Exception:
         tb = traceback.format_exc()
-        db.search_logs.update_one({"_id": ObjectId(id)}, {"$set": {"status": "failed", "error": tb}})
+        SCANS_TOTAL.inc(timings.entity, "failed")
+        write_final(ObjectId(id), {"status": "failed", "error": tb, "timings": timings.as_dict(),
+                                   "updated_at": datetime.utcnow()})
+    finally:
+        resilience.reset_deadline(budget)
+        SCAN_SECONDS.observe(timings.entity, value=timings.as_dict()["total_ms"] / 1000)
+        timings.deactivate(token)
 
 ############################################
 # API Endpoints
 ############################################
-@router.post("/start")
-async def start_scan(req: SearchRequest, bg: BackgroundTasks):
-    doc = {
-        "query": req.query,
-        "source": req.source,
-        "meta": req.meta,
-        "status": "queued",
-        "results": None,
-        "created_at": datetime.utcnow(),
-        "updated_at": datetime.utcnow(),
-    }
-    id = str(db.search_logs.insert_one(doc).inserted_id)
-    bg.add_task(run_scan, id)
-    return {"id": id, "status": "queued", "query": req.query}
+def _queued_doc(query, source, meta, tenant, lane):
+    now = datetime.utcnow()
+    return {"query": query, "source": source, "meta": meta, "tenant": tenant, "lane": lane,
+            "status": "queued", "results": None, "created_at": now, "updated_at": now}
 
-@router.get("/status/{id}")
-async def status(id):
+@router.post("/start")
+async def start_scan(req: SearchRequest):
+    """Queue one scan; it runs on the fair-share scheduler, ahead of bulk work."""
+    tenant = tenant_of(req.meta)
+    lane = "batch" if (req.meta or {}).get("priority") == "batch" else "interactive"
+    id = str(db.search_logs.insert_one(_queued_doc(req.query, req.source, req.meta, tenant, lane)).inserted_id)
+    scheduler.submit(run_scan, id, tenant=tenant, lane=lane)
+    return {"id": id, "status": "queued", "query": req.query, "tenant": tenant, "lane": lane}
+
+@router.post("/bulk")
+def start_bulk(req: BulkSearchRequest):
+    """Queue many scans as batch work; the tenant gets its fair share of workers, not all of them."""
+    tenant = tenant_of(req.meta)
+    ids = []
+    for i in range(0, len(req.queries), 1000):
+        docs = [_queued_doc(q, req.source, req.meta, tenant, "batch") for q in req.queries[i:i + 1000]]
+        ids.extend(str(oid) for oid in db.search_logs.insert_many(docs).inserted_ids)
+    scheduler.submit_many(run_scan, [(id,) for id in ids], tenant=tenant, lane="batch")
+    return {"count": len(ids), "status": "queued", "tenant": tenant, "lane": "batch", "ids": ids}
+
+@router.get("/queue")
+def queue_stats():
+    """Scheduler state: queued scans per lane, and per tenant running scans and queue-wait percentiles."""
+    return scheduler.stats()
+
+def _scan_oid(id):
     try:
-        oid = ObjectId(id)
+        return ObjectId(id)
     except:
         raise HTTPException(status_code=400, detail="invalid id")
 
-    d = db.search_logs.find_one({"_id": oid})
+def _scan_etag(id, d, raw):
+    # every write to a scan sets updated_at; status is in for documents written before that
+    return responses.etag(id, d.get("updated_at"), d.get("status"), raw)
+
+def scan_doc(id, raw: bool = True):
+    d = db.search_logs.find_one({"_id": _scan_oid(id)})
     if not d:
         raise HTTPException(status_code=404, detail="not found")
 
     d["id"] = id
     d.pop("_id")
+    if raw and d.get("results"):
+        d["results"] = blob_store.hydrate(d["results"], SCAN_BLOB_FIELDS)
     return d
 
+@router.get("/status/{id}")
+def status(id: str, request: Request, raw: bool = True):
+    """
+    The scan document. Pollers send If-None-Match with the last ETag and get
+    304 without the document being read in full, hydrated or serialized.
+    """
+    if request.headers.get("if-none-match"):
+        head = db.search_logs.find_one({"_id": _scan_oid(id)}, {"updated_at": 1, "status": 1})
+        if not head:
+            raise HTTPException(status_code=404, detail="not found")
+        tag = _scan_etag(id, head, raw)
+        if responses.fresh(request, tag):
+            return responses.not_modified(tag)
+    d = scan_doc(id, raw)
+    return responses.json_response(d, _scan_etag(id, d, raw))
+
 @router.post("/run/{id}")
-async def run_now(id: str):
+def run_now(id: str):
     run_scan(id)
-    return await status(id)
+    writer.flush()
+    return responses.json_response(scan_doc(id))
+
+@router.get("/subdomains/{domain}")
+async def subdomains(domain: str, limit: int = 1000):
+    items = known_subdomains(db, domain, limit=limit)
+    return {"domain": domain.lower(), "count": len(items), "subdomains": items}
+
+class ASNLookupRequest(BaseModel):
+    ips: List[str] = Field(..., max_length=100000)
+
+@router.get("/asn/{ip}")
+def asn_lookup(ip: str, live: bool = False):
+    """ASN/prefix/registry for one IP; `live=true` asks RDAP instead of the local tables."""
+    return ip_rir(ip, live)
+
+@router.post("/asn")
+def asn_bulk_lookup(req: ASNLookupRequest):
+    """Local-table records for many IPs at once; misses come back as null, without RDAP."""
+    records = ip_index.lookup_many(req.ips)
+    return {"count": len(records), "found": sum(r is not None for r in records), "records": records}
+
+@router.get("/scoring")
+async def scoring_rules():
+    return {"model": scoring_model.version, "levels": scoring_model.levels,
+            "rules": list(scoring_model.explanations.values())}
+
+@router.get("/explain/{id}")
+async def explain(id: str):
+    d = scan_doc(id, raw=False)
+    ts = (d.get("results") or {}).get("threat_score") or {}
+    return {
+        "id": id,
+        "score": ts.get("score"),
+        "risk_level": ts.get("risk_level"),
+        "model": ts.get("model"),
+        "stale": ts.get("model") != scoring_model.version,
+        "evidence": ts.get("evidence", {}),
+        "explanations": scoring_model.explain(ts.get("rules", [])),
+    }
+
+@router.post("/rescore")
+async def rescore_history(bg: BackgroundTasks):
+    """Re-score finished scans that were scored with another model version."""
+    bg.add_task(rescore, db.search_logs)
+    return {"status": "queued", "model": scoring_model.version}
+
+@router.get("/query")
+def query_history(q: Optional[str] = None,
+                  index: str = Query("scans", pattern="^(scans|alerts|all)$"),
+                  entity: Optional[List[str]] = Query(None),
+                  risk: Optional[List[str]] = Query(None),
+                  status: Optional[List[str]] = Query(None),
+                  since: Optional[str] = Query(None, description="ISO date or date math, e.g. now-7d"),
+                  until: Optional[str] = None,
+                  size: int = Query(20, ge=1, le=100),
+                  facets: bool = True,
+                  cursor: Optional[str] = Query(None, description="`cursor` from the previous page")):
+    """
+    Full-text and filtered search over indexed scans and alerts, newest first.
+    Pass the returned `cursor` alone to get the next page.
+    """
+    params = {"q": q, "index": index, "entity": entity, "risk": risk, "status": status,
+              "since": since, "until": until, "size": size, "facets": facets}
+    try:
+        return scan_search.search(params, cursor=cursor)
+    except (ValueError, KeyError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=503, detail=f"search index unavailable: {e}")
@@ -1,76 +1,69 @@
+# app/config.py
+"""
+Central settings, read once from the environment (and ShadowTrace_backend/.env).
+
+Connection settings for MongoDB and Elasticsearch live here so every module
+gets its clients from app.database.registry instead of building its own.
+"""
 import os
-import json
-from datetime import datetime
-from elasticsearch import Elasticsearch
-from app.config import (
-    ELASTIC_URL, ELASTIC_USERNAME, ELASTIC_PASSWORD, ELASTIC_VERIFY_SSL
-)
+from dotenv import load_dotenv
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+load_dotenv(os.path.join(BASE_DIR, ".env"))
+
+
+def _bool(value, default=False):
+    if value is None or value == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _list(value):
+    return [v.strip() for v in (value or "").split(",") if v.strip()]
+
 
-#  Initialize Elasticsearch client using config variables
-def get_elasticsearch_client():
-    if not ELASTIC_URL:
-        print("[!] Elasticsearch not configured. Skipping indexing.")
-        return None
+class Settings:
+    def __init__(self, env=None):
+        env = os.environ if env is None else env
 
-    try:
-        es = Elasticsearch(
-            [ELASTIC_URL],
-            basic_auth=(ELASTIC_USERNAME, ELASTIC_PASSWORD) if ELASTIC_USERNAME else None,
-            verify_certs=ELASTIC_VERIFY_SSL,
-        )
-        if es.ping():
-            print("[+] Connected to Elasticsearch successfully.")
-        else:
-            print("[!] Elasticsearch connection failed.")
-        return es
-    except Exception as e:
-        print(f"[!] Error initializing Elasticsearch client: {e}")
-        return None
+        # ------------------ MongoDB ------------------
+        # MONGODB_URI is accepted for older deployments of the SpiderFoot ingest path; its cases
+        # lived in MONGO_DB ("shadowtrace") and are copied over by osint_processor copy-legacy
+        self.MONGO_URI = env.get("MONGO_URI") or env.get("MONGODB_URI") or ""
+        self.DB_NAME = env.get("DB_NAME", "ShadowTrace")
+        # TLS (certifi CA bundle) is on for every URI; MONGO_TLS=0 for a local plain-text mongod
+        self.MONGO_TLS = _bool(env.get("MONGO_TLS"), default=True)
+        self.MONGO_MAX_POOL_SIZE = int(env.get("MONGO_MAX_POOL_SIZE", "100"))
+        self.MONGO_MIN_POOL_SIZE = int(env.get("MONGO_MIN_POOL_SIZE", "0"))
+        self.MONGO_MAX_IDLE_MS = int(env.get("MONGO_MAX_IDLE_MS", "300000"))
+        self.MONGO_TIMEOUT_MS = int(env.get("MONGO_TIMEOUT_MS", "15000"))
 
+        # ------------------ Elasticsearch ------------------
+        self.ELASTIC_URL = env.get("ELASTIC_URL", "http://localhost:9200")
+        self.ELASTIC_USERNAME = env.get("ELASTIC_USERNAME", "")
+        self.ELASTIC_PASSWORD = env.get("ELASTIC_PASSWORD", "")
+        self.ELASTIC_VERIFY_SSL = _bool(env.get("ELASTIC_VERIFY_SSL"), default=False)
+        self.ELASTIC_CONNECTIONS_PER_NODE = int(env.get("ELASTIC_CONNECTIONS_PER_NODE", "10"))
+        self.ELASTIC_REQUEST_TIMEOUT = float(env.get("ELASTIC_REQUEST_TIMEOUT", "20"))
 
-#  Your enhanced OSINT scan runner
-def run_scan(query: str, scan_type: str):
-    """
-    Runs an OSINT scan, stores results locally,
-    and indexes them automatically into Elasticsearch.
-    """
+        # ------------------ Upstream keys / feeds ------------------
+        self.HIBP_API_KEY = env.get("HIBP_API_KEY", "00000000000000000000000000000000")
+        self.VT_API_KEY = env.get("VT_API_KEY", "")
+        self.ABUSEIPDB_KEY = env.get("ABUSEIPDB_KEY", "")
+        self.SHODAN_API_KEY = env.get("SHODAN_API_KEY", "")
+        self.DARK_FEEDS = _list(env.get("DARK_FEEDS"))
 
-    # 1️ Simulate or replace this with your real OSINT scan logic
-    scan_result = {
-        "query": query,
-        "scan_type": scan_type,
-        "timestamp": datetime.utcnow().isoformat(),
-        "status": "completed",
-        "data": {
-            "sources": ["example-source1", "example-source2"],
-            "findings": [
-                {"title": "Open directory listing", "severity": "medium"},
-                {"title": "Possible exposed API key", "severity": "high"}
-            ]
-        }
-    }
+    def public(self):
+        """Settings safe to show in diagnostics (no secrets)."""
+        hidden = ("PASSWORD", "KEY", "URI", "URL", "USERNAME", "FEEDS")
+        return {k: v for k, v in vars(self).items() if not any(h in k for h in hidden)}
 
-    # 2️ Save result locally
-    os.makedirs("scans", exist_ok=True)
-    filename = f"scans/{query}_{scan_type}.json"
-    with open(filename, "w") as f:
-        json.dump(scan_result, f, indent=2)
-    print(f"[+] Saved scan result locally at: {filename}")
 
-    # 3️ Index to Elasticsearch (if configured)
-    es = get_elasticsearch_client()
-    if es:
-        try:
-            index_name = "osint-scans"
-            es.index(index=index_name, document=scan_result)
-            print(f"[+] Indexed scan result for {query} into '{index_name}'.")
-        except Exception as e:
-            print(f"[!] Failed to index scan into Elasticsearch: {e}")
+settings = Settings()
 
-    # 4️  Return for API or frontend
-    return {
-        "query": query,
-        "scan_type": scan_type,
-        "indexed": bool(es),
-        "timestamp": scan_result["timestamp"]
-    }
+# module-level names older code imports directly
+HIBP_API_KEY = settings.HIBP_API_KEY
+ELASTIC_URL = settings.ELASTIC_URL
+ELASTIC_USERNAME = settings.ELASTIC_USERNAME
+ELASTIC_PASSWORD = settings.ELASTIC_PASSWORD
+ELASTIC_VERIFY_SSL = settings.ELASTIC_VERIFY_SSL
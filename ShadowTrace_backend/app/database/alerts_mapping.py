@@ -1,13 +1,22 @@
 # app/database/alerts_mapping.py
 
-ALERT_INDEX = "shadowtrace_alerts"
+# read alias over the alert generations; alerts are written through ALERT_WRITE_ALIAS
+ALERT_INDEX = "shadowtrace-alerts"
+ALERT_WRITE_ALIAS = "shadowtrace-alerts-write"
+ALERT_LEGACY_INDEXES = ("shadowtrace_alerts",)
 
 ALERT_MAPPING = {
     "properties": {
-        "title": {"type": "text"},
+        "alert_id": {"type": "keyword"},
+        "title": {"type": "text", "fields": {"keyword": {"type": "keyword", "ignore_above": 256}}},
         "severity": {"type": "keyword"},
+        "entity": {"type": "keyword"},
         "description": {"type": "text"},
         "timestamp": {"type": "date"},
+        # common names shared with the scans index, so one query can span both
+        "risk_level": {"type": "alias", "path": "severity"},
+        "created_at": {"type": "alias", "path": "timestamp"},
+        "doc_id": {"type": "alias", "path": "alert_id"},
         "raw": {"type": "object", "enabled": False}
     }
 }
@@ -0,0 +1,317 @@
+# app/database/blobs.py
+"""
+Content-addressed store for raw upstream payloads.
+
+Payloads (Shodan host JSON, VT reports, RDAP, whois, SpiderFoot exports) are
+serialized canonically, keyed by the sha256 of that serialization and kept
+compressed (zstd when `zstandard` is installed, zlib otherwise) in GridFS or
+on the local filesystem. Documents hold a small reference in place of the
+payload:
+
+    {"_blob": "<sha256>", "bytes": <uncompressed size>}
+
+so the same report fetched by a hundred scans is stored once, and
+search_logs / osint_cases documents stay small enough to keep the working
+set in memory. Blobs are immutable, which makes reads safe to cache.
+
+Migrate existing documents with:
+
+    python -m app.database.blobs migrate [--dry-run] [--batch 500]
+"""
+import os
+import json
+import zlib
+import hashlib
+import threading
+from collections import OrderedDict
+
+from app.utils.metrics import register, Counter
+
+BLOB_BACKEND = os.getenv("BLOB_BACKEND", "gridfs")  # gridfs | fs
+BLOB_DIR = os.getenv("BLOB_DIR", os.path.abspath(os.path.join(os.path.dirname(__file__), "../../data/blobs")))
+BLOB_BUCKET = os.getenv("BLOB_BUCKET", "blobs")
+BLOB_MIN_BYTES = int(os.getenv("BLOB_MIN_BYTES", "2048"))
+BLOB_LEVEL = int(os.getenv("BLOB_LEVEL", "6"))
+BLOB_CACHE_SIZE = int(os.getenv("BLOB_CACHE_SIZE", "512"))
+
+# result fields of a /search scan that carry full upstream payloads
+SCAN_BLOB_FIELDS = ("shodan", "vt", "abuseipdb", "ip_rir", "whois", "crtsh", "hibp", "gravatar")
+# top-level fields of an osint_cases document
+CASE_BLOB_FIELDS = ("raw",)
+# set by migrate() to the min_bytes a document was checked against, so re-runs skip it
+MIGRATED_FIELD = "blob_min_bytes"
+
+try:
+    import zstandard
+    CODEC = "zstd"
+except ImportError:
+    zstandard = None
+    CODEC = "zlib"
+
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+BLOB_PUTS = register(Counter("shadowtrace_blob_puts_total", "Payloads offered to the blob store by outcome.",
+                             ("result",)))
+BLOB_BYTES = register(Counter("shadowtrace_blob_bytes_total", "Payload bytes before and after dedup/compression.",
+                              ("kind",)))
+
+
+def encode(obj) -> bytes:
+    """Canonical serialization: equal payloads give equal bytes, whatever the key order."""
+    return json.dumps(obj, sort_keys=True, separators=(",", ":"), default=str).encode()
+
+
+def compress(data: bytes) -> bytes:
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=BLOB_LEVEL).compress(data)
+    return zlib.compress(data, BLOB_LEVEL)
+
+
+def decompress(data: bytes) -> bytes:
+    # the frame magic tells the codec, so blobs written by either build stay readable
+    if data[:4] == ZSTD_MAGIC:
+        if zstandard is None:
+            raise RuntimeError("blob is zstd-compressed but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return zlib.decompress(data)
+
+
+def is_ref(value) -> bool:
+    return isinstance(value, dict) and "_blob" in value
+
+
+############################################
+# Backends
+############################################
+class FileBackend:
+    def __init__(self, root: str = BLOB_DIR):
+        self.root = root
+
+    def _path(self, key):
+        return os.path.join(self.root, key[:2], key[2:4], key)
+
+    def existing(self, keys):
+        return {k for k in keys if os.path.exists(self._path(k))}
+
+    def write(self, key, data):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        # same key means same content, so a concurrent writer winning is harmless
+        os.replace(tmp, path)
+
+    def read(self, key):
+        with open(self._path(key), "rb") as f:
+            return f.read()
+
+
+class GridFSBackend:
+    def __init__(self, database, bucket: str = BLOB_BUCKET):
+        import gridfs
+
+        self.files = database[f"{bucket}.files"]
+        self.bucket = gridfs.GridFSBucket(database, bucket_name=bucket)
+        self.exists_error = gridfs.errors.FileExists
+
+    def existing(self, keys):
+        return {d["_id"] for d in self.files.find({"_id": {"$in": list(keys)}}, {"_id": 1})}
+
+    def write(self, key, data):
+        try:
+            self.bucket.upload_from_stream_with_id(key, key, data, metadata={"codec": CODEC})
+        except self.exists_error:
+            pass
+
+    def read(self, key):
+        return self.bucket.open_download_stream(key).read()
+
+
+############################################
+# Store
+############################################
+class BlobStore:
+    def __init__(self, backend=None, min_bytes: int = BLOB_MIN_BYTES, cache_size: int = BLOB_CACHE_SIZE):
+        self._backend = backend
+        self.min_bytes = min_bytes
+        self.cache_size = cache_size
+        self.lock = threading.Lock()
+        self.known = OrderedDict()  # keys known to be stored
+        self.cache = OrderedDict()  # key -> uncompressed bytes
+
+    @property
+    def backend(self):
+        if self._backend is None:
+            if BLOB_BACKEND == "fs":
+                self._backend = FileBackend()
+            else:
+                from app.database import mongo
+                self._backend = GridFSBackend(mongo.database())
+        return self._backend
+
+    def _remember(self, table, key, value=True):
+        with self.lock:
+            table[key] = value
+            table.move_to_end(key)
+            while len(table) > self.cache_size:
+                table.popitem(last=False)
+
+    def put_many(self, payloads: dict) -> dict:
+        """
+        Store {field: payload} and return {field: ref}. Payloads smaller than
+        min_bytes are returned unchanged. One existence lookup per call.
+        """
+        out, pending = {}, {}
+        for field, obj in payloads.items():
+            if obj is None or is_ref(obj):
+                out[field] = obj
+                continue
+            data = encode(obj)
+            if len(data) < self.min_bytes:
+                out[field] = obj
+                continue
+            key = hashlib.sha256(data).hexdigest()
+            out[field] = {"_blob": key, "bytes": len(data)}
+            pending.setdefault(key, data)
+            BLOB_BYTES.inc("raw", amount=len(data))
+
+        unknown = [k for k in pending if k not in self.known]
+        stored = self.backend.existing(unknown) if unknown else set()
+        for key, data in pending.items():
+            if key in self.known or key in stored:
+                BLOB_PUTS.inc("dedup")
+            else:
+                packed = compress(data)
+                self.backend.write(key, packed)
+                BLOB_PUTS.inc("new")
+                BLOB_BYTES.inc("stored", amount=len(packed))
+            self._remember(self.known, key)
+        return out
+
+    def put(self, obj):
+        return self.put_many({"v": obj})["v"]
+
+    def get(self, ref):
+        """Payload for a ref; anything that is not a ref is returned as is."""
+        if not is_ref(ref):
+            return ref
+        key = ref["_blob"]
+        data = self.cache.get(key)
+        if data is None:
+            data = decompress(self.backend.read(key))
+            self._remember(self.cache, key, data)
+        return json.loads(data)
+
+    # ------------------ documents ------------------
+    def externalize(self, doc: dict, fields) -> dict:
+        """Replace large payload fields of doc (in place) with refs."""
+        present = {f: doc[f] for f in fields if f in doc}
+        if present:
+            doc.update(self.put_many(present))
+        return doc
+
+    def hydrate(self, doc: dict, fields=None) -> dict:
+        """Copy of doc with ref fields resolved back to payloads."""
+        if not isinstance(doc, dict):
+            return doc
+        out = dict(doc)
+        for f in (fields or doc.keys()):
+            if is_ref(out.get(f)):
+                out[f] = self.get(out[f])
+        return out
+
+
+store = BlobStore()
+
+
+############################################
+# Migration
+############################################
+def _flush(collection, ops, dry_run):
+    if ops and not dry_run:
+        collection.bulk_write(ops, ordered=False)
+    ops.clear()
+
+
+def migrate(database, blob_store: BlobStore = None, batch_size: int = 500, dry_run: bool = False) -> dict:
+    """
+    Move inline payloads of existing search_logs and osint_cases documents into
+    the blob store. osint_cases entities also drop their copy of the raw
+    SpiderFoot item for a position into the stored export. Safe to re-run:
+    checked documents are marked with MIGRATED_FIELD and not read again
+    unless min_bytes changes.
+    """
+    from pymongo import UpdateOne
+    from app.services.osint_processor import extract_entities_from_sf
+
+    s = blob_store or store
+    report = {}
+
+    # ------------------ search_logs ------------------
+    coll = database.search_logs
+    # older scans stored some payloads (crtsh) as lists
+    inline = [cond for f in SCAN_BLOB_FIELDS for cond in (
+        {f"results.{f}": {"$type": "object"}, f"results.{f}._blob": {"$exists": False}},
+        {f"results.{f}": {"$type": "array"}})]
+    query = {MIGRATED_FIELD: {"$ne": s.min_bytes}, "$or": inline}
+    stats = report["search_logs"] = {"scanned": 0, "rewritten": 0}
+    ops = []
+    for doc in coll.find(query, {"results": 1}, batch_size=batch_size):
+        stats["scanned"] += 1
+        results = doc.get("results") or {}
+        present = {f: results[f] for f in SCAN_BLOB_FIELDS
+                   if isinstance(results.get(f), (dict, list)) and not is_ref(results[f])}
+        if dry_run:
+            refs = {f: v for f, v in present.items() if len(encode(v)) >= s.min_bytes}
+        else:
+            refs = {f: v for f, v in s.put_many(present).items() if is_ref(v)}
+        if refs:
+            stats["rewritten"] += 1
+        # payloads under the threshold stay inline; the mark keeps them from being read again
+        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {MIGRATED_FIELD: s.min_bytes,
+                                                             **{f"results.{f}": v for f, v in refs.items()}}}))
+        if len(ops) >= batch_size:
+            _flush(coll, ops, dry_run)
+    _flush(coll, ops, dry_run)
+
+    # ------------------ osint_cases ------------------
+    coll = database.osint_cases
+    query = {MIGRATED_FIELD: {"$ne": s.min_bytes},
+             "$or": [{"raw": {"$exists": True, "$ne": None}, "raw._blob": {"$exists": False}},
+                     {"entities.raw": {"$exists": True}}]}
+    stats = report["osint_cases"] = {"scanned": 0, "rewritten": 0}
+    for doc in coll.find(query, {"raw": 1, "entities": 1}, batch_size=batch_size):
+        stats["scanned"] += 1
+        raw = s.get(doc.get("raw")) if not dry_run else doc.get("raw")
+        if raw:
+            update = {"entities": [i.to_doc() for i in extract_entities_from_sf(raw)]}
+        else:
+            update = {"entities": [{k: v for k, v in e.items() if k != "raw"} for e in doc.get("entities") or []]}
+        if not dry_run:
+            update.update(s.put_many({f: doc[f] for f in CASE_BLOB_FIELDS if f in doc}))
+        update[MIGRATED_FIELD] = s.min_bytes
+        stats["rewritten"] += 1
+        ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": update}))
+        if len(ops) >= batch_size:
+            _flush(coll, ops, dry_run)
+    _flush(coll, ops, dry_run)
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(prog="python -m app.database.blobs")
+    ap.add_argument("command", choices=["migrate"])
+    ap.add_argument("--batch", type=int, default=500)
+    ap.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args()
+
+    from app.database import mongo
+
+    status = mongo.connect()
+    if status["db_status"] != "connected":
+        raise SystemExit(f"MongoDB not available: {status.get('error')}")
+    print(json.dumps(migrate(mongo.database(), batch_size=args.batch, dry_run=args.dry_run), indent=2))
+    mongo.close()
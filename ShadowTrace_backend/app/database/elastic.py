@@ -1,73 +1,60 @@
 # app/database/elastic.py
-import os
 import time
-from dotenv import load_dotenv
-
-# load .env located two levels up from this file
-BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))
-ENV_PATH = os.path.join(BASE_DIR, ".env")
-load_dotenv(ENV_PATH)
-
-ELASTIC_URL = os.getenv("ELASTIC_URL", "http://localhost:9200")
-ELASTIC_USERNAME = os.getenv("ELASTIC_USERNAME", "")
-ELASTIC_PASSWORD = os.getenv("ELASTIC_PASSWORD", "")
-ELASTIC_VERIFY_SSL = os.getenv("ELASTIC_VERIFY_SSL", "false").lower() in ("true", "1", "yes")
-
-# late import to avoid import errors while loading module
-try:
-    from elasticsearch import Elasticsearch
-    # try to import known exception classes if available
-    try:
-        from elasticsearch import exceptions as es_exceptions
-        # alias for older/newer clients
-        ElasticsearchException = getattr(es_exceptions, "ElasticsearchException", None)
-    except Exception:
-        es_exceptions = None
-        ElasticsearchException = None
-except Exception as e:
-    Elasticsearch = None
-    es_exceptions = None
-    ElasticsearchException = None
-    print("Elasticsearch python client import error:", e)
+
+from app.config import settings
+from app.database.registry import registry
+from app.utils.metrics import timed
+
+ELASTIC_URL = settings.ELASTIC_URL
 
 es_client = None
 es_status = {"elastic": "not_connected", "error": None}
 
 
-def init_elasticsearch():
-    """Initialize ES client. Safe to call multiple times."""
+def init_elasticsearch(ensure_indices: bool = True):
+    """
+    Fetch the shared ES client from the registry and ping it. Safe to call
+    multiple times. Blocking, so app startup runs it off the event loop.
+
+    The client is only published (es_client) once the index templates and
+    write aliases exist: a document indexed into a write alias that is not
+    there yet would create a concrete index under the alias name, and the
+    alias could never be attached afterwards. Returns the ensure() report.
+    """
     global es_client, es_status
-    if Elasticsearch is None:
-        es_status = {"elastic": "error", "error": "elasticsearch client not installed"}
-        return
+    if not ELASTIC_URL:
+        es_status = {"elastic": "disabled", "error": "ELASTIC_URL not set"}
+        return None
 
     try:
-        kwargs = {}
-        verify = ELASTIC_VERIFY_SSL
-        # If URL is https and no username/password provided, client will still try anonymous TLS
-        if ELASTIC_USERNAME and ELASTIC_PASSWORD:
-            kwargs["basic_auth"] = (ELASTIC_USERNAME, ELASTIC_PASSWORD)
-
-        # Use the URL list form to allow http/https
-        es_client = Elasticsearch([ELASTIC_URL], verify_certs=verify, request_timeout=20, **kwargs)
-
+        client = registry.elastic()
         # ping will perform a simple request to the root
-        if es_client.ping():
-            es_status = {"elastic": "connected"}
-            print("Connected to Elasticsearch at", ELASTIC_URL)
-        else:
+        if not client.ping():
             # if ping returns False, show info
             es_status = {"elastic": "unreachable", "error": f"ping returned False for {ELASTIC_URL}"}
             es_client = None
+            return None
     except Exception as e:
         es_client = None
         es_status = {"elastic": "error", "error": str(e)}
         # print brief info for logs
         print("Elasticsearch connection failed:", e)
+        return None
 
-
-# initialize on import
-init_elasticsearch()
+    report = None
+    if ensure_indices:
+        from app.database import index_lifecycle
+        try:
+            report = index_lifecycle.ensure(client)
+        except Exception as e:
+            es_client = None
+            es_status = {"elastic": "error", "error": f"index generations not set up: {e}"}
+            print("Elasticsearch index setup failed:", e)
+            return None
+    es_client = client
+    es_status = {"elastic": "connected"}
+    print("Connected to Elasticsearch at", ELASTIC_URL)
+    return report
 
 
 def create_index(index_name: str, mapping: dict = None, wait_for_active_shards: str = "1"):
@@ -89,15 +76,21 @@ def create_index(index_name: str, mapping: dict = None, wait_for_active_shards:
             # option: wait for shard active (not blocking by default)
             # es_client.indices.refresh(index=index_name)
             return True
+        if mapping:
+            # new fields and sub-fields are additive, so existing indexes pick them up
+            es_client.indices.put_mapping(index=index_name, properties=mapping.get("properties", {}))
         return False
     except Exception as e:
         # re-raise to let caller handle failures
         raise
 
 
-def index_doc(index_name: str, body: dict, doc_id: str = None, refresh: bool = False):
+@timed("es", "index")
+def index_doc(index_name: str, body: dict, doc_id: str = None, refresh: bool = False, require_alias: bool = False):
     """
-    Index a document into ES. doc_id optional.
+    Index a document into ES. doc_id optional. Pass require_alias=True when
+    index_name is a write alias, so a missing alias is an error instead of
+    an auto-created index under the alias name.
     """
     if es_client is None:
         raise RuntimeError("Elasticsearch client not initialized")
@@ -105,19 +98,20 @@ def index_doc(index_name: str, body: dict, doc_id: str = None, refresh: bool = F
     try:
         if doc_id:
             # modern client uses 'document' keyword
-            es_client.index(index=index_name, id=doc_id, document=body, refresh=refresh)
+            es_client.index(index=index_name, id=doc_id, document=body, refresh=refresh, require_alias=require_alias)
         else:
-            es_client.index(index=index_name, document=body, refresh=refresh)
+            es_client.index(index=index_name, document=body, refresh=refresh, require_alias=require_alias)
     except Exception as e:
         # bubble up to callers so they can retry
         raise
 
 
-def index_doc_with_retry(index_name: str, body: dict, doc_id: str = None, attempts: int = 3, delay: float = 1.0):
+def index_doc_with_retry(index_name: str, body: dict, doc_id: str = None, attempts: int = 3, delay: float = 1.0,
+                         require_alias: bool = False):
     last_exc = None
     for i in range(attempts):
         try:
-            index_doc(index_name, body, doc_id=doc_id, refresh=False)
+            index_doc(index_name, body, doc_id=doc_id, refresh=False, require_alias=require_alias)
             return True
         except Exception as e:
             last_exc = e
@@ -125,6 +119,7 @@ def index_doc_with_retry(index_name: str, body: dict, doc_id: str = None, attemp
     raise last_exc
 
 
+@timed("es", "search")
 def search_docs(index_name: str, query: dict, size: int = 10):
     """
     Execute a search. Query should be the body (dict).
@@ -140,5 +135,31 @@ def search_docs(index_name: str, query: dict, size: int = 10):
         raise
 
 
+@timed("es", "search")
+def search_pit(body: dict):
+    """
+    Search inside a point in time; `body` carries the pit id, sort and search_after.
+    """
+    if es_client is None:
+        raise RuntimeError("Elasticsearch client not initialized")
+    return es_client.search(body=body)
+
+
+def open_pit(index_name: str, keep_alive: str = "1m") -> str:
+    if es_client is None:
+        raise RuntimeError("Elasticsearch client not initialized")
+    return es_client.open_point_in_time(index=index_name, keep_alive=keep_alive)["id"]
+
+
+def close_pit(pit_id: str):
+    if es_client is None:
+        return
+    try:
+        es_client.close_point_in_time(id=pit_id)
+    except Exception as e:
+        # an expired PIT is already gone
+        print(f"[!] Failed to close point in time: {e}")
+
+
 def get_status():
     return es_status
@@ -1,13 +1,23 @@
 # app/database/es_mapping.py
-SCAN_INDEX = "shadowtrace-osint-scans-v2"
+# Scans are written through SCAN_WRITE_ALIAS into generations
+# (shadowtrace-osint-scans-000001, -000002, ...) that roll over by size or
+# age; SCAN_INDEX is the read alias over every generation. See
+# app/database/index_lifecycle.py.
+SCAN_INDEX = "shadowtrace-osint-scans"
+SCAN_WRITE_ALIAS = "shadowtrace-osint-scans-write"
+# single indexes from before rollover; kept readable through SCAN_INDEX until retention drops them
+SCAN_LEGACY_INDEXES = ("shadowtrace-osint-scans-v2", "shadowtrace-osint-scans-v3")
 
 
-# Example mapping - adjust fields as you store them in MongoDB
 MAPPING = {
     "properties": {
-        "query": {"type": "text"},
+        "scan_id": {"type": "keyword"},
+        "query": {"type": "text", "fields": {"keyword": {"type": "keyword", "ignore_above": 256}}},
         "type": {"type": "keyword"},
         "source": {"type": "keyword"},
+        "status": {"type": "keyword"},
+        "risk_level": {"type": "keyword"},
+        "score": {"type": "float"},
         "summary": {"type": "text"},
         "findings": {
             "type": "nested",
@@ -19,6 +29,12 @@ MAPPING = {
             }
         },
         "timestamp": {"type": "date"},
+        "created_at": {"type": "date"},
+        "updated_at": {"type": "date"},
+        # common names shared with the alerts index, so one query can span both
+        "entity": {"type": "alias", "path": "type"},
+        "doc_id": {"type": "alias", "path": "scan_id"},
+        "results": {"type": "object", "enabled": False},
         "raw": {"type": "object", "enabled": False}  # store raw if you want but not indexed
     }
 }
@@ -0,0 +1,248 @@
+# app/database/index_lifecycle.py
+"""
+Rolling index generations for scans and alerts.
+
+Each family (scans, alerts) is a series of generations, e.g.
+shadowtrace-alerts-000001, -000002, ..., created from an index template
+built from es_mapping.py / alerts_mapping.py:
+
+    <name>-write   write alias, on the newest generation only
+    <name>         read alias, on every generation (and on the pre-rollover
+                   single index, so old documents stay searchable)
+
+The write alias rolls over to a new generation by age, primary shard size
+or document count, so a mapping change only needs a template update and a
+rollover. A generation stops taking writes when the next one is created; after
+ES_FORCEMERGE_AFTER_HOURS it is write-blocked and force-merged to one
+segment, and after the family's retention period it is deleted. The write
+generation is never touched.
+
+The app runs ensure() when Elasticsearch connects and maintain() every
+ES_MAINTENANCE_INTERVAL seconds. The same steps are available as
+
+    python -m app.database.index_lifecycle ensure|rollover|retention|maintain|status [--dry-run]
+"""
+import os
+import json
+import time
+import asyncio
+
+from app.database import elastic
+from app.database.es_mapping import SCAN_INDEX, SCAN_WRITE_ALIAS, SCAN_LEGACY_INDEXES, MAPPING as SCAN_MAPPING
+from app.database.alerts_mapping import ALERT_INDEX, ALERT_WRITE_ALIAS, ALERT_LEGACY_INDEXES, ALERT_MAPPING
+
+ES_INDEX_SHARDS = int(os.getenv("ES_INDEX_SHARDS", "1"))
+ES_INDEX_REPLICAS = int(os.getenv("ES_INDEX_REPLICAS", "1"))
+ES_ROLLOVER_MAX_AGE = os.getenv("ES_ROLLOVER_MAX_AGE", "30d")
+ES_ROLLOVER_MAX_SHARD_SIZE = os.getenv("ES_ROLLOVER_MAX_SHARD_SIZE", "30gb")
+ES_ROLLOVER_MAX_DOCS = int(os.getenv("ES_ROLLOVER_MAX_DOCS", "0"))  # 0: no document limit
+ES_FORCEMERGE_AFTER_HOURS = float(os.getenv("ES_FORCEMERGE_AFTER_HOURS", "24"))
+ES_SCAN_RETENTION_DAYS = float(os.getenv("ES_SCAN_RETENTION_DAYS", "365"))
+ES_ALERT_RETENTION_DAYS = float(os.getenv("ES_ALERT_RETENTION_DAYS", "180"))
+ES_MAINTENANCE_INTERVAL = int(os.getenv("ES_MAINTENANCE_INTERVAL", "3600"))
+
+
+class IndexFamily:
+    def __init__(self, name, read_alias, write_alias, mapping, legacy=(), retention_days=None):
+        self.name = name
+        self.read_alias = read_alias
+        self.write_alias = write_alias
+        self.mapping = mapping
+        self.legacy = tuple(legacy)
+        self.retention_days = retention_days
+
+    @property
+    def pattern(self):
+        return f"{self.read_alias}-0*"
+
+    @property
+    def first_generation(self):
+        return f"{self.read_alias}-000001"
+
+    def template(self):
+        return {
+            "index_patterns": [self.pattern],
+            "priority": 200,
+            "template": {
+                "settings": {"number_of_shards": ES_INDEX_SHARDS, "number_of_replicas": ES_INDEX_REPLICAS},
+                "mappings": self.mapping,
+                # every new generation joins the read alias as it is created
+                "aliases": {self.read_alias: {}},
+            },
+            "meta": {"managed_by": "shadowtrace"},
+        }
+
+
+FAMILIES = {
+    "scans": IndexFamily("scans", SCAN_INDEX, SCAN_WRITE_ALIAS, SCAN_MAPPING,
+                         SCAN_LEGACY_INDEXES, ES_SCAN_RETENTION_DAYS),
+    "alerts": IndexFamily("alerts", ALERT_INDEX, ALERT_WRITE_ALIAS, ALERT_MAPPING,
+                          ALERT_LEGACY_INDEXES, ES_ALERT_RETENTION_DAYS),
+}
+
+
+def _client(es):
+    es = es if es is not None else elastic.es_client
+    if es is None:
+        raise RuntimeError("Elasticsearch client not initialized")
+    return es
+
+
+def rollover_conditions():
+    conditions = {"max_age": ES_ROLLOVER_MAX_AGE, "max_primary_shard_size": ES_ROLLOVER_MAX_SHARD_SIZE}
+    if ES_ROLLOVER_MAX_DOCS:
+        conditions["max_docs"] = ES_ROLLOVER_MAX_DOCS
+    return conditions
+
+
+############################################
+# Setup
+############################################
+def ensure(es=None, families=None) -> dict:
+    """Templates, the first generation with its write alias, and read aliases on legacy indexes. Idempotent."""
+    es = _client(es)
+    report = {}
+    for fam in families or FAMILIES.values():
+        es.indices.put_index_template(name=fam.read_alias, **fam.template())
+        out = report[fam.name] = {"template": fam.read_alias, "created": None, "adopted": []}
+        if not es.indices.exists_alias(name=fam.write_alias):
+            try:
+                es.indices.create(index=fam.first_generation,
+                                  aliases={fam.write_alias: {"is_write_index": True}})
+                out["created"] = fam.first_generation
+            except Exception as e:
+                # another worker bootstrapped it first
+                if "resource_already_exists" not in str(e):
+                    raise
+        for name in fam.legacy:
+            if es.indices.exists(index=name) and not es.indices.exists_alias(name=fam.read_alias, index=name):
+                es.indices.update_aliases(actions=[{"add": {"index": name, "alias": fam.read_alias}}])
+                out["adopted"].append(name)
+    return report
+
+
+############################################
+# Maintenance
+############################################
+def generations(es, fam: IndexFamily):
+    """[(index, created_ms, settings, aliases)] of a family, oldest first, legacy indexes included."""
+    names = [fam.pattern] + [n for n in fam.legacy if es.indices.exists(index=n)]
+    info = es.indices.get(index=",".join(names), ignore_unavailable=True, allow_no_indices=True)
+    gens = [(name, int(d["settings"]["index"]["creation_date"]), d["settings"]["index"], d.get("aliases") or {})
+            for name, d in info.items()]
+    return sorted(gens, key=lambda g: (g[1], g[0]))
+
+
+def rollover(es=None, families=None, dry_run: bool = False) -> dict:
+    es = _client(es)
+    report = {}
+    for fam in families or FAMILIES.values():
+        resp = es.indices.rollover(alias=fam.write_alias, conditions=rollover_conditions(), dry_run=dry_run)
+        report[fam.name] = {
+            "rolled_over": resp.get("rolled_over", False),
+            "old_index": resp.get("old_index"),
+            "new_index": resp.get("new_index"),
+            "conditions": resp.get("conditions", {}),
+        }
+        if resp.get("rolled_over"):
+            print(f"[index] {fam.write_alias} rolled over to {resp['new_index']}")
+    return report
+
+
+def retention(es=None, families=None, now: float = None, dry_run: bool = False) -> dict:
+    """Force-merge generations that stopped taking writes; delete those past the family's retention."""
+    es = _client(es)
+    now_ms = (now if now is not None else time.time()) * 1000
+    report = {}
+    for fam in families or FAMILIES.values():
+        out = report[fam.name] = {"merged": [], "deleted": []}
+        gens = generations(es, fam)
+        # a generation retired when the next one was created
+        for (name, _, index_settings, aliases), (_, retired_ms, _, _) in zip(gens, gens[1:]):
+            if (aliases.get(fam.write_alias) or {}).get("is_write_index"):
+                continue
+            age_hours = (now_ms - retired_ms) / 3_600_000
+            if fam.retention_days is not None and age_hours > fam.retention_days * 24:
+                out["deleted"].append(name)
+                if not dry_run:
+                    es.indices.delete(index=name)
+                    print(f"[index] deleted {name} (retired {age_hours / 24:.0f} days ago)")
+            elif age_hours > ES_FORCEMERGE_AFTER_HOURS and \
+                    str((index_settings.get("blocks") or {}).get("write")).lower() != "true":
+                out["merged"].append(name)
+                if not dry_run:
+                    # read-only from here on, so the single merged segment stays that way
+                    es.indices.put_settings(index=name, settings={"index.blocks.write": True})
+                    es.indices.forcemerge(index=name, max_num_segments=1, wait_for_completion=False)
+                    print(f"[index] force-merging {name}")
+    return report
+
+
+def maintain(es=None, dry_run: bool = False) -> dict:
+    return {"rollover": rollover(es, dry_run=dry_run), "retention": retention(es, dry_run=dry_run)}
+
+
+def status(es=None) -> dict:
+    es = _client(es)
+    out = {}
+    for fam in FAMILIES.values():
+        gens = generations(es, fam)
+        stats = es.indices.stats(index=fam.read_alias, metric="docs,store,segments")["indices"] if gens else {}
+        out[fam.name] = {
+            "read_alias": fam.read_alias,
+            "write_alias": fam.write_alias,
+            "retention_days": fam.retention_days,
+            "generations": [{
+                "index": name,
+                "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(created / 1000)),
+                "write": bool((aliases.get(fam.write_alias) or {}).get("is_write_index")),
+                "read_only": str((index_settings.get("blocks") or {}).get("write")).lower() == "true",
+                "docs": stats.get(name, {}).get("primaries", {}).get("docs", {}).get("count"),
+                "bytes": stats.get(name, {}).get("primaries", {}).get("store", {}).get("size_in_bytes"),
+                "segments": stats.get(name, {}).get("primaries", {}).get("segments", {}).get("count"),
+            } for name, created, index_settings, aliases in gens],
+        }
+    return out
+
+
+async def maintain_forever(interval: int = ES_MAINTENANCE_INTERVAL):
+    """Lifespan task: rollover and retention on a fixed interval while Elasticsearch is connected."""
+    while True:
+        await asyncio.sleep(interval)
+        if elastic.es_client is None:
+            # not connected, or the aliases could not be set up at startup: try again
+            if elastic.ELASTIC_URL:
+                await asyncio.to_thread(elastic.init_elasticsearch)
+            continue
+        try:
+            await asyncio.to_thread(maintain)
+        except Exception as e:
+            print(f"[!] Index maintenance failed: {e}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(prog="python -m app.database.index_lifecycle")
+    ap.add_argument("command", choices=["ensure", "rollover", "retention", "maintain", "status"])
+    ap.add_argument("--family", choices=sorted(FAMILIES))
+    ap.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args()
+
+    # the CLI reaches the cluster even when ensure() would fail, to inspect or repair it
+    elastic.init_elasticsearch(ensure_indices=False)
+    if elastic.es_client is None:
+        raise SystemExit(f"Elasticsearch not available: {elastic.get_status()}")
+    fams = [FAMILIES[args.family]] if args.family else None
+    if args.command == "ensure":
+        result = ensure(families=fams)
+    elif args.command == "rollover":
+        result = rollover(families=fams, dry_run=args.dry_run)
+    elif args.command == "retention":
+        result = retention(families=fams, dry_run=args.dry_run)
+    elif args.command == "maintain":
+        result = {"rollover": rollover(families=fams, dry_run=args.dry_run),
+                  "retention": retention(families=fams, dry_run=args.dry_run)}
+    else:
+        result = status()
+    print(json.dumps(result, indent=2))
@@ -1,41 +1,74 @@
 # database/mongo.py
-import os
-import certifi
-from pymongo import MongoClient
-from dotenv import load_dotenv
+from app.config import settings
+from app.database.registry import registry
 
-# Load .env from D:\ShadowTrace\.env
-BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-load_dotenv(os.path.join(BASE_DIR, ".env"))
+DB_NAME = settings.DB_NAME
 
-MONGO_URI = os.getenv("MONGO_URI")
-DB_NAME = os.getenv("DB_NAME", "ShadowTrace")
+client = None
+_database = None
+db_status = {"db_status": "connecting", "error": None}
 
-db = None
-scans_collection = None
-db_status = {"db_status": "failed", "error": "Not connected"}
 
-if not MONGO_URI:
-    print("[!] MONGO_URI not found in .env")
-else:
+class _Lazy:
+    """
+    Module-level stand-in for the pymongo Database / Collection, so modules can
+    `from app.database.mongo import db` at import time while the client is only
+    created by connect() during app startup.
+    """
+
+    def __init__(self, resolve):
+        self._resolve = resolve
+
+    def _target(self):
+        target = self._resolve()
+        if target is None:
+            raise RuntimeError(f"MongoDB not connected ({db_status.get('error') or db_status['db_status']})")
+        return target
+
+    def __getattr__(self, name):
+        return getattr(self._target(), name)
+
+    def __getitem__(self, name):
+        return self._target()[name]
+
+    def __bool__(self):
+        return self._resolve() is not None
+
+
+db = _Lazy(lambda: _database)
+scans_collection = _Lazy(lambda: _database["scans"] if _database is not None else None)
+
+
+def database():
+    """The connected pymongo Database itself, for APIs such as gridfs that reject the `db` proxy."""
+    return db._target()
+
+
+def connect():
+    """Create the shared client and ping it. Blocking; app startup runs it off the event loop."""
+    global client, _database, db_status
+    if not settings.MONGO_URI:
+        db_status = {"db_status": "failed", "error": "MONGO_URI not set"}
+        print("[!] MONGO_URI not found in .env")
+        return db_status
+
     try:
-        # Force modern TLS + fresh CA bundle
-        client = MongoClient(
-            MONGO_URI,
-            tls=True,
-            tlsCAFile=certifi.where(),
-            serverSelectionTimeoutMS=15000,
-            connectTimeoutMS=15000,
-            socketTimeoutMS=15000,
-            tlsAllowInvalidCertificates=False  # NEVER True in prod
-        )
-        # Test connection
+        client = registry.mongo_client()
+        # Test connection; db stays unset until the server answers
         client.admin.command("ping")
-        db = client[DB_NAME]
-        scans_collection = db["scans"]
+        _database = client[DB_NAME]
         db_status = {"db_status": "connected"}
-        print(f"MongoDB Atlas CONNECTED: {DB_NAME}")
+        print(f"MongoDB CONNECTED: {DB_NAME}")
     except Exception as e:
         error_msg = str(e)
+        _database = None
         db_status = {"db_status": "failed", "error": error_msg}
-        print(f"MongoDB connection FAILED: {error_msg}")
\ No newline at end of file
+        print(f"MongoDB connection FAILED: {error_msg}")
+    return db_status
+
+
+def close():
+    global client, _database
+    registry.close()
+    client = None
+    _database = None
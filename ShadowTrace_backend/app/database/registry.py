@@ -0,0 +1,166 @@
+# app/database/registry.py
+"""
+One pooled MongoDB client and one Elasticsearch client per process.
+
+Clients are created on first use (from the lifespan hook in practice) and
+shared by everything else; pool sizes come from app.config. Pool utilization
+is tracked through pymongo's connection pool events and read from the ES
+transport's urllib3 pools, and exported as metrics.
+"""
+import threading
+
+from app.config import settings
+from app.utils.metrics import register, Gauge
+
+
+class MongoPoolCounter:
+    """Open and checked-out connections per server, fed by pymongo pool events."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.open = {}
+        self.in_use = {}
+
+    def add(self, table, address, n):
+        key = "%s:%s" % address
+        with self.lock:
+            table[key] = max(0, table.get(key, 0) + n)
+
+    def cleared(self, address):
+        with self.lock:
+            self.in_use.pop("%s:%s" % address, None)
+
+    def listener(self):
+        from pymongo import monitoring
+        counter = self
+
+        class PoolListener(monitoring.ConnectionPoolListener):
+            def connection_created(self, event): counter.add(counter.open, event.address, 1)
+            def connection_closed(self, event): counter.add(counter.open, event.address, -1)
+            def connection_checked_out(self, event): counter.add(counter.in_use, event.address, 1)
+            def connection_checked_in(self, event): counter.add(counter.in_use, event.address, -1)
+            def pool_cleared(self, event): counter.cleared(event.address)
+            def pool_created(self, event): pass
+            def pool_ready(self, event): pass
+            def pool_closed(self, event): pass
+            def connection_ready(self, event): pass
+            def connection_check_out_started(self, event): pass
+            def connection_check_out_failed(self, event): pass
+
+        return PoolListener()
+
+
+class ConnectionRegistry:
+    def __init__(self, config=settings):
+        self.settings = config
+        self._lock = threading.Lock()
+        self._mongo = None
+        self._es = None
+        self.mongo_pool = MongoPoolCounter()
+
+    # ------------------ MongoDB ------------------
+    def mongo_client(self):
+        if self._mongo is None:
+            with self._lock:
+                if self._mongo is None:
+                    if not self.settings.MONGO_URI:
+                        raise RuntimeError("MONGO_URI not set")
+                    from pymongo import MongoClient
+
+                    s = self.settings
+                    kwargs = {}
+                    if s.MONGO_TLS:
+                        import certifi
+                        # Force modern TLS + fresh CA bundle
+                        kwargs.update(tls=True, tlsCAFile=certifi.where(), tlsAllowInvalidCertificates=False)
+                    self._mongo = MongoClient(
+                        s.MONGO_URI,
+                        maxPoolSize=s.MONGO_MAX_POOL_SIZE,
+                        minPoolSize=s.MONGO_MIN_POOL_SIZE,
+                        maxIdleTimeMS=s.MONGO_MAX_IDLE_MS,
+                        serverSelectionTimeoutMS=s.MONGO_TIMEOUT_MS,
+                        connectTimeoutMS=s.MONGO_TIMEOUT_MS,
+                        socketTimeoutMS=s.MONGO_TIMEOUT_MS,
+                        event_listeners=[self.mongo_pool.listener()],
+                        **kwargs,
+                    )
+        return self._mongo
+
+    def mongo_db(self):
+        return self.mongo_client()[self.settings.DB_NAME]
+
+    # ------------------ Elasticsearch ------------------
+    def elastic(self):
+        if self._es is None:
+            with self._lock:
+                if self._es is None:
+                    s = self.settings
+                    if not s.ELASTIC_URL:
+                        raise RuntimeError("ELASTIC_URL not set")
+                    from elasticsearch import Elasticsearch
+
+                    kwargs = {}
+                    if s.ELASTIC_USERNAME and s.ELASTIC_PASSWORD:
+                        kwargs["basic_auth"] = (s.ELASTIC_USERNAME, s.ELASTIC_PASSWORD)
+                    self._es = Elasticsearch(
+                        [s.ELASTIC_URL],
+                        verify_certs=s.ELASTIC_VERIFY_SSL,
+                        request_timeout=s.ELASTIC_REQUEST_TIMEOUT,
+                        connections_per_node=s.ELASTIC_CONNECTIONS_PER_NODE,
+                        **kwargs,
+                    )
+        return self._es
+
+    # ------------------ introspection ------------------
+    def pool_stats(self):
+        mongo = {"max_size": self.settings.MONGO_MAX_POOL_SIZE, "servers": {}}
+        with self.mongo_pool.lock:
+            for addr in set(self.mongo_pool.open) | set(self.mongo_pool.in_use):
+                mongo["servers"][addr] = {"open": self.mongo_pool.open.get(addr, 0),
+                                          "in_use": self.mongo_pool.in_use.get(addr, 0)}
+        elastic = {"max_size": self.settings.ELASTIC_CONNECTIONS_PER_NODE, "nodes": {}}
+        if self._es is not None:
+            try:
+                for node in self._es.transport.node_pool.all():
+                    q = node.pool.pool
+                    # the urllib3 queue holds idle connections plus empty slots
+                    in_use = q.maxsize - q.qsize() if q is not None else 0
+                    elastic["nodes"][f"{node.pool.host}:{node.pool.port}"] = {"in_use": in_use}
+            except Exception:
+                pass
+        return {"mongo": mongo, "elastic": elastic}
+
+    def close(self):
+        with self._lock:
+            if self._mongo is not None:
+                self._mongo.close()
+            if self._es is not None:
+                self._es.close()
+            self._mongo = None
+            self._es = None
+
+
+registry = ConnectionRegistry()
+
+
+def _utilization():
+    stats = registry.pool_stats()
+    out = {}
+    for addr, s in stats["mongo"]["servers"].items():
+        out[("mongo", addr)] = round(s["in_use"] / stats["mongo"]["max_size"], 4)
+    for addr, s in stats["elastic"]["nodes"].items():
+        out[("elastic", addr)] = round(s["in_use"] / stats["elastic"]["max_size"], 4)
+    return out
+
+
+def _in_use():
+    stats = registry.pool_stats()
+    out = {("mongo", a): s["in_use"] for a, s in stats["mongo"]["servers"].items()}
+    out.update({("elastic", a): s["in_use"] for a, s in stats["elastic"]["nodes"].items()})
+    return out
+
+
+register(Gauge("shadowtrace_pool_connections_in_use", "Checked-out connections per pool and server.",
+               ("pool", "server"), fn=_in_use))
+register(Gauge("shadowtrace_pool_utilization", "Checked-out connections / max pool size.",
+               ("pool", "server"), fn=_utilization))
@@ -0,0 +1,308 @@
+# app/database/write_behind.py
+"""
+Write-behind buffer for Mongo updates on the scan hot path.
+
+Callers hand over an update (`writer.update(collection, filter, update)`)
+and carry on; a flusher thread sends everything pending as one ordered
+`bulk_write` per collection once WRITE_BEHIND_BATCH updates are waiting or
+WRITE_BEHIND_INTERVAL_MS has passed, whichever comes first. Updates to the
+same document that are still pending are merged into one ($set/$unset/
+$setOnInsert keys, later values win; $inc amounts add up), so a status
+transition followed by the result write costs a single operation.
+
+Updates marked `progress=True` (intermediate state nobody waits on) are
+written with WRITE_PROGRESS_W instead of the collection's write concern. A
+progress update merged with a normal one is written as a normal one.
+
+`update` returns a ticket; `ticket.wait()` blocks until that update reached
+Mongo (or failed). `flush()` writes everything pending on the calling
+thread, for readers that need their own writes back right away.
+
+A failed flush does not drop its updates. In an ordered bulk_write that
+stopped on a write error, the updates before it were applied, the failing
+one fails its tickets, and the rest are queued again. After any other error
+(network, stepdown) the whole batch is queued again, up to
+WRITE_BEHIND_RETRIES times. Updates with $inc are the exception: they
+may already have been applied, so they fail instead of being retried.
+Requeued updates keep their place ahead of newer updates to the same
+document.
+"""
+import os
+import time
+import threading
+
+from app.utils.metrics import register, Counter, Gauge, Histogram
+
+WRITE_BEHIND_BATCH = int(os.getenv("WRITE_BEHIND_BATCH", "500"))
+WRITE_BEHIND_INTERVAL_MS = float(os.getenv("WRITE_BEHIND_INTERVAL_MS", "50"))
+# past this many pending updates, callers flush inline (backpressure)
+WRITE_BEHIND_MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "20000"))
+WRITE_PROGRESS_W = os.getenv("WRITE_PROGRESS_W", "1")
+WRITE_BEHIND_RETRIES = int(os.getenv("WRITE_BEHIND_RETRIES", "5"))
+
+MERGEABLE = ("$set", "$unset", "$setOnInsert", "$inc")
+
+WRITE_BEHIND_OPS = register(Counter(
+    "shadowtrace_write_behind_ops_total", "Buffered Mongo updates by outcome.", ("collection", "result")))
+WRITE_BEHIND_FLUSH_SECONDS = register(Histogram(
+    "shadowtrace_write_behind_flush_seconds", "Duration of one bulk_write flush.", ("collection",)))
+
+
+def progress_concern():
+    from pymongo import WriteConcern
+    w = int(WRITE_PROGRESS_W) if WRITE_PROGRESS_W.isdigit() else WRITE_PROGRESS_W
+    return WriteConcern(w=w, j=False) if w else WriteConcern(w=0)
+
+
+def _fields(update):
+    return {(op, k) for op, spec in update.items() for k in spec}
+
+
+def _merge(a: dict, b: dict):
+    """Update document applying a then b, or None when they cannot be combined."""
+    if any(op not in MERGEABLE for op in (*a, *b)):
+        return None
+    # the same field under two operators ($set then $unset, ...), or a field and one of
+    # its subpaths, keeps both writes
+    ka, kb = _fields(a), _fields(b)
+    for op, k in kb:
+        for op_a, k_a in ka:
+            if k == k_a and op != op_a:
+                return None
+            if k != k_a and (k.startswith(k_a + ".") or k_a.startswith(k + ".")):
+                return None
+    out = {op: dict(spec) for op, spec in a.items()}
+    for op, spec in b.items():
+        target = out.setdefault(op, {})
+        for k, v in spec.items():
+            target[k] = target.get(k, 0) + v if op == "$inc" and k in target else v
+    return out
+
+
+class Ticket:
+    """Completion handle for one buffered update."""
+
+    __slots__ = ("event", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.error = None
+
+    def done(self, error=None):
+        self.error = error
+        self.event.set()
+
+    def wait(self, timeout: float = None) -> bool:
+        """True once written; raises the bulk_write error if the write failed."""
+        if not self.event.wait(timeout):
+            return False
+        if self.error is not None:
+            raise self.error
+        return True
+
+
+class _Pending:
+    __slots__ = ("key", "collection", "filter", "update", "upsert", "progress", "tickets", "attempts")
+
+    def __init__(self, key, collection, filter, update, upsert, progress, ticket):
+        self.key = key
+        self.collection = collection
+        self.filter = filter
+        self.update = update
+        self.upsert = upsert
+        self.progress = progress
+        self.tickets = [ticket]
+        self.attempts = 0
+
+
+class WriteBehind:
+    def __init__(self, batch: int = WRITE_BEHIND_BATCH, interval_ms: float = WRITE_BEHIND_INTERVAL_MS,
+                 max_pending: int = WRITE_BEHIND_MAX_PENDING):
+        self.batch = batch
+        self.interval = interval_ms / 1000
+        self.max_pending = max_pending
+        self.cond = threading.Condition()
+        self.flush_lock = threading.Lock()  # one flush at a time keeps per-document order
+        self.pending = {}  # (collection name, filter key, upsert, seq) -> _Pending, in arrival order
+        self.last = {}  # (collection name, filter key, upsert) -> seq of its newest pending update
+        self.seq = 0
+        self.oldest = None
+        self.thread = None
+        self.closed = False
+        self.stats_counts = {"queued": 0, "coalesced": 0, "written": 0, "failed": 0, "requeued": 0, "flushes": 0}
+
+    # ------------------ enqueue ------------------
+    def update(self, collection, filter: dict, update: dict, upsert: bool = False, progress: bool = False) -> Ticket:
+        """Buffer an update_one; merged with a pending update to the same document when possible."""
+        ticket = Ticket()
+        name = collection.full_name
+        fkey = (name, repr(sorted(filter.items())), upsert)
+        with self.cond:
+            self.stats_counts["queued"] += 1
+            # only the newest pending update for a document is a merge candidate
+            last = self.pending.get(fkey + (self.last.get(fkey),))
+            merged = _merge(last.update, update) if last is not None else None
+            if merged is not None:
+                last.update = merged
+                last.progress = last.progress and progress
+                last.tickets.append(ticket)
+                self.stats_counts["coalesced"] += 1
+                WRITE_BEHIND_OPS.inc(name, "coalesced")
+            else:
+                self.seq += 1
+                self.last[fkey] = self.seq
+                self.pending[fkey + (self.seq,)] = _Pending(fkey, collection, filter, update, upsert, progress, ticket)
+                if self.oldest is None:
+                    self.oldest = time.monotonic()
+            size = len(self.pending)
+            # wake the flusher to start the interval, or to flush a full batch
+            if size == 1 or size >= self.batch:
+                self.cond.notify()
+        self._ensure_thread()
+        if size >= self.max_pending or self.closed:
+            self.flush()
+        return ticket
+
+    # ------------------ flushing ------------------
+    def _ensure_thread(self):
+        if self.thread is None and not self.closed:
+            with self.cond:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+                    self.thread.start()
+
+    def _run(self):
+        while True:
+            with self.cond:
+                while not self.pending and not self.closed:
+                    self.cond.wait()
+                if self.closed and not self.pending:
+                    return
+                # wait out the interval from the oldest pending update, unless the batch fills first
+                while len(self.pending) < self.batch and not self.closed:
+                    left = self.oldest + self.interval - time.monotonic() if self.oldest else 0
+                    if left <= 0:
+                        break
+                    self.cond.wait(left)
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[write-behind] flush failed: {e}")
+
+    def _take(self):
+        with self.cond:
+            items = list(self.pending.values())
+            self.pending = {}
+            self.last = {}
+            self.oldest = None
+        return items
+
+    def _requeue(self, items):
+        """Put updates from a failed flush back, ahead of anything queued since. Called under flush_lock."""
+        with self.cond:
+            requeued = {}
+            for p in items:
+                self.seq += 1
+                requeued[p.key + (self.seq,)] = p
+                # a newer pending update to the document stays the merge candidate
+                self.last.setdefault(p.key, self.seq)
+            self.pending = {**requeued, **self.pending}
+            # retried after one interval, not straight away
+            self.oldest = time.monotonic()
+            self.stats_counts["requeued"] += len(items)
+            self.cond.notify()
+
+    @staticmethod
+    def _applied(error, ops):
+        """How many leading ops of an ordered bulk_write were applied before `error`, or None if unknown."""
+        from pymongo.errors import BulkWriteError
+        if isinstance(error, BulkWriteError):
+            errors = error.details.get("writeErrors") or []
+            if errors:
+                return errors[0]["index"]
+        return None
+
+    def flush(self) -> int:
+        """Write everything pending now, on this thread. Returns the number of operations sent."""
+        from pymongo import UpdateOne
+        with self.flush_lock:
+            items = self._take()
+            if not items:
+                return 0
+            # a document with any normal update pending goes out entirely at the normal
+            # write concern, so all of its updates land in one ordered bulk_write
+            normal = {p.key for p in items if not p.progress}
+            groups = {}
+            for p in items:
+                progress = p.progress and p.key not in normal
+                groups.setdefault((p.key[0], progress), (p.collection, []))[1].append(p)
+            retry = []
+            for (name, progress), (collection, ops) in groups.items():
+                coll = collection.with_options(write_concern=progress_concern()) if progress else collection
+                t0 = time.perf_counter()
+                error = None
+                try:
+                    coll.bulk_write([UpdateOne(p.filter, p.update, upsert=p.upsert) for p in ops], ordered=True)
+                except Exception as e:
+                    error = e
+                    print(f"[write-behind] bulk_write to {name} failed: {e}")
+                WRITE_BEHIND_FLUSH_SECONDS.observe(name, value=time.perf_counter() - t0)
+                outcome = {}  # _Pending -> None (written), an error (failed) or "retry"
+                if error is None:
+                    outcome = dict.fromkeys(ops)
+                else:
+                    applied = self._applied(error, ops)
+                    for i, p in enumerate(ops):
+                        if applied is not None and i < applied:
+                            outcome[p] = None
+                        elif applied is not None and i == applied:
+                            outcome[p] = error  # the op the server refused; retrying would not help
+                        elif p.attempts + 1 >= WRITE_BEHIND_RETRIES or (applied is None and "$inc" in p.update):
+                            outcome[p] = error
+                        else:
+                            outcome[p] = "retry"
+                counts = {"written": 0, "failed": 0, "requeued": 0}
+                for p, result in outcome.items():
+                    if result == "retry":
+                        p.attempts += 1
+                        retry.append(p)
+                        counts["requeued"] += 1
+                        continue
+                    counts["failed" if result is not None else "written"] += 1
+                    for t in p.tickets:
+                        t.done(result)
+                for result, n in counts.items():
+                    if n:
+                        WRITE_BEHIND_OPS.inc(name, result, amount=n)
+                counts.pop("requeued")  # counted by _requeue
+                with self.cond:
+                    for result, n in counts.items():
+                        self.stats_counts[result] += n
+                    self.stats_counts["flushes"] += 1
+            if retry:
+                self._requeue(retry)
+            return len(items)
+
+    def close(self):
+        """Stop the flusher after writing what is pending."""
+        with self.cond:
+            self.closed = True
+            self.cond.notify()
+        if self.thread is not None:
+            self.thread.join(timeout=10)
+            self.thread = None
+        # failed flushes requeue; each update is retried at most WRITE_BEHIND_RETRIES times
+        while self.flush() and self.pending:
+            time.sleep(self.interval)
+
+    def stats(self):
+        with self.cond:
+            return {"pending": len(self.pending), "batch": self.batch, "interval_ms": self.interval * 1000,
+                    **self.stats_counts}
+
+
+# shared by every scan in the process
+writer = WriteBehind()
+
+register(Gauge("shadowtrace_write_behind_pending", "Mongo updates waiting for the next flush.",
+               fn=lambda: {(): len(writer.pending)}))
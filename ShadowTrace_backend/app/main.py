@@ -1,6 +1,9 @@
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse, JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
+import asyncio
 import os
 
 # ------------------ Load .env ------------------
@@ -9,45 +12,117 @@ ENV_PATH = os.path.join(BASE_DIR, ".env")
 load_dotenv(ENV_PATH)
 
 # ------------------ Import MongoDB ------------------
-from app.database.mongo import db, db_status, scans_collection
+# clients are created in the lifespan hook below, not at import
+from app.database import mongo
+from app.database.mongo import db, scans_collection
+from app.database.write_behind import writer as mongo_writer
 
 # ------------------ Import Elasticsearch ------------------
 from app.database.elastic import (
+    init_elasticsearch,
     get_status as get_elastic_status,
     create_index,
     index_doc
 )
 
-# ------------------ Import ES Index Mappings ------------------
-from app.database.es_mapping import SCAN_INDEX, MAPPING as SCAN_MAPPING
-
-# ------------------ Alerts Mapping (fallback if missing) ------------------
-try:
-    from app.database.alerts_mapping import ALERT_INDEX, ALERT_MAPPING
-except ImportError:
-    ALERT_INDEX, ALERT_MAPPING = "shadowtrace_alerts", {
-        "properties": {
-            "title": {"type": "text"},
-            "severity": {"type": "keyword"},
-            "description": {"type": "text"},
-            "timestamp": {"type": "date"},
-            "raw": {"type": "object", "enabled": False}
-        }
-    }
+# ------------------ ES Index Generations ------------------
+from app.database import index_lifecycle
 
 # ------------------ Router Imports ------------------
 from app.api.search import router as search_router
 from app.api.alerts import router as alerts_router
 from app.api.history import router as history_router
 from app.api.utils import router as utils_router
+from app.api.reports import router as reports_router
+from app.api.breaches import router as breaches_router
 from app.routers import osint
 
+# ------------------ Metrics ------------------
+from app.utils.metrics import render_metrics
+
+# ------------------ Responses ------------------
+from app.utils.responses import FastJSONResponse, CompressionMiddleware
+
+# ------------------ Alert Dispatcher ------------------
+from app.utils.alerts import dispatcher as alert_dispatcher
+
+# ------------------ Health Monitor ------------------
+from app.utils.health import monitor as health_monitor
+
+# ------------------ Report Rendering ------------------
+from app.services.reports import reports as report_service
+from app.services.scan_scheduler import scheduler as scan_scheduler
+
+
+# ====================================================================
+#  LIFESPAN
+# ====================================================================
+
+def connect_mongo():
+    status = mongo.connect()
+    if status["db_status"] == "connected":
+        print(f" MongoDB connected: {db.name}")
+    else:
+        print(f" MongoDB connection failed: {status.get('error')}")
+
+
+def connect_elastic():
+    # templates, write/read aliases and the first generation of each index family
+    # are set up before the client is handed out
+    report = init_elasticsearch()
+    elastic_info = get_elastic_status()
+    if elastic_info.get("elastic") != "connected":
+        print(f" Elasticsearch issue: {elastic_info}")
+        return
+    print(" Elasticsearch connected.")
+    for family, out in (report or {}).items():
+        print(f" Index family '{family}' ensured: {out}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    print(" Starting ShadowTrace Backend...")
+
+    # Databases connect in the background so a slow or dead dependency does
+    # not hold up startup; /health/ready reports when they are usable.
+    app.state.connecting = [
+        asyncio.create_task(asyncio.to_thread(connect_mongo)),
+        asyncio.create_task(asyncio.to_thread(connect_elastic)),
+    ]
+
+    # Alert delivery
+    await alert_dispatcher.start()
+    print(f" Alert dispatcher started ({len(alert_dispatcher.destinations)} destinations).")
+
+    # Dependency checks run in the background; /health serves their snapshot
+    await health_monitor.start()
+
+    # Rollover and retention of the scan/alert index generations
+    app.state.index_maintenance = asyncio.create_task(index_lifecycle.maintain_forever())
+    print(" ShadowTrace Backend startup complete.")
+
+    yield
+
+    # running scans finish; queued ones stay "queued" in Mongo
+    await asyncio.to_thread(scan_scheduler.close)
+    # buffered scan writes go out before the client closes
+    await asyncio.to_thread(mongo_writer.close)
+    # deliver what is already queued (including alerts from the scans above)
+    # before the process exits
+    await alert_dispatcher.stop()
+    await health_monitor.stop()
+    app.state.index_maintenance.cancel()
+    report_service.shutdown()
+    mongo.close()
+
 
 # ------------------ FastAPI App Setup ------------------
 app = FastAPI(
     title="ShadowTrace OSINT Engine",
     description="Automated OSINT & Threat Actor Profiling for Hackathon",
-    version="1.0"
+    version="1.0",
+    lifespan=lifespan,
+    default_response_class=FastJSONResponse,
 )
 
 # ------------------ CORS ------------------
@@ -59,11 +134,17 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# ------------------ Compression ------------------
+# gzip/brotli for JSON and text bodies over COMPRESS_MIN_BYTES
+app.add_middleware(CompressionMiddleware)
+
 # ------------------ Register Routers ------------------
 app.include_router(search_router)
 app.include_router(alerts_router)
 app.include_router(history_router)
 app.include_router(utils_router)
+app.include_router(reports_router)
+app.include_router(breaches_router)
 app.include_router(osint.router)
 
 # ====================================================================
@@ -83,69 +164,58 @@ async def home():
 
 @app.get("/health")
 async def health():
-    """Check health of MongoDB and Elasticsearch connections."""
-    if not db:
-        return {"status": "error", "db": db_status}
+    """Last snapshot of the background dependency checks, with latency history summaries."""
+    return Response(health_monitor.body, media_type="application/json")
 
-    try:
-        db.command("ping")
-        return {
-            "status": "healthy",
-            "db": {"name": db.name, "status": "connected"},
-            "elastic": get_elastic_status(),
-            "collections": db.list_collection_names()[:5]
-        }
-    except Exception as e:
-        return {"status": "error", "db": {"status": "failed", "error": str(e)}}
 
+@app.get("/health/live")
+async def health_live():
+    """Liveness: the process and its event loop answer. Dependencies are not consulted."""
+    return health_monitor.liveness()
 
-@app.get("/utils/elastic-status")
-async def elastic_status():
-    return get_elastic_status()
 
+@app.get("/health/ready")
+@app.get("/ready")
+async def health_ready():
+    """Readiness: every critical dependency passed its last background check."""
+    return Response(health_monitor.ready_body, media_type="application/json",
+                    status_code=200 if health_monitor.ready else 503)
 
-@app.post("/utils/elastic-test")
-async def elastic_test():
-    try:
-        create_index("shadowtrace_test")
-        index_doc("shadowtrace_test", {"message": "Elasticsearch test document"})
-        return {"status": "indexed"}
-    except Exception as e:
-        return {"status": "error", "error": str(e)}
 
+@app.get("/health/history/{check}")
+async def health_history(check: str):
+    """Recent latency samples for one dependency check."""
+    out = health_monitor.history(check)
+    if out is None:
+        return JSONResponse({"error": f"unknown check '{check}'"}, status_code=404)
+    return out
 
-# ====================================================================
-#  STARTUP EVENT
-# ====================================================================
 
-@app.on_event("startup")
-async def startup_event():
-    print(" Starting ShadowTrace Backend...")
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    """Prometheus text exposition of span histograms, queue depths and cache stats."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
-    # MongoDB
-    if db_status["db_status"] == "connected":
-        print(f" MongoDB connected: {db.name}")
-    else:
-        print(f" MongoDB connection failed: {db_status.get('error')}")
 
-    # Elasticsearch
-    elastic_info = get_elastic_status()
-    if elastic_info.get("elastic") == "connected":
-        print(" Elasticsearch connected.")
-    else:
-        print(f" Elasticsearch issue: {elastic_info}")
+@app.get("/utils/elastic-status")
+async def elastic_status():
+    return get_elastic_status()
+
 
-    # Create/Search indexes
+@app.get("/utils/indices")
+def index_generations():
+    """Generations, aliases, sizes and retention of the scan and alert indexes."""
     try:
-        create_index(SCAN_INDEX, mapping=SCAN_MAPPING)
-        print(f" Index '{SCAN_INDEX}' ensured.")
+        return index_lifecycle.status()
     except Exception as e:
-        print(f" Could not create '{SCAN_INDEX}': {e}")
+        return JSONResponse({"error": str(e)}, status_code=503)
 
+
+@app.post("/utils/elastic-test")
+async def elastic_test():
     try:
-        create_index(ALERT_INDEX, mapping=ALERT_MAPPING)
-        print(f" Index '{ALERT_INDEX}' ensured.")
+        create_index("shadowtrace_test")
+        index_doc("shadowtrace_test", {"message": "Elasticsearch test document"})
+        return {"status": "indexed"}
     except Exception as e:
-        print(f" Could not create '{ALERT_INDEX}': {e}")
-
-    print(" ShadowTrace Backend startup complete.")
+        return {"status": "error", "error": str(e)}
@@ -1,9 +1,11 @@
 # app/routers/osint.py
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 from app.services.spiderfoot_client import SpiderFootClient
 from app.services.osint_processor import store_scan_in_mongo
 from app.database.mongo import db
+from app.utils.metrics import span
+from app.utils import responses
 
 
 router = APIRouter(prefix="/osint", tags=["OSINT"])
@@ -33,24 +35,17 @@ def start_osint_scan(req: StartScanRequest):
     if not scan_id:
         raise HTTPException(status_code=500, detail="Failed to start SpiderFoot scan")
 
-    # Save minimal record in MongoDB
-    db.osint_cases.update_one(
-        {"case_id": req.case_id},
-        {"$setOnInsert": {
-            "case_id": req.case_id,
-            "target": req.target,
-            "scans": []
-        }},
-        upsert=True
-    )
-
-    # Attach scan entry
-    db.osint_cases.update_one(
-        {"case_id": req.case_id},
-        {"$addToSet": {
-            "scans": {"scan_id": scan_id, "scan_name": req.scan_name}
-        }}
-    )
+    with span("mongo", "osint_cases.update"):
+        # Create the case if needed and attach the scan entry in one upsert
+        # ($addToSet creates the scans array on insert)
+        db.osint_cases.update_one(
+            {"case_id": req.case_id},
+            {
+                "$setOnInsert": {"case_id": req.case_id, "target": req.target},
+                "$addToSet": {"scans": {"scan_id": scan_id, "scan_name": req.scan_name}},
+            },
+            upsert=True
+        )
 
     return {
         "status": "started",
@@ -78,8 +73,16 @@ def store_scan(req: StoreRequest):
     return {"status": "stored", **res}
 
 @router.get("/entities/{case_id}")
-def get_case_entities(case_id: str):
-    case = db.osint_cases.find_one({"case_id": case_id}, {"_id": 0, "entities": 1})
+def get_case_entities(case_id: str, request: Request):
+    # case documents are written once, so id + timestamp identify the entity list
+    if request.headers.get("if-none-match"):
+        head = db.osint_cases.find_one({"case_id": case_id}, {"_id": 1, "timestamp": 1})
+        if not head:
+            return {"error": "Case not found"}
+        tag = responses.etag(case_id, head["_id"], head.get("timestamp"))
+        if responses.fresh(request, tag):
+            return responses.not_modified(tag)
+    case = db.osint_cases.find_one({"case_id": case_id}, {"_id": 1, "timestamp": 1, "entities": 1})
 
     if not case:
         return {"error": "Case not found"}
@@ -92,4 +95,4 @@ def get_case_entities(case_id: str):
         ent_type = ent.get("type", "unknown")
         grouped.setdefault(ent_type, []).append(ent["value"])
 
-    return grouped
+    return responses.json_response(grouped, responses.etag(case_id, case["_id"], case.get("timestamp")))
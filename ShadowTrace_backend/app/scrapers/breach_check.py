@@ -1,25 +1,56 @@
-import requests
+import os
+import asyncio
 import urllib.parse
 from app.config import HIBP_API_KEY
+from app.services.breach_index import breach_index
+from app.utils import resilience
+from app.utils.metrics import span, timed
+from models.subject_model import Evidence
 
+HIBP_BASE = os.getenv("HIBP_BASE", "https://haveibeenpwned.com/api/v3")
+HIBP_SITE = os.getenv("HIBP_SITE", "https://haveibeenpwned.com")
+# ask HIBP when the local index has nothing for an address
+BREACH_HIBP_FALLBACK = os.getenv("BREACH_HIBP_FALLBACK", "true").lower() in ("1", "true", "yes", "on")
+
+
+@timed("probe", "hibp")
 def check_hibp_breaches(email: str):
     """
     Query Have I Been Pwned for breach data.
     Uses test key for development (no paid key required).
     """
-    encoded = urllib.parse.quote(email)
-    url = f"https://haveibeenpwned.com/api/v3/breachedaccount/{encoded}?truncateResponse=false"
-    
-    headers = {
-        "hibp-api-key": HIBP_API_KEY,
-        "User-Agent": "ShadowTrace OSINT Engine"
-    }
-    
-    response = requests.get(url, headers=headers)
+    try:
+        encoded = urllib.parse.quote(email)
+        url = f"{HIBP_BASE}/breachedaccount/{encoded}?truncateResponse=false"
+        headers = {"hibp-api-key": HIBP_API_KEY, "User-Agent": "ShadowTrace OSINT Engine"}
+        r = resilience.get("hibp", url, headers=headers, timeout=6)
+        if r.status_code == 200:
+            return {"ok": True, "source": "hibp", "data": r.json()}
+        elif r.status_code == 404:
+            return {"ok": False, "source": "hibp", "message": "No breaches found"}
+        else:
+            return {"ok": False, "source": "hibp", "status": r.status_code, "error": r.text}
+    except Exception as e:
+        return {"ok": False, "source": "hibp", "error": str(e)}
+
+
+def check_breaches(email: str):
+    """Breaches for an address: the local breach index first, HIBP on a miss."""
+    with span("probe", "breach_index"):
+        local = breach_index.lookup(email, "email")
+    if local:
+        return {"ok": True, "source": "local", "count": local["count"],
+                "data": [{"Name": name, "Source": "local"} for name in local["breaches"]]}
+    if not BREACH_HIBP_FALLBACK:
+        return {"ok": False, "source": "local", "message": "No breaches found"}
+    return check_hibp_breaches(email)
+
 
-    if response.status_code == 200:
-        return {"found": True, "data": response.json()}
-    elif response.status_code == 404:
-        return {"found": False, "message": "No breaches found"}
-    else:
-        return {"found": False, "status": response.status_code, "error": response.text}
+async def breach(email: str):
+    """osint_engine source: one Evidence per breach the address appears in."""
+    res = await asyncio.to_thread(check_breaches, email)
+    if not res.get("ok"):
+        return []
+    return [Evidence("breach", f"{HIBP_SITE}/PwnedWebsites#{b.get('Name', '')}" if res["source"] == "hibp"
+                     else f"breach-index:{b['Name']}", b.get("Title") or b.get("Name") or "breach")
+            for b in res["data"]]
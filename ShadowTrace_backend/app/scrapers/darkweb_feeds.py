@@ -1,5 +1,6 @@
 import httpx
 from app.config import settings
+from models.subject_model import Evidence
 
 async def darkweb(indicator):
     hits=[]
@@ -7,5 +8,5 @@ async def darkweb(indicator):
         for feed in settings.DARK_FEEDS:
             r = await c.get(feed)
             if r.status_code == 200 and indicator.lower() in r.text.lower():
-                hits.append({"platform":"darkweb","url":feed,"title":"Seen in dark-web dump feed"})
+                hits.append(Evidence("darkweb", feed, "Seen in dark-web dump feed"))
     return hits
@@ -1,15 +1,15 @@
+import os
 import httpx
-from bs4 import BeautifulSoup
+from app.utils.profile_html import parse_profile_html, read_head_async
+from models.subject_model import Evidence
+
+GITHUB_BASE = os.getenv("GITHUB_BASE", "https://github.com")
 
 async def github(username):
-    url = f"https://github.com/{username}"
+    url = f"{GITHUB_BASE}/{username}"
     async with httpx.AsyncClient(timeout=10) as c:
-        r = await c.get(url)
-        if r.status_code == 200:
-            soup = BeautifulSoup(r.text,"html.parser")
-            return [{
-                "platform": "github",
-                "url": url,
-                "title": soup.title.string if soup.title else ""
-            }]
+        async with c.stream("GET", url) as r:
+            if r.status_code == 200:
+                parsed = parse_profile_html(await read_head_async(r))
+                return [Evidence("github", url, parsed["title"] or "")]
     return []
@@ -1,14 +1,14 @@
+import os
 import httpx
+from models.subject_model import Evidence
+
+REDDIT_BASE = os.getenv("REDDIT_BASE", "https://www.reddit.com")
 
 async def reddit(username):
-    url = f"https://www.reddit.com/user/{username}/about.json"
+    url = f"{REDDIT_BASE}/user/{username}/about.json"
     headers={"User-Agent":"ShadowTrace"}
     async with httpx.AsyncClient(timeout=10, headers=headers) as c:
         r = await c.get(url)
         if r.status_code==200 and r.json().get("data"):
-            return [{
-                "platform":"reddit",
-                "url":url,
-                "title":"Reddit profile detected"
-            }]
+            return [Evidence("reddit", url, "Reddit profile detected")]
     return []
@@ -0,0 +1,401 @@
+# app/services/analytics_export.py
+"""
+Columnar export of scan history for analytics.
+
+Mongo cursors are streamed and flattened into Arrow record batches of about
+EXPORT_BATCH rows, one table per well-known section:
+
+    scans            one row per search_logs document: query, entity, status,
+                     threat_score (score, risk level, fired rules, evidence)
+    scan_platforms   one row per social platform probed by a username scan
+    case_entities    one row per SpiderFoot entity stored in osint_cases
+
+`export_parquet` writes them as hive-partitioned Parquet
+(<table>/date=YYYY-MM-DD/<entity|type>=.../part-<run>-<n>.parquet) and
+`arrow_stream` yields one table as an Arrow IPC stream for HTTP. Memory is
+bounded by one batch plus the open Parquet writers (EXPORT_MAX_OPEN_FILES),
+whatever the collection size.
+
+Exports are incremental: each source remembers the upper bound of its last
+run in <out>/_watermarks.json, and the next run reads documents whose
+watermark field (search_logs.updated_at, osint_cases.timestamp) is past it.
+A scan that changed state after it was exported appears again with its new
+status; keep the row with the latest updated_at per scan_id.
+
+The upper bound of a run is EXPORT_LAG_SECONDS in the past, not now:
+`updated_at` is stamped before the write goes through the write-behind
+buffer (and a final scan write may wait up to FINAL_WRITE_TIMEOUT before
+falling back to a direct write), so a document stamped just before "now"
+can land after the cursor has read its range and would be skipped for good.
+
+    python -m app.services.analytics_export parquet --out /data/exports
+    python -m app.services.analytics_export parquet --out /data/exports --full
+"""
+import os
+import re
+import json
+import time
+from datetime import datetime, timezone, timedelta
+from collections import OrderedDict
+
+from app.utils.metrics import register, Counter
+
+EXPORT_DIR = os.getenv("EXPORT_DIR", os.path.abspath(os.path.join(os.path.dirname(__file__), "../../data/exports")))
+EXPORT_BATCH = int(os.getenv("EXPORT_BATCH", "20000"))
+EXPORT_MAX_OPEN_FILES = int(os.getenv("EXPORT_MAX_OPEN_FILES", "64"))
+EXPORT_COMPRESSION = os.getenv("EXPORT_COMPRESSION", "zstd")
+# well above WRITE_BEHIND_INTERVAL_MS plus its retries, FINAL_WRITE_TIMEOUT and clock skew between hosts
+EXPORT_LAG_SECONDS = float(os.getenv("EXPORT_LAG_SECONDS", "120"))
+
+WATERMARK_FILE = "_watermarks.json"
+HIVE_NULL = "__HIVE_DEFAULT_PARTITION__"
+_UNSAFE = re.compile(r"[^A-Za-z0-9_.@-]+")
+
+EXPORT_ROWS = register(Counter("shadowtrace_export_rows_total", "Rows exported by table.", ("table",)))
+
+_schemas = {}
+
+
+def _pa():
+    import pyarrow as pa
+    if not _schemas:
+        ts = pa.timestamp("ms", tz="UTC")
+        _schemas["scans"] = pa.schema([
+            ("scan_id", pa.string()), ("query", pa.string()), ("source", pa.string()),
+            ("entity", pa.string()), ("status", pa.string()),
+            ("created_at", ts), ("updated_at", ts),
+            ("score", pa.int32()), ("risk_level", pa.string()), ("threat_model", pa.string()),
+            ("rules", pa.list_(pa.string())), ("evidence", pa.map_(pa.string(), pa.float64())),
+            ("total_ms", pa.float64()),
+        ])
+        _schemas["scan_platforms"] = pa.schema([
+            ("scan_id", pa.string()), ("username", pa.string()), ("created_at", ts),
+            ("platform", pa.string()), ("exists", pa.bool_()), ("status", pa.int32()), ("url", pa.string()),
+            ("display_name", pa.string()), ("location", pa.string()),
+            ("match_score", pa.int32()), ("likely_face", pa.bool_()),
+        ])
+        _schemas["case_entities"] = pa.schema([
+            ("case_id", pa.string()), ("scan_id", pa.string()), ("target", pa.string()),
+            ("stored_at", ts), ("type", pa.string()), ("value", pa.string()),
+            ("module", pa.string()), ("severity", pa.string()), ("timestamp", ts),
+        ])
+    return pa
+
+
+############################################
+# Flattening
+############################################
+def _str(v):
+    return None if v is None else str(v)
+
+
+def _int(v):
+    try:
+        return None if v is None else int(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def _ts(v):
+    # naive datetimes (what Mongo returns) are UTC to Arrow's timestamp[ms, UTC]
+    if isinstance(v, datetime):
+        return v
+    if isinstance(v, str):
+        try:
+            return _ts(datetime.fromisoformat(v.replace("Z", "+00:00")))
+        except ValueError:
+            return None
+    return None
+
+
+def _day(ts):
+    return ts.isoformat()[:10] if ts else None
+
+
+def scan_rows(doc, want):
+    """(table, partition values, row) for one search_logs document."""
+    results = doc.get("results") or {}
+    created = _ts(doc.get("created_at"))
+    day = _day(created)
+    scan_id = str(doc["_id"])
+    if "scans" in want:
+        yield "scans", *_scan_row(doc, results, scan_id, created, day)
+    if "scan_platforms" in want:
+        platforms = (results.get("social_profile") or {}).get("platforms") or {}
+        for name, p in platforms.items():
+            yield "scan_platforms", (day,), {
+                "scan_id": scan_id, "username": _str(doc.get("query")), "created_at": created,
+                "platform": name, "exists": p.get("exists"), "status": _int(p.get("status")), "url": p.get("url"),
+                "display_name": _str(p.get("display_name")), "location": _str(p.get("location")),
+                "match_score": _int(p.get("match_score")), "likely_face": p.get("likely_face"),
+            }
+
+
+def _scan_row(doc, results, scan_id, created, day):
+    threat = results.get("threat_score") or {}
+    entity = (results.get("meta") or {}).get("entity")
+    evidence = threat.get("evidence") or {}
+    return (day, entity), {
+        "scan_id": scan_id, "query": _str(doc.get("query")), "source": _str(doc.get("source")),
+        "entity": entity, "status": doc.get("status"),
+        "created_at": created, "updated_at": _ts(doc.get("updated_at")),
+        "score": _int(threat.get("score")), "risk_level": threat.get("risk_level"),
+        "threat_model": _str(doc.get("threat_model") or threat.get("model")),
+        "rules": [str(r) for r in threat.get("rules") or []],
+        "evidence": [(k, float(v)) for k, v in evidence.items() if v is not None and not isinstance(v, (str, dict, list))],
+        "total_ms": (doc.get("timings") or {}).get("total_ms"),
+    }
+
+
+def case_rows(doc, want):
+    """(table, partition values, row) per SpiderFoot entity of one osint_cases document."""
+    stored = _ts(doc.get("timestamp"))
+    day = _day(stored)
+    for e in doc.get("entities") or []:
+        yield "case_entities", (day, e.get("type") or None), {
+            "case_id": _str(doc.get("case_id")), "scan_id": _str(doc.get("scan_id")), "target": _str(doc.get("target")),
+            "stored_at": stored, "type": e.get("type"), "value": _str(e.get("value")),
+            "module": _str(e.get("module")), "severity": _str(e.get("severity")), "timestamp": _ts(e.get("timestamp")),
+        }
+
+
+class Source:
+    def __init__(self, collection, watermark, projection, rows, tables):
+        self.collection = collection
+        self.watermark = watermark
+        self.projection = projection
+        self.rows = rows
+        self.tables = tables  # table -> partition column names
+
+
+SOURCES = {
+    "search_logs": Source(
+        "search_logs", "updated_at",
+        {"query": 1, "source": 1, "status": 1, "created_at": 1, "updated_at": 1, "threat_model": 1,
+         "timings.total_ms": 1, "results.meta.entity": 1, "results.threat_score": 1,
+         "results.social_profile.platforms": 1},
+        scan_rows, {"scans": ("date", "entity"), "scan_platforms": ("date",)}),
+    "osint_cases": Source(
+        "osint_cases", "timestamp",
+        {"case_id": 1, "scan_id": 1, "target": 1, "timestamp": 1, "entities": 1},
+        case_rows, {"case_entities": ("date", "type")}),
+}
+TABLES = {t: name for name, s in SOURCES.items() for t in s.tables}
+
+
+############################################
+# Batching
+############################################
+def _columns(table, rows):
+    """Record batch of a table from a list of row dicts."""
+    pa = _pa()
+    schema = _schemas[table]
+    return pa.RecordBatch.from_pydict({f.name: [r[f.name] for r in rows] for f in schema}, schema=schema)
+
+
+def batches(docs, source: Source, tables=None, batch_size: int = EXPORT_BATCH, partitioned: bool = True):
+    """
+    Yield (table, partition values, record batch) for an iterable of documents,
+    one round per batch_size rows (a case document holds many entities).
+    Unpartitioned, each round is one batch per table.
+    """
+    want = set(tables or source.tables)
+    buf = {}
+    n = 0
+    for doc in docs:
+        for table, part, row in source.rows(doc, want):
+            buf.setdefault((table, part if partitioned else ()), []).append(row)
+            n += 1
+        if n >= batch_size:
+            yield from _drain(buf)
+            buf, n = {}, 0
+    yield from _drain(buf)
+
+
+def _drain(buf):
+    for (table, part), rows in buf.items():
+        yield table, part, _columns(table, rows)
+
+
+def cursor(database, source: Source, since=None, until=None, batch_size: int = EXPORT_BATCH):
+    """Documents of a source with since < watermark field <= until."""
+    # stored datetimes are naive UTC
+    since, until = (d.astimezone(timezone.utc).replace(tzinfo=None) if d is not None and d.tzinfo else d
+                    for d in (since, until))
+    window = {}
+    if since is not None:
+        window["$gt"] = since
+    if until is not None:
+        window["$lte"] = until
+    query = {source.watermark: window} if window else {}
+    coll = database[source.collection]
+    coll.create_index(source.watermark)
+    return coll.find(query, source.projection, batch_size=min(batch_size, 10000), no_cursor_timeout=True)
+
+
+############################################
+# Parquet
+############################################
+def _part_dir(root, table, names, values):
+    parts = [os.path.join(root, table)]
+    for name, v in zip(names, values):
+        v = HIVE_NULL if v in (None, "") else _UNSAFE.sub("_", str(v))[:100]
+        parts.append(f"{name}={v}")
+    return os.path.join(*parts)
+
+
+class PartitionedWriter:
+    """Parquet writers per partition directory, at most max_open at a time (LRU)."""
+
+    def __init__(self, root: str, run_id: str, max_open: int = EXPORT_MAX_OPEN_FILES):
+        self.root = root
+        self.run_id = run_id
+        self.max_open = max_open
+        self.open = OrderedDict()  # directory -> ParquetWriter
+        self.seq = {}
+        self.files = []
+        self.rows = {}
+
+    def write(self, table, names, values, batch):
+        import pyarrow.parquet as pq
+        d = _part_dir(self.root, table, names, values)
+        w = self.open.get(d)
+        if w is None:
+            while len(self.open) >= self.max_open:
+                self.open.popitem(last=False)[1].close()
+            os.makedirs(d, exist_ok=True)
+            n = self.seq[d] = self.seq.get(d, -1) + 1
+            path = os.path.join(d, f"part-{self.run_id}-{n:05d}.parquet")
+            # partition columns live in the directory names, not in the files
+            schema = batch.schema
+            for name in names:
+                if name in schema.names:
+                    schema = schema.remove(schema.get_field_index(name))
+            w = self.open[d] = pq.ParquetWriter(path, schema, compression=EXPORT_COMPRESSION)
+            self.files.append(path)
+        else:
+            self.open.move_to_end(d)
+        for name in names:
+            if name in batch.schema.names:
+                batch = batch.drop_columns([name])
+        w.write_batch(batch)
+        self.rows[table] = self.rows.get(table, 0) + batch.num_rows
+
+    def close(self):
+        while self.open:
+            self.open.popitem(last=False)[1].close()
+
+    def abort(self):
+        self.close()
+        for path in self.files:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _read_watermarks(out_dir):
+    try:
+        with open(os.path.join(out_dir, WATERMARK_FILE)) as f:
+            return {k: datetime.fromisoformat(v) for k, v in json.load(f).items()}
+    except (OSError, ValueError):
+        return {}
+
+
+def _write_watermarks(out_dir, marks):
+    tmp = os.path.join(out_dir, WATERMARK_FILE + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump({k: v.isoformat() for k, v in marks.items()}, f, indent=2)
+    os.replace(tmp, os.path.join(out_dir, WATERMARK_FILE))
+
+
+def export_docs(docs, source: Source, out_dir: str, run_id: str, batch_size: int = EXPORT_BATCH) -> dict:
+    """Write one source's documents as partitioned Parquet; files of a failed run are removed."""
+    _pa()
+    writer = PartitionedWriter(out_dir, run_id)
+    try:
+        for table, part, batch in batches(docs, source, batch_size=batch_size):
+            writer.write(table, source.tables[table], part, batch)
+        writer.close()
+    except BaseException:
+        writer.abort()
+        raise
+    for table, n in writer.rows.items():
+        EXPORT_ROWS.inc(table, amount=n)
+    return {"rows": writer.rows, "files": len(writer.files)}
+
+
+def export_parquet(database, out_dir: str = EXPORT_DIR, sources=None, full: bool = False,
+                   batch_size: int = EXPORT_BATCH, lag: float = EXPORT_LAG_SECONDS) -> dict:
+    """Incremental partitioned Parquet export of each source since its watermark, up to `lag` seconds ago."""
+    from app.database.write_behind import writer
+    os.makedirs(out_dir, exist_ok=True)
+    marks = {} if full else _read_watermarks(out_dir)
+    # this process's buffered writes go out first; other processes are covered by the lag
+    writer.flush()
+    until = datetime.utcnow() - timedelta(seconds=lag)
+    run_id = until.strftime("%Y%m%dT%H%M%S")
+    report = {}
+    for name in sources or SOURCES:
+        source = SOURCES[name]
+        since = marks.get(name)
+        t0 = time.perf_counter()
+        docs = cursor(database, source, since, until, batch_size)
+        try:
+            out = export_docs(docs, source, out_dir, run_id, batch_size)
+        finally:
+            docs.close()
+        marks[name] = until
+        _write_watermarks(out_dir, marks)
+        report[name] = {"since": since.isoformat() if since else None, "until": until.isoformat(),
+                        "seconds": round(time.perf_counter() - t0, 2), **out}
+    return report
+
+
+############################################
+# Arrow IPC stream
+############################################
+def arrow_stream(database, table: str, since=None, until=None, batch_size: int = EXPORT_BATCH):
+    """Arrow IPC stream bytes (schema, record batches, end-of-stream) of one table."""
+    if table not in TABLES:
+        raise KeyError(table)
+    docs = cursor(database, SOURCES[TABLES[table]], since, until, batch_size)
+    try:
+        yield from stream_docs(docs, table, batch_size)
+    finally:
+        docs.close()
+
+
+def stream_docs(docs, table: str, batch_size: int = EXPORT_BATCH):
+    """Arrow IPC stream of one table from an iterable of source documents."""
+    _pa()
+    yield _schemas[table].serialize().to_pybytes()
+    rows = 0
+    try:
+        for _, _, batch in batches(docs, SOURCES[TABLES[table]], (table,), batch_size, partitioned=False):
+            rows += batch.num_rows
+            yield batch.serialize().to_pybytes()
+    finally:
+        EXPORT_ROWS.inc(table, amount=rows)
+    # end-of-stream marker: continuation token + zero length
+    yield b"\xff\xff\xff\xff\x00\x00\x00\x00"
+
+
+if __name__ == "__main__":
+    import argparse
+    from app.database import mongo
+
+    ap = argparse.ArgumentParser(prog="python -m app.services.analytics_export")
+    sub = ap.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("parquet")
+    p.add_argument("--out", default=EXPORT_DIR)
+    p.add_argument("--source", action="append", choices=sorted(SOURCES))
+    p.add_argument("--full", action="store_true", help="ignore the watermarks and export everything")
+    p.add_argument("--batch", type=int, default=EXPORT_BATCH)
+    p.add_argument("--lag", type=float, default=EXPORT_LAG_SECONDS,
+                   help="seconds behind now to stop at, so writes still in flight are not skipped")
+    args = ap.parse_args()
+
+    if mongo.connect()["db_status"] != "connected":
+        raise SystemExit("MongoDB not connected")
+    print(json.dumps(export_parquet(mongo.db, args.out, args.source, args.full, args.batch, args.lag), indent=2))
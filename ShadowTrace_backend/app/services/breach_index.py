@@ -0,0 +1,417 @@
+# app/services/breach_index.py
+"""
+Local breach corpus index.
+
+Licensed breach compilations are ingested into one file per kind (email,
+password) laid out like the Pwned Passwords range files, but in a single
+binary file:
+
+    <kind>.bin      fixed 28-byte records sorted by SHA-1:
+                    sha1(20) | breach set id (u32) | occurrences (u32)
+    <kind>.fan.npy  2**20 + 1 record offsets, one bucket per 5-hex-digit
+                    hash prefix (the Pwned Passwords range)
+    meta.json       breach names, breach sets, counts
+
+Emails are keyed by SHA-1 of the trimmed, lower-cased address, passwords by
+SHA-1 of the password (the Pwned Passwords key, so their "HASH:COUNT" dumps
+load as they are). A lookup reads one fan-out entry and binary-searches a
+bucket of a few dozen records in the memory-mapped file: O(log n) with one
+or two page reads, shared by every worker. range() returns a whole bucket
+for k-anonymity clients.
+
+Ingest sorts dumps in bounded runs and merges them with the current index,
+so dumps larger than memory are fine:
+
+    python -m app.services.breach_index ingest --breach Collection1 --format combo dump.txt.gz
+    python -m app.services.breach_index ingest --breach pwned-passwords --format sha1count pwnedpasswords.txt
+"""
+import os
+import gzip
+import heapq
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import threading
+
+from app.utils.metrics import register, Counter
+
+BREACH_INDEX_DIR = os.getenv("BREACH_INDEX_DIR",
+                             os.path.abspath(os.path.join(os.path.dirname(__file__), "../../data/breaches")))
+BREACH_RUN_RECORDS = int(os.getenv("BREACH_RUN_RECORDS", "5000000"))
+BREACH_RECHECK = float(os.getenv("BREACH_RECHECK", "60"))
+
+KINDS = ("email", "password")
+PREFIX_BITS = 20  # 5 hex digits, as in the Pwned Passwords range API
+FORMATS = ("combo", "email", "sha1count", "password")
+
+_dtypes = {}
+
+
+def _np():
+    import numpy as np
+    if not _dtypes:
+        _dtypes["record"] = np.dtype([("h", "S20"), ("set", "<u4"), ("count", "<u4")])
+        _dtypes["run"] = np.dtype([("h", "S20"), ("breach", "<u4"), ("count", "<u4")])
+    return np
+
+
+############################################
+# Keys
+############################################
+def email_key(email: str) -> bytes:
+    return hashlib.sha1(email.strip().lower().encode()).digest()
+
+
+def password_key(password: str) -> bytes:
+    return hashlib.sha1(password.encode("utf-8", "surrogateescape")).digest()
+
+
+def key_for(value: str, kind: str):
+    """(table, key) for an email, a plaintext password or a SHA-1 hex digest ("sha1")."""
+    if kind == "email":
+        return "email", email_key(value)
+    if kind == "password":
+        return "password", password_key(value)
+    if kind == "sha1":
+        return "password", bytes.fromhex(value.strip()[:40])
+    raise ValueError(f"unknown breach lookup kind '{kind}'")
+
+
+############################################
+# Ingest
+############################################
+def _open(path):
+    return gzip.open(path, "rt", errors="surrogateescape") if path.endswith(".gz") \
+        else open(path, errors="surrogateescape")
+
+
+def parse_dump(path, fmt):
+    """(kind, key, occurrences) for each usable line of a dump."""
+    with _open(path) as f:
+        for line in f:
+            line = line.rstrip("\r\n")
+            if not line:
+                continue
+            if fmt == "sha1count":
+                h, _, n = line.partition(":")
+                try:
+                    yield "password", bytes.fromhex(h[:40]), int(n or 1)
+                except ValueError:
+                    continue
+            elif fmt == "password":
+                yield "password", password_key(line), 1
+            else:
+                # combo lists use ':' or ';' between address and password
+                sep = min((i for i in (line.find(":"), line.find(";")) if i > 0), default=-1)
+                email = line[:sep] if sep > 0 else line
+                if "@" not in email:
+                    continue
+                yield "email", email_key(email), 1
+                if fmt == "combo" and sep > 0 and line[sep + 1:]:
+                    yield "password", password_key(line[sep + 1:]), 1
+
+
+class _Runs:
+    """Sorted on-disk runs of (key, breach, count) for one kind."""
+
+    def __init__(self, workdir, kind):
+        self.workdir = workdir
+        self.kind = kind
+        self.buf = []
+        self.paths = []
+
+    def add(self, key, breach, count):
+        self.buf.append((key, breach, count))
+        if len(self.buf) >= BREACH_RUN_RECORDS:
+            self.flush()
+
+    def flush(self):
+        np = _np()
+        if not self.buf:
+            return
+        arr = np.array(self.buf, dtype=_dtypes["run"])
+        arr.sort(order=["h", "breach"])
+        path = os.path.join(self.workdir, f"{self.kind}.run{len(self.paths)}")
+        arr.tofile(path)
+        self.paths.append(path)
+        self.buf = []
+
+    def readers(self, block=1 << 16):
+        np = _np()
+        for path in self.paths:
+            yield _iter_file(np.memmap(path, dtype=_dtypes["run"], mode="r"), block,
+                             lambda r: (_pad(r[0]), (r[1],), r[2]))
+
+
+def _iter_file(arr, block, conv):
+    for i in range(0, len(arr), block):
+        for r in arr[i:i + block].tolist():
+            yield conv(r)
+
+
+def _pad(h: bytes) -> bytes:
+    # numpy hands back S20 values with trailing NUL bytes stripped
+    return h + b"\x00" * (20 - len(h))
+
+
+def ingest(sources, out_dir: str = BREACH_INDEX_DIR) -> dict:
+    """
+    Add breaches to the index. `sources` is [(breach name, format, [paths])];
+    the new records are merged with the existing index into new files, which
+    replace the old ones in one directory swap.
+    """
+    np = _np()
+    current = BreachIndex(out_dir)
+    current.load()
+
+    parent = os.path.dirname(out_dir.rstrip("/")) or "."
+    os.makedirs(parent, exist_ok=True)
+    # runs go next to the index, not /tmp: they are as large as the dumps
+    workdir = tempfile.mkdtemp(prefix="breach_ingest_", dir=parent)
+    try:
+        return _ingest(np, current, sources, out_dir, workdir)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _ingest(np, current, sources, out_dir, workdir):
+    meta = current.meta or {"breaches": [], "sets": [], "counts": {}}
+    names = [b["name"] for b in meta["breaches"]]
+    breaches = list(meta["breaches"])
+    runs = {k: _Runs(workdir, k) for k in KINDS}
+    for name, fmt, paths in sources:
+        if name in names:
+            raise ValueError(f"breach '{name}' is already in the index")
+        if fmt not in FORMATS:
+            raise ValueError(f"unknown dump format '{fmt}'")
+        bid = len(breaches)
+        names.append(name)
+        entry = {"name": name, "format": fmt, "files": [os.path.basename(p) for p in paths],
+                 "ingested_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()), "records": 0}
+        for path in paths:
+            for kind, key, n in parse_dump(path, fmt):
+                runs[kind].add(key, bid, n)
+                entry["records"] += 1
+        breaches.append(entry)
+    for r in runs.values():
+        r.flush()
+
+    # breach sets: each record points at the sorted tuple of breaches it appears in
+    sets = [tuple(s) for s in meta["sets"]]
+    set_ids = {s: i for i, s in enumerate(sets)}
+
+    def set_id(s):
+        if s not in set_ids:
+            set_ids[s] = len(sets)
+            sets.append(s)
+        return set_ids[s]
+
+    tmp = out_dir.rstrip("/") + f".tmp{os.getpid()}"
+    os.makedirs(tmp, exist_ok=True)
+    counts = {}
+    for kind in KINDS:
+        streams = list(runs[kind].readers())
+        old = current.tables.get(kind) if current.tables else None
+        if old is not None:
+            streams.append(_iter_file(old["records"], 1 << 16,
+                                      lambda r: (_pad(r[0]), sets[r[1]], r[2])))
+        counts[kind] = _write_table(np, tmp, kind, heapq.merge(*streams, key=lambda r: r[0]), set_id)
+
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump({"breaches": breaches, "sets": [list(s) for s in sets], "counts": counts,
+                   "prefix_bits": PREFIX_BITS,
+                   "built_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())}, f)
+
+    old_dir = None
+    if os.path.isdir(out_dir):
+        old_dir = out_dir.rstrip("/") + f".old{os.getpid()}"
+        os.rename(out_dir, old_dir)
+    os.rename(tmp, out_dir)
+    if old_dir:
+        shutil.rmtree(old_dir, ignore_errors=True)
+    return {"breaches": [b["name"] for b in breaches], "counts": counts, "sets": len(sets)}
+
+
+def _write_table(np, tmp, kind, merged, set_id, block=1 << 16) -> int:
+    """Group the merged stream by key and write records plus the prefix fan-out; returns the record count."""
+    fan = np.zeros(1 << PREFIX_BITS, dtype=np.uint64)
+    total = 0
+    out = []
+
+    def flush(f):
+        nonlocal total
+        if not out:
+            return
+        arr = np.array(out, dtype=_dtypes["record"])
+        hb = np.frombuffer(arr["h"].tobytes(), dtype=np.uint8).reshape(-1, 20).astype(np.uint32)
+        prefix = (hb[:, 0] << 12) | (hb[:, 1] << 4) | (hb[:, 2] >> 4)
+        fan[:] += np.bincount(prefix, minlength=1 << PREFIX_BITS).astype(np.uint64)
+        arr.tofile(f)
+        total += len(arr)
+        out.clear()
+
+    with open(os.path.join(tmp, f"{kind}.bin"), "wb") as f:
+        key, members, n = None, set(), 0
+        for h, bs, c in merged:
+            if h != key:
+                if key is not None:
+                    out.append((key, set_id(tuple(sorted(members))), min(n, 0xFFFFFFFF)))
+                    if len(out) >= block:
+                        flush(f)
+                key, members, n = h, set(), 0
+            members.update(bs)
+            n += c
+        if key is not None:
+            out.append((key, set_id(tuple(sorted(members))), min(n, 0xFFFFFFFF)))
+        flush(f)
+    np.save(os.path.join(tmp, f"{kind}.fan.npy"), np.concatenate(([0], np.cumsum(fan))).astype(np.uint64))
+    return total
+
+
+############################################
+# Lookup
+############################################
+class BreachIndex:
+    def __init__(self, path: str = BREACH_INDEX_DIR):
+        self.path = path
+        self.lock = threading.Lock()
+        self.tables = None
+        self.meta = None
+        self.mtime = None
+        self.checked = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def load(self):
+        """Map the tables (again, if the index was rebuilt). False when there is no index."""
+        np = _np()
+        try:
+            mtime = os.stat(os.path.join(self.path, "meta.json")).st_mtime
+        except OSError:
+            self.tables = None
+            return False
+        if mtime == self.mtime and self.tables is not None:
+            return True
+        with open(os.path.join(self.path, "meta.json")) as f:
+            meta = json.load(f)
+        tables = {}
+        for kind in KINDS:
+            path = os.path.join(self.path, f"{kind}.bin")
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            records = np.memmap(path, dtype=_dtypes["record"], mode="r").view(np.ndarray) if size \
+                else np.zeros(0, dtype=_dtypes["record"])
+            fan = np.load(os.path.join(self.path, f"{kind}.fan.npy"), mmap_mode="r").view(np.ndarray)
+            tables[kind] = {"records": records, "keys": records["h"], "fan": fan}
+        meta["names"] = [b["name"] for b in meta["breaches"]]
+        self.tables, self.meta, self.mtime = tables, meta, mtime
+        return True
+
+    def ready(self):
+        now = time.monotonic()
+        if self.tables is None or now - self.checked > BREACH_RECHECK:
+            with self.lock:
+                if self.tables is None or now - self.checked > BREACH_RECHECK:
+                    self.checked = now
+                    self.load()
+        return self.tables is not None
+
+    def _bucket(self, table, key: bytes):
+        p = (key[0] << 12) | (key[1] << 4) | (key[2] >> 4)
+        fan = table["fan"]
+        return int(fan[p]), int(fan[p + 1])
+
+    def _find(self, table, key: bytes):
+        lo, hi = self._bucket(table, key)
+        if lo == hi:
+            return None
+        i = lo + int(table["keys"][lo:hi].searchsorted(key))
+        if i < hi and table["keys"][i] == key.rstrip(b"\x00"):
+            return table["records"][i]
+        return None
+
+    def _result(self, rec):
+        names = self.meta["names"]
+        return {"found": True, "count": int(rec["count"]),
+                "breaches": [names[b] for b in self.meta["sets"][int(rec["set"])]]}
+
+    def lookup(self, value: str, kind: str = "email"):
+        """{"found", "count", "breaches"} for an email, password or SHA-1; None when not in the index."""
+        table_kind, key = key_for(value, kind)
+        if not self.ready():
+            return None
+        rec = self._find(self.tables[table_kind], key)
+        if rec is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self._result(rec)
+
+    def lookup_many(self, values, kind: str = "email"):
+        """lookup() for a batch of IOCs; unparseable values come back as None."""
+        out = []
+        for v in values:
+            try:
+                out.append(self.lookup(v, kind))
+            except (ValueError, TypeError, IndexError):
+                out.append(None)
+        return out
+
+    def range(self, prefix: str, kind: str = "password"):
+        """Every key in a 5-hex-digit prefix bucket as (35-digit suffix, count), Pwned Passwords style."""
+        prefix = prefix.strip().upper()
+        if len(prefix) != 5 or any(c not in "0123456789ABCDEF" for c in prefix):
+            raise ValueError("prefix must be 5 hex digits")
+        table_kind = "password" if kind in ("password", "sha1") else kind
+        if table_kind not in KINDS:
+            raise ValueError(f"unknown breach lookup kind '{kind}'")
+        if not self.ready():
+            return []
+        table = self.tables[table_kind]
+        p = int(prefix, 16)
+        lo, hi = int(table["fan"][p]), int(table["fan"][p + 1])
+        return [(_pad(h).hex().upper()[5:], int(c)) for h, _, c in table["records"][lo:hi].tolist()]
+
+    def stats(self):
+        return {
+            "loaded": self.tables is not None,
+            "path": self.path,
+            "built_at": (self.meta or {}).get("built_at"),
+            "counts": (self.meta or {}).get("counts"),
+            "breaches": len((self.meta or {}).get("breaches", [])),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+# shared index; every worker maps the same files
+breach_index = BreachIndex()
+
+register(Counter("shadowtrace_breach_index_lookups_total", "Local breach index lookups by result.", ("result",),
+                 fn=lambda: {("hit",): breach_index.hits, ("miss",): breach_index.misses}))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(prog="python -m app.services.breach_index")
+    sub = ap.add_subparsers(dest="command", required=True)
+    i = sub.add_parser("ingest")
+    i.add_argument("--breach", required=True)
+    i.add_argument("--format", choices=FORMATS, default="combo")
+    i.add_argument("--out", default=BREACH_INDEX_DIR)
+    i.add_argument("paths", nargs="+")
+    q = sub.add_parser("lookup")
+    q.add_argument("--kind", choices=("email", "password", "sha1"), default="email")
+    q.add_argument("values", nargs="+")
+    sub.add_parser("stats")
+    args = ap.parse_args()
+
+    if args.command == "ingest":
+        print(json.dumps(ingest([(args.breach, args.format, args.paths)], args.out), indent=2))
+    elif args.command == "lookup":
+        print(json.dumps(breach_index.lookup_many(args.values, args.kind), indent=2))
+    else:
+        breach_index.ready()
+        print(json.dumps(breach_index.stats(), indent=2))
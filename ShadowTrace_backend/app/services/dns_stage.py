@@ -0,0 +1,211 @@
+# app/services/dns_stage.py
+"""
+Bulk async DNS resolution stage.
+
+One shared async resolver runs on a dedicated event loop thread so that scan
+worker threads (run_scan) and async callers (submit_many) share the same TTL-respecting
+cache, negative cache and in-flight bound. Identical lookups that are already
+in flight are coalesced onto a single query. dnspython is loaded on first use.
+"""
+import os
+import time
+import asyncio
+import threading
+
+from app.utils.metrics import register, Counter, Gauge
+
+RECORD_TYPES = ("A", "AAAA", "MX", "NS", "TXT", "CNAME")
+
+DNS_NAMESERVERS = [n.strip() for n in os.getenv("DNS_NAMESERVERS", "").split(",") if n.strip()]
+DNS_PORT = int(os.getenv("DNS_PORT", "53"))
+DNS_TIMEOUT = float(os.getenv("DNS_TIMEOUT", "4"))
+DNS_MAX_IN_FLIGHT = int(os.getenv("DNS_MAX_IN_FLIGHT", "256"))
+DNS_CACHE_SIZE = int(os.getenv("DNS_CACHE_SIZE", "100000"))
+DNS_NEGATIVE_TTL = int(os.getenv("DNS_NEGATIVE_TTL", "300"))
+DNS_MIN_TTL = int(os.getenv("DNS_MIN_TTL", "5"))
+
+
+class DNSCache:
+    """(name, rtype) -> result with per-entry expiry; oldest entries evicted first."""
+
+    def __init__(self, max_size: int = DNS_CACHE_SIZE):
+        self.max_size = max_size
+        self.entries = {}
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        item = self.entries.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        expires, value, negative = item
+        if expires < time.monotonic():
+            del self.entries[key]
+            self.misses += 1
+            return None
+        if negative:
+            self.negative_hits += 1
+        else:
+            self.hits += 1
+        return value
+
+    def put(self, key, value, ttl, negative=False):
+        if key not in self.entries and len(self.entries) >= self.max_size:
+            self.entries.pop(next(iter(self.entries)))
+        self.entries[key] = (time.monotonic() + ttl, value, negative)
+
+    def stats(self):
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            "size": len(self.entries),
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.negative_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+
+def _negative_ttl(exc):
+    """RFC 2308: negative answers live for min(SOA TTL, SOA MINIMUM)."""
+    import dns.rdatatype
+    import dns.resolver
+    try:
+        if isinstance(exc, dns.resolver.NXDOMAIN):
+            responses = list(exc.responses().values())
+        else:
+            responses = [exc.kwargs["response"]]
+        for resp in responses:
+            for rrset in resp.authority:
+                if rrset.rdtype == dns.rdatatype.SOA:
+                    return max(DNS_MIN_TTL, min(rrset.ttl, rrset[0].minimum))
+    except Exception:
+        pass
+    return DNS_NEGATIVE_TTL
+
+
+class DNSStage:
+    def __init__(self, nameservers=None, port: int = DNS_PORT, timeout: float = DNS_TIMEOUT,
+                 max_in_flight: int = DNS_MAX_IN_FLIGHT, cache: DNSCache = None):
+        self.nameservers = nameservers if nameservers is not None else DNS_NAMESERVERS
+        self.port = port
+        self.timeout = timeout
+        self.max_in_flight = max_in_flight
+        self.cache = cache or DNSCache()
+        self.resolver = None
+        self.semaphore = None
+        self.pending = {}
+        self.in_flight = 0
+        self.queries = 0
+        self.loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    # ------------------ event loop ------------------
+    def _ensure_loop(self):
+        """Start the stage's private loop thread on first sync use."""
+        if self.loop is not None:
+            return self.loop
+        with self._lock:
+            if self.loop is None:
+                loop = asyncio.new_event_loop()
+                t = threading.Thread(target=loop.run_forever, name="dns-stage", daemon=True)
+                t.start()
+                self._thread = t
+                self.loop = loop
+        return self.loop
+
+    def _setup(self):
+        if self.resolver is None:
+            import dns.asyncresolver
+            r = dns.asyncresolver.Resolver(configure=not self.nameservers)
+            if self.nameservers:
+                r.nameservers = list(self.nameservers)
+            r.port = self.port
+            r.lifetime = self.timeout
+            self.resolver = r
+            self.semaphore = asyncio.Semaphore(self.max_in_flight)
+
+    # ------------------ async API ------------------
+    async def resolve(self, name: str, rtype: str = "A"):
+        """
+        Resolve one record set. Returns a list of rdata strings, or
+        {"error": ...} like the old blocking safe_dns.
+        """
+        key = (name.lower().rstrip("."), rtype.upper())
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        fut = self.pending.get(key)
+        if fut is None:
+            fut = asyncio.ensure_future(self._query(key))
+            self.pending[key] = fut
+            fut.add_done_callback(lambda _: self.pending.pop(key, None))
+        return await asyncio.shield(fut)
+
+    async def _query(self, key):
+        import dns.resolver
+        self._setup()
+        name, rtype = key
+        async with self.semaphore:
+            self.in_flight += 1
+            self.queries += 1
+            try:
+                answer = await self.resolver.resolve(name, rtype)
+                value = [r.to_text() for r in answer]
+                self.cache.put(key, value, max(DNS_MIN_TTL, answer.rrset.ttl))
+                return value
+            except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer) as e:
+                value = {"error": str(e)}
+                self.cache.put(key, value, _negative_ttl(e), negative=True)
+                return value
+            except Exception as e:
+                # timeouts / SERVFAIL are not cached
+                return {"error": str(e) or e.__class__.__name__}
+            finally:
+                self.in_flight -= 1
+
+    async def resolve_many(self, names, rtypes=("A",)):
+        """{name: {rtype: result}} for every name x rtype, resolved concurrently."""
+        names = list(dict.fromkeys(names))
+        pairs = [(n, t) for n in names for t in rtypes]
+        results = await asyncio.gather(*(self.resolve(n, t) for n, t in pairs))
+        out = {n: {} for n in names}
+        for (n, t), r in zip(pairs, results):
+            out[n][t] = r
+        return out
+
+    # ------------------ bridges ------------------
+    # The resolver, semaphore and pending futures belong to the stage loop, so
+    # callers on other loops or threads go through these.
+    async def submit_many(self, names, rtypes=("A",)):
+        """resolve_many for coroutines running on another event loop."""
+        loop = self._ensure_loop()
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self.resolve_many(names, rtypes), loop))
+
+    def resolve_sync(self, name: str, rtype: str = "A"):
+        loop = self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(self.resolve(name, rtype), loop).result()
+
+    def resolve_many_sync(self, names, rtypes=("A",)):
+        loop = self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(self.resolve_many(names, rtypes), loop).result()
+
+    def stats(self):
+        return {"in_flight": self.in_flight, "queries": self.queries,
+                "coalesced_pending": len(self.pending), "cache": self.cache.stats()}
+
+
+# shared stage used by the scan paths
+dns_stage = DNSStage()
+
+register(Counter("shadowtrace_cache_requests_total", "Cache lookups by result.", ("cache", "result"),
+                 fn=lambda: {("dns", "hit"): dns_stage.cache.hits,
+                             ("dns", "negative_hit"): dns_stage.cache.negative_hits,
+                             ("dns", "miss"): dns_stage.cache.misses}))
+register(Gauge("shadowtrace_cache_hit_ratio", "Hit ratio since start.", ("cache",),
+               fn=lambda: {("dns",): dns_stage.cache.stats()["hit_rate"]}))
+register(Gauge("shadowtrace_dns_in_flight", "DNS queries on the wire.",
+               fn=lambda: {(): dns_stage.in_flight}))
@@ -0,0 +1,374 @@
+# app/services/domain_rdap.py
+"""
+Domain registration data over RDAP, with port-43 whois as the fallback.
+
+The IANA RDAP bootstrap registry (dns.json, RFC 9224) maps every TLD that
+runs RDAP to its server. It is cached in RDAP_DIR and refreshed once it is
+older than RDAP_BOOTSTRAP_TTL; a stale copy keeps serving if IANA cannot be
+reached. A lookup is one GET against the TLD's server over the pooled HTTP
+session (plus the registrar's server when the registry links to it, the
+RDAP equivalent of a thin-whois referral), and the structured JSON is
+mapped onto the field names python-whois produced, so stored scans look
+the same whichever path answered.
+
+Port-43 whois is only used when the TLD has no RDAP server or its server is
+failing. Those answers are cached per registrar whois server: each
+registrar gets its own bounded LRU, so a burst of lookups against one
+registrar cannot evict everybody else's entries.
+
+    python -m app.services.domain_rdap refresh
+    python -m app.services.domain_rdap lookup example.com
+"""
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+
+from app.utils.http import session
+from app.utils.metrics import register, Counter
+
+RDAP_BOOTSTRAP_URL = os.getenv("RDAP_BOOTSTRAP_URL", "https://data.iana.org/rdap/dns.json")
+RDAP_DIR = os.getenv("RDAP_DIR", os.path.abspath(os.path.join(os.path.dirname(__file__), "../../data/rdap")))
+RDAP_BOOTSTRAP_TTL = float(os.getenv("RDAP_BOOTSTRAP_TTL", "86400"))
+RDAP_TIMEOUT = float(os.getenv("RDAP_TIMEOUT", "6"))
+# follow the registry's "related" link to the registrar's RDAP server
+RDAP_FOLLOW_RELATED = os.getenv("RDAP_FOLLOW_RELATED", "true").lower() in ("1", "true", "yes", "on")
+RDAP_CACHE_TTL = float(os.getenv("RDAP_CACHE_TTL", "3600"))
+RDAP_CACHE_SIZE = int(os.getenv("RDAP_CACHE_SIZE", "10000"))
+
+# port-43 fallback; WHOIS_SERVER pins every query to one server (mirrors, tests)
+WHOIS_SERVER = os.getenv("WHOIS_SERVER", "")
+WHOIS_TIMEOUT = int(os.getenv("WHOIS_TIMEOUT", "10"))
+WHOIS_CACHE_TTL = float(os.getenv("WHOIS_CACHE_TTL", "86400"))
+WHOIS_CACHE_PER_REGISTRAR = int(os.getenv("WHOIS_CACHE_PER_REGISTRAR", "2000"))
+
+RDAP_ACCEPT = "application/rdap+json, application/json;q=0.9"
+EVENTS = {"registration": "creation_date", "expiration": "expiration_date", "last changed": "updated_date"}
+
+
+class _LRU:
+    """Small TTL + LRU map."""
+
+    def __init__(self, size: int, ttl: float):
+        self.size = size
+        self.ttl = ttl
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.items.get(key)
+            if item is None:
+                return None
+            if item[0] < time.time():
+                del self.items[key]
+                return None
+            self.items.move_to_end(key)
+            return item[1]
+
+    def put(self, key, value):
+        with self.lock:
+            self.items[key] = (time.time() + self.ttl, value)
+            self.items.move_to_end(key)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+
+############################################
+# RDAP response parsing
+############################################
+def _vcard(entity, prop: str):
+    """First value of a jCard property ("fn", "org", "email", ...)."""
+    for item in ((entity or {}).get("vcardArray") or [None, []])[1] or []:
+        if item and item[0] == prop:
+            value = item[3]
+            if isinstance(value, list):
+                value = " ".join(v for v in value if isinstance(v, str) and v)
+            return value or None
+    return None
+
+
+def _country(entity):
+    for item in ((entity or {}).get("vcardArray") or [None, []])[1] or []:
+        if item and item[0] == "adr":
+            cc = (item[1] or {}).get("cc")
+            if cc:
+                return cc
+            if isinstance(item[3], list) and len(item[3]) > 6 and item[3][6]:
+                return item[3][6]
+    return None
+
+
+def _entities(entities):
+    """Entities depth first, nested ones (registrar abuse contacts) included."""
+    for e in entities or []:
+        yield e
+        yield from _entities(e.get("entities"))
+
+
+def _with_role(entities, role: str):
+    return next((e for e in entities if role in (e.get("roles") or [])), None)
+
+
+def parse_domain(obj: dict) -> dict:
+    """RDAP domain object -> python-whois style fields."""
+    entities = list(_entities(obj.get("entities")))
+    registrar = _with_role(entities, "registrar")
+    registrant = _with_role(entities, "registrant")
+    data = {
+        "domain_name": (obj.get("ldhName") or obj.get("unicodeName") or "").lower() or None,
+        "registrar": _vcard(registrar, "fn"),
+        "registrar_iana_id": next((p.get("identifier") for p in (registrar or {}).get("publicIds") or []
+                                   if p.get("type") == "IANA Registrar ID"), None),
+        "name_servers": sorted({ns["ldhName"].lower().rstrip(".") for ns in obj.get("nameservers") or []
+                                if ns.get("ldhName")}),
+        "status": list(obj.get("status") or []),
+        "dnssec": (obj.get("secureDNS") or {}).get("delegationSigned"),
+        "emails": sorted({m.lower() for m in (_vcard(e, "email") for e in entities) if m}),
+        "name": _vcard(registrant, "fn"),
+        "org": _vcard(registrant, "org"),
+        "country": _country(registrant),
+    }
+    for e in obj.get("events") or []:
+        field = EVENTS.get(e.get("eventAction"))
+        if field and e.get("eventDate"):
+            data[field] = e["eventDate"]
+    return data
+
+
+def _related(obj: dict, url: str):
+    """The registrar's RDAP URL for this domain, when the registry points at one."""
+    for link in obj.get("links") or []:
+        href = link.get("href") or ""
+        if link.get("rel") == "related" and "/domain/" in href and href.rstrip("/") != url.rstrip("/") \
+                and "rdap" in (link.get("type") or "application/rdap+json"):
+            return href
+    return None
+
+
+def _merge(registry: dict, registrar: dict) -> dict:
+    """Registry answer, gaps filled from the registrar's (thick) answer."""
+    out = dict(registry)
+    for k, v in registrar.items():
+        if v not in (None, [], "") and out.get(k) in (None, [], ""):
+            out[k] = v
+    return out
+
+
+############################################
+# Lookups
+############################################
+class DomainRegistration:
+    def __init__(self, path: str = RDAP_DIR, bootstrap_url: str = RDAP_BOOTSTRAP_URL):
+        self.path = path
+        self.bootstrap_url = bootstrap_url
+        self.servers = None  # tld -> base URL
+        self.loaded_at = 0.0
+        self.published = None
+        self.lock = threading.Lock()
+        self.results = _LRU(RDAP_CACHE_SIZE, RDAP_CACHE_TTL)
+        self.whois_cache = {}  # registrar whois server -> _LRU
+        self.whois_domains = _LRU(RDAP_CACHE_SIZE, WHOIS_CACHE_TTL)  # domain -> registrar whois server
+        self.counts = {}
+
+    def _count(self, source: str, result: str):
+        key = (source, result)
+        self.counts[key] = self.counts.get(key, 0) + 1
+
+    # ------------------ bootstrap ------------------
+    @property
+    def bootstrap_file(self):
+        return os.path.join(self.path, "dns.json")
+
+    def refresh(self) -> dict:
+        """Download the IANA bootstrap file and swap it in."""
+        r = session.get(self.bootstrap_url, timeout=RDAP_TIMEOUT)
+        r.raise_for_status()
+        doc = r.json()
+        if not isinstance(doc.get("services"), list):
+            raise ValueError("RDAP bootstrap file has no services")
+        os.makedirs(self.path, exist_ok=True)
+        tmp = self.bootstrap_file + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(doc, f)
+        os.replace(tmp, self.bootstrap_file)
+        self._load(doc)
+        return {"tlds": len(self.servers), "publication": self.published}
+
+    def _load(self, doc: dict):
+        servers = {}
+        for tlds, urls in ((s[0], s[1]) for s in doc.get("services") or [] if len(s) >= 2):
+            # prefer https when a TLD lists both
+            url = next((u for u in urls if u.startswith("https://")), urls[0] if urls else None)
+            for tld in tlds:
+                if url:
+                    servers[tld.lower()] = url if url.endswith("/") else url + "/"
+        self.servers = servers
+        self.published = doc.get("publication")
+        self.loaded_at = time.time()
+
+    def ready(self) -> bool:
+        """Bootstrap loaded: from disk first, refreshed from IANA once it is older than RDAP_BOOTSTRAP_TTL."""
+        if self.servers is not None and time.time() - self.loaded_at < RDAP_BOOTSTRAP_TTL:
+            return True
+        with self.lock:
+            if self.servers is not None and time.time() - self.loaded_at < RDAP_BOOTSTRAP_TTL:
+                return True
+            if self.servers is None and os.path.exists(self.bootstrap_file):
+                try:
+                    with open(self.bootstrap_file) as f:
+                        self._load(json.load(f))
+                    self.loaded_at = os.path.getmtime(self.bootstrap_file)
+                except (OSError, ValueError) as e:
+                    print(f"[rdap] bootstrap file unreadable: {e}")
+                if self.servers is not None and time.time() - self.loaded_at < RDAP_BOOTSTRAP_TTL:
+                    return True
+            try:
+                info = self.refresh()
+                print(f"[rdap] bootstrap refreshed: {info['tlds']} TLDs, published {info['publication']}")
+            except Exception as e:
+                print(f"[rdap] bootstrap refresh failed: {e}")
+                # keep serving the stale table; try IANA again in a minute
+                self.loaded_at = time.time() - RDAP_BOOTSTRAP_TTL + 60
+        return self.servers is not None
+
+    def server_for(self, domain: str):
+        """RDAP base URL for a domain; the longest matching label suffix wins."""
+        if not self.ready():
+            return None
+        labels = domain.split(".")
+        for i in range(1, len(labels)):
+            url = self.servers.get(".".join(labels[i:]))
+            if url:
+                return url
+        return None
+
+    # ------------------ RDAP ------------------
+    def _get(self, url: str):
+        r = session.get(url, headers={"Accept": RDAP_ACCEPT}, timeout=RDAP_TIMEOUT)
+        if r.status_code == 404:
+            return None
+        r.raise_for_status()
+        return r.json()
+
+    def rdap(self, domain: str, base: str):
+        """Registry (and registrar) RDAP answer; None when the registry has no such domain."""
+        labels = domain.split(".")
+        # a host name under the domain: walk up until the registry knows the name
+        for i in range(0, max(1, len(labels) - 1)):
+            name = ".".join(labels[i:])
+            url = f"{base}domain/{name}"
+            obj = self._get(url)
+            if obj is None:
+                continue
+            data = parse_domain(obj)
+            related = _related(obj, url) if RDAP_FOLLOW_RELATED else None
+            if related:
+                try:
+                    extra = self._get(related)
+                    if extra:
+                        data = _merge(data, parse_domain(extra))
+                except Exception as e:
+                    print(f"[rdap] registrar lookup failed for {name}: {e}")
+            return {"ok": True, "source": "rdap", "server": base, "data": data}
+        return None
+
+    # ------------------ port-43 fallback ------------------
+    def whois(self, domain: str):
+        """python-whois over port 43; answers cached per registrar whois server."""
+        cache = self.whois_cache.get(self.whois_domains.get(domain))
+        if cache is not None:
+            cached = cache.get(domain)
+            if cached is not None:
+                self._count("whois", "cached")
+                return cached
+        from whois import NICClient
+        from whois.parser import WhoisEntry
+        client = NICClient()
+        host = WHOIS_SERVER or client.choose_server(domain)
+        if not host:
+            return {"ok": False, "source": "whois", "error": f"no whois server for {domain}"}
+        text = client.whois(domain, host, 0, timeout=WHOIS_TIMEOUT, quiet=True)
+        # thin registries refer to the registrar's own server
+        registrar_host = NICClient.findwhois_server(text, host, domain) or host
+        if registrar_host != host:
+            text += client.whois(domain, registrar_host, 0, timeout=WHOIS_TIMEOUT, quiet=True)
+        w = WhoisEntry.load(domain, text)
+        res = {"ok": True, "source": "whois", "server": registrar_host,
+               "data": {k: (list(v) if isinstance(v, (list, set, tuple)) else str(v)) for k, v in w.items()}}
+        self.whois_domains.put(domain, registrar_host)
+        with self.lock:
+            cache = self.whois_cache.setdefault(registrar_host, _LRU(WHOIS_CACHE_PER_REGISTRAR, WHOIS_CACHE_TTL))
+        cache.put(domain, res)
+        self._count("whois", "ok")
+        return res
+
+    # ------------------ entry point ------------------
+    def lookup(self, domain: str):
+        """Registration data for a domain: RDAP when the TLD has a server, port-43 whois otherwise."""
+        domain = domain.strip().rstrip(".").lower()
+        if domain.startswith(("http://", "https://")):
+            domain = domain.split("/")[2]
+        domain = domain.encode("idna").decode("ascii")
+        cached = self.results.get(domain)
+        if cached is not None:
+            self._count("rdap", "cached")
+            return cached
+        base = self.server_for(domain)
+        error = None
+        if base:
+            try:
+                res = self.rdap(domain, base)
+                if res is None:
+                    res = {"ok": False, "source": "rdap", "server": base, "status": 404, "error": "domain not found"}
+                self._count("rdap", "ok" if res["ok"] else "not_found")
+                self.results.put(domain, res)
+                return res
+            except Exception as e:
+                # registry RDAP down or misbehaving: ask port 43 instead
+                error = str(e)
+                self._count("rdap", "error")
+                print(f"[rdap] {base} failed for {domain}: {e}")
+        try:
+            res = self.whois(domain)
+        except Exception as e:
+            self._count("whois", "error")
+            res = {"ok": False, "source": "whois", "error": str(e)}
+        if error:
+            res["rdap_error"] = error
+        return res
+
+    def stats(self):
+        return {
+            "bootstrap": self.bootstrap_url,
+            "tlds": len(self.servers or {}),
+            "publication": self.published,
+            "loaded_at": self.loaded_at or None,
+            "cached": len(self.results.items),
+            "whois_cached": {host: len(c.items) for host, c in self.whois_cache.items()},
+            "lookups": {f"{s}:{r}": n for (s, r), n in self.counts.items()},
+        }
+
+
+# shared across scans; the bootstrap is loaded on first use
+domain_registration = DomainRegistration()
+
+register(Counter("shadowtrace_domain_registration_lookups_total", "Domain registration lookups by source and result.",
+                 ("source", "result"), fn=lambda: dict(domain_registration.counts)))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(prog="python -m app.services.domain_rdap")
+    sub = ap.add_subparsers(dest="command", required=True)
+    sub.add_parser("refresh")
+    q = sub.add_parser("lookup")
+    q.add_argument("domains", nargs="+")
+    args = ap.parse_args()
+
+    if args.command == "refresh":
+        print(json.dumps(domain_registration.refresh(), indent=2))
+    else:
+        print(json.dumps({d: domain_registration.lookup(d) for d in args.domains}, indent=2, default=str))
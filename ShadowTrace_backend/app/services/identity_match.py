@@ -0,0 +1,134 @@
+# app/services/identity_match.py
+"""
+Cross-platform identity match scoring.
+
+Features (linked domains, display/bio text, avatar hash) are extracted once per
+platform; domain overlap is found through an inverted index, display-name
+similarity reuses one difflib matcher for the username (and one result per
+distinct display name), and avatar perceptual hashes are compared pairwise
+with numpy. Avatar matches are
+reported next to the scores; they do not change them.
+"""
+import os
+import re
+import difflib
+
+AVATAR_MATCH_DISTANCE = int(os.getenv("AVATAR_MATCH_DISTANCE", "6"))
+
+_URL_HOST = re.compile(r"https?://([^\s\"'>/?#]+)", re.I)
+
+
+def _host(netloc: str) -> str:
+    host = netloc.rsplit("@", 1)[-1].split(":", 1)[0].lower()
+    return host[4:] if host.startswith("www.") else host
+
+
+class PlatformFeatures:
+    __slots__ = ("name", "display", "text", "domains", "avatar_hash")
+
+    def __init__(self, name: str, entry):
+        self.name = name
+        self.display = (entry.display_name or "").lower()
+        bio = entry.bio or ""
+        self.text = f"{self.display} {bio.lower()}"
+        self.domains = {_host(h) for h in _URL_HOST.findall(f"{bio} {entry.url or ''}")}
+        self.domains.discard("")
+        self.avatar_hash = entry.hash
+
+
+def display_similarity(username: str, displays) -> dict:
+    """
+    {display name: int(difflib ratio * 100)} against username, the score the
+    per-platform matcher used. rapidfuzz's ratio is an LCS ratio and differs
+    from difflib's on some pairs, which would move platforms across the
+    50/80 thresholds.
+    """
+    matcher = difflib.SequenceMatcher(None, "", username)  # the username side is indexed once
+    out = {}
+    for d in displays:
+        if d in out:
+            continue
+        if not d or not username:
+            out[d] = 0
+            continue
+        matcher.set_seq1(d)
+        out[d] = int(matcher.ratio() * 100)
+    return out
+
+
+def domain_overlap(features):
+    """{platform index: {other indices sharing a linked domain}} via domain -> platforms index."""
+    by_domain = {}
+    for i, f in enumerate(features):
+        for d in f.domains:
+            by_domain.setdefault(d, []).append(i)
+    shared = {}
+    for idx in by_domain.values():
+        if len(idx) < 2:
+            continue
+        for i in idx:
+            shared.setdefault(i, set()).update(j for j in idx if j != i)
+    return shared
+
+
+def avatar_matches(features, max_distance: int = AVATAR_MATCH_DISTANCE):
+    """Pairs of platforms whose avatar perceptual hashes are within max_distance bits."""
+    idx, hashes = [], []
+    for i, f in enumerate(features):
+        if not f.avatar_hash:
+            continue
+        try:
+            hashes.append(int(f.avatar_hash, 16))
+            idx.append(i)
+        except ValueError:
+            continue
+    if len(hashes) < 2:
+        return []
+    import numpy as np
+    h = np.array(hashes, dtype=np.uint64)
+    xor = np.bitwise_xor.outer(h, h)
+    dist = np.unpackbits(xor.view(np.uint8).reshape(len(h), len(h), 8), axis=2).sum(axis=2)
+    a, b = np.nonzero(np.triu(dist <= max_distance, k=1))
+    return [{"platforms": [features[idx[i]].name, features[idx[j]].name],
+             "hash": features[idx[i]].avatar_hash, "distance": int(dist[i, j])}
+            for i, j in zip(a.tolist(), b.tolist())]
+
+
+def score_platforms(username: str, platforms: dict) -> dict:
+    """
+    Match score and evidence for every platform probed by social_probe
+    ({name: models.subject_model.Profile}).
+    Returns {"scores": {platform: {"score", "evidence"}}, "shared_domains": {...},
+    "avatar_matches": [...]}.
+    """
+    names = list(platforms)
+    features = [PlatformFeatures(n, platforms[n]) for n in names]
+    uname = username.lower()
+
+    sims = display_similarity(uname, [f.display for f in features])
+    shared = domain_overlap(features)
+    avatars = avatar_matches(features)
+
+    scores = {}
+    for i, f in enumerate(features):
+        entry = platforms[f.name]
+        score = 0
+        evidence = list(entry.evidence or [])
+        sim = sims[f.display]
+        if sim >= 80:
+            score += 40; evidence.append("display_name_similar")
+        elif sim >= 50:
+            score += 20; evidence.append("display_name_partial")
+        if entry.avatar:
+            score += 20; evidence.append("avatar_present")
+        if uname in f.text:
+            score += 15; evidence.append("username_in_bio")
+        if i in shared:
+            score += 25; evidence.append("shared_website")
+        scores[f.name] = {"score": min(score, 95), "evidence": list(dict.fromkeys(evidence))}
+
+    return {
+        "scores": scores,
+        "shared_domains": {names[i]: sorted(names[j] for j in peers) for i, peers in shared.items()},
+        "avatar_matches": avatars,
+    }
@@ -0,0 +1,393 @@
+# app/services/ip_asn.py
+"""
+Offline IP -> ASN / prefix / registry lookups.
+
+`build` compiles public dumps into sorted integer range tables:
+
+    pfx2as      routeviews prefix-to-AS files ("1.1.1.0<TAB>24<TAB>13335"),
+                IPv4 and IPv6, plain or .gz
+    delegated   RIR delegation stats ("apnic|AU|ipv4|1.1.1.0|256|...")
+    asnames     optional "13335 CLOUDFLARENET, US" lines
+
+Nested prefixes are flattened so every table is a list of disjoint ranges
+(the most specific prefix wins), stored as numpy arrays in IPINTEL_DIR and
+memory-mapped read-only, so every worker process shares one copy through
+the page cache. A lookup is one binary search (np.searchsorted) per table;
+lookup_many() does a whole batch in one vectorized call.
+
+IPv6 ranges are keyed on the upper 64 bits. Routed prefixes are /64 or
+shorter, so longer IPv6 prefixes are skipped at build time.
+
+    python -m app.services.ip_asn build --pfx2as routeviews-rv2-*.pfx2as.gz --delegated delegated-*-latest
+"""
+import os
+import re
+import gzip
+import json
+import time
+import socket
+import threading
+
+from app.utils.metrics import register, Counter
+
+IPINTEL_DIR = os.getenv("IPINTEL_DIR", os.path.abspath(os.path.join(os.path.dirname(__file__), "../../data/ipintel")))
+IPINTEL_RECHECK = float(os.getenv("IPINTEL_RECHECK", "60"))
+
+TABLES = ("asn4", "asn6", "reg4", "reg6")
+_ASNAME = re.compile(r"^\s*(?:AS)?(\d+)\s+(.+?)\s*$")
+
+
+############################################
+# Parsing
+############################################
+def _open(path):
+    return gzip.open(path, "rt", errors="replace") if path.endswith(".gz") else open(path, errors="replace")
+
+
+def _ip_int(text: str):
+    """(version, int); IPv6 keeps only the upper 64 bits."""
+    if ":" in text:
+        return 6, int.from_bytes(socket.inet_pton(socket.AF_INET6, text)[:8], "big")
+    return 4, int.from_bytes(socket.inet_aton(text), "big")
+
+
+def parse_pfx2as(path):
+    """(version, start, end, asn, prefix length) for each routed prefix."""
+    with _open(path) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) < 3 or parts[0].startswith("#"):
+                continue
+            try:
+                version, start = _ip_int(parts[0])
+                plen = int(parts[1])
+                # multi-origin "a_b" and AS-set "a,b": keep the first origin
+                asn = int(re.split(r"[_,]", parts[2])[0])
+            except (OSError, ValueError):
+                continue
+            bits = 32 if version == 4 else 64
+            if version == 6 and plen > 64:
+                continue
+            size = 1 << (bits - plen)
+            start &= ~(size - 1)
+            yield version, start, start + size - 1, asn, plen
+
+
+def parse_delegated(path):
+    """(version, start, end, registry, country) for allocated/assigned ranges."""
+    with _open(path) as f:
+        for line in f:
+            parts = line.strip().split("|")
+            if len(parts) < 7 or parts[2] not in ("ipv4", "ipv6") or parts[1] == "*":
+                continue
+            if parts[6] not in ("allocated", "assigned"):
+                continue
+            try:
+                version, start = _ip_int(parts[3])
+                value = int(parts[4])
+            except (OSError, ValueError):
+                continue
+            if version == 4:
+                end = start + value - 1
+            elif value > 64:
+                continue
+            else:
+                end = start + (1 << (64 - value)) - 1
+            yield version, start, end, parts[0].lower(), parts[1].upper()
+
+
+def parse_asnames(path):
+    names = {}
+    with _open(path) as f:
+        for line in f:
+            m = _ASNAME.match(line)
+            if m:
+                names[int(m.group(1))] = m.group(2)
+    return names
+
+
+def flatten(ranges):
+    """
+    Disjoint (start, end, value) ranges from CIDR-nested ones; the most
+    specific range wins and adjacent ranges with equal values are merged.
+    """
+    out = []
+
+    def emit(a, b, v):
+        if a > b:
+            return
+        if out and out[-1][2] == v and out[-1][1] + 1 == a:
+            out[-1][1] = b
+        else:
+            out.append([a, b, v])
+
+    stack, pos = [], 0  # enclosing (end, value), innermost last
+    for start, end, value in sorted(ranges, key=lambda r: (r[0], -r[1])):
+        while stack and stack[-1][0] < start:
+            e, v = stack.pop()
+            emit(pos, e, v)
+            pos = e + 1
+        if stack:
+            emit(pos, start - 1, stack[-1][1])
+        stack.append((end, value))
+        pos = start
+    while stack:
+        e, v = stack.pop()
+        emit(pos, e, v)
+        pos = e + 1
+    return out
+
+
+############################################
+# Build
+############################################
+def build(out_dir: str = IPINTEL_DIR, pfx2as=(), delegated=(), asnames=None) -> dict:
+    """Compile dumps into the range tables in `out_dir`; replaces what was there."""
+    import numpy as np
+
+    asn = {4: [], 6: []}
+    for path in pfx2as:
+        for version, start, end, a, plen in parse_pfx2as(path):
+            asn[version].append((start, end, (a, plen)))
+    labels, label_ids = [], {}
+    reg = {4: [], 6: []}
+    for path in delegated:
+        for version, start, end, registry, cc in parse_delegated(path):
+            key = f"{registry}|{cc}"
+            if key not in label_ids:
+                label_ids[key] = len(labels)
+                labels.append(key)
+            reg[version].append((start, end, label_ids[key]))
+
+    tmp = out_dir.rstrip("/") + f".tmp{os.getpid()}"
+    os.makedirs(tmp, exist_ok=True)
+    counts = {}
+    for version in (4, 6):
+        dtype = np.uint32 if version == 4 else np.uint64
+        rows = flatten(asn[version])
+        counts[f"asn{version}"] = len(rows)
+        np.save(os.path.join(tmp, f"asn{version}_start.npy"), np.array([r[0] for r in rows], dtype=dtype))
+        np.save(os.path.join(tmp, f"asn{version}_end.npy"), np.array([r[1] for r in rows], dtype=dtype))
+        np.save(os.path.join(tmp, f"asn{version}_asn.npy"), np.array([r[2][0] for r in rows], dtype=np.uint32))
+        np.save(os.path.join(tmp, f"asn{version}_plen.npy"), np.array([r[2][1] for r in rows], dtype=np.uint8))
+        rows = flatten(reg[version])
+        counts[f"reg{version}"] = len(rows)
+        np.save(os.path.join(tmp, f"reg{version}_start.npy"), np.array([r[0] for r in rows], dtype=dtype))
+        np.save(os.path.join(tmp, f"reg{version}_end.npy"), np.array([r[1] for r in rows], dtype=dtype))
+        np.save(os.path.join(tmp, f"reg{version}_label.npy"), np.array([r[2] for r in rows], dtype=np.uint16))
+
+    meta = {
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "sources": {"pfx2as": [os.path.basename(p) for p in pfx2as],
+                    "delegated": [os.path.basename(p) for p in delegated],
+                    "asnames": os.path.basename(asnames) if asnames else None},
+        "counts": counts,
+        "labels": labels,
+        "asnames": {str(k): v for k, v in (parse_asnames(asnames) if asnames else {}).items()},
+    }
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump(meta, f)
+
+    # swap directories so running workers never map a half-written table
+    old = None
+    if os.path.isdir(out_dir):
+        old = out_dir.rstrip("/") + f".old{os.getpid()}"
+        os.rename(out_dir, old)
+    os.rename(tmp, out_dir)
+    if old:
+        import shutil
+        shutil.rmtree(old, ignore_errors=True)
+    return {k: v for k, v in meta.items() if k not in ("labels", "asnames")}
+
+
+############################################
+# Lookup
+############################################
+class IPAsnIndex:
+    def __init__(self, path: str = IPINTEL_DIR):
+        self.path = path
+        self.lock = threading.Lock()
+        self.tables = None
+        self.meta = {}
+        self.mtime = None
+        self.checked = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def _meta_path(self):
+        return os.path.join(self.path, "meta.json")
+
+    def load(self):
+        """Map the tables (again, if they were rebuilt). False when none have been built."""
+        import numpy as np
+
+        try:
+            mtime = os.stat(self._meta_path()).st_mtime
+        except OSError:
+            self.tables = None
+            return False
+        if mtime == self.mtime and self.tables is not None:
+            return True
+        with open(self._meta_path()) as f:
+            meta = json.load(f)
+        tables = {}
+        for name in TABLES:
+            cols = ("start", "end", "asn", "plen") if name.startswith("asn") else ("start", "end", "label")
+            # plain ndarray views of the maps: indexing a np.memmap is several times slower
+            tables[name] = {c: np.load(os.path.join(self.path, f"{name}_{c}.npy"), mmap_mode="r").view(np.ndarray)
+                            for c in cols}
+        meta["asnames"] = {int(k): v for k, v in meta.get("asnames", {}).items()}
+        self.tables, self.meta, self.mtime = tables, meta, mtime
+        return True
+
+    def ready(self):
+        now = time.monotonic()
+        if self.tables is None or now - self.checked > IPINTEL_RECHECK:
+            with self.lock:
+                if self.tables is None or now - self.checked > IPINTEL_RECHECK:
+                    self.checked = now
+                    self.load()
+        return self.tables is not None
+
+    @staticmethod
+    def _find(table, keys):
+        import numpy as np
+
+        i = np.searchsorted(table["start"], keys, side="right") - 1
+        found = i >= 0
+        i = np.where(found, i, 0)
+        found &= table["end"][i] >= keys
+        return i, found
+
+    def _record(self, ip, version, key, asn, plen, label):
+        bits = 32 if version == 4 else 64
+        net = key & ~((1 << (bits - plen)) - 1)
+        if version == 4:
+            cidr = f"{socket.inet_ntoa(net.to_bytes(4, 'big'))}/{plen}"
+        else:
+            cidr = f"{socket.inet_ntop(socket.AF_INET6, net.to_bytes(8, 'big') + bytes(8))}/{plen}"
+        registry = country = None
+        if label is not None:
+            registry, country = self.meta["labels"][label].split("|")
+        return {
+            "ip": ip,
+            "asn": str(asn),
+            "asn_cidr": cidr,
+            "asn_registry": registry,
+            "asn_country_code": country,
+            "asn_description": self.meta["asnames"].get(asn),
+        }
+
+    @staticmethod
+    def _find_one(table, key):
+        starts = table["start"]
+        # a key of the table's own dtype; a Python int would make numpy cast the whole array
+        i = int(starts.searchsorted(starts.dtype.type(key), side="right")) - 1
+        if i < 0 or int(table["end"][i]) < key:
+            return None
+        return i
+
+    def lookup(self, ip: str):
+        """ASN record for one address, or None when it is not in a routed prefix (or no tables are built)."""
+        if not self.ready():
+            self.misses += 1
+            return None
+        try:
+            version, key = _ip_int(ip)
+        except (OSError, ValueError, TypeError):
+            return None
+        asn_t, reg_t = self.tables[f"asn{version}"], self.tables[f"reg{version}"]
+        i = self._find_one(asn_t, key)
+        if i is None:
+            self.misses += 1
+            return None
+        r = self._find_one(reg_t, key)
+        self.hits += 1
+        return self._record(ip, version, key, int(asn_t["asn"][i]), int(asn_t["plen"][i]),
+                            int(reg_t["label"][r]) if r is not None else None)
+
+    def lookup_many(self, ips):
+        """Records (or None) for a batch of addresses, one vectorized search per table."""
+        import numpy as np
+
+        out = [None] * len(ips)
+        if not self.ready():
+            self.misses += len(ips)
+            return out
+        groups = {4: ([], []), 6: ([], [])}
+        for n, ip in enumerate(ips):
+            try:
+                version, key = _ip_int(ip)
+            except (OSError, ValueError, TypeError):
+                continue
+            groups[version][0].append(n)
+            groups[version][1].append(key)
+        for version, (idx, keys) in groups.items():
+            asn_t, reg_t = self.tables[f"asn{version}"], self.tables[f"reg{version}"]
+            if not idx or len(asn_t["start"]) == 0:
+                continue
+            karr = np.array(keys, dtype=np.uint32 if version == 4 else np.uint64)
+            ai, afound = self._find(asn_t, karr)
+            hit = np.flatnonzero(afound)
+            ai = ai[hit]
+            labels = [None] * len(hit)
+            if len(reg_t["start"]):
+                ri, rfound = self._find(reg_t, karr[hit])
+                labels = np.where(rfound, reg_t["label"][ri].astype(np.int32), -1).tolist()
+                labels = [None if l < 0 else l for l in labels]
+            # gather whole columns at once; the records are then built from plain ints
+            for j, asn, plen, label in zip(hit.tolist(), asn_t["asn"][ai].tolist(),
+                                           asn_t["plen"][ai].tolist(), labels):
+                n = idx[j]
+                out[n] = self._record(ips[n], version, keys[j], asn, plen, label)
+        found = sum(r is not None for r in out)
+        self.hits += found
+        self.misses += len(ips) - found
+        return out
+
+    def lookup_keys(self, keys, version: int = 4):
+        """ASNs (0 for a miss) for integer keys; the fast path for bulk scans and benchmarks."""
+        import numpy as np
+
+        if not self.ready():
+            return np.zeros(len(keys), dtype=np.uint32)
+        table = self.tables[f"asn{version}"]
+        i, found = self._find(table, keys)
+        return np.where(found, table["asn"][i], 0)
+
+    def stats(self):
+        return {
+            "loaded": self.tables is not None,
+            "path": self.path,
+            "built_at": self.meta.get("built_at"),
+            "counts": self.meta.get("counts"),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+# shared index; each worker maps the same files
+ip_index = IPAsnIndex()
+
+register(Counter("shadowtrace_ipintel_lookups_total", "Local IP/ASN table lookups by result.", ("result",),
+                 fn=lambda: {("hit",): ip_index.hits, ("miss",): ip_index.misses}))
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(prog="python -m app.services.ip_asn")
+    sub = ap.add_subparsers(dest="command", required=True)
+    b = sub.add_parser("build")
+    b.add_argument("--pfx2as", nargs="*", default=[])
+    b.add_argument("--delegated", nargs="*", default=[])
+    b.add_argument("--asnames")
+    b.add_argument("--out", default=IPINTEL_DIR)
+    q = sub.add_parser("lookup")
+    q.add_argument("ips", nargs="+")
+    args = ap.parse_args()
+
+    if args.command == "build":
+        print(json.dumps(build(args.out, args.pfx2as, args.delegated, args.asnames), indent=2))
+    else:
+        print(json.dumps(ip_index.lookup_many(args.ips), indent=2))
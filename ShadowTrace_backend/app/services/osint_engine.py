@@ -7,6 +7,7 @@ from app.scrapers.darkweb_feeds import darkweb
 from app.state import SCAN_CACHE   # ✅ FIXED circular import
 from app.services.scoring import score
 from app.services.correlation import correlate
+from models.subject_model import Subject
 
 async def run_scan(qid, value):
     ind, typ = normalize(value)
@@ -28,12 +29,5 @@ async def run_scan(qid, value):
     conf = score(results)
     links = correlate(results)
 
-    # Store result in global memory
-    SCAN_CACHE[qid] = {
-        "indicator": ind,
-        "type": typ,
-        "confidence": conf,
-        "links": links,
-        "sources": results,
-        "status": "completed"
-    }
+    # Store result in global memory (Subject.to_doc() gives the dict form)
+    SCAN_CACHE[qid] = Subject(ind, typ, sources=results, confidence=conf, links=links)
@@ -1,72 +1,76 @@
 # app/services/osint_processor.py
-from datetime import datetime
-from pymongo import MongoClient
+"""
+SpiderFoot export parsing and storage into `osint_cases`.
+
+Cases are written to the shared database (DB_NAME on MONGO_URI), the one
+/osint/entities reads. Older deployments wrote them to a separate database
+(MONGO_DB, default "shadowtrace", on MONGODB_URI); copy those over once with
+
+    python -m app.services.osint_processor copy-legacy [--source-uri URI] [--source-db shadowtrace] [--dry-run]
+
+then run `python -m app.database.blobs migrate` to move their raw exports
+into the blob store.
+"""
 import os
+from datetime import datetime
 from typing import Dict, Any, List
 
-MONGO_URI = os.getenv("MONGODB_URI", "mongodb://localhost:27017")
-MONGO_DB = os.getenv("MONGO_DB", "shadowtrace")
-
-client = MongoClient(MONGO_URI)
-db = client[MONGO_DB]
+from app.database.mongo import db
+from app.database.blobs import store as blob_store, CASE_BLOB_FIELDS
+from app.utils.metrics import span
+from models.subject_model import Indicator
 
-def extract_entities_from_sf(raw: Dict[str, Any]) -> List[Dict[str, Any]]:
+def extract_entities_from_sf(raw: Dict[str, Any]) -> List[Indicator]:
     """
-    Parse SpiderFoot JSON export and return a flat list of normalized entities.
+    Parse SpiderFoot JSON export and return a flat list of normalized entities,
+    de-duplicated by (type, value).
     The exact JSON structure differs by version; this parser handles the common patterns:
     - events or data entries containing type, value, module, note, severity, etc.
     """
     entities = []
+    seen = set()
 
     # Common locations: 'events', 'data', 'results', 'items' - try all
     possible_containers = []
     for k in ("events", "data", "results", "items", "scan_data"):
         if k in raw:
-            possible_containers.append(raw[k])
+            possible_containers.append((k, raw[k]))
 
     # If top-level is an array, use it
     if not possible_containers and isinstance(raw, list):
-        possible_containers = [raw]
+        possible_containers = [(None, raw)]
 
-    for container in possible_containers:
+    for key, container in possible_containers:
         if not isinstance(container, list):
             continue
-        for item in container:
+        for i, item in enumerate(container):
             # flexible extraction
-            ent = {}
             # spiderfoot newer versions often have 'data' or 'value' & 'type'
             ent_type = item.get("type") or item.get("data_type") or item.get("name") or item.get("eventType")
             ent_value = item.get("value") or item.get("data") or item.get("text") or item.get("event")
-            module = item.get("module") or item.get("source") or item.get("sourceModule")
-            severity = item.get("severity") or item.get("risk") or item.get("confidence")
-            timestamp = item.get("timestamp") or item.get("date") or item.get("time")
 
             if ent_value is None:
                 # some items have nested data structures, skip if not simple
                 continue
 
-            ent["type"] = (ent_type or "").lower()
-            ent["value"] = ent_value
-            ent["module"] = module
-            ent["severity"] = severity
+            ent_type = (ent_type or "").lower()
+            # de-dupe by (type,value) before building anything
+            dedupe_key = (ent_type, str(ent_value))
+            if dedupe_key in seen:
+                continue
+            seen.add(dedupe_key)
+
+            module = item.get("module") or item.get("source") or item.get("sourceModule")
+            severity = item.get("severity") or item.get("risk") or item.get("confidence")
+            timestamp = item.get("timestamp") or item.get("date") or item.get("time")
             try:
-                ent["timestamp"] = datetime.fromisoformat(timestamp) if isinstance(timestamp, str) else timestamp
+                timestamp = datetime.fromisoformat(timestamp) if isinstance(timestamp, str) else timestamp
             except Exception:
-                ent["timestamp"] = None
-            # raw item for traceability
-            ent["raw"] = item
-            entities.append(ent)
+                timestamp = None
+            # position of the raw item in the export (kept once, in the blob store) for traceability
+            entities.append(Indicator(ent_type, ent_value, module, severity, timestamp, (key, i)))
 
-    # de-dupe by (type,value)
-    seen = set()
-    unique = []
-    for e in entities:
-        key = (e.get("type"), str(e.get("value")))
-        if key in seen:
-            continue
-        seen.add(key)
-        unique.append(e)
-    return unique
+    return entities
 
 def store_scan_in_mongo(case_id: str, scan_id: str, target: str, raw: Dict[str, Any]) -> Dict[str, Any]:
     """
@@ -81,8 +85,67 @@ def store_scan_in_mongo(case_id: str, scan_id: str, target: str, raw: Dict[str,
         "source": "spiderfoot",
         "timestamp": datetime.utcnow(),
         "entity_count": len(entities),
-        "entities": entities,
+        "entities": [e.to_doc() for e in entities],
         "raw": raw
     }
-    res = db.osint_cases.insert_one(doc)
+    # the full SpiderFoot export is kept once in the blob store, not per case document
+    blob_store.externalize(doc, CASE_BLOB_FIELDS)
+    with span("mongo", "osint_cases.insert"):
+        res = db.osint_cases.insert_one(doc)
     return {"inserted_id": str(res.inserted_id), "entity_count": len(entities)}
+
+
+def copy_legacy_cases(source, dest, batch_size: int = 500, dry_run: bool = False) -> Dict[str, int]:
+    """
+    Copy osint_cases documents from the old per-service database into the
+    shared one. Documents keep their _id and ones already present are skipped,
+    so the copy can be re-run.
+    """
+    stats = {"scanned": 0, "copied": 0}
+    batch = []
+
+    def flush():
+        ids = [d["_id"] for d in batch]
+        present = {d["_id"] for d in dest.osint_cases.find({"_id": {"$in": ids}}, {"_id": 1})}
+        new = [d for d in batch if d["_id"] not in present]
+        if new and not dry_run:
+            dest.osint_cases.insert_many(new, ordered=False)
+        stats["copied"] += len(new)
+        batch.clear()
+
+    for doc in source.osint_cases.find({}, batch_size=batch_size):
+        stats["scanned"] += 1
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return stats
+
+
+if __name__ == "__main__":
+    import json
+    import argparse
+
+    ap = argparse.ArgumentParser(prog="python -m app.services.osint_processor")
+    ap.add_argument("command", choices=["copy-legacy"])
+    ap.add_argument("--source-uri", default=os.getenv("MONGODB_URI") or os.getenv("MONGO_URI"))
+    ap.add_argument("--source-db", default=os.getenv("MONGO_DB", "shadowtrace"))
+    ap.add_argument("--batch", type=int, default=500)
+    ap.add_argument("--dry-run", action="store_true")
+    args = ap.parse_args()
+
+    from pymongo import MongoClient
+    from app.database import mongo
+
+    status = mongo.connect()
+    if status["db_status"] != "connected":
+        raise SystemExit(f"MongoDB not available: {status.get('error')}")
+    dest = mongo.database()
+    source_client = MongoClient(args.source_uri or "mongodb://localhost:27017")
+    source = source_client[args.source_db]
+    if (source.client.address, source.name) == (dest.client.address, dest.name):
+        raise SystemExit("source and destination are the same database")
+    print(json.dumps(copy_legacy_cases(source, dest, batch_size=args.batch, dry_run=args.dry_run), indent=2))
+    source_client.close()
+    mongo.close()
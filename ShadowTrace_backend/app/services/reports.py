@@ -0,0 +1,278 @@
+# app/services/reports.py
+"""
+Case report jobs.
+
+A report request is keyed by the case version: a hash of the case's
+osint_cases documents (ids, timestamps, entity counts, scans), the template
+and the format. A version that was rendered before is served from the report
+cache. Otherwise a job gathers the case (one projected find, one entity
+aggregation - no per-scan reads) and hands it to a process pool that renders HTML/PDF off the API process. Identical requests
+while a job is in flight share that job.
+"""
+import os
+import json
+import time
+import uuid
+import hashlib
+import threading
+import concurrent.futures
+from collections import OrderedDict
+from datetime import datetime
+
+from app.database import mongo
+from app.database.mongo import db
+from app.database import blobs
+from app.utils import pdf_export
+from app.utils.metrics import register, Counter, Histogram
+
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", "2"))
+REPORT_MAX_ENTITIES = int(os.getenv("REPORT_MAX_ENTITIES", "20000"))
+REPORT_JOBS_KEPT = int(os.getenv("REPORT_JOBS_KEPT", "1000"))
+REPORT_BUCKET = os.getenv("REPORT_BUCKET", "reports")
+REPORT_DIR = os.getenv("REPORT_DIR", os.path.abspath(os.path.join(os.path.dirname(__file__), "../../data/reports")))
+
+REPORTS = register(Counter("shadowtrace_reports_total", "Report requests by format and outcome.",
+                           ("format", "result")))
+REPORT_SECONDS = register(Histogram("shadowtrace_report_seconds", "Report job duration by stage.",
+                                    ("format", "stage")))
+
+
+############################################
+# Case data
+############################################
+def case_version(database, case_id: str, fmt: str):
+    """Cache key for the current state of a case, or None when the case does not exist."""
+    docs = list(database.osint_cases.find(
+        {"case_id": case_id}, {"_id": 1, "timestamp": 1, "entity_count": 1, "scans": 1}).sort("_id", 1))
+    if not docs:
+        return None
+    spec = [pdf_export.template_version(), fmt, REPORT_MAX_ENTITIES, docs]
+    return hashlib.sha1(json.dumps(spec, default=str, sort_keys=True).encode()).hexdigest()
+
+
+def entity_pipeline(case_id: str, limit: int = REPORT_MAX_ENTITIES):
+    """Distinct (type, value) entities of a case with their counts per type, in one pass."""
+    return [
+        {"$match": {"case_id": case_id, "entities.0": {"$exists": True}}},
+        {"$project": {"entities": 1}},
+        {"$unwind": "$entities"},
+        {"$group": {
+            "_id": {"type": "$entities.type", "value": "$entities.value"},
+            "modules": {"$addToSet": "$entities.module"},
+            "severity": {"$max": "$entities.severity"},
+            "first_seen": {"$min": "$entities.timestamp"},
+            "seen": {"$sum": 1},
+        }},
+        {"$facet": {
+            "entities": [{"$sort": {"_id.type": 1, "_id.value": 1}}, {"$limit": limit}],
+            "by_type": [{"$group": {"_id": "$_id.type", "count": {"$sum": 1}}}, {"$sort": {"count": -1}}],
+        }},
+    ]
+
+
+def gather_case(database, case_id: str) -> dict:
+    """Everything the report template needs: one projected find for the case documents, one aggregation for entities."""
+    docs = list(database.osint_cases.find(
+        {"case_id": case_id}, {"target": 1, "timestamp": 1, "scan_id": 1, "entity_count": 1, "scans": 1}))
+    if not docs:
+        return None
+    out = next(iter(database.osint_cases.aggregate(entity_pipeline(case_id))), None) or {}
+
+    # the case header document holds started scans; stored documents hold results
+    stored = [{"scan_id": d["scan_id"], "timestamp": d.get("timestamp"), "entity_count": d.get("entity_count")}
+              for d in docs if d.get("scan_id")]
+    by_id = {s["scan_id"]: s for s in stored}
+    scans = []
+    for d in docs:
+        for s in d.get("scans") or []:
+            scans.append({**s, **by_id.pop(s.get("scan_id"), {})})
+    scans += list(by_id.values())
+
+    entities = {}
+    for e in out.get("entities", []):
+        entities.setdefault(e["_id"]["type"], []).append({
+            "value": e["_id"]["value"],
+            "modules": sorted(m for m in e["modules"] if m),
+            "severity": e.get("severity"),
+            "first_seen": e.get("first_seen"),
+            "seen": e["seen"],
+        })
+    by_type = [{"type": r["_id"], "count": r["count"]} for r in out.get("by_type", [])]
+    total = sum(r["count"] for r in by_type)
+    shown = len(out.get("entities", []))
+    stamps = [d["timestamp"] for d in docs if d.get("timestamp")]
+    return {
+        "case_id": case_id,
+        "target": next((d["target"] for d in docs if d.get("target")), None),
+        "first_seen": min(stamps) if stamps else None,
+        "last_seen": max(stamps) if stamps else None,
+        "scans": scans,
+        "stored": stored,
+        "by_type": by_type,
+        "entities": entities,
+        "entity_total": total,
+        "entity_shown": shown,
+        "truncated": shown < total,
+    }
+
+
+############################################
+# Jobs
+############################################
+class ReportService:
+    def __init__(self, workers: int = REPORT_WORKERS, cache=None, database=None):
+        self.workers = workers
+        self._cache = cache
+        self._db = database
+        self.lock = threading.Lock()
+        self.jobs = OrderedDict()
+        self.in_flight = {}  # version -> job id
+        self._pool = None
+        self._runner = None
+
+    @property
+    def db(self):
+        return self._db if self._db is not None else db
+
+    @property
+    def cache(self):
+        """Rendered reports, stored next to the raw payload blobs and keyed by version."""
+        if self._cache is None:
+            if blobs.BLOB_BACKEND == "fs":
+                self._cache = blobs.FileBackend(REPORT_DIR)
+            else:
+                # gridfs needs the Database itself, not the module-level proxy
+                database = self._db if self._db is not None else mongo.database()
+                self._cache = blobs.GridFSBackend(database, bucket=REPORT_BUCKET)
+        return self._cache
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            with self.lock:
+                if self._pool is None:
+                    import multiprocessing
+                    # spawn: forked children would inherit the parent's Mongo sockets and loop threads
+                    self._pool = concurrent.futures.ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context("spawn"),
+                        initializer=pdf_export.init_worker,
+                    )
+                    if self._runner is None:
+                        # gathering and cache writes are I/O; these threads just drive the pool
+                        self._runner = concurrent.futures.ThreadPoolExecutor(
+                            max_workers=self.workers * 2, thread_name_prefix="report")
+        return self._pool
+
+    def warm(self):
+        """Start the worker processes now instead of on the first request."""
+        list(self.pool.map(_noop, range(self.workers)))
+
+    def shutdown(self):
+        if self._runner is not None:
+            self._runner.shutdown(wait=False, cancel_futures=True)
+            self._runner = None
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def _reset(self, pool):
+        with self.lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _new_job(self, case_id, fmt, version, status):
+        job = {
+            "id": uuid.uuid4().hex,
+            "case_id": case_id,
+            "format": fmt,
+            "version": version,
+            "status": status,
+            "cached": status == "done",
+            "created_at": datetime.utcnow(),
+        }
+        self.jobs[job["id"]] = job
+        while len(self.jobs) > REPORT_JOBS_KEPT:
+            self.jobs.popitem(last=False)
+        return job
+
+    def submit(self, case_id: str, fmt: str = "pdf"):
+        """Job for rendering the current version of a case; None if the case does not exist."""
+        if fmt not in pdf_export.FORMATS:
+            raise ValueError(f"unknown report format '{fmt}'")
+        version = case_version(self.db, case_id, fmt)
+        if version is None:
+            return None
+        if self.cache.existing([version]):
+            REPORTS.inc(fmt, "cached")
+            with self.lock:
+                return self._new_job(case_id, fmt, version, "done")
+
+        pool = self.pool
+        with self.lock:
+            running = self.in_flight.get(version)
+            if running in self.jobs:
+                REPORTS.inc(fmt, "joined")
+                return self.jobs[running]
+            job = self._new_job(case_id, fmt, version, "queued")
+            self.in_flight[version] = job["id"]
+        self._runner.submit(self._run, job, pool)
+        return job
+
+    def _run(self, job, pool):
+        fmt = job["format"]
+        t0 = time.perf_counter()
+        try:
+            job["status"] = "gathering"
+            job["started_at"] = datetime.utcnow()
+            case = gather_case(self.db, job["case_id"])
+            if case is None:
+                raise LookupError(f"case '{job['case_id']}' has no documents")
+            case["version"] = job["version"][:12]
+            t1 = time.perf_counter()
+            REPORT_SECONDS.observe(fmt, "gather", value=t1 - t0)
+
+            job["status"] = "rendering"
+            data = pool.submit(pdf_export.render, case, fmt).result()
+            t2 = time.perf_counter()
+            REPORT_SECONDS.observe(fmt, "render", value=t2 - t1)
+
+            self.cache.write(job["version"], data)
+            job.update(status="done", bytes=len(data), entities=case["entity_total"])
+            REPORTS.inc(fmt, "rendered")
+        except Exception as e:
+            job.update(status="failed", error=f"{e.__class__.__name__}: {e}")
+            REPORTS.inc(fmt, "failed")
+            if isinstance(e, concurrent.futures.process.BrokenProcessPool):
+                # a worker died (OOM, segfault in a native renderer): start a fresh pool next time
+                self._reset(pool)
+        finally:
+            job["finished_at"] = datetime.utcnow()
+            job["duration_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+            with self.lock:
+                self.in_flight.pop(job["version"], None)
+
+    def job(self, job_id: str):
+        return self.jobs.get(job_id)
+
+    def wait(self, job_id: str, timeout: float = None, poll: float = 0.05):
+        """Block until a job leaves the queue (used by benchmarks and scripts)."""
+        deadline = time.monotonic() + timeout if timeout else None
+        while True:
+            job = self.jobs.get(job_id)
+            if job is None or job["status"] in ("done", "failed"):
+                return job
+            if deadline and time.monotonic() > deadline:
+                return job
+            time.sleep(poll)
+
+    def read(self, job: dict) -> bytes:
+        return self.cache.read(job["version"])
+
+
+def _noop(_):
+    return None
+
+
+reports = ReportService()
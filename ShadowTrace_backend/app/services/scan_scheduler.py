@@ -0,0 +1,246 @@
+# app/services/scan_scheduler.py
+"""
+Fair-share scheduling of queued scans across tenants.
+
+A tenant is whoever owns the scan: `meta.tenant`, else `meta.analyst`, else
+`meta.case_id` (see `tenant_of`). Every scan waits in its tenant's FIFO in
+one of two lanes:
+
+    interactive   single-indicator scans from /search/start
+    batch         bulk submissions (/search/bulk, or meta.priority="batch")
+
+SCHED_WORKERS threads run scans. A free worker takes interactive work
+first; while both lanes are waiting, every SCHED_BATCH_EVERY-th dispatch
+goes to batch so bulk work still moves under a steady interactive load.
+Within a lane tenants are served by start-time fair queuing: each tenant's
+next scan is tagged max(lane virtual time, tenant's previous finish tag),
+its finish tag is that plus 1/weight, and the smallest tag runs next. A
+tenant that queued 50k scans therefore gets its weighted share of the
+workers, not all of them, and a tenant that was idle does not bank credit.
+No tenant runs more than SCHED_TENANT_CONCURRENCY scans at once.
+
+Weights come from SCHED_WEIGHTS ("alice=2,case-42=0.5"; default 1), never
+from the request. Queue wait is exported per tenant and lane
+(shadowtrace_scan_queue_seconds) and summarized by `stats()`.
+"""
+import os
+import time
+import threading
+from collections import deque
+
+from app.utils.metrics import register, Counter, Gauge, Histogram
+
+SCHED_WORKERS = int(os.getenv("SCHED_WORKERS", "16"))
+# below SCHED_WORKERS so one tenant cannot hold every worker; each point lower
+# leaves that worker idle while only one tenant has work
+SCHED_TENANT_CONCURRENCY = int(os.getenv("SCHED_TENANT_CONCURRENCY", "12"))
+SCHED_BATCH_EVERY = int(os.getenv("SCHED_BATCH_EVERY", "10"))  # 0: batch only when nothing interactive waits
+SCHED_WEIGHTS = os.getenv("SCHED_WEIGHTS", "")
+SCHED_WAIT_SAMPLES = int(os.getenv("SCHED_WAIT_SAMPLES", "1000"))
+
+LANES = ("interactive", "batch")
+DEFAULT_TENANT = "default"
+
+QUEUE_SECONDS = register(Histogram(
+    "shadowtrace_scan_queue_seconds", "Time scans waited for a worker, by tenant and lane.", ("tenant", "lane"),
+    buckets=(0.01, 0.05, 0.1, 0.5, 1, 5, 10, 30, 60, 300, 900, 3600)))
+DISPATCHED = register(Counter(
+    "shadowtrace_scan_dispatched_total", "Scans handed to a worker, by lane.", ("lane",)))
+
+
+def parse_weights(spec: str) -> dict:
+    out = {}
+    for part in filter(None, (p.strip() for p in (spec or "").split(","))):
+        name, _, w = part.rpartition("=")
+        out[name] = float(w)
+    return out
+
+
+def tenant_of(meta) -> str:
+    """Owner of a scan for scheduling purposes."""
+    meta = meta or {}
+    for key in ("tenant", "analyst", "case_id"):
+        if meta.get(key):
+            return str(meta[key])
+    return DEFAULT_TENANT
+
+
+class _Job:
+    __slots__ = ("fn", "args", "tenant", "lane", "queued_at")
+
+    def __init__(self, fn, args, tenant, lane):
+        self.fn = fn
+        self.args = args
+        self.tenant = tenant
+        self.lane = lane
+        self.queued_at = time.monotonic()
+
+
+class _Queue:
+    """One tenant's FIFO in one lane, with its fair-queuing finish tag."""
+
+    __slots__ = ("jobs", "finish")
+
+    def __init__(self):
+        self.jobs = deque()
+        self.finish = 0.0
+
+
+class FairScheduler:
+    def __init__(self, workers: int = SCHED_WORKERS, tenant_limit: int = SCHED_TENANT_CONCURRENCY,
+                 batch_every: int = SCHED_BATCH_EVERY, weights: dict = None):
+        self.workers = workers
+        self.tenant_limit = tenant_limit
+        self.batch_every = batch_every
+        self.weights = parse_weights(SCHED_WEIGHTS) if weights is None else weights
+        self.cond = threading.Condition()
+        self.lanes = {lane: {} for lane in LANES}  # lane -> tenant -> _Queue
+        self.vtime = {lane: 0.0 for lane in LANES}
+        self.running = {}  # tenant -> scans running now
+        self.waits = {}  # tenant -> recent queue waits (s)
+        self.done = {}  # tenant -> scans finished
+        self.dispatches = 0
+        self.threads = []
+        self.closed = False
+
+    # ------------------ enqueue ------------------
+    def submit(self, fn, *args, tenant: str = DEFAULT_TENANT, lane: str = "interactive"):
+        """Queue fn(*args) for `tenant`; runs on a worker thread when its turn comes."""
+        if lane not in self.lanes:
+            raise ValueError(f"unknown lane '{lane}'")
+        with self.cond:
+            q = self.lanes[lane].get(tenant)
+            if q is None:
+                q = self.lanes[lane][tenant] = _Queue()
+            q.jobs.append(_Job(fn, args, tenant, lane))
+            self.cond.notify()
+        self._ensure_workers()
+
+    def submit_many(self, fn, args_list, tenant: str = DEFAULT_TENANT, lane: str = "batch"):
+        with self.cond:
+            q = self.lanes[lane].setdefault(tenant, _Queue())
+            q.jobs.extend(_Job(fn, args, tenant, lane) for args in args_list)
+            self.cond.notify_all()
+        self._ensure_workers()
+
+    # ------------------ dispatch ------------------
+    def _pick_lane(self, lane):
+        """Tenant queue with the smallest start tag among those under their concurrency limit."""
+        best, best_start = None, None
+        vt = self.vtime[lane]
+        idle = []
+        for tenant, q in self.lanes[lane].items():
+            if not q.jobs:
+                # a tag the lane has caught up with no longer matters: drop the tenant
+                if q.finish <= vt:
+                    idle.append(tenant)
+                continue
+            if self.running.get(tenant, 0) >= self.tenant_limit:
+                continue
+            start = max(vt, q.finish)
+            if best is None or start < best_start:
+                best, best_start = tenant, start
+        for tenant in idle:
+            del self.lanes[lane][tenant]
+        return best, best_start
+
+    def _next(self):
+        """The job to run next, or None when nothing is eligible. Called with the lock held."""
+        inter, inter_start = self._pick_lane("interactive")
+        batch, batch_start = self._pick_lane("batch")
+        if inter is None and batch is None:
+            return None
+        batch_turn = self.batch_every and (self.dispatches + 1) % self.batch_every == 0
+        if batch is not None and (inter is None or batch_turn):
+            lane, tenant, start = "batch", batch, batch_start
+        else:
+            lane, tenant, start = "interactive", inter, inter_start
+        q = self.lanes[lane][tenant]
+        job = q.jobs.popleft()
+        self.vtime[lane] = start
+        q.finish = start + 1.0 / self.weights.get(tenant, 1.0)
+        self.running[tenant] = self.running.get(tenant, 0) + 1
+        self.dispatches += 1
+        return job
+
+    def _ensure_workers(self):
+        if len(self.threads) >= self.workers or self.closed:
+            return
+        with self.cond:
+            while len(self.threads) < self.workers:
+                t = threading.Thread(target=self._work, name=f"scan-worker-{len(self.threads)}", daemon=True)
+                self.threads.append(t)
+                t.start()
+
+    def _work(self):
+        while True:
+            with self.cond:
+                job = self._next()
+                while job is None:
+                    if self.closed:
+                        return
+                    self.cond.wait()
+                    job = self._next()
+            waited = time.monotonic() - job.queued_at
+            QUEUE_SECONDS.observe(job.tenant, job.lane, value=waited)
+            DISPATCHED.inc(job.lane)
+            try:
+                job.fn(*job.args)
+            except Exception as e:
+                print(f"[scheduler] job for {job.tenant} failed: {e}")
+            finally:
+                with self.cond:
+                    self.running[job.tenant] -= 1
+                    if not self.running[job.tenant]:
+                        del self.running[job.tenant]
+                    self.waits.setdefault(job.tenant, deque(maxlen=SCHED_WAIT_SAMPLES)).append(waited)
+                    self.done[job.tenant] = self.done.get(job.tenant, 0) + 1
+                    # a tenant under its limit again may unblock a waiting worker
+                    self.cond.notify()
+
+    def close(self):
+        """Stop the workers once their current scans finish; queued scans stay queued in Mongo."""
+        with self.cond:
+            self.closed = True
+            self.lanes = {lane: {} for lane in LANES}
+            self.cond.notify_all()
+        for t in self.threads:
+            t.join(timeout=5)
+        self.threads = []
+
+    # ------------------ reporting ------------------
+    def queued(self) -> dict:
+        with self.cond:
+            return {lane: sum(len(q.jobs) for q in tenants.values()) for lane, tenants in self.lanes.items()}
+
+    def stats(self) -> dict:
+        with self.cond:
+            tenants = set(self.running) | set(self.waits)
+            tenants.update(t for ts in self.lanes.values() for t, q in ts.items() if q.jobs)
+            out = {}
+            for t in sorted(tenants):
+                waits = sorted(self.waits.get(t, ()))
+                entry = {
+                    "weight": self.weights.get(t, 1.0),
+                    "queued": {lane: len(self.lanes[lane][t].jobs) for lane in LANES
+                               if t in self.lanes[lane] and self.lanes[lane][t].jobs},
+                    "running": self.running.get(t, 0),
+                    "done": self.done.get(t, 0),
+                }
+                if waits:
+                    entry["wait_ms"] = {
+                        "p50": round(waits[len(waits) // 2] * 1000, 1),
+                        "p95": round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 1),
+                        "max": round(waits[-1] * 1000, 1),
+                    }
+                out[t] = entry
+            return {"workers": self.workers, "tenant_limit": self.tenant_limit, "batch_every": self.batch_every,
+                    "queued": {lane: sum(len(q.jobs) for q in ts.values()) for lane, ts in self.lanes.items()},
+                    "tenants": out}
+
+
+# shared by every scan in the process
+scheduler = FairScheduler()
+
+register(Gauge("shadowtrace_scan_queue_depth", "Scans waiting for a worker, by lane.", ("lane",),
+               fn=lambda: {(lane,): n for lane, n in scheduler.queued().items()}))
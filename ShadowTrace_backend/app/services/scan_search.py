@@ -0,0 +1,216 @@
+# app/services/scan_search.py
+"""
+Search over indexed scans and alerts (/search/query).
+
+The first page of a query runs as a plain search and carries the facets;
+it is what dashboards re-request, so it goes through a short-TTL cache.
+Later pages open a point in time and page with search_after, never
+from/size, so deep pages cost the same as the second one and do not shift
+while new scans are indexed. The cursor handed back is opaque: it carries
+the query parameters, the PIT id and the sort values of the last hit.
+
+Both indexes expose the same field names (entity, risk_level, created_at,
+doc_id) through mapping aliases, so one query can span them.
+"""
+import os
+import json
+import time
+import base64
+import threading
+from collections import OrderedDict
+
+from app.database import elastic
+from app.database.es_mapping import SCAN_INDEX
+from app.database.alerts_mapping import ALERT_INDEX
+from app.utils.metrics import register, Counter, Gauge, Histogram
+
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", "30"))
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE", "2000"))
+SEARCH_PIT_KEEP_ALIVE = os.getenv("SEARCH_PIT_KEEP_ALIVE", "2m")
+SEARCH_TRACK_TOTAL = int(os.getenv("SEARCH_TRACK_TOTAL", "10000"))
+SEARCH_FACET_SIZE = int(os.getenv("SEARCH_FACET_SIZE", "20"))
+
+INDEXES = {"scans": SCAN_INDEX, "alerts": ALERT_INDEX, "all": f"{SCAN_INDEX},{ALERT_INDEX}"}
+TEXT_FIELDS = ["query^3", "title^3", "summary", "description"]
+SORT = [{"created_at": {"order": "desc", "unmapped_type": "date"}},
+        {"doc_id": {"order": "asc", "unmapped_type": "keyword", "missing": "_last"}}]
+SOURCE = {"excludes": ["raw", "results"]}
+SHARD_DOC_MAX = 2 ** 63 - 1
+
+SEARCH_SECONDS = register(Histogram("shadowtrace_search_seconds", "/search/query latency by page kind.",
+                                    ("page",)))
+
+
+class QueryCache:
+    """First pages keyed by their parameters, each kept for `ttl` seconds; oldest evicted first."""
+
+    def __init__(self, ttl: float = SEARCH_CACHE_TTL, max_size: int = SEARCH_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            item = self.entries.get(key)
+            if item is None or item[0] < time.monotonic():
+                if item is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+            self.hits += 1
+            return item[1]
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"size": len(self.entries), "hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0}
+
+
+cache = QueryCache()
+
+register(Counter("shadowtrace_search_cache_requests_total", "/search/query first-page cache lookups.",
+                 ("result",), fn=lambda: {("hit",): cache.hits, ("miss",): cache.misses}))
+register(Gauge("shadowtrace_search_cache_entries", "Cached /search/query first pages.",
+               fn=lambda: {(): len(cache.entries)}))
+
+
+############################################
+# Query
+############################################
+def build_query(params: dict) -> dict:
+    """ES bool query for the parameters of a /search/query request."""
+    must, filters = [], []
+    if params.get("q"):
+        must.append({"multi_match": {"query": params["q"], "fields": TEXT_FIELDS,
+                                     "type": "best_fields", "operator": "and"}})
+    if params.get("entity"):
+        filters.append({"terms": {"entity": params["entity"]}})
+    if params.get("risk"):
+        filters.append({"terms": {"risk_level": params["risk"]}})
+    if params.get("status"):
+        filters.append({"terms": {"status": params["status"]}})
+    dates = {k: v for k, v in (("gte", params.get("since")), ("lte", params.get("until"))) if v}
+    if dates:
+        filters.append({"range": {"created_at": dates}})
+    if not must and not filters:
+        return {"match_all": {}}
+    return {"bool": {"must": must, "filter": filters}}
+
+
+def facet_aggs() -> dict:
+    return {
+        "entity": {"terms": {"field": "entity", "size": SEARCH_FACET_SIZE}},
+        "risk_level": {"terms": {"field": "risk_level", "size": SEARCH_FACET_SIZE}},
+        "index": {"terms": {"field": "_index", "size": len(INDEXES)}},
+        "created_at": {"auto_date_histogram": {"field": "created_at", "buckets": 30}},
+    }
+
+
+def encode_cursor(params: dict, pit_id, after) -> str:
+    raw = json.dumps({"p": params, "pit": pit_id, "after": after}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception:
+        raise ValueError("invalid cursor")
+
+
+def _page(resp: dict, params: dict, pit_id=None) -> dict:
+    hits = resp["hits"]["hits"]
+    out = {
+        "hits": [{"id": h["_id"], "index": h["_index"], "score": h.get("_score"), **h["_source"]}
+                 for h in hits],
+        "cursor": None,
+    }
+    if len(hits) == params["size"]:
+        out["cursor"] = encode_cursor(params, resp.get("pit_id") or pit_id, hits[-1]["sort"])
+    elif pit_id:
+        # last page: the PIT would otherwise hold its segments until keep_alive runs out
+        elastic.close_pit(resp.get("pit_id") or pit_id)
+    return out
+
+
+def _facets(aggs: dict) -> dict:
+    out = {}
+    for name, agg in (aggs or {}).items():
+        key = "key_as_string" if name == "created_at" else "key"
+        out[name] = [{"value": b.get(key, b["key"]), "count": b["doc_count"]} for b in agg["buckets"]]
+    return out
+
+
+def first_page(params: dict) -> dict:
+    key = json.dumps(params, sort_keys=True)
+    cached = cache.get(key)
+    if cached is not None:
+        return {**cached, "cached": True}
+
+    body = {
+        "query": build_query(params),
+        "sort": SORT,
+        "_source": SOURCE,
+        "track_total_hits": SEARCH_TRACK_TOTAL,
+    }
+    if params.get("facets"):
+        body["aggs"] = facet_aggs()
+    resp = elastic.search_docs(INDEXES[params["index"]], body, size=params["size"])
+    total = resp["hits"]["total"]
+    out = {
+        "total": total["value"],
+        "total_exact": total["relation"] == "eq",
+        **_page(resp, params),
+    }
+    if params.get("facets"):
+        out["facets"] = _facets(resp.get("aggregations"))
+    cache.put(key, out)
+    return {**out, "cached": False}
+
+
+def next_page(cursor: str) -> dict:
+    state = decode_cursor(cursor)
+    params = state["p"]
+    pit_id, after = state.get("pit"), state["after"]
+    if pit_id is None:
+        pit_id = elastic.open_pit(INDEXES[params["index"]], keep_alive=SEARCH_PIT_KEEP_ALIVE)
+        # searches in a PIT sort on an implicit _shard_doc tiebreaker as well; doc_id is
+        # already unique, so the largest value just resumes after the first page's last hit
+        after = after + [SHARD_DOC_MAX]
+    body = {
+        "query": build_query(params),
+        "sort": SORT,
+        "_source": SOURCE,
+        "size": params["size"],
+        "search_after": after,
+        "pit": {"id": pit_id, "keep_alive": SEARCH_PIT_KEEP_ALIVE},
+        "track_total_hits": False,
+    }
+    return _page(elastic.search_pit(body), params, pit_id)
+
+
+def search(params: dict = None, cursor: str = None) -> dict:
+    """One page of results: the first page for `params`, or the page after `cursor`."""
+    t0 = time.perf_counter()
+    if cursor:
+        out, kind = next_page(cursor), "next"
+    else:
+        out = first_page(params)
+        kind = "cached" if out["cached"] else "first"
+    SEARCH_SECONDS.observe(kind, value=time.perf_counter() - t0)
+    out["took_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+    return out
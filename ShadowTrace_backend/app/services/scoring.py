@@ -1,5 +1,265 @@
+# app/services/scoring.py
+"""
+Evidence-weighted scoring.
+
+Scan results are reduced to a flat evidence dict ({type: number}). A rule
+fires when its evidence reaches `min`; per evidence type only the strongest
+firing rule counts, and fired rules combine as a noisy-OR of
+weight x source reliability. A score therefore reflects how strong the
+signals are, not how many sources happened to answer.
+
+Rules are data: override them with a JSON file (SCORING_RULES_FILE) holding
+{"rules": [...], "reliability": {...}, "levels": [[min_score, level], ...]}.
+Every score records the model version, so history can be rescored in bulk
+when the weights change.
+"""
+import os
+import json
+import math
+import bisect
+import hashlib
+from datetime import datetime
+
+SCORING_RULES_FILE = os.getenv("SCORING_RULES_FILE", "")
+
+# how much each source is trusted, 0..1
+SOURCE_RELIABILITY = {
+    "virustotal": 0.9,
+    "abuseipdb": 0.8,
+    "shodan": 0.7,
+    "hibp": 0.95,
+    "darkweb": 0.6,
+    "social": 0.5,
+}
+
+# evidence type -> source that produces it
+EVIDENCE_SOURCES = {
+    "vt_malicious": "virustotal",
+    "abuse_confidence": "abuseipdb",
+    "open_ports": "shodan",
+    "breach_count": "hibp",
+    "darkweb_hits": "darkweb",
+    "profile_hits": "social",
+    "social_confidence": "social",
+}
+
+DEFAULT_RULES = [
+    {"id": "vt_malicious_high", "evidence": "vt_malicious", "min": 10, "weight": 0.75,
+     "reason": "Flagged as malicious by 10 or more VirusTotal engines"},
+    {"id": "vt_malicious", "evidence": "vt_malicious", "min": 3, "weight": 0.35,
+     "reason": "Flagged as malicious by 3 or more VirusTotal engines"},
+    {"id": "abuse_confidence_high", "evidence": "abuse_confidence", "min": 75, "weight": 0.8,
+     "reason": "AbuseIPDB abuse confidence of 75% or more"},
+    {"id": "abuse_confidence", "evidence": "abuse_confidence", "min": 30, "weight": 0.4,
+     "reason": "AbuseIPDB abuse confidence of 30% or more"},
+    {"id": "open_ports_many", "evidence": "open_ports", "min": 10, "weight": 0.15,
+     "reason": "10 or more ports exposed according to Shodan"},
+    {"id": "breach_many", "evidence": "breach_count", "min": 5, "weight": 0.35,
+     "reason": "Appears in 5 or more known breaches"},
+    {"id": "breach", "evidence": "breach_count", "min": 1, "weight": 0.2,
+     "reason": "Appears in a known breach"},
+    {"id": "darkweb", "evidence": "darkweb_hits", "min": 1, "weight": 0.5,
+     "reason": "Seen in a dark-web dump feed"},
+    {"id": "profiles_many", "evidence": "profile_hits", "min": 3, "weight": 0.3,
+     "reason": "Public profiles found on 3 or more platforms"},
+    {"id": "profiles", "evidence": "profile_hits", "min": 1, "weight": 0.2,
+     "reason": "Public profile found"},
+    {"id": "social_match", "evidence": "social_confidence", "min": 70, "weight": 0.2,
+     "reason": "Profiles across platforms likely belong to the same person"},
+]
+
+RISK_LEVELS = ((60, "high"), (25, "medium"), (0, "low"))
+
+
+def _source(rule):
+    return rule.get("source") or EVIDENCE_SOURCES.get(rule["evidence"], "-")
+
+
+_MISSING = float("-inf")
+
+
+class ScoringModel:
+    def __init__(self, rules=None, reliability=None, levels=None):
+        self.rules = {r["id"]: dict(r) for r in (rules or DEFAULT_RULES)}
+        self.reliability = dict(reliability or SOURCE_RELIABILITY)
+        self.levels = tuple(sorted((tuple(l) for l in (levels or RISK_LEVELS)), reverse=True))
+        spec = {"rules": sorted(self.rules.values(), key=lambda r: r["id"]),
+                "reliability": self.reliability, "levels": self.levels}
+        self.version = hashlib.sha1(json.dumps(spec, sort_keys=True).encode()).hexdigest()[:12]
+
+        # evidence type -> (ascending thresholds, rule ids, log(1 - weight * reliability))
+        grouped = {}
+        for r in self.rules.values():
+            grouped.setdefault(r["evidence"], []).append(r)
+        self.tables = {}
+        for ev, rs in grouped.items():
+            rs.sort(key=lambda r: r["min"])
+            logs = [math.log1p(-min(0.999, r["weight"] * self.reliability.get(_source(r), 0.5))) for r in rs]
+            self.tables[ev] = ([r["min"] for r in rs], [r["id"] for r in rs], logs)
+            for r, lg in zip(rs, logs):
+                r["_log"] = lg
+        # rendered once per model; scores only carry rule ids
+        self.explanations = {rid: self._explain(r) for rid, r in self.rules.items()}
+
+    def _explain(self, rule):
+        source = _source(rule)
+        return {
+            "rule": rule["id"],
+            "evidence": rule["evidence"],
+            "source": source,
+            "weight": rule["weight"],
+            "reliability": self.reliability.get(source, 0.5),
+            "contribution": round((1 - math.exp(rule["_log"])) * 100, 1),
+            "reason": rule.get("reason", ""),
+        }
+
+    def level(self, score):
+        for threshold, name in self.levels:
+            if score >= threshold:
+                return name
+        return self.levels[-1][1]
+
+    def _result(self, log_sum, fired):
+        s = int(round((1 - math.exp(log_sum)) * 100))
+        return {"score": s, "risk_level": self.level(s), "rules": fired, "model": self.version}
+
+    def score(self, evidence: dict) -> dict:
+        log_sum = 0.0
+        fired = []
+        for ev, (thresholds, ids, logs) in self.tables.items():
+            v = evidence.get(ev)
+            if v is None:
+                continue
+            i = bisect.bisect_right(thresholds, v) - 1
+            if i >= 0:
+                log_sum += logs[i]
+                fired.append(ids[i])
+        return self._result(log_sum, fired)
+
+    def score_many(self, evidences) -> list:
+        """score() for a batch; thresholds, exp and levels are evaluated per column, not per document."""
+        import numpy as np
+
+        n = len(evidences)
+        log_sum = np.zeros(n)
+        fired = [[] for _ in range(n)]
+        for ev, (thresholds, ids, logs) in self.tables.items():
+            vals = np.array([e.get(ev, _MISSING) for e in evidences], dtype=float)
+            vals[np.isnan(vals)] = _MISSING  # explicit None
+            idx = np.searchsorted(thresholds, vals, side="right") - 1
+            hit = np.flatnonzero(idx >= 0)
+            if not len(hit):
+                continue
+            log_sum[hit] += np.asarray(logs)[idx[hit]]
+            for k, i in zip(hit.tolist(), idx[hit].tolist()):
+                fired[k].append(ids[i])
+        scores = np.rint((1 - np.exp(log_sum)) * 100).astype(int).tolist()
+        # levels are sorted by descending threshold
+        cuts = [t for t, _ in reversed(self.levels)]
+        names = [l for _, l in reversed(self.levels)]
+        lvl = (np.searchsorted(cuts, scores, side="right") - 1).clip(0).tolist()
+        v = self.version
+        return [{"score": s, "risk_level": names[i], "rules": f, "model": v} for s, i, f in zip(scores, lvl, fired)]
+
+    def explain(self, rule_ids) -> list:
+        return [self.explanations[r] for r in rule_ids if r in self.explanations]
+
+
+def load_model(path: str = SCORING_RULES_FILE) -> ScoringModel:
+    if not path:
+        return ScoringModel()
+    with open(path) as f:
+        spec = json.load(f)
+    return ScoringModel(spec.get("rules"), spec.get("reliability"), spec.get("levels"))
+
+
+model = load_model()
+
+
+############################################
+# Evidence extraction
+############################################
+def _dig(d, *keys):
+    for k in keys:
+        if not isinstance(d, dict):
+            return None
+        d = d.get(k)
+    return d
+
+
+def evidence_from_scan(res: dict) -> dict:
+    """Evidence from a /search scan result document."""
+    ev = {}
+    vt = _dig(res, "vt", "data", "data", "attributes", "last_analysis_stats", "malicious")
+    if vt is not None:
+        ev["vt_malicious"] = vt
+    abuse = _dig(res, "abuseipdb", "data", "abuseConfidenceScore")
+    if abuse is not None:
+        ev["abuse_confidence"] = abuse
+    ports = _dig(res, "shodan", "host", "ports")
+    if isinstance(ports, list):
+        ev["open_ports"] = len(ports)
+    hibp = res.get("hibp")
+    if isinstance(hibp, dict) and "ok" in hibp:
+        ev["breach_count"] = len(hibp["data"]) if hibp.get("ok") and isinstance(hibp.get("data"), list) else 0
+    profile = res.get("social_profile")
+    if isinstance(profile, dict):
+        ev["profile_hits"] = len(profile.get("links_found") or [])
+        ev["social_confidence"] = profile.get("confidence", 0)
+    return ev
+
+
+def evidence_from_sources(docs) -> dict:
+    """Evidence from osint_engine source hits (models.subject_model.Evidence)."""
+    platforms = [d.platform for d in docs]
+    return {
+        "breach_count": platforms.count("breach"),
+        "darkweb_hits": platforms.count("darkweb"),
+        "profile_hits": len({p for p in platforms if p not in ("breach", "darkweb")}),
+    }
+
+
+def assess(res: dict) -> dict:
+    """threat_score for a scan result: the score plus the evidence it was based on."""
+    ev = evidence_from_scan(res)
+    return {**model.score(ev), "evidence": ev}
+
+
 def score(docs):
-    s = 10 + len(docs)*10
-    if any(d["platform"]=="breach" for d in docs): s+=25
-    if any(d["platform"]=="darkweb" for d in docs): s+=30
-    return min(100,s)
+    """0-100 confidence for a list of osint_engine source hits."""
+    return model.score(evidence_from_sources(docs))["score"]
+
+
+def rescore(collection, scoring_model: ScoringModel = None, batch_size: int = 1000) -> dict:
+    """Recompute threat_score for every finished scan whose model version differs."""
+    from pymongo import UpdateOne
+    from app.database.blobs import store, SCAN_BLOB_FIELDS
+
+    m = scoring_model or model
+    cursor = collection.find(
+        {"status": "done", "threat_model": {"$ne": m.version}},
+        {"results": 1},
+        batch_size=batch_size,
+    )
+    updated = 0
+    batch = []
+
+    def flush():
+        nonlocal updated
+        # evidence lives in the upstream payloads, which may have been moved to the blob store
+        evs = [evidence_from_scan(store.hydrate(d.get("results") or {}, SCAN_BLOB_FIELDS)) for d in batch]
+        ops = [UpdateOne({"_id": d["_id"]}, {"$set": {"results.threat_score": {**s, "evidence": ev},
+                                                      "threat_model": m.version,
+                                                      "updated_at": datetime.utcnow()}})
+               for d, s, ev in zip(batch, m.score_many(evs), evs)]
+        if ops:
+            collection.bulk_write(ops, ordered=False)
+        updated += len(ops)
+        batch.clear()
+
+    for doc in cursor:
+        batch.append(doc)
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+    return {"updated": updated, "model": m.version}
@@ -1,12 +1,16 @@
 # app/services/spiderfoot_client.py
+import os
 import requests
 from typing import Optional
 
-SPIDERFOOT_BASE = "http://127.0.0.1:5001"
+from app.utils.metrics import timed
+
+SPIDERFOOT_BASE = os.getenv("SPIDERFOOT_BASE", "http://127.0.0.1:5001")
 TIMEOUT = 30
 
 class SpiderFootClient:
     @staticmethod
+    @timed("spiderfoot", "start_scan")
     def start_scan(scan_name: str, target: str, use_case: str = "all") -> dict:
         url = f"{SPIDERFOOT_BASE}/startscan"
         payload = {"scanname": scan_name, "scantarget": target, "usecase": use_case}
@@ -14,6 +18,7 @@ class SpiderFootClient:
         return {"status_code": r.status_code, "text": r.text}
 
     @staticmethod
+    @timed("spiderfoot", "stop_scan")
     def stop_scan(scan_id: str) -> dict:
         # SpiderFoot has multiple variants; try the common stop endpoints
         candidates = [
@@ -30,6 +35,7 @@ class SpiderFootClient:
         return {"ok": False, "error": "stop endpoints failed"}
 
     @staticmethod
+    @timed("spiderfoot", "get_scan_raw")
     def get_scan_raw(scan_id: str) -> Optional[dict]:
         """
         Attempt to fetch a JSON export of scan results.
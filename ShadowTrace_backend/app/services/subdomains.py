@@ -0,0 +1,161 @@
+# app/services/subdomains.py
+"""
+Certificate transparency subdomain enumeration (crt.sh).
+
+The crt.sh JSON array is parsed incrementally while it downloads, names are
+de-duplicated as they arrive, and unique subdomains are kept per domain with
+first/last-seen dates. The highest certificate id seen is remembered so later
+scans only process certificates logged since then.
+"""
+import os
+import json
+import codecs
+from datetime import datetime
+
+
+from app.utils import resilience
+from app.utils.metrics import timed
+
+CRTSH_URL = os.getenv("CRTSH_URL", "https://crt.sh")
+CRTSH_TIMEOUT = (5, 60)  # connect, per-read
+CHUNK_SIZE = 64 * 1024
+
+SUBDOMAIN_COLLECTION = "subdomains"
+CT_STATE_COLLECTION = "ct_state"
+
+_indexes_ready = False
+
+
+def iter_json_array(chunks):
+    """
+    Yield the elements of a top-level JSON array from an iterable of byte
+    chunks without materializing the whole document.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buf = ""
+    pos = 0
+    started = False
+
+    for chunk in chunks:
+        buf = buf[pos:] + utf8.decode(chunk)
+        pos = 0
+        n = len(buf)
+        while True:
+            while pos < n and buf[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= n:
+                break
+            if not started:
+                if buf[pos] != "[":
+                    raise ValueError("expected a JSON array")
+                started = True
+                pos += 1
+                continue
+            if buf[pos] == "]":
+                return
+            try:
+                obj, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                break  # element continues in the next chunk
+            yield obj
+            pos = end
+
+
+def _ts(value):
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _ensure_indexes(db):
+    global _indexes_ready
+    if not _indexes_ready:
+        db[SUBDOMAIN_COLLECTION].create_index([("domain", 1), ("name", 1)], unique=True)
+        db[CT_STATE_COLLECTION].create_index("domain", unique=True)
+        _indexes_ready = True
+
+
+@timed("probe", "crtsh")
+def enumerate_subdomains(domain: str, db=None):
+    """
+    Stream crt.sh for `domain`, returning names from certificates newer than
+    the last scan. When `db` is given, results are merged into the subdomain
+    index and the high-water certificate id is advanced.
+    """
+    domain = domain.lower().rstrip(".")
+    suffix = "." + domain
+    last_id = 0
+    if db is not None:
+        _ensure_indexes(db)
+        state = db[CT_STATE_COLLECTION].find_one({"domain": domain}) or {}
+        last_id = state.get("last_id", 0)
+
+    seen = {}  # name -> [first_seen, last_seen]
+    certs = skipped = 0
+    max_id = last_id
+    try:
+        with resilience.get("crtsh", f"{CRTSH_URL}/", params={"q": f"%.{domain}", "output": "json"},
+                            timeout=CRTSH_TIMEOUT, stream=True) as r:
+            if r.status_code != 200:
+                return {"ok": False, "error": f"crt.sh returned {r.status_code}"}
+            for entry in iter_json_array(r.iter_content(CHUNK_SIZE)):
+                cert_id = entry.get("id") or 0
+                if cert_id <= last_id:
+                    skipped += 1
+                    continue
+                certs += 1
+                max_id = max(max_id, cert_id)
+                logged = _ts(entry.get("entry_timestamp"))
+                for name in (entry.get("name_value") or "").split("\n"):
+                    name = name.strip().lower()
+                    if name.startswith("*."):
+                        name = name[2:]
+                    if name != domain and not name.endswith(suffix):
+                        continue
+                    span = seen.get(name)
+                    if span is None:
+                        seen[name] = [logged, logged]
+                    elif logged:
+                        if not span[0] or logged < span[0]:
+                            span[0] = logged
+                        if not span[1] or logged > span[1]:
+                            span[1] = logged
+    except Exception as e:
+        return {"ok": False, "error": str(e)}
+
+    result = {
+        "ok": True,
+        "new_certificates": certs,
+        "skipped_certificates": skipped,
+        "last_id": max_id,
+        "names": sorted(seen),
+    }
+
+    if db is not None:
+        from pymongo import UpdateOne
+        now = datetime.utcnow()
+        ops = []
+        for name, (first, last) in seen.items():
+            update = {"$setOnInsert": {"domain": domain, "name": name, "discovered_at": now}}
+            if first:
+                update["$min"] = {"first_seen": first}
+                update["$max"] = {"last_seen": last}
+            ops.append(UpdateOne({"domain": domain, "name": name}, update, upsert=True))
+        if ops:
+            db[SUBDOMAIN_COLLECTION].bulk_write(ops, ordered=False)
+        db[CT_STATE_COLLECTION].update_one(
+            {"domain": domain},
+            {"$max": {"last_id": max_id}, "$set": {"updated_at": now}},
+            upsert=True,
+        )
+        result["total_known"] = db[SUBDOMAIN_COLLECTION].count_documents({"domain": domain})
+
+    return result
+
+
+def known_subdomains(db, domain: str, limit: int = 1000):
+    """Subdomains recorded for `domain`, most recently seen first."""
+    cur = db[SUBDOMAIN_COLLECTION].find({"domain": domain.lower()}, {"_id": 0, "domain": 0})
+    return list(cur.sort("last_seen", -1).limit(limit))
@@ -0,0 +1,363 @@
+# app/utils/alerts.py
+"""
+Alert fan-out delivery.
+
+Alerts are handed to the dispatcher without blocking the caller (scans run in
+worker threads), coalesced per destination into digests, and delivered to
+webhooks / email with a per-destination concurrency limit. Deliveries that keep
+failing after exponential backoff land in a dead-letter collection.
+"""
+import os
+import json
+import time
+import random
+import asyncio
+import uuid
+import smtplib
+from collections import deque
+from datetime import datetime
+from email.message import EmailMessage
+
+
+from app.utils.metrics import register, Gauge, Counter
+
+ALERT_WEBHOOKS = [u.strip() for u in os.getenv("ALERT_WEBHOOKS", "").split(",") if u.strip()]
+ALERT_EMAILS = [e.strip() for e in os.getenv("ALERT_EMAILS", "").split(",") if e.strip()]
+
+SMTP_HOST = os.getenv("SMTP_HOST", "")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
+SMTP_USER = os.getenv("SMTP_USER", "")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD", "")
+SMTP_FROM = os.getenv("SMTP_FROM", "shadowtrace@localhost")
+
+ALERT_QUEUE_SIZE = int(os.getenv("ALERT_QUEUE_SIZE", "100000"))
+# per destination: what an unreachable webhook can hold back; the default takes a full inbox burst
+ALERT_DEST_QUEUE_SIZE = int(os.getenv("ALERT_DEST_QUEUE_SIZE", str(ALERT_QUEUE_SIZE)))
+ALERT_BATCH_SIZE = int(os.getenv("ALERT_BATCH_SIZE", "500"))
+ALERT_BATCH_WINDOW = float(os.getenv("ALERT_BATCH_WINDOW", "1.0"))
+ALERT_DEST_CONCURRENCY = int(os.getenv("ALERT_DEST_CONCURRENCY", "4"))
+ALERT_MAX_RETRIES = int(os.getenv("ALERT_MAX_RETRIES", "5"))
+ALERT_RETRY_BASE = float(os.getenv("ALERT_RETRY_BASE", "0.5"))
+
+DEAD_LETTER_COLLECTION = "alerts_dead_letter"
+
+# alert levels that are pushed to destinations; "low" is only indexed
+NOTIFY_SEVERITIES = ("medium", "high", "critical")
+
+
+class Destination:
+    """One webhook URL or email recipient with its own buffer and limits."""
+
+    def __init__(self, kind: str, target: str, concurrency: int, queue_size: int = ALERT_DEST_QUEUE_SIZE):
+        self.kind = kind
+        self.target = target
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.in_flight = set()
+        self.dropped = 0
+        self.delivered = 0
+        self.batches = 0
+        self.failed_attempts = 0
+        self.dead_lettered = 0
+
+    @property
+    def key(self):
+        return f"{self.kind}:{self.target}"
+
+    def stats(self):
+        return {
+            "destination": self.key,
+            "pending": self.queue.qsize(),
+            "in_flight": len(self.in_flight),
+            "dropped": self.dropped,
+            "delivered": self.delivered,
+            "batches": self.batches,
+            "failed_attempts": self.failed_attempts,
+            "dead_lettered": self.dead_lettered,
+        }
+
+
+class AlertDispatcher:
+    """
+    Async outbound queue -> per-destination batcher -> bounded delivery tasks.
+
+    `enqueue` is thread-safe and never blocks; everything else runs on the
+    event loop the dispatcher was started on.
+    """
+
+    def __init__(self, webhooks=None, emails=None, batch_size: int = ALERT_BATCH_SIZE,
+                 batch_window: float = ALERT_BATCH_WINDOW, concurrency: int = ALERT_DEST_CONCURRENCY,
+                 max_retries: int = ALERT_MAX_RETRIES, retry_base: float = ALERT_RETRY_BASE,
+                 queue_size: int = ALERT_QUEUE_SIZE, dest_queue_size: int = ALERT_DEST_QUEUE_SIZE):
+        self.webhooks = list(webhooks or [])
+        self.emails = list(emails or [])
+        self.batch_size = batch_size
+        self.batch_window = batch_window
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.retry_base = retry_base
+        self.queue_size = queue_size
+        self.dest_queue_size = dest_queue_size
+
+        self.loop = None
+        self.inbox = None
+        self.destinations = []
+        self.tasks = []
+        self.http = None
+        self.accepted = 0
+        self.dropped = 0
+        self.dead_letters = deque(maxlen=1000)  # used when Mongo is unavailable
+
+    @classmethod
+    def from_env(cls):
+        return cls(webhooks=ALERT_WEBHOOKS, emails=ALERT_EMAILS)
+
+    @property
+    def running(self):
+        return self.loop is not None
+
+    # ------------------ lifecycle ------------------
+    async def start(self):
+        if self.running:
+            return
+        import httpx
+        self.loop = asyncio.get_running_loop()
+        self.inbox = asyncio.Queue(maxsize=self.queue_size)
+        self.http = httpx.AsyncClient(
+            timeout=10,
+            limits=httpx.Limits(max_connections=max(10, self.concurrency * len(self.webhooks or [1]))),
+        )
+        self.destinations = [Destination("webhook", u, self.concurrency, self.dest_queue_size)
+                             for u in self.webhooks]
+        if SMTP_HOST:
+            self.destinations += [Destination("email", e, self.concurrency, self.dest_queue_size)
+                                  for e in self.emails]
+
+        self.tasks = [asyncio.create_task(self._route())]
+        self.tasks += [asyncio.create_task(self._batch(d)) for d in self.destinations]
+
+    async def stop(self, drain_timeout: float = 10.0):
+        """
+        Flush what is queued (bounded by drain_timeout), then cancel workers.
+        Deliveries still running after the drain are cancelled and dead-lettered
+        before the HTTP client closes under them.
+        """
+        if not self.running:
+            return
+        try:
+            await asyncio.wait_for(self._drain(), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            pass
+        for t in self.tasks:
+            t.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        deliveries = [t for d in self.destinations for t in d.in_flight]
+        for t in deliveries:
+            t.cancel()
+        await asyncio.gather(*deliveries, return_exceptions=True)
+        await self.http.aclose()
+        self.tasks = []
+        self.loop = None
+
+    async def _drain(self):
+        await self.inbox.join()
+        for d in self.destinations:
+            await d.queue.join()
+
+    # ------------------ producer side ------------------
+    def enqueue(self, alert: dict) -> bool:
+        """Queue an alert for delivery. Safe to call from any thread."""
+        if not self.running or not self.destinations:
+            return False
+        try:
+            if self._on_loop():
+                self._put(alert)
+            else:
+                self.loop.call_soon_threadsafe(self._put, alert)
+            return True
+        except RuntimeError:
+            # loop already closed
+            return False
+
+    def _on_loop(self):
+        try:
+            return asyncio.get_running_loop() is self.loop
+        except RuntimeError:
+            return False
+
+    def _put(self, alert):
+        try:
+            self.inbox.put_nowait(alert)
+            self.accepted += 1
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    # ------------------ workers ------------------
+    async def _route(self):
+        """Fan each alert out to every destination buffer."""
+        while True:
+            alert = await self.inbox.get()
+            try:
+                for d in self.destinations:
+                    try:
+                        d.queue.put_nowait(alert)
+                    except asyncio.QueueFull:
+                        d.dropped += 1
+            finally:
+                self.inbox.task_done()
+
+    async def _batch(self, dest: Destination):
+        """Coalesce a destination's alerts into digests of up to batch_size."""
+        while True:
+            batch = [await dest.queue.get()]
+            deadline = self.loop.time() + self.batch_window
+            while len(batch) < self.batch_size:
+                # take whatever is already buffered without yielding
+                while len(batch) < self.batch_size and not dest.queue.empty():
+                    batch.append(dest.queue.get_nowait())
+                remaining = deadline - self.loop.time()
+                if len(batch) >= self.batch_size or remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(dest.queue.get(), timeout=remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            await dest.semaphore.acquire()
+            task = asyncio.create_task(self._deliver(dest, batch))
+            dest.in_flight.add(task)
+            task.add_done_callback(dest.in_flight.discard)
+
+    async def _deliver(self, dest: Destination, batch: list):
+        settled = False
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    if dest.kind == "webhook":
+                        await self._send_webhook(dest.target, batch)
+                    else:
+                        await asyncio.to_thread(_send_email, dest.target, batch)
+                    settled = True
+                    dest.delivered += len(batch)
+                    dest.batches += 1
+                    return
+                except Exception as e:
+                    dest.failed_attempts += 1
+                    last_error = str(e)
+                    if attempt == self.max_retries:
+                        break
+                    # exponential backoff with full jitter
+                    await asyncio.sleep(random.uniform(0, self.retry_base * (2 ** attempt)))
+            settled = True
+            dest.dead_lettered += len(batch)
+            await self._dead_letter(dest, batch, last_error)
+        except asyncio.CancelledError:
+            # stop() gave up on this digest; keep it for replay
+            if not settled:
+                dest.dead_lettered += len(batch)
+                await self._dead_letter(dest, batch, "cancelled at shutdown")
+            raise
+        finally:
+            dest.semaphore.release()
+            for _ in batch:
+                dest.queue.task_done()
+
+    async def _send_webhook(self, url: str, batch: list):
+        payload = {"digest": True, "count": len(batch), "sent_at": datetime.utcnow().isoformat(), "alerts": batch}
+        r = await self.http.post(url, content=json.dumps(payload, default=str),
+                                 headers={"Content-Type": "application/json"})
+        if r.status_code >= 300:
+            raise RuntimeError(f"webhook returned {r.status_code}")
+
+    async def _dead_letter(self, dest: Destination, batch: list, error: str):
+        record = {
+            "destination": dest.key,
+            "error": error,
+            "count": len(batch),
+            "alerts": batch,
+            "failed_at": datetime.utcnow(),
+        }
+        try:
+            from app.database.mongo import db
+            if not db:
+                raise RuntimeError("MongoDB not connected")
+            await asyncio.to_thread(db[DEAD_LETTER_COLLECTION].insert_one, record)
+        except Exception:
+            self.dead_letters.append(record)
+
+    # ------------------ introspection ------------------
+    def queue_depth(self):
+        if not self.running:
+            return 0
+        return self.inbox.qsize() + sum(d.queue.qsize() for d in self.destinations)
+
+    def stats(self):
+        return {
+            "running": self.running,
+            "accepted": self.accepted,
+            "dropped": self.dropped,
+            "queue_depth": self.queue_depth(),
+            "destinations": [d.stats() for d in self.destinations],
+        }
+
+
+def _send_email(recipient: str, batch: list):
+    msg = EmailMessage()
+    worst = max((a.get("severity") or "low" for a in batch), key=_severity_rank)
+    msg["Subject"] = f"[ShadowTrace] {len(batch)} alert(s), highest severity: {worst}"
+    msg["From"] = SMTP_FROM
+    msg["To"] = recipient
+    lines = [f"- [{a.get('severity')}] {a.get('title')}: {a.get('description') or ''}" for a in batch]
+    msg.set_content("\n".join(lines))
+
+    with smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=10) as s:
+        s.starttls()
+        if SMTP_USER:
+            s.login(SMTP_USER, SMTP_PASSWORD)
+        s.send_message(msg)
+
+
+def _severity_rank(sev):
+    return {"low": 0, "medium": 1, "high": 2, "critical": 3}.get(sev, 0)
+
+
+# shared dispatcher, started/stopped by app.main
+dispatcher = AlertDispatcher.from_env()
+
+register(Gauge("shadowtrace_alert_queue_depth", "Alerts waiting to be delivered.",
+               fn=lambda: {(): dispatcher.queue_depth()}))
+register(Gauge("shadowtrace_alert_deliveries_in_flight", "Digest deliveries running per destination.", ("destination",),
+               fn=lambda: {(d.key,): len(d.in_flight) for d in dispatcher.destinations}))
+register(Counter("shadowtrace_alerts_delivered_total", "Alerts delivered per destination.", ("destination",),
+                 fn=lambda: {(d.key,): d.delivered for d in dispatcher.destinations}))
+register(Counter("shadowtrace_alerts_dropped_total", "Alerts dropped because a destination's buffer was full.",
+                 ("destination",), fn=lambda: {(d.key,): d.dropped for d in dispatcher.destinations}))
+register(Counter("shadowtrace_alerts_dead_lettered_total", "Alerts dead-lettered per destination.", ("destination",),
+                 fn=lambda: {(d.key,): d.dead_lettered for d in dispatcher.destinations}))
+
+
+def raise_alert(title: str, severity: str, description: str = "", raw: dict = None) -> dict:
+    """
+    Record an alert in Elasticsearch and hand it to the dispatcher.
+    Never raises: alerting must not fail the scan that produced it.
+    """
+    alert = {
+        "alert_id": uuid.uuid4().hex,
+        "title": title,
+        "severity": severity,
+        "description": description,
+        "timestamp": datetime.utcnow().isoformat(),
+        "entity": (raw or {}).get("entity"),
+        "raw": raw or {},
+    }
+    try:
+        from app.database.elastic import index_doc
+        from app.database.alerts_mapping import ALERT_WRITE_ALIAS
+        index_doc(ALERT_WRITE_ALIAS, alert, doc_id=alert["alert_id"], require_alias=True)
+    except Exception as e:
+        print(f"[!] Failed to index alert '{title}': {e}")
+
+    if severity in NOTIFY_SEVERITIES:
+        # the raw payload stays in ES; digests only carry the summary
+        dispatcher.enqueue({k: v for k, v in alert.items() if k != "raw"})
+    return alert
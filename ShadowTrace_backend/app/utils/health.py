@@ -0,0 +1,265 @@
+# app/utils/health.py
+"""
+Background dependency health checks.
+
+Every check runs on its own interval in a worker thread, all of them
+concurrently, with a timeout. A timed-out check's thread cannot be stopped,
+so the check is skipped until that thread returns rather than piling up
+more blocked threads while its dependency is down. Results go into a snapshot that the /health
+endpoints return as-is (pre-serialized), so a probe never touches the
+network or blocks the event loop. Each check keeps a bounded latency
+history.
+
+Liveness only says the process and its event loop are responsive;
+readiness says every critical dependency passed its last check.
+"""
+import os
+import json
+import time
+import asyncio
+from collections import deque
+from datetime import datetime, timezone
+
+from app.config import settings
+from app.utils.metrics import register, Gauge, Histogram
+
+HEALTH_INTERVAL = float(os.getenv("HEALTH_INTERVAL", "5"))
+HEALTH_KEYS_INTERVAL = float(os.getenv("HEALTH_KEYS_INTERVAL", "300"))
+HEALTH_TIMEOUT = float(os.getenv("HEALTH_TIMEOUT", "3"))
+HEALTH_HISTORY = int(os.getenv("HEALTH_HISTORY", "120"))
+
+VT_BASE = os.getenv("VT_BASE", "https://www.virustotal.com/api/v3")
+ABUSEIPDB_BASE = os.getenv("ABUSEIPDB_BASE", "https://api.abuseipdb.com/api/v2")
+SHODAN_BASE = os.getenv("SHODAN_API_URL", "https://api.shodan.io")
+
+CHECK_SECONDS = register(Histogram(
+    "shadowtrace_health_check_seconds", "Dependency health check latency.", ("check",),
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)))
+
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+
+class Unavailable(Exception):
+    """Raised by a check that knows why it is down without having to try."""
+
+
+class Check:
+    """One dependency probe: a blocking callable returning a detail dict or raising."""
+
+    def __init__(self, name, fn, interval=HEALTH_INTERVAL, timeout=HEALTH_TIMEOUT, critical=False,
+                 history=HEALTH_HISTORY):
+        self.name = name
+        self.fn = fn
+        self.interval = interval
+        self.timeout = timeout
+        self.critical = critical
+        self.history = deque(maxlen=history)  # (unix time, latency ms, ok)
+        self.last = {"status": "pending"}
+        self.next_run = 0.0
+        self.running = False
+
+    def record(self, status, latency_ms, detail=None, error=None):
+        ok = status == "ok"
+        self.history.append((time.time(), round(latency_ms, 2), ok))
+        self.last = {"status": status, "latency_ms": round(latency_ms, 2), "checked_at": _now()}
+        if detail:
+            self.last["detail"] = detail
+        if error:
+            self.last["error"] = error
+        CHECK_SECONDS.observe(self.name, value=latency_ms / 1000)
+
+    @property
+    def ok(self):
+        return self.last.get("status") == "ok"
+
+    def summary(self):
+        lat = sorted(ms for _, ms, ok in self.history if ok)
+        out = {**self.last, "critical": self.critical, "samples": len(self.history)}
+        if self.history:
+            out["success_ratio"] = round(sum(1 for *_, ok in self.history if ok) / len(self.history), 3)
+        if lat:
+            out["p50_ms"] = lat[len(lat) // 2]
+            out["p95_ms"] = lat[min(len(lat) - 1, int(len(lat) * 0.95))]
+            out["max_ms"] = lat[-1]
+        return out
+
+
+def _thread_done(check, future):
+    check.running = False
+    if not future.cancelled():
+        future.exception()  # already recorded by _run (or abandoned after a timeout)
+
+
+class HealthMonitor:
+    def __init__(self, tick: float = 0.5):
+        self.tick = tick
+        self.checks = {}
+        self.task = None
+        self.in_flight = set()
+        self.started_at = None
+        self.last_round = None
+        self.body = b"{}"
+        self.ready_body = b"{}"
+        self.status = "starting"
+
+    def add(self, check: Check):
+        self.checks[check.name] = check
+        return check
+
+    @property
+    def ready(self):
+        crit = [c for c in self.checks.values() if c.critical]
+        return bool(crit) and all(c.ok for c in crit)
+
+    # ------------------ lifecycle ------------------
+    async def start(self):
+        if self.task is not None:
+            return
+        self.started_at = time.time()
+        self._publish()
+        self.task = asyncio.create_task(self._loop())
+
+    async def stop(self):
+        if self.task is None:
+            return
+        tasks = [self.task, *self.in_flight]
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.task = None
+
+    async def _loop(self):
+        while True:
+            now = time.monotonic()
+            due = [c for c in self.checks.values() if c.next_run <= now and not c.running]
+            if due:
+                # a slow check must not delay the others, so each one publishes on its own
+                for c in due:
+                    c.next_run = now + c.interval
+                    t = asyncio.create_task(self._run(c))
+                    self.in_flight.add(t)
+                    t.add_done_callback(self.in_flight.discard)
+            await asyncio.sleep(self.tick)
+
+    async def run(self, names=None):
+        """Run the given checks (default: all) now, concurrently, and wait for them."""
+        checks = [self.checks[n] for n in (names or self.checks) if n in self.checks]
+        await asyncio.gather(*(self._run(c) for c in checks if not c.running))
+
+    async def _run(self, check: Check):
+        check.running = True
+        t0 = time.perf_counter()
+        work = asyncio.get_running_loop().run_in_executor(None, check.fn)
+        # running stays set until the thread returns, however long after the timeout that is
+        work.add_done_callback(lambda f: _thread_done(check, f))
+        try:
+            detail = await asyncio.wait_for(asyncio.shield(work), timeout=check.timeout)
+            check.record("ok", (time.perf_counter() - t0) * 1000, detail=detail)
+        except asyncio.TimeoutError:
+            check.record("timeout", (time.perf_counter() - t0) * 1000, error=f"no answer within {check.timeout}s")
+        except Unavailable as e:
+            status, _, reason = str(e).partition(":")
+            check.record(status, (time.perf_counter() - t0) * 1000, error=reason.strip() or None)
+        except Exception as e:
+            check.record("fail", (time.perf_counter() - t0) * 1000, error=str(e)[:300])
+        finally:
+            self.last_round = time.time()
+            self._publish()
+
+    # ------------------ snapshot ------------------
+    def _publish(self):
+        checks = {name: c.summary() for name, c in self.checks.items()}
+        ready = self.ready
+        if ready and all(c.ok or c.last.get("status") == "missing" for c in self.checks.values()):
+            self.status = "healthy"
+        elif ready:
+            self.status = "degraded"
+        else:
+            self.status = "error"
+        snapshot = {"status": self.status, "ready": ready, "updated_at": _now(), "checks": checks}
+        self.body = json.dumps(snapshot, default=str).encode()
+        self.ready_body = json.dumps({"ready": ready, "checks": {
+            n: {"status": c.last.get("status"), "error": c.last.get("error")}
+            for n, c in self.checks.items() if c.critical}}).encode()
+
+    def liveness(self):
+        return {
+            "alive": True,
+            "uptime_s": round(time.time() - self.started_at, 1) if self.started_at else 0,
+            "monitor_running": self.task is not None and not self.task.done(),
+            "last_check_age_s": round(time.time() - self.last_round, 1) if self.last_round else None,
+        }
+
+    def history(self, name):
+        c = self.checks.get(name)
+        if c is None:
+            return None
+        return {"check": name, "samples": [
+            {"t": datetime.fromtimestamp(t, timezone.utc).isoformat(), "latency_ms": ms, "ok": ok}
+            for t, ms, ok in c.history]}
+
+
+############################################
+# Checks
+############################################
+def check_mongo():
+    from app.database import mongo
+    if not mongo.db:
+        raise Unavailable(f"{mongo.db_status.get('db_status')}: {mongo.db_status.get('error') or ''}")
+    mongo.db.command("ping")
+    return {"name": mongo.DB_NAME}
+
+
+def check_elastic():
+    from app.database import elastic
+    if elastic.es_client is None:
+        status = elastic.es_status
+        raise Unavailable(f"{status.get('elastic')}: {status.get('error') or ''}")
+    if not elastic.es_client.ping():
+        raise Exception(f"ping returned False for {elastic.ELASTIC_URL}")
+    return None
+
+
+def _key_check(url, headers=None):
+    from app.utils.http import session
+    r = session.get(url, headers=headers, timeout=HEALTH_TIMEOUT)
+    if r.status_code in (401, 403):
+        raise Unavailable(f"invalid: HTTP {r.status_code}")
+    if r.status_code >= 500:
+        raise Exception(f"HTTP {r.status_code}")
+    return None
+
+
+def check_shodan():
+    if not settings.SHODAN_API_KEY:
+        raise Unavailable("missing")
+    return _key_check(f"{SHODAN_BASE}/api-info?key={settings.SHODAN_API_KEY}")
+
+
+def check_virustotal():
+    if not settings.VT_API_KEY:
+        raise Unavailable("missing")
+    return _key_check(f"{VT_BASE}/domains/google.com", {"x-apikey": settings.VT_API_KEY})
+
+
+def check_abuseipdb():
+    if not settings.ABUSEIPDB_KEY:
+        raise Unavailable("missing")
+    return _key_check(f"{ABUSEIPDB_BASE}/check?ipAddress=8.8.8.8",
+                      {"Key": settings.ABUSEIPDB_KEY, "Accept": "application/json"})
+
+
+# upstream API keys cost quota, so they are checked far less often than the databases
+KEY_CHECKS = ("shodan", "virustotal", "abuseipdb")
+
+monitor = HealthMonitor()
+monitor.add(Check("mongo", check_mongo, critical=True))
+monitor.add(Check("elastic", check_elastic))
+monitor.add(Check("shodan", check_shodan, interval=HEALTH_KEYS_INTERVAL))
+monitor.add(Check("virustotal", check_virustotal, interval=HEALTH_KEYS_INTERVAL))
+monitor.add(Check("abuseipdb", check_abuseipdb, interval=HEALTH_KEYS_INTERVAL))
+
+register(Gauge("shadowtrace_health_up", "1 when the dependency passed its last health check.", ("check",),
+               fn=lambda: {(n,): int(c.ok) for n, c in monitor.checks.items()}))
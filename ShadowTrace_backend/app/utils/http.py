@@ -0,0 +1,16 @@
+# app/utils/http.py
+"""Process-wide pooled HTTP session for outbound OSINT requests."""
+import os
+import requests
+from requests.adapters import HTTPAdapter
+
+HTTP_POOL_CONNECTIONS = int(os.getenv("HTTP_POOL_CONNECTIONS", "32"))
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "64"))
+
+USER_AGENT = "ShadowTrace OSINT Engine"
+
+session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=HTTP_POOL_CONNECTIONS, pool_maxsize=HTTP_POOL_MAXSIZE)
+session.mount("http://", _adapter)
+session.mount("https://", _adapter)
+session.headers["User-Agent"] = USER_AGENT
@@ -0,0 +1,264 @@
+# app/utils/indicators.py
+"""
+Single-pass indicator classifier shared by the /search scan path and the
+osint_engine path.
+
+`classify(value)` returns `(canonical_value, kind)` where kind is one of
+KINDS. A compiled regex picks the candidate kind in a single match; IPs are
+then validated with inet_pton and checked against the special-purpose ranges,
+networks are canonicalized with `ipaddress`, and Bitcoin addresses must pass
+their Base58Check or bech32/bech32m checksum (otherwise the value is matched
+against the kinds after "wallet", usually ending up a username).
+"""
+import re
+import hashlib
+import ipaddress
+from bisect import bisect_right
+from socket import inet_pton, inet_ntop, AF_INET, AF_INET6
+
+KINDS = (
+    "ip", "private_ip", "cidr", "url", "email", "domain",
+    "hash", "wallet", "phone", "username", "unknown",
+)
+
+_V4 = r"\d{1,3}(?:\.\d{1,3}){3}"
+_V6 = r"[0-9a-fA-F]{0,4}(?::[0-9a-fA-F]{0,4}){2,7}(?:%\w+)?|[0-9a-fA-F:]*:" + _V4
+
+# Structural characters route a value to one compiled pattern ("://" -> url,
+# "@" -> email, ":" -> IPv6, "/" -> IPv4 network); everything else goes
+# through a single combined pattern whose alternatives are ordered: the first
+# one that matches the whole string wins.
+_URL = re.compile(r"(?P<url>([a-zA-Z][a-zA-Z0-9+.-]*)://([^\s/?#]+)([^\s#]*)(?:#\S*)?)")
+_EMAIL = re.compile(r"(?P<email>[^@\s]+@[^@\s]+\.[^@\s]+)")
+_COLON = re.compile(r"(?P<cidr>(?:" + _V6 + r")/\d{1,3})|(?P<ipv6>" + _V6 + r")")
+_SLASH = re.compile(r"(?P<cidr>" + _V4 + r"/\d{1,2})")
+# what a value that looks like a Bitcoin address but fails its checksum can still be
+_AFTER_BTC = (
+    r"(?P<domain>(?:[a-zA-Z0-9](?:[a-zA-Z0-9-]{0,61}[a-zA-Z0-9])?\.)+[a-zA-Z]{2,63}\.?)"
+    r"|(?P<phone>\+?\d[\d\s\-().]{5,})"
+    r"|(?P<username>[a-zA-Z0-9_.-]{3,})"
+)
+_PLAIN = re.compile(
+    r"(?P<ipv4>" + _V4 + r")"
+    r"|(?P<eth>0[xX][0-9a-fA-F]{40})"
+    r"|(?P<hash>[0-9a-fA-F]{32}|[0-9a-fA-F]{40}|[0-9a-fA-F]{64})"
+    r"|(?P<btc>bc1[ac-hj-np-z02-9]{11,71}|BC1[AC-HJ-NP-Z02-9]{11,71}|[13][a-km-zA-HJ-NP-Z1-9]{25,34})"
+    r"|" + _AFTER_BTC
+)
+_NOT_BTC = re.compile(_AFTER_BTC)
+
+
+def _pattern(v):
+    if "://" in v:
+        return _URL
+    if "@" in v:
+        return _EMAIL
+    if ":" in v:
+        return _COLON
+    if "/" in v:
+        return _SLASH
+    return _PLAIN
+
+
+HASH_ALGORITHMS = {32: "md5", 40: "sha1", 64: "sha256"}
+
+# Non-global ranges (IANA special-purpose registries). Checked with a bisect
+# over merged integer intervals instead of ipaddress' per-call is_global scan.
+_SPECIAL_V4 = (
+    "0.0.0.0/8", "10.0.0.0/8", "100.64.0.0/10", "127.0.0.0/8", "169.254.0.0/16",
+    "172.16.0.0/12", "192.0.0.0/24", "192.0.2.0/24", "192.168.0.0/16", "198.18.0.0/15",
+    "198.51.100.0/24", "203.0.113.0/24", "224.0.0.0/4", "240.0.0.0/4",
+)
+_SPECIAL_V6 = (
+    "::/128", "::1/128", "64:ff9b:1::/48", "100::/64", "2001::/23", "2001:db8::/32",
+    "2002::/16", "3fff::/20", "5f00::/16", "fc00::/7", "fe80::/10", "ff00::/8",
+)
+
+
+def _intervals(nets):
+    spans = sorted((int(n.network_address), int(n.broadcast_address))
+                   for n in map(ipaddress.ip_network, nets))
+    merged = []
+    for lo, hi in spans:
+        if merged and lo <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], hi)
+        else:
+            merged.append([lo, hi])
+    return [lo for lo, _ in merged], [hi for _, hi in merged]
+
+
+_V4_STARTS, _V4_ENDS = _intervals(_SPECIAL_V4)
+_V6_STARTS, _V6_ENDS = _intervals(_SPECIAL_V6)
+
+
+def _in(n, starts, ends):
+    i = bisect_right(starts, n) - 1
+    return i >= 0 and n <= ends[i]
+
+
+_V4_MAPPED = b"\x00" * 10 + b"\xff\xff"
+
+
+def _ipv4(v):
+    try:
+        n = int.from_bytes(inet_pton(AF_INET, v), "big")
+    except OSError:
+        return v, "unknown"
+    return v, ("private_ip" if _in(n, _V4_STARTS, _V4_ENDS) else "ip")
+
+
+def _ipv6(v):
+    try:
+        packed = inet_pton(AF_INET6, v)
+    except OSError:
+        try:
+            # zone ids (fe80::1%eth0) are only understood by ipaddress
+            packed = ipaddress.IPv6Address(v).packed
+        except ValueError:
+            return v, "unknown"
+    if packed[:12] == _V4_MAPPED:
+        return _ipv4(inet_ntop(AF_INET, packed[12:]))
+    return inet_ntop(AF_INET6, packed), ("private_ip" if _in(int.from_bytes(packed, "big"), _V6_STARTS, _V6_ENDS) else "ip")
+
+
+def _cidr(v):
+    try:
+        return str(ipaddress.ip_network(v, strict=False)), "cidr"
+    except ValueError:
+        return v, "unknown"
+
+
+_DEFAULT_PORTS = {"http": ":80", "https": ":443"}
+
+
+def _url(v):
+    scheme, netloc, rest = _URL.fullmatch(v).group(2, 3, 4)
+    scheme = scheme.lower()
+    netloc = netloc.lower()
+    port = _DEFAULT_PORTS.get(scheme)
+    if port and netloc.endswith(port):
+        netloc = netloc[:-len(port)]
+    return f"{scheme}://{netloc}{rest or '/'}", "url"
+
+
+def _domain(v):
+    return v.lower().rstrip("."), "domain"
+
+
+_NON_DIGIT = re.compile(r"\D")
+
+
+def _phone(v):
+    digits = _NON_DIGIT.sub("", v)
+    if not 6 <= len(digits) <= 15:
+        return v, "unknown"
+    return digits, "phone"
+
+
+_B58 = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+_B58_INDEX = {c: i for i, c in enumerate(_B58)}
+# mainnet P2PKH ("1...") and P2SH ("3...") version bytes
+_B58_VERSIONS = {"1": 0x00, "3": 0x05}
+
+
+def _base58check(v) -> bool:
+    n = 0
+    for c in v:
+        n = n * 58 + _B58_INDEX[c]
+    pad = len(v) - len(v.lstrip("1"))
+    if n.bit_length() > 200:
+        return False
+    raw = b"\x00" * pad + (n.to_bytes((n.bit_length() + 7) // 8, "big") if n else b"")
+    if len(raw) != 25 or raw[0] != _B58_VERSIONS[v[0]]:
+        return False
+    return hashlib.sha256(hashlib.sha256(raw[:21]).digest()).digest()[:4] == raw[21:]
+
+
+_BECH32 = "qpzry9x8gf2tvdw0s3jn54khce6mua7l"
+_BECH32_GEN = (0x3B6A57B2, 0x26508E6D, 0x1EA119FA, 0x3D4233DD, 0x2A1462B3)
+_BECH32M_CONST = 0x2BC830A3
+
+
+def _polymod(values) -> int:
+    chk = 1
+    for v in values:
+        top = chk >> 25
+        chk = (chk & 0x1FFFFFF) << 5 ^ v
+        for i in range(5):
+            if (top >> i) & 1:
+                chk ^= _BECH32_GEN[i]
+    return chk
+
+
+def _segwit(v) -> bool:
+    """BIP 173 / BIP 350: bech32 for witness version 0, bech32m for 1-16, valid program length."""
+    data = [_BECH32.index(c) for c in v[3:].lower()]
+    if len(data) < 7:
+        return False
+    const = _polymod([3, 3, 0, 2, 3] + data)  # hrp "bc" expanded
+    version = data[0]
+    if version > 16 or const != (1 if version == 0 else _BECH32M_CONST):
+        return False
+    bits = len(data[1:-6]) * 5
+    if bits % 8 > 4:
+        return False
+    length = bits // 8
+    return 2 <= length <= 40 and (version != 0 or length in (20, 32))
+
+
+def _btc(v):
+    if _segwit(v) if v[:3].lower() == "bc1" else _base58check(v):
+        return (v.lower() if v[:3].lower() == "bc1" else v), "wallet"
+    m = _NOT_BTC.fullmatch(v)
+    return _NORMALIZERS[m.lastgroup](v) if m is not None else (v, "unknown")
+
+
+_NORMALIZERS = {
+    "url": _url,
+    "email": lambda v: (v.lower(), "email"),
+    "cidr": _cidr,
+    "ipv4": _ipv4,
+    "ipv6": _ipv6,
+    "eth": lambda v: (v.lower(), "wallet"),
+    "hash": lambda v: (v.lower(), "hash"),
+    "btc": _btc,
+    "domain": _domain,
+    "phone": _phone,
+    "username": lambda v: (v.lower(), "username"),
+}
+
+
+def classify(value: str):
+    """Return (canonical_value, kind) for a single indicator."""
+    v = value.strip()
+    m = _pattern(v).fullmatch(v)
+    if m is None:
+        return v, "unknown"
+    return _NORMALIZERS[m.lastgroup](v)
+
+
+def classify_many(values):
+    """
+    Batch classification for bulk ingest. Accepts any iterable of strings
+    (e.g. an open file) and returns a list of (canonical_value, kind).
+    Repeated values within the batch are classified once.
+    """
+    pattern = _pattern
+    norm = _NORMALIZERS
+    seen = {}
+    get = seen.get
+    out = []
+    append = out.append
+    for value in values:
+        r = get(value)
+        if r is None:
+            v = value.strip()
+            m = pattern(v).fullmatch(v)
+            r = seen[value] = norm[m.lastgroup](v) if m is not None else (v, "unknown")
+        append(r)
+    return out
+
+
+def hash_algorithm(value: str):
+    """md5 / sha1 / sha256 for a value classified as "hash"."""
+    return HASH_ALGORITHMS.get(len(value))
@@ -0,0 +1,208 @@
+# app/utils/metrics.py
+"""
+In-process metrics with Prometheus text exposition.
+
+`span()` times a block of hot-path work into the shared span histogram
+(labeled by span, provider and entity type), tracks it as in flight while it
+runs, and - when a scan is being timed on the current thread - records the
+duration in that scan's `timings` section as well.
+"""
+import time
+import threading
+import functools
+import contextvars
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+def _fmt_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _escape(v):
+    return str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, doc, labels=(), fn=None):
+        self.name = name
+        self.doc = doc
+        self.labels = tuple(labels)
+        self.lock = threading.Lock()
+        self.values = {}
+        self.fn = fn
+
+    def header(self):
+        return [f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"]
+
+    def inc(self, *label_values, amount=1):
+        with self.lock:
+            self.values[label_values] = self.values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = self.header()
+        values = self.values
+        if self.fn is not None:
+            try:
+                values = self.fn()
+            except Exception:
+                values = {}
+        for lv, v in sorted(values.items()):
+            lines.append(f"{self.name}{_fmt_labels(self.labels, lv)} {v}")
+        return lines
+
+
+class Counter(_Metric):
+    """Monotonic counter; pass `fn` returning {label_values: value} to read an existing counter at scrape time."""
+    kind = "counter"
+
+
+class Gauge(_Metric):
+    """Settable gauge; pass `fn` returning {label_values: value} to sample at scrape time."""
+    kind = "gauge"
+
+    def set(self, *label_values, value):
+        with self.lock:
+            self.values[label_values] = value
+
+    def dec(self, *label_values, amount=1):
+        self.inc(*label_values, amount=-amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, doc, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, doc, labels)
+        self.buckets = tuple(buckets)
+        self.series = {}  # label_values -> [bucket counts..., sum, count]
+
+    def observe(self, *label_values, value):
+        with self.lock:
+            s = self.series.get(label_values)
+            if s is None:
+                s = self.series[label_values] = [0] * (len(self.buckets) + 2)
+            for i, b in enumerate(self.buckets):
+                if value <= b:
+                    s[i] += 1
+                    break
+            s[-2] += value
+            s[-1] += 1
+
+    def render(self):
+        lines = self.header()
+        names = self.labels + ("le",)
+        with self.lock:
+            series = {k: list(v) for k, v in self.series.items()}
+        for lv, s in sorted(series.items()):
+            cumulative = 0
+            for i, b in enumerate(self.buckets):
+                cumulative += s[i]
+                lines.append(f"{self.name}_bucket{_fmt_labels(names, lv + (b,))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_fmt_labels(names, lv + ('+Inf',))} {s[-1]}")
+            lines.append(f"{self.name}_sum{_fmt_labels(self.labels, lv)} {s[-2]}")
+            lines.append(f"{self.name}_count{_fmt_labels(self.labels, lv)} {s[-1]}")
+        return lines
+
+
+REGISTRY = []
+
+
+def register(metric):
+    REGISTRY.append(metric)
+    return metric
+
+
+def render_metrics() -> str:
+    lines = []
+    for m in REGISTRY:
+        lines.extend(m.render())
+    return "\n".join(lines) + "\n"
+
+
+# ------------------ core metrics ------------------
+SPAN_SECONDS = register(Histogram(
+    "shadowtrace_span_seconds", "Duration of instrumented hot-path work.", ("span", "provider", "entity")))
+SPANS_IN_FLIGHT = register(Gauge(
+    "shadowtrace_spans_in_flight", "Instrumented operations currently running.", ("span", "provider")))
+SPAN_ERRORS = register(Counter(
+    "shadowtrace_span_errors_total", "Instrumented operations that raised.", ("span", "provider", "entity")))
+SCAN_SECONDS = register(Histogram(
+    "shadowtrace_scan_seconds", "End-to-end scan duration.", ("entity",)))
+SCANS_TOTAL = register(Counter(
+    "shadowtrace_scans_total", "Finished scans by outcome.", ("entity", "status")))
+
+
+# ------------------ per-scan timings ------------------
+_current_scan = contextvars.ContextVar("shadowtrace_scan_timings", default=None)
+
+
+class ScanTimings:
+    """Collects span durations (ms) for one scan; stored as the scan's `timings`."""
+
+    def __init__(self, entity: str = "-"):
+        self.entity = entity
+        self.started = time.perf_counter()
+        self.spans = {}
+        self.lock = threading.Lock()
+
+    def add(self, key, seconds):
+        key = key.replace(".", "_")  # stored as a Mongo field name
+        with self.lock:
+            # repeated spans (e.g. one per platform) accumulate
+            self.spans[key] = round(self.spans.get(key, 0) + seconds * 1000, 2)
+
+    def activate(self):
+        return _current_scan.set(self)
+
+    def deactivate(self, token):
+        _current_scan.reset(token)
+
+    def as_dict(self):
+        return {"total_ms": round((time.perf_counter() - self.started) * 1000, 2), "spans": dict(self.spans)}
+
+
+def current_scan():
+    return _current_scan.get()
+
+
+def submit(executor, fn, *args, **kwargs):
+    """executor.submit that carries the current scan into the worker thread."""
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+@contextmanager
+def span(span_name: str, provider: str = "-", entity: str = None):
+    scan = _current_scan.get()
+    if entity is None:
+        entity = scan.entity if scan is not None else "-"
+    SPANS_IN_FLIGHT.inc(span_name, provider)
+    t0 = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        SPAN_ERRORS.inc(span_name, provider, entity)
+        raise
+    finally:
+        dt = time.perf_counter() - t0
+        SPANS_IN_FLIGHT.dec(span_name, provider)
+        SPAN_SECONDS.observe(span_name, provider, entity, value=dt)
+        if scan is not None:
+            scan.add(f"{span_name}:{provider}", dt)
+
+
+def timed(span_name: str, provider: str = "-"):
+    """Decorator form of span()."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def run(*args, **kwargs):
+            with span(span_name, provider):
+                return fn(*args, **kwargs)
+        return run
+    return deco
@@ -1,7 +1,8 @@
-import re
+from app.utils.indicators import classify
 
 def normalize(val):
-    v = val.strip()
-    if "@" in v: return v.lower(), "email"
-    if re.fullmatch(r"\+?\d[\d -]{6,}", v): return re.sub(r"\D","",v), "phone"
-    return v.lower(), "username"
+    # the social probes key on "username": anything that is not an email or a phone
+    # number is one, including dotted handles that also parse as domains
+    v, kind = classify(val)
+    if kind in ("email", "phone"): return v, kind
+    return val.strip().lower(), "username"
@@ -0,0 +1,85 @@
+# app/utils/pdf_export.py
+"""
+Case report rendering: Jinja2 to HTML, WeasyPrint to PDF.
+
+This module is what the report worker processes import. Templates are
+compiled once per process (the first time init_worker or render runs) and
+their bytecode is shared between processes through a FileSystemBytecodeCache,
+so a freshly spawned worker does not recompile them. Nothing here touches
+the database: workers receive the gathered case data and return bytes.
+"""
+import os
+import hashlib
+import tempfile
+from datetime import datetime
+
+TEMPLATE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../templates/reports"))
+REPORT_TEMPLATE = os.getenv("REPORT_TEMPLATE", "case_report.html")
+BYTECODE_DIR = os.getenv("REPORT_BYTECODE_DIR", os.path.join(tempfile.gettempdir(), "shadowtrace_jinja"))
+
+FORMATS = {"html": "text/html; charset=utf-8", "pdf": "application/pdf"}
+
+_env = None
+
+
+def template_version(name: str = REPORT_TEMPLATE) -> str:
+    """Hash of the template source; part of every report cache key."""
+    h = hashlib.sha1()
+    for fname in sorted(os.listdir(TEMPLATE_DIR)):
+        with open(os.path.join(TEMPLATE_DIR, fname), "rb") as f:
+            h.update(fname.encode() + b"\0" + f.read())
+    h.update(name.encode())
+    return h.hexdigest()[:12]
+
+
+def environment():
+    global _env
+    if _env is None:
+        from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache, select_autoescape
+
+        os.makedirs(BYTECODE_DIR, exist_ok=True)
+        _env = Environment(
+            loader=FileSystemLoader(TEMPLATE_DIR),
+            autoescape=select_autoescape(["html"]),
+            bytecode_cache=FileSystemBytecodeCache(BYTECODE_DIR),
+            auto_reload=False,  # templates only change with a deploy
+            trim_blocks=True,
+            lstrip_blocks=True,
+        )
+        _env.filters["ts"] = _fmt_ts
+    return _env
+
+
+def _fmt_ts(value):
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M UTC")
+    return value or "-"
+
+
+def init_worker():
+    """Process pool initializer: compile the report template and load WeasyPrint up front."""
+    environment().get_template(REPORT_TEMPLATE)
+    try:
+        import weasyprint  # noqa: F401
+    except Exception:
+        # HTML reports still work without WeasyPrint's system libraries
+        pass
+
+
+def render_html(case: dict) -> str:
+    return environment().get_template(REPORT_TEMPLATE).render(case=case, generated_at=datetime.utcnow())
+
+
+def render_pdf(html: str) -> bytes:
+    from weasyprint import HTML
+    return HTML(string=html, base_url=TEMPLATE_DIR).write_pdf()
+
+
+def render(case: dict, fmt: str = "pdf") -> bytes:
+    """Render a gathered case to `fmt` ("html" or "pdf")."""
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown report format '{fmt}'")
+    html = render_html(case)
+    if fmt == "html":
+        return html.encode()
+    return render_pdf(html)
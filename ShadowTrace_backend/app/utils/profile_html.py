@@ -0,0 +1,173 @@
+# app/utils/profile_html.py
+"""
+Profile page metadata extraction.
+
+Everything we read from a profile page (<title>, og:/twitter: meta tags and
+JSON-LD) lives in the document head, so responses are streamed only until
+</head> (or <body>) shows up and that prefix is parsed with selectolax's lexbor
+backend (BeautifulSoup when selectolax is not installed or fails on a page).
+"""
+import os
+import re
+import json
+
+from app.utils.metrics import register, Counter
+
+PROFILE_HEAD_MAX_BYTES = int(os.getenv("PROFILE_HEAD_MAX_BYTES", str(512 * 1024)))
+PROFILE_CHUNK_SIZE = int(os.getenv("PROFILE_CHUNK_SIZE", "16384"))
+
+_HEAD_END = re.compile(rb"</head\s*>|<body[\s>]", re.I)
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as _SelectolaxParser
+except ImportError:
+    _SelectolaxParser = None
+
+PARSER = "selectolax" if _SelectolaxParser else "bs4"
+
+PROFILE_BYTES = register(Counter(
+    "shadowtrace_profile_bytes_total", "Profile page bytes downloaded vs. advertised.", ("kind",)))
+
+
+############################################
+# Head-only download
+############################################
+class HeadBuffer:
+    """Accumulates response bytes until the head is complete (or max_bytes is hit)."""
+
+    def __init__(self, max_bytes: int = PROFILE_HEAD_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.buf = bytearray()
+        self.end = None
+
+    def feed(self, chunk: bytes) -> bool:
+        """Add a chunk; True once no more bytes are needed."""
+        start = max(0, len(self.buf) - 16)  # a tag may straddle two chunks
+        self.buf += chunk
+        m = _HEAD_END.search(self.buf, start)
+        if m:
+            # keep </head>, drop <body ...
+            self.end = m.end() if m.group(0)[1:2] == b"/" else m.start()
+            return True
+        return len(self.buf) >= self.max_bytes
+
+    @property
+    def read(self):
+        return len(self.buf)
+
+    def head(self) -> bytes:
+        return bytes(self.buf[:self.end if self.end is not None else self.max_bytes])
+
+
+def read_head_chunks(chunks, max_bytes: int = PROFILE_HEAD_MAX_BYTES):
+    """Consume byte chunks until the head is complete. Returns (head_bytes, bytes_read)."""
+    hb = HeadBuffer(max_bytes)
+    for chunk in chunks:
+        if chunk and hb.feed(chunk):
+            break
+    return hb.head(), hb.read
+
+
+def _decode(data: bytes, encoding):
+    return data.decode(encoding or "utf-8", errors="replace")
+
+
+def read_head(response, max_bytes: int = PROFILE_HEAD_MAX_BYTES) -> str:
+    """Head of a streamed requests response; the rest of the body is never downloaded."""
+    try:
+        data, read = read_head_chunks(response.iter_content(PROFILE_CHUNK_SIZE), max_bytes)
+    finally:
+        response.close()
+    _count_bytes(response.headers, read)
+    return _decode(data, response.encoding)
+
+
+async def read_head_async(response, max_bytes: int = PROFILE_HEAD_MAX_BYTES) -> str:
+    """read_head for an httpx response opened with client.stream()."""
+    hb = HeadBuffer(max_bytes)
+    try:
+        async for chunk in response.aiter_bytes(PROFILE_CHUNK_SIZE):
+            if chunk and hb.feed(chunk):
+                break
+    finally:
+        await response.aclose()
+    _count_bytes(response.headers, hb.read)
+    return _decode(hb.head(), response.encoding)
+
+
+def _count_bytes(headers, read):
+    PROFILE_BYTES.inc("read", amount=read)
+    try:
+        PROFILE_BYTES.inc("advertised", amount=int(headers.get("Content-Length") or read))
+    except ValueError:
+        PROFILE_BYTES.inc("advertised", amount=read)
+
+
+############################################
+# Parsers: each returns (title, {meta key: content}, [json-ld text])
+############################################
+def _scan_selectolax(html):
+    tree = _SelectolaxParser(html)
+    node = tree.css_first("title")
+    title = node.text(strip=True) if node else None
+    metas = {}
+    for node in tree.css("meta"):
+        attrs = node.attributes
+        key = (attrs.get("property") or attrs.get("name") or "").lower()
+        if key and attrs.get("content") and key not in metas:
+            metas[key] = attrs["content"]
+    ld = [n.text() for n in tree.css('script[type="application/ld+json"]')]
+    return title, metas, ld
+
+
+def _scan_bs4(html):
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, "html.parser")
+    title = soup.title.string.strip() if soup.title and soup.title.string else None
+    metas = {}
+    for node in soup.find_all("meta"):
+        key = (node.get("property") or node.get("name") or "").lower()
+        if key and node.get("content") and key not in metas:
+            metas[key] = node["content"]
+    ld = [s.string or "" for s in soup.select('script[type="application/ld+json"]')]
+    return title, metas, ld
+
+
+_SCANNERS = {"selectolax": _scan_selectolax, "bs4": _scan_bs4}
+
+
+def scan_head(html: str, parser: str = None):
+    """(title, metas, json_ld) using `parser` or selectolax when installed; falls back to BeautifulSoup."""
+    try:
+        return _SCANNERS[parser or PARSER](html)
+    except Exception:
+        return _scan_bs4(html)
+
+
+def parse_profile_html(html_text: str, parser: str = None):
+    """Display name, bio and avatar from a profile page (or just its head)."""
+    result = {"display_name": None, "bio": None, "location": None, "avatar": None, "title": None, "evidence": []}
+    if not html_text:
+        return result
+    title, metas, ld = scan_head(html_text, parser)
+    result["title"] = title
+
+    # JSON-LD wins over meta tags
+    for text in ld:
+        try:
+            data = json.loads(text or "{}")
+            if isinstance(data, list):
+                data = data[0]
+            if data.get("name"):
+                result["display_name"] = data["name"]
+            if data.get("description"):
+                result["bio"] = data["description"]
+            if data.get("image"):
+                result["avatar"] = data["image"]
+        except Exception:
+            continue
+
+    result["display_name"] = result["display_name"] or metas.get("og:title") or metas.get("twitter:title")
+    result["bio"] = result["bio"] or metas.get("og:description") or metas.get("description")
+    result["avatar"] = result["avatar"] or metas.get("og:image") or metas.get("twitter:image")
+    return result
@@ -0,0 +1,414 @@
+# app/utils/resilience.py
+"""
+Upstream resilience for the scan fan-out: circuit breakers, adaptive
+timeouts, hedged GETs and a per-scan deadline budget.
+
+Every outbound call to a named provider ("vt", "shodan", "crtsh", ...) goes
+through `request()`, which
+
+  - refuses straight away while the provider's breaker is open. The breaker
+    opens when, over the last BREAKER_WINDOW calls (at least
+    BREAKER_MIN_CALLS), the error rate reaches BREAKER_ERROR_RATE or the
+    share of calls slower than BREAKER_SLOW_MS reaches BREAKER_SLOW_RATE.
+    After BREAKER_OPEN_SECONDS it lets BREAKER_HALF_OPEN_CALLS trial calls
+    through (half-open); they all succeed -> closed, one fails -> open again.
+  - sizes the timeout from the provider's recent latencies (p99 times
+    ADAPTIVE_TIMEOUT_MULT, never above the caller's timeout), and never past
+    the scan's deadline.
+  - for GET/HEAD, sends a second identical request when the first has not
+    answered within the provider's p95 and takes whichever answers first.
+    Hedges are limited to HEDGE_RATIO of the provider's requests.
+  - retries (when asked to) with jittered exponential backoff, but only
+    while the breaker and the deadline allow it.
+
+`deadline(seconds)` (or `set_deadline`/`reset_deadline`) sets the budget
+for everything the current scan does, including work submitted to
+executors through `metrics.submit`; `gather()`
+collects a fan-out and reports the sections still running when the budget
+runs out instead of waiting for them.
+
+RESILIENCE=false turns all of it off (fixed timeouts, no breaker, no hedge).
+"""
+import os
+import time
+import random
+import threading
+import contextvars
+import concurrent.futures
+from collections import deque
+from contextlib import contextmanager
+
+from app.utils.http import session
+from app.utils.metrics import register, Counter, Gauge, submit
+
+RESILIENCE = os.getenv("RESILIENCE", "true").lower() in ("1", "true", "yes", "on")
+
+BREAKER_WINDOW = int(os.getenv("BREAKER_WINDOW", "50"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "10"))
+BREAKER_ERROR_RATE = float(os.getenv("BREAKER_ERROR_RATE", "0.5"))
+BREAKER_SLOW_MS = float(os.getenv("BREAKER_SLOW_MS", "3000"))
+BREAKER_SLOW_RATE = float(os.getenv("BREAKER_SLOW_RATE", "0.8"))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+BREAKER_HALF_OPEN_CALLS = int(os.getenv("BREAKER_HALF_OPEN_CALLS", "3"))
+
+LATENCY_SAMPLES = int(os.getenv("LATENCY_SAMPLES", "200"))
+# percentiles are trusted (for timeouts and hedging) once this many calls succeeded
+LATENCY_MIN_SAMPLES = int(os.getenv("LATENCY_MIN_SAMPLES", "20"))
+ADAPTIVE_TIMEOUT_MULT = float(os.getenv("ADAPTIVE_TIMEOUT_MULT", "3"))
+ADAPTIVE_TIMEOUT_MIN_MS = float(os.getenv("ADAPTIVE_TIMEOUT_MIN_MS", "500"))
+
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_MS = float(os.getenv("HEDGE_MIN_MS", "20"))
+HEDGE_RATIO = float(os.getenv("HEDGE_RATIO", "0.1"))
+HEDGE_WORKERS = int(os.getenv("HEDGE_WORKERS", "128"))
+
+RETRY_BACKOFF_MS = float(os.getenv("RETRY_BACKOFF_MS", "200"))
+
+IDEMPOTENT = ("GET", "HEAD")
+STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+UPSTREAM_REQUESTS = register(Counter(
+    "shadowtrace_upstream_requests_total", "Upstream requests by provider and outcome.", ("provider", "result")))
+UPSTREAM_HEDGES = register(Counter(
+    "shadowtrace_upstream_hedges_total", "Hedged upstream requests sent, and how many answered first.",
+    ("provider", "outcome")))
+DEADLINE_EXCEEDED = register(Counter(
+    "shadowtrace_scan_deadline_exceeded_total", "Scan sections cut short by the deadline budget.", ("section",)))
+
+
+class Unavailable(Exception):
+    """The call was not made: breaker open or no budget left."""
+
+
+class CircuitOpen(Unavailable):
+    pass
+
+
+class DeadlineExceeded(Unavailable):
+    pass
+
+
+############################################
+# Deadline budget
+############################################
+_deadline = contextvars.ContextVar("shadowtrace_deadline", default=None)
+
+
+def set_deadline(seconds: float):
+    """Start a budget on the current context; nested budgets only ever shrink. 0/None leaves it unbounded."""
+    if not seconds or not RESILIENCE:
+        return None
+    at = time.monotonic() + seconds
+    outer = _deadline.get()
+    return _deadline.set(at if outer is None else min(at, outer))
+
+
+def reset_deadline(token):
+    if token is not None:
+        _deadline.reset(token)
+
+
+@contextmanager
+def deadline(seconds: float):
+    token = set_deadline(seconds)
+    try:
+        yield
+    finally:
+        reset_deadline(token)
+
+
+def remaining():
+    """Seconds left in the current budget, or None without one."""
+    at = _deadline.get()
+    return None if at is None else at - time.monotonic()
+
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def _cap(timeout, limit: float):
+    """A requests timeout (seconds or a (connect, read) tuple) no longer than `limit`."""
+    if isinstance(timeout, tuple):
+        return tuple(min(t, limit) for t in timeout)
+    return min(timeout, limit)
+
+
+def bounded(timeout):
+    """`timeout` cut to what is left of the budget; raises when nothing is."""
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        raise DeadlineExceeded("scan deadline exceeded")
+    return _cap(timeout, left)
+
+
+def gather(futures: dict) -> tuple:
+    """
+    Results of {section: future} as they finish, waiting no longer than the
+    budget. Returns (results, late): sections still running at the deadline
+    get an {"ok": False, "partial": True} result and are listed in `late`.
+    """
+    done, _ = concurrent.futures.wait(futures.values(), timeout=remaining() if RESILIENCE else None)
+    results, late = {}, []
+    for name, f in futures.items():
+        if f in done:
+            results[name] = f.result()
+        else:
+            f.cancel()
+            late.append(name)
+            results[name] = {"ok": False, "error": "scan deadline exceeded", "partial": True}
+            DEADLINE_EXCEEDED.inc(name)
+    return results, late
+
+
+############################################
+# Circuit breaker
+############################################
+class Breaker:
+    def __init__(self, name):
+        self.name = name
+        self.lock = threading.Lock()
+        self.state = "closed"
+        self.outcomes = deque(maxlen=BREAKER_WINDOW)  # (failed, slow)
+        self.opened_at = 0.0
+        self.trials = 0
+        self.trial_ok = 0
+        self.opens = 0
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open":
+                if time.monotonic() - self.opened_at < BREAKER_OPEN_SECONDS:
+                    return False
+                self.state = "half_open"
+                self.trials = self.trial_ok = 0
+            if self.trials >= BREAKER_HALF_OPEN_CALLS:
+                return False
+            self.trials += 1
+            return True
+
+    def _open(self):
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self.outcomes.clear()
+        self.opens += 1
+        print(f"[resilience] circuit for {self.name} opened")
+
+    def record(self, failed: bool, seconds: float):
+        slow = seconds * 1000 >= BREAKER_SLOW_MS
+        with self.lock:
+            if self.state == "half_open":
+                if failed or slow:
+                    self._open()
+                else:
+                    self.trial_ok += 1
+                    if self.trial_ok >= BREAKER_HALF_OPEN_CALLS:
+                        self.state = "closed"
+                        print(f"[resilience] circuit for {self.name} closed")
+                return
+            if self.state == "open":
+                return  # started before the breaker opened
+            self.outcomes.append((failed, slow))
+            n = len(self.outcomes)
+            if n < BREAKER_MIN_CALLS:
+                return
+            errors = sum(f for f, _ in self.outcomes)
+            slows = sum(s for _, s in self.outcomes)
+            if errors / n >= BREAKER_ERROR_RATE or slows / n >= BREAKER_SLOW_RATE:
+                self._open()
+
+
+############################################
+# Providers
+############################################
+class Provider:
+    """Breaker, latency window and hedge allowance for one upstream."""
+
+    def __init__(self, name):
+        self.name = name
+        self.breaker = Breaker(name)
+        self.lock = threading.Lock()
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)  # seconds, successful calls only
+        self.hedge_tokens = 1.0
+
+    def percentile(self, p):
+        with self.lock:
+            if len(self.latencies) < LATENCY_MIN_SAMPLES:
+                return None
+            s = sorted(self.latencies)
+        return s[min(len(s) - 1, int(len(s) * p / 100))]
+
+    def timeout(self, default):
+        p99 = self.percentile(99)
+        if p99 is None:
+            return default
+        return _cap(default, max(ADAPTIVE_TIMEOUT_MIN_MS / 1000, p99 * ADAPTIVE_TIMEOUT_MULT))
+
+    def hedge_delay(self):
+        p = self.percentile(HEDGE_PERCENTILE)
+        return None if p is None else max(HEDGE_MIN_MS / 1000, p)
+
+    def take_hedge(self) -> bool:
+        with self.lock:
+            if self.hedge_tokens < 1:
+                return False
+            self.hedge_tokens -= 1
+            return True
+
+    def record(self, ok: bool, seconds: float):
+        with self.lock:
+            if ok:
+                self.latencies.append(seconds)
+            # every request earns a fraction of a hedge, so hedges stay under HEDGE_RATIO
+            self.hedge_tokens = min(10.0, self.hedge_tokens + HEDGE_RATIO)
+        self.breaker.record(not ok, seconds)
+        UPSTREAM_REQUESTS.inc(self.name, "ok" if ok else "error")
+
+    def stats(self):
+        p50, p95, p99 = (self.percentile(p) for p in (50, 95, 99))
+        ms = lambda v: None if v is None else round(v * 1000, 1)
+        return {"state": self.breaker.state, "opens": self.breaker.opens, "samples": len(self.latencies),
+                "p50_ms": ms(p50), "p95_ms": ms(p95), "p99_ms": ms(p99)}
+
+
+_providers_lock = threading.Lock()
+providers = {}
+
+
+def provider(name: str) -> Provider:
+    p = providers.get(name)
+    if p is None:
+        with _providers_lock:
+            p = providers.setdefault(name, Provider(name))
+    return p
+
+
+def stats():
+    return {name: p.stats() for name, p in sorted(providers.items())}
+
+
+############################################
+# Requests
+############################################
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _executor():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = concurrent.futures.ThreadPoolExecutor(HEDGE_WORKERS, thread_name_prefix="hedge")
+    return _pool
+
+
+def _failed(r) -> bool:
+    return r.status_code >= 500 or r.status_code == 429
+
+
+def _send(p: Provider, method, url, timeout, kwargs):
+    t0 = time.perf_counter()
+    try:
+        r = session.request(method, url, timeout=timeout, **kwargs)
+    except Exception:
+        p.record(False, time.perf_counter() - t0)
+        raise
+    p.record(not _failed(r), time.perf_counter() - t0)
+    return r
+
+
+def _discard(f):
+    if not f.cancelled() and f.exception() is None:
+        f.result().close()
+
+
+def _hedged(p: Provider, method, url, timeout, kwargs):
+    delay = p.hedge_delay()
+    if delay is None or delay >= (max(timeout) if isinstance(timeout, tuple) else timeout):
+        return _send(p, method, url, timeout, kwargs)
+    pool = _executor()
+    first = submit(pool, _send, p, method, url, timeout, kwargs)
+    try:
+        return first.result(timeout=delay)
+    except concurrent.futures.TimeoutError:
+        pass
+    left = remaining()
+    if p.breaker.state != "closed" or (left is not None and left <= 0) or not p.take_hedge():
+        return first.result()
+    second = submit(pool, _send, p, method, url, bounded(timeout), kwargs)
+    UPSTREAM_HEDGES.inc(p.name, "sent")
+    pending, last = {first, second}, None
+    while pending:
+        done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+        for f in done:
+            if f.exception() is None and not _failed(f.result()):
+                if f is second:
+                    UPSTREAM_HEDGES.inc(p.name, "won")
+                for other in pending:
+                    other.add_done_callback(_discard)
+                if last is not None:
+                    _discard(last)
+                return f.result()
+            if last is not None:
+                _discard(last)
+            last = f
+    return last.result()
+
+
+def request(name: str, method: str, url: str, timeout=6, retries: int = 0, hedge: bool = True, **kwargs):
+    """
+    session.request through provider `name`'s breaker, adaptive timeout and
+    (GET/HEAD) hedging. Returns the response, 5xx included; raises on
+    transport errors, an open breaker or an exhausted budget.
+    """
+    method = method.upper()
+    if not RESILIENCE:
+        for attempt in range(retries + 1):
+            try:
+                return session.request(method, url, timeout=timeout, **kwargs)
+            except Exception:
+                if attempt == retries:
+                    raise
+                time.sleep(RETRY_BACKOFF_MS / 1000)
+
+    p = provider(name)
+    hedge = hedge and method in IDEMPOTENT
+    for attempt in range(retries + 1):
+        # the budget is checked first: a half-open trial slot taken by a call that
+        # is never sent would not be handed back, and the breaker would stay shut
+        t = bounded(p.timeout(timeout))
+        if not p.breaker.allow():
+            UPSTREAM_REQUESTS.inc(name, "rejected")
+            raise CircuitOpen(f"circuit open for {name}")
+        try:
+            r = _hedged(p, method, url, t, kwargs) if hedge else _send(p, method, url, t, kwargs)
+            if not _failed(r) or attempt == retries:
+                return r
+            r.close()
+        except Exception:
+            if attempt == retries:
+                raise
+        # full jitter; skipped when the wait alone would use up the budget
+        backoff = random.uniform(0, RETRY_BACKOFF_MS / 1000 * 2 ** attempt)
+        left = remaining()
+        if left is not None and left <= backoff:
+            raise DeadlineExceeded("scan deadline exceeded")
+        time.sleep(backoff)
+
+
+def get(name: str, url: str, **kwargs):
+    return request(name, "GET", url, **kwargs)
+
+
+def head(name: str, url: str, **kwargs):
+    return request(name, "HEAD", url, **kwargs)
+
+
+register(Gauge("shadowtrace_upstream_breaker_state", "Circuit breaker state (0 closed, 1 half-open, 2 open).",
+               ("provider",), fn=lambda: {(n,): STATES[p.breaker.state] for n, p in list(providers.items())}))
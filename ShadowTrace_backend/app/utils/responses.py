@@ -0,0 +1,269 @@
+# app/utils/responses.py
+"""
+JSON serialization, conditional GETs and compression for API responses.
+
+`FastJSONResponse` renders with orjson (stdlib json when orjson is missing)
+and is the app's default response class. Endpoints that return large
+documents build it themselves (`json_response`) so FastAPI's
+jsonable_encoder pass is skipped as well.
+
+Polled read endpoints tag their body with a strong ETag computed from the
+document's `updated_at`/version (`etag`). A request whose If-None-Match
+names the current tag gets `304 Not Modified` (`fresh` / `not_modified`)
+before the full document is read, hydrated or serialized.
+
+`CompressionMiddleware` encodes JSON and text bodies of COMPRESS_MIN_BYTES
+or more with brotli (when the `brotli` package is installed and the client
+accepts it) or gzip. Streamed bodies are compressed chunk by chunk. The
+encoding is appended to the ETag (`"<tag>-br"`), as a strong validator must
+differ per content coding; `fresh` accepts either form.
+"""
+import os
+import json
+import zlib
+import hashlib
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from app.utils.metrics import register, Counter
+
+COMPRESS = os.getenv("COMPRESS", "1") == "1"
+COMPRESS_MIN_BYTES = int(os.getenv("COMPRESS_MIN_BYTES", "1024"))
+COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "6"))
+# quality 11 costs ~50x the CPU of 4 for a few percent more; 4-5 is the usual on-the-fly setting
+COMPRESS_BROTLI_QUALITY = int(os.getenv("COMPRESS_BROTLI_QUALITY", "4"))
+
+COMPRESSIBLE_TYPES = ("application/json", "text/", "application/javascript", "application/xml",
+                      "application/x-ndjson", "image/svg+xml")
+ENCODINGS = ("br", "gzip")
+
+CONDITIONAL = register(Counter(
+    "shadowtrace_conditional_requests_total",
+    "Conditional GETs by endpoint and result (not_modified or full).", ("endpoint", "result")))
+RESPONSE_BYTES = register(Counter(
+    "shadowtrace_response_bytes_total",
+    "Response body bytes before (identity) and after compression, by encoding.", ("encoding", "stage")))
+
+
+############################################
+# Serialization
+############################################
+_orjson = None
+
+
+def _default(o):
+    if isinstance(o, (set, frozenset)):
+        return list(o)
+    if isinstance(o, bytes):
+        return o.decode(errors="replace")
+    # ObjectId, Decimal128 and anything else Mongo hands back
+    return str(o)
+
+
+def dumps(content) -> bytes:
+    global _orjson
+    if _orjson is None:
+        try:
+            import orjson
+            _orjson = orjson
+        except ImportError:
+            _orjson = False
+    if _orjson:
+        try:
+            return _orjson.dumps(content, default=_default, option=_orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass  # ints beyond 64 bits and other values orjson refuses
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class FastJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+############################################
+# ETags / conditional GETs
+############################################
+def etag(*parts) -> str:
+    """Strong ETag over the values that change whenever the representation does."""
+    h = hashlib.blake2b("\x1f".join(map(str, parts)).encode(), digest_size=12)
+    return f'"{h.hexdigest()}"'
+
+
+def _opaque(tag: str) -> str:
+    tag = tag.strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    tag = tag.strip('"')
+    for enc in ENCODINGS:
+        if tag.endswith("-" + enc):
+            return tag[:-len(enc) - 1]
+    return tag
+
+
+def fresh(request: Request, tag: str) -> bool:
+    """True when the client's If-None-Match already names `tag` (in any content coding)."""
+    header = request.headers.get("if-none-match")
+    route = request.scope.get("route")
+    endpoint = getattr(route, "path", request.url.path)
+    if not header:
+        return False
+    want = _opaque(tag)
+    hit = header.strip() == "*" or any(_opaque(t) == want for t in header.split(","))
+    CONDITIONAL.inc(endpoint, "not_modified" if hit else "full")
+    return hit
+
+
+def _cache_headers(tag: str) -> dict:
+    # clients may keep the body but must revalidate before every use
+    return {"ETag": tag, "Cache-Control": "no-cache"}
+
+
+def not_modified(tag: str) -> Response:
+    return Response(status_code=304, headers=_cache_headers(tag))
+
+
+def json_response(content, tag: str = None, status_code: int = 200) -> FastJSONResponse:
+    return FastJSONResponse(content, status_code=status_code, headers=_cache_headers(tag) if tag else None)
+
+
+############################################
+# Compression
+############################################
+_brotli = None
+
+
+def _brotli_module():
+    global _brotli
+    if _brotli is None:
+        try:
+            import brotli
+            _brotli = brotli
+        except ImportError:
+            _brotli = False
+    return _brotli or None
+
+
+def choose_encoding(accept: str):
+    """Best coding the client accepts: br, then gzip, else None."""
+    accepted = {}
+    for part in (accept or "").split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        for p in params.split(";"):
+            k, _, v = p.strip().partition("=")
+            if k == "q":
+                try:
+                    q = float(v)
+                except ValueError:
+                    q = 0.0
+        accepted[name.strip().lower()] = q
+    for enc in ENCODINGS:
+        if enc == "br" and _brotli_module() is None:
+            continue
+        if accepted.get(enc, accepted.get("*", 0)) > 0:
+            return enc
+    return None
+
+
+class _Encoder:
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == "br":
+            self.c = _brotli_module().Compressor(quality=COMPRESS_BROTLI_QUALITY)
+        else:
+            self.c = zlib.compressobj(COMPRESS_GZIP_LEVEL, zlib.DEFLATED, 31)  # 31: gzip container
+
+    def chunk(self, data: bytes) -> bytes:
+        """Compress and flush, so each streamed chunk reaches the client without waiting for the next."""
+        if self.encoding == "br":
+            return self.c.process(data) + self.c.flush()
+        return self.c.compress(data) + self.c.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        if self.encoding == "br":
+            return self.c.process(data) + self.c.finish()
+        return self.c.compress(data) + self.c.flush()
+
+
+class CompressionMiddleware:
+    """ASGI middleware: brotli/gzip for compressible bodies over a size threshold."""
+
+    def __init__(self, app, minimum_size: int = COMPRESS_MIN_BYTES):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not COMPRESS:
+            return await self.app(scope, receive, send)
+        accept = next((v.decode("latin-1") for k, v in scope["headers"] if k == b"accept-encoding"), "")
+        encoding = choose_encoding(accept)
+        if encoding is None:
+            return await self.app(scope, receive, send)
+
+        start = None
+        encoder = None  # set once the body is being compressed
+        passthrough = False
+
+        async def wrapped(message):
+            nonlocal start, encoder, passthrough
+            if passthrough:
+                return await send(message)
+            if message["type"] == "http.response.start":
+                headers = {k.lower(): v for k, v in message.get("headers", [])}
+                ctype = headers.get(b"content-type", b"").decode("latin-1")
+                if (b"content-encoding" in headers or message["status"] in (204, 304) or message["status"] < 200
+                        or not ctype.startswith(COMPRESSIBLE_TYPES)):
+                    passthrough = True
+                    return await send(message)
+                start = message  # held until the first body chunk says how big the body is
+                return
+            if message["type"] != "http.response.body":
+                return await send(message)
+
+            body = message.get("body", b"")
+            more = message.get("more_body", False)
+            if encoder is None:
+                if not more and len(body) < self.minimum_size:
+                    passthrough = True
+                    await send(start)
+                    return await send(message)
+                encoder = _Encoder(encoding)
+                out = encoder.chunk(body) if more else encoder.finish(body)
+                # whole bodies keep a (corrected) Content-Length; streamed ones go chunked
+                await send({**start, "headers": _encoded_headers(start.get("headers", []), encoding,
+                                                                None if more else len(out))})
+            else:
+                out = encoder.chunk(body) if more else encoder.finish(body)
+            RESPONSE_BYTES.inc(encoding, "identity", amount=len(body))
+            RESPONSE_BYTES.inc(encoding, "encoded", amount=len(out))
+            await send({"type": "http.response.body", "body": out, "more_body": more})
+
+        await self.app(scope, receive, wrapped)
+
+
+def _encoded_headers(raw, encoding: str, length):
+    out = []
+    vary = None
+    for k, v in raw:
+        name = k.lower()
+        if name == b"content-length":
+            continue
+        if name == b"etag" and v.endswith(b'"') and not v.startswith(b"W/"):
+            v = v[:-1] + f"-{encoding}".encode() + b'"'
+        if name == b"vary":
+            vary = v
+            continue
+        out.append((k, v))
+    if length is not None:
+        out.append((b"content-length", str(length).encode()))
+    out.append((b"content-encoding", encoding.encode()))
+    if vary is None:
+        vary = b"Accept-Encoding"
+    elif b"accept-encoding" not in vary.lower() and vary.strip() != b"*":
+        vary += b", Accept-Encoding"
+    out.append((b"vary", vary))
+    return out
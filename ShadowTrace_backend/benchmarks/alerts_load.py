@@ -0,0 +1,96 @@
+"""
+Alert dispatcher load test against a local webhook sink.
+
+    python -m benchmarks.alerts_load --alerts 50000 --destinations 4
+
+Starts a minimal HTTP sink on 127.0.0.1, points an AlertDispatcher at it and
+reports end-to-end delivered alerts/sec (all destinations included).
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from app.utils.alerts import AlertDispatcher
+
+
+class WebhookSink:
+    """Tiny asyncio HTTP/1.1 server that counts alerts in digest payloads."""
+
+    def __init__(self, fail_every: int = 0):
+        self.alerts = 0
+        self.requests = 0
+        self.fail_every = fail_every
+        self.server = None
+
+    async def start(self, host="127.0.0.1", port=0):
+        self.server = await asyncio.start_server(self._handle, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                body = await reader.readexactly(length)
+                self.requests += 1
+                if self.fail_every and self.requests % self.fail_every == 0:
+                    writer.write(b"HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\n\r\n")
+                else:
+                    self.alerts += json.loads(body)["count"]
+                    writer.write(b"HTTP/1.1 204 No Content\r\nContent-Length: 0\r\n\r\n")
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError):
+            pass
+        finally:
+            writer.close()
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+async def main(n_alerts, n_dest, batch_size, fail_every):
+    sink = WebhookSink(fail_every=fail_every)
+    port = await sink.start()
+    urls = [f"http://127.0.0.1:{port}/hook/{i}" for i in range(n_dest)]
+    d = AlertDispatcher(webhooks=urls, batch_size=batch_size, batch_window=0.05, retry_base=0.01)
+    await d.start()
+
+    alert = {"title": "High risk ip: 203.0.113.7", "severity": "high",
+             "description": "load test", "timestamp": "2025-01-01T00:00:00"}
+    t0 = time.perf_counter()
+    for i in range(n_alerts):
+        d.enqueue({**alert, "seq": i})
+        if i % 1000 == 0:
+            await asyncio.sleep(0)  # let the router run, like a live producer would
+    await d.stop(drain_timeout=120)
+    elapsed = time.perf_counter() - t0
+    await sink.stop()
+
+    delivered = sum(x.delivered for x in d.destinations)
+    print(json.dumps({
+        "alerts_enqueued": n_alerts,
+        "destinations": n_dest,
+        "deliveries": delivered,
+        "sink_alerts": sink.alerts,
+        "http_requests": sink.requests,
+        "dead_lettered": sum(x.dead_lettered for x in d.destinations),
+        "dropped": d.dropped + sum(x.dropped for x in d.destinations),
+        "elapsed_s": round(elapsed, 3),
+        "alerts_per_sec": round(n_alerts / elapsed),
+        "deliveries_per_sec": round(delivered / elapsed),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--alerts", type=int, default=50000)
+    ap.add_argument("--destinations", type=int, default=4)
+    ap.add_argument("--batch-size", type=int, default=500)
+    ap.add_argument("--fail-every", type=int, default=0, help="answer 503 to every Nth request")
+    args = ap.parse_args()
+    asyncio.run(main(args.alerts, args.destinations, args.batch_size, args.fail_every))
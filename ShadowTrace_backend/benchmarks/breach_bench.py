@@ -0,0 +1,116 @@
+"""
+Local breach index: ingest throughput and lookup latency.
+
+    python -m benchmarks.breach_bench --accounts 2000000 --run-records 500000
+
+Writes two synthetic combo dumps (email:password, --overlap of the second
+dump's accounts also in the first) and a Pwned Passwords style
+"SHA1:COUNT" file, ingests them one after another (so the second and third
+merge with the index already on disk, in runs of --run-records), then
+times single and bulk email lookups (hits and misses), SHA-1 lookups and
+range queries. A sample is checked against the dumps.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+from app.services import breach_index as bi
+
+
+def write_dumps(d, n, overlap, rnd):
+    first = [f"user{i}@example{i % 97}.com" for i in range(n)]
+    shared = rnd.sample(first, int(n * overlap))
+    second = shared + [f"other{i}@example{i % 89}.org" for i in range(n - len(shared))]
+    paths = []
+    for name, accounts in (("breach-a", first), ("breach-b", second)):
+        path = os.path.join(d, f"{name}.txt")
+        with open(path, "w") as f:
+            for a in accounts:
+                f.write(f"{a}:pw{rnd.randrange(n // 4)}\n")
+        paths.append(path)
+    sha = os.path.join(d, "pwned.txt")
+    with open(sha, "w") as f:
+        for i in range(n // 2):
+            f.write(f"{hashlib.sha1(f'pp{i}'.encode()).hexdigest().upper()}:{i % 50 + 1}\n")
+    return first, second, shared, paths + [sha]
+
+
+def timed_each(fn, items):
+    out = []
+    for x in items:
+        t0 = time.perf_counter()
+        fn(x)
+        out.append((time.perf_counter() - t0) * 1e6)
+    return {"n": len(out), "p50_us": round(statistics.median(out), 1),
+            "p99_us": round(sorted(out)[int(len(out) * 0.99)], 1)}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--accounts", type=int, default=2000000)
+    ap.add_argument("--overlap", type=float, default=0.3)
+    ap.add_argument("--run-records", type=int, default=500000)
+    ap.add_argument("--lookups", type=int, default=100000)
+    args = ap.parse_args()
+
+    bi.BREACH_RUN_RECORDS = args.run_records
+    rnd = random.Random(9)
+    d = tempfile.mkdtemp(prefix="shadowtrace_breach_")
+    first, second, shared, (path_a, path_b, path_sha) = write_dumps(d, args.accounts, args.overlap, rnd)
+    out = os.path.join(d, "index")
+
+    ingest = []
+    for name, fmt, path in (("breach-a", "combo", path_a), ("breach-b", "combo", path_b),
+                            ("pwned-passwords", "sha1count", path_sha)):
+        lines = sum(1 for _ in open(path))
+        t0 = time.perf_counter()
+        bi.ingest([(name, fmt, [path])], out)
+        s = time.perf_counter() - t0
+        ingest.append({"breach": name, "lines": lines, "seconds": round(s, 1), "lines_per_sec": round(lines / s)})
+
+    index = bi.BreachIndex(out)
+    index.load()
+    size_mb = sum(os.path.getsize(os.path.join(out, f)) for f in os.listdir(out)) / 2 ** 20
+
+    hits = rnd.sample(first, args.lookups)
+    misses = [f"nobody{i}@nowhere.test" for i in range(args.lookups)]
+    shas = [hashlib.sha1(f"pp{rnd.randrange(args.accounts // 2)}".encode()).hexdigest() for _ in range(args.lookups)]
+    report = {
+        "accounts_per_dump": args.accounts,
+        "ingest": ingest,
+        "records": index.meta["counts"],
+        "breach_sets": len(index.meta["sets"]),
+        "index_mb": round(size_mb, 1),
+        "email_hit": timed_each(lambda e: index.lookup(e, "email"), hits),
+        "email_miss": timed_each(lambda e: index.lookup(e, "email"), misses),
+        "sha1_hit": timed_each(lambda h: index.lookup(h, "sha1"), shas),
+        "range": timed_each(lambda p: index.range(p), [h[:5] for h in shas[:10000]]),
+    }
+    t0 = time.perf_counter()
+    bulk = index.lookup_many(hits + misses, "email")
+    report["bulk_lookups_per_sec"] = round(len(bulk) / (time.perf_counter() - t0))
+
+    shared_set, second_set = set(shared), set(second)
+    wrong = 0
+    for e in rnd.sample(first, 5000) + rnd.sample(second, 5000):
+        want = sorted((["breach-a"] if e.startswith("user") else []) + (["breach-b"] if e in second_set else []))
+        if e in shared_set:
+            want = ["breach-a", "breach-b"]
+        got = index.lookup(e, "email")
+        wrong += (sorted(got["breaches"]) if got else []) != want
+    wrong += sum(index.lookup(e, "email") is not None for e in misses[:5000])
+    report["verified"] = 15000
+    report["mismatches"] = wrong
+
+    shutil.rmtree(d, ignore_errors=True)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Indicator classifier throughput.
+
+    python -m benchmarks.classifier_bench --lines 1000000 [--unique 0.2] [--file iocs.txt]
+
+Compares app.utils.indicators.classify_many with the previous sequential
+detect_entity (five regexes + hand-split IPv4) over a mixed IOC corpus. The legacy function neither canonicalizes nor knows
+IPv6/CIDR/URL/hash/wallet, so it is a lower bound rather than a like-for-like.
+"""
+import argparse
+import json
+import random
+import re
+import time
+
+from app.utils.indicators import classify_many
+
+SAMPLES = [
+    "8.8.8.8", "10.1.2.3", "203.0.113.77", "2001:4860:4860::8888", "fe80::1",
+    "192.168.0.0/16", "https://Evil.example.net/login?x=1", "alice@example.com",
+    "example.org", "sub.domain.co.uk", "d41d8cd98f00b204e9800998ecf8427e",
+    "e3b0c44298fc1c149afbf4c8996fb92427ae41e4649b934ca495991b7852b855",
+    "0x52908400098527886E0F7030069857D2E4169EE7", "1BoatSLRHtKNngkdXEeobR76b53LETtpyT",
+    "+91 81234-56789", "john_doe", "not an indicator",
+]
+
+# previous implementation, kept here only as the comparison baseline
+_IPV4 = re.compile(r"^\s*(?:\d{1,3}\.){3}\d{1,3}\s*$")
+_DOMAIN = re.compile(r"^(?!-)(?:[a-zA-Z0-9-]{1,63}\.)+[a-zA-Z]{2,63}$")
+_EMAIL = re.compile(r"^[^@]+@[^@]+\.[^@]+$")
+_PHONE = re.compile(r"^\+?\d[\d\s\-()]{5,}$")
+_USERNAME = re.compile(r"^[a-zA-Z0-9_.-]{3,}$")
+
+
+def legacy_detect_entity(q):
+    q = q.strip()
+    if _IPV4.match(q):
+        parts = list(map(int, q.split(".")))
+        if (parts[0] == 10) or (parts[0] == 172 and 16 <= parts[1] <= 31) or (parts[0] == 192 and parts[1] == 168):
+            return "private_ip"
+        return "ip"
+    if _EMAIL.match(q): return "email"
+    if _DOMAIN.match(q): return "domain"
+    if _PHONE.match(q): return "phone"
+    if _USERNAME.match(q): return "username"
+    return "unknown"
+
+
+def synthetic_corpus(n, unique_ratio, seed=42):
+    """
+    Mixed IOC lines. `unique_ratio` of them are freshly generated (random IPs,
+    hashes, addresses); the rest repeat earlier lines, as feed dumps do.
+    """
+    rnd = random.Random(seed)
+    makers = [
+        lambda: ".".join(str(rnd.randrange(256)) for _ in range(4)),
+        lambda: "2001:%x:%x::%x" % (rnd.randrange(65536), rnd.randrange(65536), rnd.randrange(65536)),
+        lambda: "%x" % rnd.getrandbits(128),
+        lambda: "%064x" % rnd.getrandbits(256),
+        lambda: "user%d@mail%d.example.com" % (rnd.randrange(10**6), rnd.randrange(100)),
+        lambda: "host%d.example%d.net" % (rnd.randrange(10**6), rnd.randrange(100)),
+        lambda: "https://cdn%d.example.org/p/%d" % (rnd.randrange(1000), rnd.randrange(10**6)),
+        lambda: "user_%d" % rnd.randrange(10**6),
+        lambda: rnd.choice(SAMPLES),
+    ]
+    lines = []
+    for _ in range(n):
+        if lines and rnd.random() >= unique_ratio:
+            lines.append(lines[rnd.randrange(len(lines))])
+        else:
+            lines.append(rnd.choice(makers)())
+    return lines
+
+
+def timed(fn, lines):
+    t0 = time.perf_counter()
+    fn(lines)
+    return time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lines", type=int, default=1_000_000)
+    ap.add_argument("--unique", type=float, default=1.0,
+                    help="fraction of distinct lines in the synthetic corpus (feeds are often ~0.2)")
+    ap.add_argument("--file", help="newline-separated indicators instead of the synthetic corpus")
+    args = ap.parse_args()
+
+    if args.file:
+        with open(args.file, encoding="utf-8", errors="replace") as f:
+            lines = f.read().splitlines()
+    else:
+        lines = synthetic_corpus(args.lines, args.unique)
+
+    new = timed(classify_many, lines)
+    old = timed(lambda ls: [legacy_detect_entity(x) for x in ls], lines)
+    print(json.dumps({
+        "lines": len(lines),
+        "distinct": len(set(lines)),
+        "classify_many_lines_per_sec": round(len(lines) / new),
+        "legacy_detect_entity_lines_per_sec": round(len(lines) / old),
+        "speedup": round(old / new, 2),
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+DNS stage throughput against a local stub DNS server.
+
+    python -m benchmarks.dns_bench --names 5000 --in-flight 256
+
+The stub answers A/AAAA/MX/NS/TXT for *.bench.test (TTL 300), NXDOMAIN for
+nx-*.bench.test with an SOA in the authority section, so both the positive
+and the negative cache are exercised. Answers are delayed by --latency-ms to
+stand in for a real recursive resolver's round trip. Reports cold (all misses) and warm
+(cache) resolutions/sec, plus the old path: blocking dns.resolver calls from
+a 16-thread pool.
+"""
+import argparse
+import asyncio
+import concurrent.futures
+import json
+import multiprocessing
+import time
+
+import dns.message
+import dns.rcode
+import dns.resolver
+import dns.rrset
+
+from app.services.dns_stage import DNSStage
+
+ZONE = "bench.test."
+RDATA = {
+    "A": "192.0.2.10",
+    "AAAA": "2001:db8::10",
+    "MX": "10 mail.bench.test.",
+    "NS": "ns1.bench.test.",
+    "TXT": '"v=spf1 -all"',
+}
+
+
+class StubDNS(asyncio.DatagramProtocol):
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        q = dns.message.from_wire(data)
+        resp = dns.message.make_response(q)
+        question = q.question[0]
+        name = question.name.to_text()
+        rtype = dns.rdatatype.to_text(question.rdtype)
+        if name.startswith("nx-") or not name.endswith(ZONE):
+            resp.set_rcode(dns.rcode.NXDOMAIN)
+            resp.authority.append(dns.rrset.from_text(
+                ZONE, 300, "IN", "SOA", "ns1.bench.test. admin.bench.test. 1 3600 600 86400 60"))
+        elif rtype in RDATA:
+            resp.answer.append(dns.rrset.from_text(name, 300, "IN", rtype, RDATA[rtype]))
+        wire = resp.to_wire()
+        if self.latency:
+            asyncio.get_running_loop().call_later(self.latency, self.transport.sendto, wire, addr)
+        else:
+            self.transport.sendto(wire, addr)
+
+
+def _serve(port_conn, latency):
+    async def run():
+        loop = asyncio.get_running_loop()
+        transport, _ = await loop.create_datagram_endpoint(lambda: StubDNS(latency), local_addr=("127.0.0.1", 0))
+        port_conn.send(transport.get_extra_info("sockname")[1])
+        await asyncio.Event().wait()
+    asyncio.run(run())
+
+
+def start_stub(latency=0.0):
+    """Run the stub in a child process so it does not share our GIL; returns (port, process)."""
+    parent, child = multiprocessing.Pipe()
+    proc = multiprocessing.Process(target=_serve, args=(child, latency), daemon=True)
+    proc.start()
+    return parent.recv(), proc
+
+
+def legacy(names, port, rtype="A"):
+    r = dns.resolver.Resolver(configure=False)
+    r.nameservers = ["127.0.0.1"]
+    r.port = port
+
+    def one(n):
+        try:
+            return [i.to_text() for i in r.resolve(n, rtype, lifetime=4)]
+        except Exception as e:
+            return {"error": str(e)}
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=16) as ex:
+        return list(ex.map(one, names))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--names", type=int, default=5000)
+    ap.add_argument("--in-flight", type=int, default=256)
+    ap.add_argument("--nx-ratio", type=float, default=0.1)
+    ap.add_argument("--latency-ms", type=float, default=20, help="simulated upstream round trip")
+    args = ap.parse_args()
+
+    port, stub = start_stub(args.latency_ms / 1000)
+    n_nx = int(args.names * args.nx_ratio)
+    names = [f"h{i}.bench.test" for i in range(args.names - n_nx)] + [f"nx-{i}.bench.test" for i in range(n_nx)]
+    rtypes = ("A", "MX")
+
+    stage = DNSStage(nameservers=["127.0.0.1"], port=port, max_in_flight=args.in_flight)
+    t0 = time.perf_counter()
+    cold = stage.resolve_many_sync(names, rtypes)
+    t_cold = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    stage.resolve_many_sync(names, rtypes)
+    t_warm = time.perf_counter() - t0
+
+    lookups = len(names) * len(rtypes)
+    t0 = time.perf_counter()
+    for rt in rtypes:
+        legacy(names, port, rt)
+    t_legacy = time.perf_counter() - t0
+
+    ok = sum(1 for r in cold.values() if isinstance(r["A"], list))
+    print(json.dumps({
+        "lookups": lookups,
+        "resolved_A": ok,
+        "stage_cold_per_sec": round(lookups / t_cold),
+        "stage_warm_per_sec": round(lookups / t_warm),
+        "legacy_threadpool_per_sec": round(lookups / t_legacy),
+        "stats": stage.stats(),
+    }, indent=2))
+    stub.terminate()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+Analytics export throughput and memory over millions of documents.
+
+    python -m benchmarks.export_bench --scans 2000000 --cases 20000
+
+Generates search_logs-shaped documents (a fifth of them username scans with
+social platform results) and osint_cases documents with --entities
+SpiderFoot entities each, lazily, so the generator itself holds nothing.
+They are fed through app.services.analytics_export exactly as a Mongo
+cursor would be:
+
+    parquet   export_docs: partitioned Parquet, incremental runs of --runs
+              slices (each run adds files next to the previous ones)
+    arrow     stream_docs: the Arrow IPC stream served over HTTP
+
+Reports documents/sec, rows/sec, output size and RSS sampled every
+--sample documents (flat RSS = constant memory), then reads the Parquet
+dataset back with hive partitioning and checks the row counts.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from app.services import analytics_export as ax
+
+ENTITIES = ("ip", "domain", "email", "username", "hash", "url")
+PLATFORMS = ("github", "twitter", "reddit", "instagram", "tiktok", "medium", "gitlab", "keybase", "hackernews", "devto")
+RULES = ("vt_malicious", "abuse_high", "breached", "new_domain", "open_ports", "many_profiles")
+
+
+def rss_mb():
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+
+
+def scan_docs(n, start, rnd):
+    t = start
+    for i in range(n):
+        t += timedelta(seconds=rnd.random() * 2)
+        entity = ENTITIES[i % 5] if i % 5 else "username"
+        doc = {
+            "_id": ObjectId(), "query": f"target{i}.example.com", "source": "api", "status": "done",
+            "created_at": t, "updated_at": t + timedelta(seconds=3), "threat_model": "v3",
+            "timings": {"total_ms": rnd.random() * 4000},
+            "results": {
+                "meta": {"entity": entity},
+                "threat_score": {"score": rnd.randrange(100), "risk_level": rnd.choice(("low", "medium", "high")),
+                                 "rules": rnd.sample(RULES, 2), "model": "v3",
+                                 "evidence": {"vt_malicious": rnd.randrange(20), "abuse_score": rnd.randrange(100)}},
+            },
+        }
+        if entity == "username":
+            doc["results"]["social_profile"] = {"platforms": {p: {
+                "exists": bool(rnd.getrandbits(1)), "status": 200, "url": f"https://{p}.com/target{i}",
+                "display_name": f"Target {i}", "match_score": rnd.randrange(100), "likely_face": None,
+            } for p in PLATFORMS}}
+        yield doc
+
+
+def case_docs(n, entities, start, rnd):
+    for i in range(n):
+        yield {"_id": ObjectId(), "case_id": f"case{i % 500}", "scan_id": f"SF{i}", "target": f"corp{i}.example",
+               "timestamp": start + timedelta(minutes=i),
+               "entities": [{"type": rnd.choice(("ip_address", "internet_name", "emailaddr", "linked_url_internal")),
+                             "value": f"value-{i}-{j}.example.com", "module": "sfp_dnsresolve",
+                             "severity": 100, "timestamp": start} for j in range(entities)]}
+
+
+def sampled(docs, every, samples):
+    for i, d in enumerate(docs):
+        if i % every == 0:
+            samples.append(round(rss_mb(), 1))
+        yield d
+
+
+def dir_mb(path):
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, fs in os.walk(path) for f in fs) / 2 ** 20
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--scans", type=int, default=2000000)
+    ap.add_argument("--cases", type=int, default=20000)
+    ap.add_argument("--entities", type=int, default=50)
+    ap.add_argument("--runs", type=int, default=2, help="incremental export runs the scans are split into")
+    ap.add_argument("--batch", type=int, default=ax.EXPORT_BATCH)
+    ap.add_argument("--sample", type=int, default=100000)
+    args = ap.parse_args()
+
+    rnd = random.Random(4)
+    start = datetime(2024, 1, 1)
+    out = tempfile.mkdtemp(prefix="shadowtrace_export_")
+    report = {"scans": args.scans, "cases": args.cases, "batch": args.batch}
+    try:
+        rss = []
+        per_run = args.scans // args.runs
+        t0 = time.perf_counter()
+        rows = {}
+        for r in range(args.runs):
+            n = per_run if r < args.runs - 1 else args.scans - per_run * (args.runs - 1)
+            docs = sampled(scan_docs(n, start + timedelta(days=30 * r), rnd), args.sample, rss)
+            res = ax.export_docs(docs, ax.SOURCES["search_logs"], out, f"run{r}", args.batch)
+            for k, v in res["rows"].items():
+                rows[k] = rows.get(k, 0) + v
+        s = time.perf_counter() - t0
+        report["parquet_scans"] = {"seconds": round(s, 1), "docs_per_sec": round(args.scans / s),
+                                   "rows": rows, "rows_per_sec": round(sum(rows.values()) / s),
+                                   "rss_mb": {"min": min(rss), "max": max(rss), "samples": len(rss)}}
+
+        rss = []
+        t0 = time.perf_counter()
+        res = ax.export_docs(sampled(case_docs(args.cases, args.entities, start, rnd), max(1, args.sample // 50), rss),
+                             ax.SOURCES["osint_cases"], out, "run0", args.batch)
+        s = time.perf_counter() - t0
+        report["parquet_cases"] = {"seconds": round(s, 1), "docs_per_sec": round(args.cases / s), "rows": res["rows"],
+                                   "rows_per_sec": round(sum(res["rows"].values()) / s),
+                                   "rss_mb": {"min": min(rss), "max": max(rss), "samples": len(rss)}}
+        report["parquet_mb"] = round(dir_mb(out), 1)
+        report["files"] = sum(len(fs) for _, _, fs in os.walk(out))
+
+        rss = []
+        t0 = time.perf_counter()
+        size = 0
+        for chunk in ax.stream_docs(sampled(scan_docs(args.scans, start, rnd), args.sample, rss), "scans", args.batch):
+            size += len(chunk)
+        s = time.perf_counter() - t0
+        report["arrow_stream_scans"] = {"seconds": round(s, 1), "docs_per_sec": round(args.scans / s),
+                                        "mb": round(size / 2 ** 20, 1),
+                                        "rss_mb": {"min": min(rss), "max": max(rss), "samples": len(rss)}}
+
+        import pyarrow.dataset as ds
+        got = {t: ds.dataset(os.path.join(out, t), format="parquet", partitioning="hive").count_rows()
+               for t in ("scans", "scan_platforms", "case_entities")}
+        want = {**rows, **res["rows"]}
+        report["read_back"] = got
+        report["mismatches"] = sum(got[t] != want.get(t, 0) for t in got)
+    finally:
+        shutil.rmtree(out, ignore_errors=True)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
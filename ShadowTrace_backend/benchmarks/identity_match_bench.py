@@ -0,0 +1,123 @@
+"""
+Identity match scoring at 10/100/500 platforms: the old per-platform scorer
+(difflib + re-extracting every other platform's domains) vs
+app.services.identity_match.score_platforms.
+
+    python -m benchmarks.identity_match_bench --sizes 10,100,500
+"""
+import argparse
+import difflib
+import json
+import random
+import re
+import time
+from urllib.parse import urlparse
+
+from app.services.identity_match import score_platforms
+from models.subject_model import Profile
+
+
+def similarity_score(a, b):
+    if not a or not b:
+        return 0
+    return int(difflib.SequenceMatcher(None, a.lower(), b.lower()).ratio() * 100)
+
+
+def extract_domains_from_text(text):
+    if not text:
+        return set()
+    domains = set()
+    for m in re.findall(r"https?://[^\s\"'>]+", text):
+        try:
+            d = urlparse(m).netloc
+            if d:
+                domains.add(d.lower().lstrip("www."))
+        except Exception:
+            continue
+    return domains
+
+
+def legacy_score(username, platform_entry, all_platforms):
+    score = 0
+    evidence = platform_entry.get("evidence", [])[:]
+    display = platform_entry.get("display_name") or ""
+    bio = platform_entry.get("bio") or ""
+    sim = similarity_score(display, username)
+    if sim >= 80:
+        score += 40; evidence.append("display_name_similar")
+    elif sim >= 50:
+        score += 20; evidence.append("display_name_partial")
+    if platform_entry.get("avatar"):
+        score += 20; evidence.append("avatar_present")
+    if username.lower() in (display.lower() + " " + bio.lower()):
+        score += 15; evidence.append("username_in_bio")
+    domains_here = extract_domains_from_text(bio + " " + (platform_entry.get("url") or ""))
+    for other in all_platforms.values():
+        if other is platform_entry:
+            continue
+        other_text = (other.get("bio") or "") + " " + (other.get("url") or "")
+        if domains_here & extract_domains_from_text(other_text):
+            score += 25; evidence.append("shared_website")
+            break
+    return {"score": min(score, 95), "evidence": list(dict.fromkeys(evidence))}
+
+
+def synthetic_platforms(n, username="jdoe_sec", seed=5):
+    rnd = random.Random(seed)
+    base_hash = rnd.getrandbits(64)
+    platforms = {}
+    for i in range(n):
+        site = f"site{i}"
+        exists = rnd.random() < 0.6
+        entry = {"exists": exists, "status": 200 if exists else 404, "url": f"https://{site}.example/{username}",
+                 "evidence": []}
+        if exists:
+            links = " ".join(f"https://{rnd.choice(['jdoe.dev', 'blog.example.org', f'x{i}.example'])}/p{k}"
+                             for k in range(rnd.randint(0, 3)))
+            entry.update({
+                "display_name": rnd.choice([username, "J. Doe", "jdoe", f"user{i}", "Security Researcher"]),
+                "bio": f"Pentester and CTF player. {links} " + "lorem ipsum " * rnd.randint(5, 40),
+                "avatar": f"https://{site}.example/a.png" if rnd.random() < 0.7 else None,
+            })
+            if entry["avatar"]:
+                h = base_hash ^ (1 << rnd.randrange(64)) if rnd.random() < 0.3 else rnd.getrandbits(64)
+                entry["hash"] = f"{h:016x}"
+        platforms[site] = entry
+    return platforms
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--sizes", default="10,100,500")
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    username = "jdoe_sec"
+    report = {}
+    for n in (int(s) for s in args.sizes.split(",")):
+        platforms = synthetic_platforms(n, username)
+        profiles = {k: Profile.from_doc(e) for k, e in platforms.items()}
+
+        def best(fn):
+            times = []
+            for _ in range(args.repeat):
+                t0 = time.perf_counter()
+                out = fn()
+                times.append(time.perf_counter() - t0)
+            return min(times), out
+
+        legacy_s, legacy = best(lambda: {k: legacy_score(username, e, platforms) for k, e in platforms.items()})
+        new_s, new = best(lambda: score_platforms(username, profiles))
+        diff = sum(1 for k in platforms if legacy[k] != new["scores"][k])
+        report[n] = {
+            "legacy_ms": round(legacy_s * 1000, 2),
+            "engine_ms": round(new_s * 1000, 2),
+            "speedup": round(legacy_s / new_s, 1),
+            "avatar_matches": len(new["avatar_matches"]),
+            "score_mismatches": diff,
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Cold-start budget: time to import app.main and to finish the lifespan startup,
+each in a fresh interpreter.
+
+    python -m benchmarks.import_bench --runs 5 --budget-ms 1000
+
+Databases point at an unroutable address so the run also shows that a dead
+dependency no longer holds up startup. Exits non-zero when the median cold
+start exceeds --budget-ms. --top lists the slowest imports (-X importtime).
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROBE = r"""
+import time, json, contextlib, io
+t0 = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    import app.main
+t1 = time.perf_counter()
+from fastapi.testclient import TestClient
+with contextlib.redirect_stdout(io.StringIO()):
+    with TestClient(app.main.app) as c:
+        t2 = time.perf_counter()
+        status = c.get("/").status_code
+print(json.dumps({"import_ms": (t1 - t0) * 1000, "startup_ms": (t2 - t0) * 1000, "status": status}))
+"""
+
+# unroutable (TEST-NET-3) so connects hang until their timeout
+DEAD_DEPS = {
+    "MONGO_URI": "mongodb://203.0.113.1:27017",
+    "ELASTIC_URL": "http://203.0.113.1:9200",
+}
+
+
+def run_probe(env):
+    out = subprocess.run([sys.executable, "-c", PROBE], env=env, capture_output=True, text=True, timeout=120)
+    if out.returncode != 0:
+        raise RuntimeError(out.stderr[-2000:])
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def top_imports(env, n):
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import app.main"], env=env,
+                         capture_output=True, text=True, timeout=120)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        try:
+            _, cumulative, name = line.split("|")
+            rows.append((int(cumulative), name.rstrip()))
+        except ValueError:
+            continue
+    rows.sort(reverse=True)
+    return [{"module": name.strip(), "depth": (len(name) - len(name.lstrip())) // 2,
+             "cumulative_ms": round(us / 1000, 1)} for us, name in rows[:n]]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--runs", type=int, default=5)
+    ap.add_argument("--budget-ms", type=float, default=1000)
+    ap.add_argument("--top", type=int, default=15)
+    args = ap.parse_args()
+
+    env = {**os.environ, **DEAD_DEPS, "PYTHONDONTWRITEBYTECODE": "1"}
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [os.getcwd(), env.get("PYTHONPATH")]))
+
+    runs = [run_probe(env) for _ in range(args.runs)]
+    report = {
+        "runs": args.runs,
+        "import_ms_median": round(statistics.median(r["import_ms"] for r in runs), 1),
+        "startup_ms_median": round(statistics.median(r["startup_ms"] for r in runs), 1),
+        "startup_ms_max": round(max(r["startup_ms"] for r in runs), 1),
+        "budget_ms": args.budget_ms,
+        "slowest_imports": top_imports(env, args.top),
+    }
+    report["within_budget"] = report["startup_ms_median"] <= args.budget_ms
+    print(json.dumps(report, indent=2))
+    if not report["within_budget"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
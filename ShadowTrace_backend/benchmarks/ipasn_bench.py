@@ -0,0 +1,152 @@
+"""
+Local IP -> ASN lookups over routeviews-sized synthetic tables.
+
+    python -m benchmarks.ipasn_bench --prefixes 1000000 --lookups 10000000
+
+Writes a pfx2as dump (--prefixes IPv4 prefixes, /8-/24 and nested, plus a
+tenth as many IPv6 /19-/48) and a delegated-stats file, builds the tables
+with app.services.ip_asn.build and reports build time, table size, and
+lookup rates for the three entry points:
+
+    lookup_keys   vectorized over --lookups integer keys (bulk scans)
+    lookup_many   batches of address strings, records with CIDR/registry
+    lookup        one address per call (the per-scan path)
+
+A sample of lookups is checked against a brute-force longest-prefix match.
+"""
+import argparse
+import ipaddress
+import json
+import os
+import random
+import shutil
+import socket
+import tempfile
+import time
+
+import numpy as np
+
+from app.services.ip_asn import IPAsnIndex, build
+
+
+def synth_v4(n, rnd):
+    prefixes = set()
+    while len(prefixes) < n:
+        plen = rnd.choice((8, 12, 16, 16, 19, 20, 22, 22, 23, 24, 24, 24, 24, 24))
+        net = rnd.getrandbits(32) & ~((1 << (32 - plen)) - 1) & 0xFFFFFFFF
+        if net >> 24 in (0, 10, 127) or net >> 28 >= 14:
+            continue
+        prefixes.add((net, plen))
+    return prefixes
+
+
+def synth_v6(n, rnd):
+    prefixes = set()
+    while len(prefixes) < n:
+        plen = rnd.choice((19, 29, 32, 32, 36, 40, 44, 48, 48, 48))
+        net = (0x2000 << 48 | rnd.getrandbits(61)) & ~((1 << (64 - plen)) - 1)
+        prefixes.add((net, plen))
+    return prefixes
+
+
+def write_dumps(d, v4, v6, rnd):
+    asns = {}
+    pfx = os.path.join(d, "routeviews.pfx2as")
+    with open(pfx, "w") as f:
+        for net, plen in v4:
+            asns[(4, net, plen)] = a = rnd.randrange(1, 400000)
+            f.write(f"{socket.inet_ntoa(net.to_bytes(4, 'big'))}\t{plen}\t{a}\n")
+        for net, plen in v6:
+            asns[(6, net, plen)] = a = rnd.randrange(1, 400000)
+            addr = socket.inet_ntop(socket.AF_INET6, net.to_bytes(8, "big") + bytes(8))
+            f.write(f"{addr}\t{plen}\t{a}\n")
+    deleg = os.path.join(d, "delegated-extended")
+    regs = ("arin", "ripencc", "apnic", "lacnic", "afrinic")
+    with open(deleg, "w") as f:
+        f.write("2|nro|20240101|0|19830705|20240101|+0000\n")
+        for block in range(1, 224):
+            f.write(f"{rnd.choice(regs)}|{rnd.choice(('US', 'DE', 'JP', 'BR', 'ZA'))}|ipv4|"
+                    f"{block}.0.0.0|16777216|20000101|allocated|x\n")
+    return pfx, deleg, asns
+
+
+def reference(asns, ip):
+    """Longest-prefix match by brute force over prefix lengths."""
+    v4 = ":" not in ip
+    key = int(ipaddress.ip_address(ip)) if v4 else int(ipaddress.ip_address(ip)) >> 64
+    bits = 32 if v4 else 64
+    for plen in range(bits, -1, -1):
+        net = key & ~((1 << (bits - plen)) - 1)
+        a = asns.get((4 if v4 else 6, net, plen))
+        if a is not None:
+            return str(a)
+    return None
+
+
+def rate(n, seconds):
+    return {"per_sec": round(n / seconds), "ns_per_lookup": round(seconds / n * 1e9, 1)}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--prefixes", type=int, default=1000000)
+    ap.add_argument("--lookups", type=int, default=10000000)
+    ap.add_argument("--strings", type=int, default=1000000)
+    ap.add_argument("--singles", type=int, default=100000)
+    ap.add_argument("--verify", type=int, default=20000)
+    args = ap.parse_args()
+
+    rnd = random.Random(3)
+    d = tempfile.mkdtemp(prefix="shadowtrace_ipintel_")
+    v4, v6 = synth_v4(args.prefixes, rnd), synth_v6(args.prefixes // 10, rnd)
+    pfx, deleg, asns = write_dumps(d, v4, v6, rnd)
+
+    out = os.path.join(d, "tables")
+    t0 = time.perf_counter()
+    meta = build(out, [pfx], [deleg])
+    build_s = time.perf_counter() - t0
+    table_bytes = sum(os.path.getsize(os.path.join(out, f)) for f in os.listdir(out))
+
+    index = IPAsnIndex(out)
+    index.load()
+
+    keys = np.frombuffer(np.random.default_rng(5).bytes(4 * args.lookups), dtype=np.uint32)
+    index.lookup_keys(keys[:1000])
+    t0 = time.perf_counter()
+    found = index.lookup_keys(keys)
+    bulk_s = time.perf_counter() - t0
+
+    ips = [socket.inet_ntoa(k.to_bytes(4, "big")) for k in keys[:args.strings].tolist()]
+    t0 = time.perf_counter()
+    for i in range(0, len(ips), 10000):
+        index.lookup_many(ips[i:i + 10000])
+    many_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for ip in ips[:args.singles]:
+        index.lookup(ip)
+    single_s = time.perf_counter() - t0
+
+    sample = ips[:args.verify] + [
+        socket.inet_ntop(socket.AF_INET6, (net + rnd.randrange(1 << (64 - plen))).to_bytes(8, "big") + bytes(8))
+        for net, plen in rnd.sample(sorted(v6), min(args.verify // 4, len(v6)))]
+    mismatches = sum((r["asn"] if r else None) != reference(asns, ip)
+                     for ip, r in zip(sample, index.lookup_many(sample)))
+
+    shutil.rmtree(d, ignore_errors=True)
+    print(json.dumps({
+        "prefixes": {"v4": len(v4), "v6": len(v6)},
+        "ranges": meta["counts"],
+        "build_s": round(build_s, 1),
+        "table_mb": round(table_bytes / 2 ** 20, 1),
+        "lookup_keys": {"lookups": len(keys), "hit_ratio": round(float((found > 0).mean()), 3),
+                        **rate(len(keys), bulk_s)},
+        "lookup_many": {"lookups": len(ips), "batch": 10000, **rate(len(ips), many_s)},
+        "lookup": {"lookups": args.singles, **rate(args.singles, single_s)},
+        "verified": len(sample),
+        "mismatches": mismatches,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+"""
+Local mock of the OSINT upstreams (VirusTotal, AbuseIPDB, HIBP, Shodan, crt.sh,
+Gravatar, social profile pages, GitHub/Reddit, dark-web feeds, SpiderFoot,
+RDAP and the IANA RDAP bootstrap, port-43 whois) with configurable latency,
+error rate and payload size, and optionally a latency tail per upstream (--slow).
+
+    python -m benchmarks.mock_upstreams --port 8900 --latency-ms 50 --error-rate 0.02
+
+Every upstream lives under its own path prefix, so the app is pointed at it
+with the usual base-URL settings (see `env_for`).
+"""
+import argparse
+import hashlib
+import json
+import random
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+# 1x1 PNG
+PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010802000000907753de"
+    "0000000c4944415408d763f8cfc0000003010100c9fe92ef0000000049454e44ae426082"
+)
+
+
+class MockConfig:
+    def __init__(self, latency_ms=50.0, jitter_ms=20.0, error_rate=0.0, payload_kb=8, crtsh_certs=500,
+                 spiderfoot_events=2000, seed=1, slow=None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.payload_kb = payload_kb
+        self.crtsh_certs = crtsh_certs
+        self.spiderfoot_events = spiderfoot_events
+        # upstream -> (probability, extra ms): a degraded provider's latency tail
+        self.slow = slow or {}
+        self.rnd = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = {}
+
+    def count(self, upstream):
+        with self.lock:
+            self.requests[upstream] = self.requests.get(upstream, 0) + 1
+
+    def delay(self, upstream=None):
+        with self.lock:
+            d = max(0.0, self.rnd.gauss(self.latency_ms, self.jitter_ms)) / 1000
+            fail = self.rnd.random() < self.error_rate
+            p, extra_ms = self.slow.get(upstream, (0, 0))
+            if p and self.rnd.random() < p:
+                d += extra_ms / 1000
+        time.sleep(d)
+        return fail
+
+
+def _padding(kb):
+    return "x" * (kb * 1024)
+
+
+def _stable_int(s, mod):
+    return int(hashlib.md5(s.encode()).hexdigest(), 16) % mod
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    config: MockConfig = None
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        # headers and body go out in separate writes; without this, Nagle plus the
+        # client's delayed ACK adds ~40 ms to every keep-alive response
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    # ------------------ plumbing ------------------
+    def _send(self, status, body=b"", ctype="application/json"):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode()
+        elif isinstance(body, str):
+            body = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            try:
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # the client gave up (timeout, or a hedged request that lost)
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        self.do_GET()
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        segs = [s for s in parts.path.split("/") if s]
+        upstream = segs[0] if segs else ""
+        cfg = self.config
+        cfg.count(upstream)
+        if cfg.delay(upstream):
+            return self._send(500, {"error": "mock upstream failure"})
+        route = getattr(self, f"_{upstream}", None)
+        if route is None:
+            return self._send(404, {"error": "unknown upstream"})
+        route(segs[1:], parse_qs(parts.query))
+
+    # ------------------ upstreams ------------------
+    def _vt(self, segs, qs):
+        key = segs[-1] if segs else ""
+        malicious = _stable_int(key, 15)
+        self._send(200, {"data": {"id": key, "attributes": {
+            "last_analysis_stats": {"malicious": malicious, "harmless": 60, "undetected": 10},
+            "padding": _padding(self.config.payload_kb),
+        }}})
+
+    def _abuseipdb(self, segs, qs):
+        ip = (qs.get("ipAddress") or [""])[0]
+        self._send(200, {"data": {"ipAddress": ip, "abuseConfidenceScore": _stable_int(ip, 100)}})
+
+    def _hibp(self, segs, qs):
+        email = segs[-1] if segs else ""
+        if _stable_int(email, 2):
+            return self._send(404, b"")
+        self._send(200, [{"Name": "MockBreach", "BreachDate": "2020-01-01", "DataClasses": ["Emails"]}])
+
+    def _shodan(self, segs, qs):
+        if segs[:2] == ["shodan", "host"] and len(segs) == 3 and segs[2] != "search":
+            return self._send(200, {"ip_str": segs[2], "ports": [22, 80, 443],
+                                    "data": [{"port": 80, "banner": _padding(self.config.payload_kb)}]})
+        self._send(200, {"matches": [], "total": 0})
+
+    def _crtsh(self, segs, qs):
+        q = (qs.get("q") or ["%.example.com"])[0].lstrip("%.")
+        certs = [{
+            "id": 1000 + i,
+            "entry_timestamp": f"2024-01-{1 + i % 28:02d}T00:00:00",
+            "name_value": f"host{i % 97}.{q}\n*.{q}",
+            "issuer_name": "C=US, O=Mock CA",
+        } for i in range(self.config.crtsh_certs)]
+        self._send(200, certs)
+
+    def _gravatar(self, segs, qs):
+        self._send(404 if _stable_int(self.path, 2) else 200, PNG, ctype="image/png")
+
+    def _social(self, segs, qs):
+        site, username = (segs + ["", ""])[:2]
+        if _stable_int(site + username, 4) == 0:
+            return self._send(404, "<html><head><title>Not found</title></head></html>", ctype="text/html")
+        host = self.headers.get("Host")
+        head = (
+            f"<title>{username} on {site}</title>"
+            f'<meta property="og:title" content="{username.title()}">'
+            f'<meta property="og:description" content="Security researcher. https://{username}.example.com">'
+            f'<meta property="og:image" content="http://{host}/avatar/{username}.png">'
+        )
+        body = f"<div>{_padding(self.config.payload_kb)}</div>"
+        self._send(200, f"<html><head>{head}</head><body>{body}</body></html>", ctype="text/html")
+
+    def _github(self, segs, qs):
+        self._social(["github"] + segs, qs)
+
+    def _reddit(self, segs, qs):
+        username = segs[1] if len(segs) > 1 else ""
+        self._send(200, {"data": {"name": username, "total_karma": _stable_int(username, 5000)}})
+
+    def _darkweb(self, segs, qs):
+        self._send(200, "\n".join(f"leak{i}@example.com:hunter2" for i in range(200)) + "\n" + _padding(self.config.payload_kb),
+                   ctype="text/plain")
+
+    def _avatar(self, segs, qs):
+        self._send(200, PNG, ctype="image/png")
+
+    def _spiderfoot(self, segs, qs):
+        if segs[:1] == ["startscan"]:
+            return self._send(200, ["SUCCESS", "MOCKSCAN"])
+        events = [{
+            "type": ("IP_ADDRESS", "INTERNET_NAME", "EMAILADDR", "LINKED_URL_INTERNAL")[i % 4],
+            "data": f"value-{i % 400}.example.com",
+            "module": "sfp_mock",
+            "confidence": 100,
+            "timestamp": "2024-01-01T00:00:00",
+        } for i in range(self.config.spiderfoot_events)]
+        self._send(200, {"events": events})
+
+    def _rdap(self, segs, qs):
+        if segs[:1] == ["domain"] and len(segs) == 2:
+            return self._rdap_domain(segs[1].lower(), registrar=False)
+        if segs[:2] == ["registrar", "domain"] and len(segs) == 3:
+            return self._rdap_domain(segs[2].lower(), registrar=True)
+        self._send(200, {"handle": "MOCK-NET", "asn": "64500", "asn_cidr": "203.0.113.0/24",
+                         "network": {"name": "MOCKNET", "country": "US"}, "objects": {}})
+
+    def _rdap_domain(self, name, registrar):
+        """Thin registry answer linking to the registrar's thick one; names starting "nx" are unregistered."""
+        if name.startswith("nx") or name.count(".") != 1:
+            return self._send(404, {"errorCode": 404, "title": "Not Found"}, ctype="application/rdap+json")
+        host = self.headers.get("Host")
+        year = 1995 + _stable_int(name, 25)
+        obj = {
+            "objectClassName": "domain",
+            "handle": f"{_stable_int(name, 10 ** 8)}_DOMAIN-MOCK",
+            "ldhName": name.upper(),
+            "status": ["client delete prohibited", "client transfer prohibited"],
+            "events": [{"eventAction": "registration", "eventDate": f"{year}-08-14T04:00:00Z"},
+                       {"eventAction": "expiration", "eventDate": "2030-08-13T04:00:00Z"},
+                       {"eventAction": "last changed", "eventDate": "2024-08-14T07:01:38Z"}],
+            "nameservers": [{"objectClassName": "nameserver", "ldhName": f"NS{i}.MOCKDNS.TEST"} for i in (1, 2)],
+            "secureDNS": {"delegationSigned": bool(_stable_int(name, 2))},
+            "entities": [{
+                "objectClassName": "entity", "handle": "376", "roles": ["registrar"],
+                "publicIds": [{"type": "IANA Registrar ID", "identifier": "376"}],
+                "vcardArray": ["vcard", [["version", {}, "text", "4.0"], ["fn", {}, "text", "Mock Registrar, Inc."]]],
+                "entities": [{"objectClassName": "entity", "roles": ["abuse"], "vcardArray": ["vcard", [
+                    ["version", {}, "text", "4.0"], ["fn", {}, "text", "Abuse"],
+                    ["email", {}, "text", "abuse@mockregistrar.test"]]]}],
+            }],
+            "links": [{"value": f"http://{host}/rdap/domain/{name}", "rel": "self",
+                       "href": f"http://{host}/rdap/domain/{name}", "type": "application/rdap+json"}],
+        }
+        if registrar:
+            obj["entities"].append({"objectClassName": "entity", "roles": ["registrant"], "vcardArray": ["vcard", [
+                ["version", {}, "text", "4.0"], ["fn", {}, "text", "REDACTED FOR PRIVACY"],
+                ["org", {}, "text", f"{name.split('.')[0].title()} Holdings"],
+                ["adr", {"cc": "US"}, "text", ["", "", "", "", "CA", "", "US"]]]]})
+        else:
+            obj["links"].append({"value": f"http://{host}/rdap/domain/{name}", "rel": "related",
+                                 "href": f"http://{host}/rdap/registrar/domain/{name}",
+                                 "type": "application/rdap+json"})
+        self._send(200, obj, ctype="application/rdap+json")
+
+    def _iana(self, segs, qs):
+        """RDAP bootstrap registry routing the mock's TLDs to its RDAP server."""
+        host = self.headers.get("Host")
+        self._send(200, {"version": "1.0", "publication": "2024-01-01T00:00:00Z", "description": "mock",
+                         "services": [[["com", "net", "org", "io", "test"], [f"http://{host}/rdap/"]]]})
+
+    def _http(self, segs, qs):
+        self._send(200, b"", ctype="text/html")
+
+
+def whois_text(name):
+    """Verisign-style thin record that refers to the registrar's server (which answers the same)."""
+    name = name.strip().lower()
+    if name.startswith("nx"):
+        return f'No match for "{name.upper()}".\r\n>>> Last update of whois database: 2024-08-14T07:01:38Z <<<\r\n'
+    year = 1995 + _stable_int(name, 25)
+    lines = [
+        f"Domain Name: {name.upper()}",
+        f"Registry Domain ID: {_stable_int(name, 10 ** 8)}_DOMAIN_COM-VRSN",
+        "Registrar WHOIS Server: localhost",
+        "Registrar URL: http://www.mockregistrar.test",
+        "Updated Date: 2024-08-14T07:01:38Z",
+        f"Creation Date: {year}-08-14T04:00:00Z",
+        "Registry Expiry Date: 2030-08-13T04:00:00Z",
+        "Registrar: Mock Registrar, Inc.",
+        "Registrar IANA ID: 376",
+        "Registrar Abuse Contact Email: abuse@mockregistrar.test",
+        "Domain Status: clientDeleteProhibited https://icann.org/epp#clientDeleteProhibited",
+        "Domain Status: clientTransferProhibited https://icann.org/epp#clientTransferProhibited",
+        "Name Server: NS1.MOCKDNS.TEST",
+        "Name Server: NS2.MOCKDNS.TEST",
+        f"DNSSEC: {'signedDelegation' if _stable_int(name, 2) else 'unsigned'}",
+        f"Registrant Organization: {name.split('.')[0].title()} Holdings",
+        "Registrant Country: US",
+        ">>> Last update of whois database: 2024-08-14T07:01:38Z <<<",
+        "",
+        "NOTICE: The expiration date displayed in this record is the date the registrar's sponsorship "
+        "of the domain name registration in the registry is currently set to expire. " * 6,
+    ]
+    return "\r\n".join(lines) + "\r\n"
+
+
+def serve_whois(host="127.0.0.1", port=43, config: MockConfig = None):
+    """Port-43 whois mock (one query per connection, as RFC 3912). Returns the server."""
+    import socketserver
+    config = config or MockConfig()
+
+    class WhoisHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            query = self.rfile.readline().decode("utf-8", "replace")
+            config.count("whois43")
+            config.delay()
+            self.wfile.write(whois_text(query).encode())
+
+    class WhoisServer(socketserver.ThreadingTCPServer):
+        allow_reuse_address = True
+        daemon_threads = True
+
+    server = WhoisServer((host, port), WhoisHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def serve(host="127.0.0.1", port=0, config: MockConfig = None):
+    """Start the mock in a daemon thread. Returns (server, base_url)."""
+    handler = type("BoundHandler", (Handler,), {"config": config or MockConfig()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+
+def parse_slow(spec):
+    """"shodan=1:8000,vt=0.05:3000" -> {upstream: (probability, extra ms)}"""
+    out = {}
+    for part in filter(None, (spec or "").split(",")):
+        name, rest = part.split("=")
+        p, ms = rest.split(":")
+        out[name] = (float(p), float(ms))
+    return out
+
+
+def env_for(base):
+    """Settings that point the app at a running mock."""
+    return {
+        "VT_API_KEY": "mock", "VT_BASE": f"{base}/vt",
+        "ABUSEIPDB_KEY": "mock", "ABUSEIPDB_BASE": f"{base}/abuseipdb",
+        "HIBP_BASE": f"{base}/hibp",
+        "SHODAN_API_KEY": "mock", "SHODAN_API_URL": f"{base}/shodan",
+        "CRTSH_URL": f"{base}/crtsh",
+        "GRAVATAR_BASE": f"{base}/gravatar",
+        "SPIDERFOOT_BASE": f"{base}/spiderfoot",
+        "GITHUB_BASE": f"{base}/github",
+        "REDDIT_BASE": f"{base}/reddit",
+        "DARK_FEEDS": f"{base}/darkweb/feed1.txt,{base}/darkweb/feed2.txt",
+        "RDAP_BOOTSTRAP_URL": f"{base}/iana/rdap/dns.json",
+    }
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--port", type=int, default=8900)
+    ap.add_argument("--latency-ms", type=float, default=50)
+    ap.add_argument("--jitter-ms", type=float, default=20)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--payload-kb", type=int, default=8)
+    ap.add_argument("--slow", help="per-upstream latency tail, e.g. shodan=1:8000,vt=0.05:3000")
+    ap.add_argument("--whois-port", type=int, default=0, help="also serve port-43 whois here (43 needs root)")
+    args = ap.parse_args()
+    cfg = MockConfig(args.latency_ms, args.jitter_ms, args.error_rate, args.payload_kb, slow=parse_slow(args.slow))
+    srv, url = serve(port=args.port, config=cfg)
+    if args.whois_port:
+        serve_whois(port=args.whois_port, config=cfg)
+        print(f"mock whois on 127.0.0.1:{args.whois_port}")
+    print(f"mock upstreams on {url}", flush=True)
+    print(json.dumps(env_for(url), indent=2))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        srv.shutdown()
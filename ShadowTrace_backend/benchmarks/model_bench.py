@@ -0,0 +1,108 @@
+"""
+Memory per entity and (de)serialization throughput of the typed records in
+models/subject_model.py against the plain dicts they replace.
+
+    python -m benchmarks.model_bench --entities 100000
+"""
+import argparse
+import datetime
+import gc
+import json
+import time
+import tracemalloc
+
+import bson
+
+from app.services.osint_processor import extract_entities_from_sf
+from models.subject_model import Indicator, dumps, loads
+
+TYPES = ("ip_address", "internet_name", "emailaddr", "linked_url_internal", "affiliate_internet_name")
+
+
+def spiderfoot_export(n):
+    return {"events": [{
+        "type": TYPES[i % len(TYPES)].upper(),
+        "data": f"host-{i}.example.com",
+        "module": f"sfp_module_{i % 40}",
+        "confidence": 100,
+        "timestamp": "2024-01-01T00:00:00",
+    } for i in range(n)]}
+
+
+def as_dict(i: Indicator) -> dict:
+    # the shape extract_entities_from_sf produced before the typed records
+    return {"type": i.type, "value": i.value, "module": i.module, "severity": i.severity,
+            "timestamp": i.timestamp, "raw_at": list(i.raw_at)}
+
+
+def measure(build):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    obj = build()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return obj, after - before
+
+
+def rate(n, fn, repeat=3):
+    best = min(_timed(fn) for _ in range(repeat))
+    return round(n / best)
+
+
+def _timed(fn):
+    t0 = time.perf_counter()
+    fn()
+    return time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--entities", type=int, default=100000)
+    args = ap.parse_args()
+    n = args.entities
+
+    export = spiderfoot_export(n)
+    indicators = extract_entities_from_sf(export)
+    ts = datetime.datetime(2024, 1, 1)
+
+    # strings come fresh from a JSON parser in production, so rebuild them per record
+    def fresh(i):
+        return (("%s" % i.type)[:], "".join(i.value), "".join(i.module))
+
+    dicts, dict_bytes = measure(lambda: [
+        {"type": t, "value": v, "module": m, "severity": 100, "timestamp": ts, "raw_at": ["events", k]}
+        for k, (t, v, m) in enumerate(fresh(i) for i in indicators)])
+    records, record_bytes = measure(lambda: [
+        Indicator(t, v, m, 100, ts, ("events", k))
+        for k, (t, v, m) in enumerate(fresh(i) for i in indicators)])
+
+    docs = [i.to_doc() for i in records]
+    json_dicts = json.dumps(dicts, default=str).encode()
+    json_records = dumps(records)
+    bson_doc = bson.encode({"entities": docs})
+
+    report = {
+        "entities": n,
+        "extract_per_sec": rate(n, lambda: extract_entities_from_sf(export)),
+        "bytes_per_entity": {"dict": round(dict_bytes / n), "record": round(record_bytes / n)},
+        "to_doc_per_sec": rate(n, lambda: [i.to_doc() for i in records]),
+        "from_doc_per_sec": rate(n, lambda: [Indicator.from_doc(d) for d in docs]),
+        "json_dumps_per_sec": {
+            "dict_json": rate(n, lambda: json.dumps(dicts, default=str)),
+            "record_dumps": rate(n, lambda: dumps(records)),
+        },
+        "json_loads_per_sec": {
+            "dict_json": rate(n, lambda: json.loads(json_dicts)),
+            "record_loads": rate(n, lambda: loads(json_records, Indicator)),
+        },
+        "bson_per_sec": {
+            "encode": rate(n, lambda: bson.encode({"entities": [i.to_doc() for i in records]})),
+            "decode": rate(n, lambda: [Indicator.from_doc(d) for d in bson.decode(bson_doc)["entities"]]),
+        },
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
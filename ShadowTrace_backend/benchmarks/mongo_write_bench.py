@@ -0,0 +1,148 @@
+"""
+Mongo round trips per scan: the old run_scan write pattern vs write-behind.
+
+    python -m benchmarks.mongo_write_bench --scans 20000 --concurrency 32 --mongo-uri mongodb://localhost:27017
+
+Drives only the persistence side of run_scan for --scans queued scans from
+--concurrency threads, with a --payload-kb results document:
+
+    before   find_one, update_one(running), update_one(done), find_one
+    after    find_one_and_update(running, progress write concern, returns the
+             document) + writer.update(done), flushed as bulk_write batches
+
+and reports scans/sec, Mongo commands per scan and commands/sec. Commands
+are counted at the collection (a bulk_write is one command). Without
+--mongo-uri it runs on mongomock, whose lookups scan the whole collection:
+use a few hundred scans there and read only the command counts.
+"""
+import argparse
+import concurrent.futures
+import json
+import threading
+import time
+from datetime import datetime
+
+from pymongo import ReturnDocument
+
+from app.database.write_behind import WriteBehind, progress_concern
+
+
+class Counting:
+    """Collection proxy counting the commands sent through it."""
+
+    def __init__(self, coll, counts):
+        self._coll = coll
+        self._counts = counts
+
+    @property
+    def full_name(self):
+        return self._coll.full_name
+
+    def with_options(self, **kwargs):
+        return Counting(self._coll.with_options(**kwargs), self._counts)
+
+    def __getattr__(self, name):
+        fn = getattr(self._coll, name)
+        counts = self._counts
+
+        def call(*args, **kwargs):
+            with counts["lock"]:
+                counts[name] = counts.get(name, 0) + 1
+            return fn(*args, **kwargs)
+        return call
+
+
+def seed(coll, n):
+    ids = []
+    for i in range(0, n, 1000):
+        res = coll.insert_many([{"query": f"host{j}.example.com", "source": "bench", "status": "queued",
+                                 "results": None, "created_at": datetime.utcnow()} for j in range(i, min(n, i + 1000))])
+        ids.extend(res.inserted_ids)
+    return ids
+
+
+def before(coll, oid, results):
+    doc = coll.find_one({"_id": oid})
+    coll.update_one({"_id": oid}, {"$set": {"status": "running"}})
+    coll.update_one({"_id": oid}, {"$set": {"status": "done", "results": results, "updated_at": datetime.utcnow()}})
+    coll.find_one({"_id": oid})
+    return doc
+
+
+def after(coll, writer, oid, results):
+    doc = coll.with_options(write_concern=progress_concern()).find_one_and_update(
+        {"_id": oid}, {"$set": {"status": "running"}}, return_document=ReturnDocument.AFTER)
+    final = {"status": "done", "results": results, "updated_at": datetime.utcnow()}
+    writer.update(coll, {"_id": oid}, {"$set": final})
+    return {**doc, **final}
+
+
+def run(name, fn, ids, concurrency, counts):
+    counts.clear()
+    counts["lock"] = threading.Lock()
+    t0 = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(fn, ids))
+    wall = time.perf_counter() - t0
+    commands = sum(v for k, v in counts.items() if k != "lock")
+    return {"scans": len(ids), "seconds": round(wall, 2), "scans_per_sec": round(len(ids) / wall, 1),
+            "commands": {k: v for k, v in counts.items() if k != "lock"},
+            "commands_per_scan": round(commands / len(ids), 3),
+            "commands_per_sec": round(commands / wall, 1)}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--scans", type=int, default=20000)
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--payload-kb", type=int, default=4)
+    ap.add_argument("--batch", type=int, default=500)
+    ap.add_argument("--interval-ms", type=float, default=50)
+    ap.add_argument("--mongo-uri")
+    args = ap.parse_args()
+
+    if args.mongo_uri:
+        from pymongo import MongoClient
+        db = MongoClient(args.mongo_uri, maxPoolSize=args.concurrency + 4)["shadowtrace_bench"]
+    else:
+        import mongomock
+        from benchmarks.scan_bench import _mongomock_compat
+        _mongomock_compat(mongomock)
+        db = mongomock.MongoClient()["shadowtrace_bench"]
+    db.client.drop_database("shadowtrace_bench")
+
+    results = {"note": "x" * (args.payload_kb * 1024)}
+    counts = {}
+    report = {"scans": args.scans, "concurrency": args.concurrency, "payload_kb": args.payload_kb,
+              "backend": "mongodb" if args.mongo_uri else "mongomock"}
+
+    raw = db["search_logs_before"]
+    ids = seed(raw, args.scans)
+    coll = Counting(raw, counts)
+    report["before"] = run("before", lambda oid: before(coll, oid, results), ids, args.concurrency, counts)
+
+    raw = db["search_logs_after"]
+    ids = seed(raw, args.scans)
+    coll = Counting(raw, counts)
+    writer = WriteBehind(batch=args.batch, interval_ms=args.interval_ms)
+
+    def scan(oid):
+        after(coll, writer, oid, results)
+
+    res = run("after", scan, ids, args.concurrency, counts)
+    t0 = time.perf_counter()
+    writer.close()
+    drain = time.perf_counter() - t0
+    res["drain_seconds"] = round(drain, 3)
+    res["writer"] = writer.stats()
+    report["after"] = res
+    report["done"] = {"before": db["search_logs_before"].count_documents({"status": "done"}),
+                      "after": raw.count_documents({"status": "done"})}
+    report["speedup"] = round(res["scans_per_sec"] / report["before"]["scans_per_sec"], 2)
+
+    db.client.drop_database("shadowtrace_bench")
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
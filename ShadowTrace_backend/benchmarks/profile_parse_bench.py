@@ -0,0 +1,152 @@
+"""
+Profile page parsing: full-page BeautifulSoup vs head-only extraction with
+selectolax (lexbor) and with BeautifulSoup.
+
+    python -m benchmarks.profile_parse_bench --corpus path/to/saved_pages/
+    python -m benchmarks.profile_parse_bench --pages 200 --body-kb 300
+
+--corpus takes a directory of saved profile pages (*.html); without it a
+synthetic corpus is generated whose heads look like GitHub/Reddit/Instagram
+profile pages (og:/twitter: tags, JSON-LD, preload links) followed by a large
+body. Each page is fed to the head reader in 16 KB chunks, as it would arrive
+off the wire. Reports parse time per page and bytes consumed, and checks the
+extracted fields match the legacy parser.
+"""
+import argparse
+import glob
+import json
+import random
+import time
+
+from bs4 import BeautifulSoup
+
+from app.utils import profile_html
+from app.utils.profile_html import parse_profile_html, read_head_chunks, PROFILE_CHUNK_SIZE
+
+FIELDS = ("display_name", "bio", "avatar")
+
+
+def legacy_parse(html_text):
+    """parse_profile_html as it was: one html.parser tree over the whole page."""
+    soup = BeautifulSoup(html_text, "html.parser")
+    result = {"display_name": None, "bio": None, "location": None, "avatar": None, "evidence": []}
+    for script in soup.select('script[type="application/ld+json"]'):
+        try:
+            data = json.loads(script.string or "{}")
+            if isinstance(data, list):
+                data = data[0]
+            if data.get("name"):
+                result["display_name"] = data["name"]
+            if data.get("description"):
+                result["bio"] = data["description"]
+            if data.get("image"):
+                result["avatar"] = data["image"]
+        except Exception:
+            continue
+    og_title = soup.find("meta", property="og:title") or soup.find("meta", attrs={"name": "twitter:title"})
+    if og_title and og_title.get("content"):
+        result["display_name"] = result["display_name"] or og_title["content"]
+    og_desc = soup.find("meta", property="og:description") or soup.find("meta", attrs={"name": "description"})
+    if og_desc and og_desc.get("content"):
+        result["bio"] = result["bio"] or og_desc["content"]
+    og_img = soup.find("meta", property="og:image") or soup.find("meta", attrs={"name": "twitter:image"})
+    if og_img and og_img.get("content"):
+        result["avatar"] = result["avatar"] or og_img["content"]
+    return result
+
+
+def synthetic_page(i, body_kb, rnd):
+    user = f"user{i}"
+    ld = ""
+    if i % 3 == 0:
+        ld = ('<script type="application/ld+json">'
+              + json.dumps({"@type": "Person", "name": f"User {i}", "description": f"Bio of {user}",
+                            "image": f"https://cdn.example.com/{user}.png"})
+              + "</script>")
+    head = "".join([
+        '<meta charset="utf-8">',
+        f"<title>{user} - Profile</title>",
+        "".join(f'<link rel="preload" href="/assets/app-{k}.js" as="script">' for k in range(20)),
+        "".join(f'<meta name="x-meta-{k}" content="{k}">' for k in range(15)),
+        f'<meta property="og:title" content="{user.title()}">',
+        f'<meta name="twitter:title" content="{user}">',
+        f'<meta property="og:description" content="Developer at example.com https://{user}.example.org">',
+        f'<meta property="og:image" content="https://avatars.example.com/{user}.png">',
+        '<style>' + "body{margin:0}" * 200 + '</style>',
+        ld,
+    ])
+    rows = []
+    size = 0
+    while size < body_kb * 1024:
+        row = (f'<div class="repo r{rnd.randint(0, 999)}"><a href="/{user}/repo{len(rows)}">repo{len(rows)}</a>'
+               f'<span class="stars">{rnd.randint(0, 5000)}</span><p>Lorem ipsum dolor sit amet.</p></div>')
+        rows.append(row)
+        size += len(row)
+    body = "<script>window.__DATA__ = {};</script>" + "".join(rows)
+    return f"<!DOCTYPE html><html><head>{head}</head><body>{body}</body></html>"
+
+
+def chunked(data, size=PROFILE_CHUNK_SIZE):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--corpus", help="directory of saved profile pages (*.html)")
+    ap.add_argument("--pages", type=int, default=100)
+    ap.add_argument("--body-kb", type=int, default=300)
+    ap.add_argument("--repeat", type=int, default=3)
+    args = ap.parse_args()
+
+    if args.corpus:
+        pages = [open(p, "rb").read() for p in sorted(glob.glob(f"{args.corpus}/*.html"))]
+    else:
+        rnd = random.Random(3)
+        pages = [synthetic_page(i, args.body_kb, rnd).encode() for i in range(args.pages)]
+    total_bytes = sum(len(p) for p in pages)
+    texts = [p.decode("utf-8", errors="replace") for p in pages]
+
+    def best(fn):
+        runs = []
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            out = fn()
+            runs.append(time.perf_counter() - t0)
+        return min(runs), out
+
+    legacy_s, legacy_out = best(lambda: [legacy_parse(t) for t in texts])
+
+    def head_only(parser):
+        read = 0
+        out = []
+        for p in pages:
+            head, n = read_head_chunks(chunked(p))
+            read += n
+            out.append(parse_profile_html(head.decode("utf-8", errors="replace"), parser))
+        return read, out
+
+    report = {
+        "pages": len(pages),
+        "bytes_total": total_bytes,
+        "legacy_bs4_full": {"ms_per_page": round(legacy_s / len(pages) * 1000, 3), "bytes_read": total_bytes},
+    }
+    for parser, available in (("selectolax", profile_html._SelectolaxParser), ("bs4", True)):
+        if not available:
+            report[f"head_{parser}"] = "not installed"
+            continue
+        secs, (read, out) = best(lambda: head_only(parser))
+        mismatches = sum(1 for a, b in zip(legacy_out, out) if any(a[f] != b[f] for f in FIELDS))
+        report[f"head_{parser}"] = {
+            "ms_per_page": round(secs / len(pages) * 1000, 3),
+            "speedup": round(legacy_s / secs, 1),
+            "bytes_read": read,
+            "bytes_saved": f"{1 - read / total_bytes:.1%}",
+            "mismatches": mismatches,
+        }
+    report["default_parser"] = profile_html.PARSER
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Domain registration lookups: RDAP via the bootstrap file vs python-whois.
+
+    python -m benchmarks.rdap_bench --lookups 500 --latency-ms 20
+
+Runs benchmarks.mock_upstreams in a child process (so the client's CPU time
+is measured on its own) serving the IANA bootstrap, registry and registrar
+RDAP, and a port-43 whois server on 127.0.0.1:43 (needs root) returning
+Verisign-style thin records that refer to a registrar server. Each path
+looks up --lookups distinct domains one after another:
+
+    whois_legacy    the old whois_domain: whois.whois() + stringified fields
+    rdap            DomainRegistration.lookup (registry + registrar RDAP)
+    whois_fallback  DomainRegistration.whois, the port-43 fallback
+    rdap_cached     the same domains again, served from the result cache
+
+and reports wall-clock p50/p99 and client CPU per lookup.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import shutil
+import socket
+import time
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_mock(latency_ms, whois_port):
+    port = free_port()
+    proc = subprocess.Popen([sys.executable, "-m", "benchmarks.mock_upstreams", "--port", str(port),
+                             "--latency-ms", str(latency_ms), "--jitter-ms", "0", "--whois-port", str(whois_port)],
+                            stdout=subprocess.PIPE, text=True)
+    for line in proc.stdout:
+        if line.startswith("mock upstreams on"):
+            return proc, f"http://127.0.0.1:{port}"
+    raise RuntimeError("mock upstreams did not start")
+
+
+def measure(fn, domains):
+    lat = []
+    cpu0 = time.process_time()
+    t0 = time.perf_counter()
+    ok = 0
+    for d in domains:
+        s = time.perf_counter()
+        ok += bool(fn(d).get("ok"))
+        lat.append((time.perf_counter() - s) * 1000)
+    wall = time.perf_counter() - t0
+    cpu = time.process_time() - cpu0
+    return {"n": len(lat), "ok": ok,
+            "p50_ms": round(statistics.median(lat), 2),
+            "p99_ms": round(sorted(lat)[int(len(lat) * 0.99)], 2),
+            "cpu_ms_per_lookup": round(cpu / len(lat) * 1000, 3),
+            "lookups_per_sec": round(len(lat) / wall, 1)}
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--lookups", type=int, default=500)
+    ap.add_argument("--latency-ms", type=float, default=20)
+    ap.add_argument("--whois-port", type=int, default=43)
+    args = ap.parse_args()
+
+    proc, base = start_mock(args.latency_ms, args.whois_port)
+    rdap_dir = tempfile.mkdtemp(prefix="shadowtrace_rdap_")
+    os.environ.update({"RDAP_BOOTSTRAP_URL": f"{base}/iana/rdap/dns.json", "RDAP_DIR": rdap_dir,
+                       "WHOIS_SERVER": "127.0.0.1"})
+    try:
+        import whois
+        from whois import NICClient
+        from app.services import domain_rdap
+
+        # python-whois picks the registry server from its own table; send it to the mock
+        NICClient.choose_server = lambda self, domain: "127.0.0.1"
+
+        def whois_legacy(domain):
+            try:
+                w = whois.whois(domain)
+                return {"ok": True, "data": {k: (list(v) if isinstance(v, (list, set, tuple)) else str(v))
+                                             for k, v in w.items()}}
+            except Exception as e:
+                return {"ok": False, "error": str(e)}
+
+        reg = domain_rdap.DomainRegistration()
+        reg.ready()
+        fallback = domain_rdap.DomainRegistration()
+        domains = [f"bench{i}.com" for i in range(args.lookups)]
+
+        report = {"latency_ms": args.latency_ms, "lookups": args.lookups}
+        report["whois_legacy"] = measure(whois_legacy, domains)
+        report["rdap"] = measure(reg.lookup, domains)
+        report["whois_fallback"] = measure(fallback.whois, domains)
+        report["rdap_cached"] = measure(reg.lookup, domains)
+
+        sample = domains[0]
+        old, new = whois_legacy(sample)["data"], reg.lookup(sample)["data"]
+        report["fields"] = {k: {"whois": old.get(k), "rdap": new.get(k)}
+                            for k in ("registrar", "creation_date", "expiration_date", "name_servers", "org")}
+        legacy, rdap = report["whois_legacy"], report["rdap"]
+        report["speedup"] = {"p50": round(legacy["p50_ms"] / rdap["p50_ms"], 2),
+                             "cpu": round(legacy["cpu_ms_per_lookup"] / rdap["cpu_ms_per_lookup"], 2)}
+    finally:
+        proc.terminate()
+        proc.wait()
+        shutil.rmtree(rdap_dir, ignore_errors=True)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
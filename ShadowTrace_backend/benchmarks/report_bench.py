@@ -0,0 +1,138 @@
+"""
+Case report throughput: reports/min for cases of --entities entities each,
+rendered through the report process pool, plus gather (aggregation) time,
+in-process render time and the latency of a cached re-request.
+
+    python -m benchmarks.report_bench --entities 1000 --reports 40 --workers 4 --format html
+
+mongomock by default. Its $unwind/$group run in Python and take seconds per
+case, so with mongomock gather is timed once and the throughput run reuses
+the gathered data; with --mongo-uri every job gathers from mongod. PDF needs
+WeasyPrint's system libraries (pango); without them the pdf run reports the
+error.
+"""
+import argparse
+import datetime
+import json
+import random
+import shutil
+import statistics
+import tempfile
+import time
+
+from benchmarks.scan_bench import _mongomock_compat
+from app.database import blobs
+from app.services import reports
+from app.services.reports import ReportService, gather_case
+from app.utils import pdf_export
+
+ENTITY_TYPES = ("ip_address", "internet_name", "emailaddr", "linked_url_internal", "affiliate_internet_name")
+
+
+def seed_case(db, case_id, entities, stored_scans, rnd):
+    now = datetime.datetime.utcnow()
+    db.osint_cases.insert_one({"case_id": case_id, "target": f"{case_id}.example",
+                               "scans": [{"scan_id": f"{case_id}-s{i}", "scan_name": f"scan {i}"}
+                                         for i in range(stored_scans)]})
+    per = entities // stored_scans
+    docs = []
+    for i in range(stored_scans):
+        ents = [{
+            "type": ENTITY_TYPES[j % len(ENTITY_TYPES)],
+            "value": f"value-{rnd.randrange(entities * 2)}.{case_id}.example",
+            "module": f"sfp_{j % 17}",
+            "severity": rnd.choice([None, 1, 2, 3]),
+            "timestamp": now,
+            "raw_at": ["events", j],
+        } for j in range(per)]
+        docs.append({"case_id": case_id, "scan_id": f"{case_id}-s{i}", "target": f"{case_id}.example",
+                     "source": "spiderfoot", "timestamp": now, "entity_count": len(ents), "entities": ents,
+                     "raw": {"_blob": "0" * 64, "bytes": 0}})
+    db.osint_cases.insert_many(docs)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--entities", type=int, default=1000)
+    ap.add_argument("--reports", type=int, default=40)
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--stored-scans", type=int, default=4)
+    ap.add_argument("--format", choices=sorted(pdf_export.FORMATS), default="html")
+    ap.add_argument("--mongo-uri")
+    args = ap.parse_args()
+
+    if args.mongo_uri:
+        from pymongo import MongoClient
+        db = MongoClient(args.mongo_uri)["shadowtrace_report_bench"]
+        db.client.drop_database("shadowtrace_report_bench")
+    else:
+        import mongomock
+        _mongomock_compat(mongomock)
+        db = mongomock.MongoClient()["shadowtrace_report_bench"]
+
+    rnd = random.Random(5)
+    cases = [f"case{i}" for i in range(args.reports)]
+    for c in cases:
+        seed_case(db, c, args.entities, args.stored_scans, rnd)
+
+    cache_dir = tempfile.mkdtemp(prefix="shadowtrace_reports_")
+    # GridFS (the default cache) on a real server, a scratch directory with mongomock
+    service = ReportService(workers=args.workers, database=db,
+                            cache=None if args.mongo_uri else blobs.FileBackend(cache_dir))
+
+    # single-report costs, in this process
+    t0 = time.perf_counter()
+    case = gather_case(db, cases[0])
+    gather_ms = (time.perf_counter() - t0) * 1000
+    case["version"] = "bench"
+    pdf_export.render_html(case)  # compile
+    renders = []
+    for _ in range(5):
+        t0 = time.perf_counter()
+        html = pdf_export.render_html(case)
+        renders.append((time.perf_counter() - t0) * 1000)
+
+    if not args.mongo_uri:
+        gathered = {c: gather_case(db, c) for c in cases}
+        reports.gather_case = lambda database, case_id: dict(gathered[case_id])
+
+    t0 = time.perf_counter()
+    service.warm()
+    warm_ms = (time.perf_counter() - t0) * 1000
+
+    t0 = time.perf_counter()
+    jobs = [service.submit(c, args.format) for c in cases]
+    done = [service.wait(j["id"]) for j in jobs]
+    wall = time.perf_counter() - t0
+    failed = [j for j in done if j["status"] != "done"]
+
+    t0 = time.perf_counter()
+    cached = service.submit(cases[0], args.format)
+    cached_ms = (time.perf_counter() - t0) * 1000
+
+    service.shutdown()
+    shutil.rmtree(cache_dir, ignore_errors=True)
+
+    report = {
+        "format": args.format,
+        "entities_per_case": case["entity_total"],
+        "workers": args.workers,
+        "gather_ms": round(gather_ms, 1),
+        "gather_in_throughput": bool(args.mongo_uri),
+        "render_html_ms_median": round(statistics.median(renders), 1),
+        "html_kb": round(len(html) / 1024, 1),
+        "pool_start_ms": round(warm_ms, 1),
+        "reports": len(jobs),
+        "failed": len(failed),
+        "reports_per_min": round(len(jobs) / wall * 60, 1) if not failed else 0,
+        "job_ms_median": round(statistics.median(j.get("duration_ms", 0) for j in done), 1),
+        "cached_request_ms": round(cached_ms, 2),
+        "cached_status": cached["status"],
+    }
+    if failed:
+        report["first_error"] = failed[0].get("error")
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Scan latency with degraded upstreams: fixed timeouts vs breakers, hedging,
+adaptive timeouts and the scan deadline.
+
+    python -m benchmarks.resilience_bench --scans 300 --concurrency 16 --deadline 3
+
+Runs search.run_scan for --scans IP and domain scans (the fan-out paths)
+against benchmarks.mock_upstreams in three scenarios:
+
+    healthy   every upstream at --latency-ms
+    tail      VirusTotal, AbuseIPDB and crt.sh answer --tail-ms late on
+              --tail-rate of their requests
+    outage    Shodan hangs for longer than its timeout on every request
+
+each twice: `legacy` (RESILIENCE off, no scan deadline: what run_scan did
+before) and `resilient` (breakers, hedging, adaptive timeouts and a
+--deadline second budget). Reports scan p50/p95/p99/max, how many scans came
+back partial, upstream requests sent and the breaker/hedge counters.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.mock_upstreams import MockConfig, serve, env_for
+from benchmarks.dns_bench import start_stub
+from benchmarks.scan_bench import make_queries, run_pool, percentile, _mongomock_compat
+
+
+def scenarios(tail_rate, tail_ms):
+    return {
+        "healthy": {},
+        "tail": {"vt": (tail_rate, tail_ms), "abuseipdb": (tail_rate, tail_ms), "crtsh": (tail_rate, tail_ms)},
+        "outage": {"shodan": (1.0, 10000)},
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--scans", type=int, default=300)
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--latency-ms", type=float, default=30)
+    ap.add_argument("--jitter-ms", type=float, default=10)
+    ap.add_argument("--tail-rate", type=float, default=0.05)
+    ap.add_argument("--tail-ms", type=float, default=4000)
+    ap.add_argument("--deadline", type=float, default=3, help="SCAN_DEADLINE_SECONDS for the resilient runs")
+    ap.add_argument("--scenarios", default="healthy,tail,outage")
+    ap.add_argument("--warmup", type=int, default=32)
+    args = ap.parse_args()
+
+    cfg = MockConfig(args.latency_ms, args.jitter_ms, crtsh_certs=50)
+    server, base = serve(config=cfg)
+    dns_port, dns_proc = start_stub(args.latency_ms / 1000)
+    os.environ.update(env_for(base))
+    rdap_dir = tempfile.mkdtemp(prefix="shadowtrace_rdap_")
+    blob_dir = tempfile.mkdtemp(prefix="shadowtrace_blobs_")
+    os.environ.update({"DNS_NAMESERVERS": "127.0.0.1", "DNS_PORT": str(dns_port), "ELASTIC_URL": "",
+                       "RDAP_DIR": rdap_dir})
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app.main  # noqa: F401
+        from app.api import search
+        from app.database import blobs
+        from app.database.write_behind import writer as mongo_writer
+        from app.services.dns_stage import dns_stage
+        from app.services.domain_rdap import domain_registration
+        from app.utils import resilience
+        from app.utils.http import session
+    import mongomock
+    _mongomock_compat(mongomock)
+    db = mongomock.MongoClient()["shadowtrace_bench"]
+    search.db = db
+    blobs.store._backend = blobs.FileBackend(blob_dir)
+    dns_stage.nameservers = ["127.0.0.1"]
+    dns_stage.port = dns_port
+
+    # fixed endpoints (IP RDAP, plain HTTP to the target) go to the mock, as in scan_bench
+    def rdap_ip(ip):
+        r = session.get(f"{base}/rdap/ip/{ip}", timeout=10)
+        return {"ok": r.ok, "source": "rdap", "rir": r.json() if r.ok else r.text}
+
+    def http_head(target):
+        try:
+            return {"status": session.head(f"{base}/http/{target}", timeout=resilience.bounded(3)).status_code}
+        except Exception as e:
+            return {"error": str(e)}
+
+    search.rdap_ip = rdap_ip
+    search.http_head = http_head
+    # crt.sh results are not merged into the subdomain index here: on mongomock those
+    # upserts cost more than the upstream call, and every run would see a different index
+    enumerate_subdomains = search.enumerate_subdomains
+    search.enumerate_subdomains = lambda domain, db=None: enumerate_subdomains(domain)
+
+    queries = make_queries(args.scans, "ip=0.5,domain=0.5")
+    report = {"scans": args.scans, "concurrency": args.concurrency, "latency_ms": args.latency_ms,
+              "deadline_s": args.deadline}
+    sink = io.StringIO()
+    # one-time costs (RDAP bootstrap, imports, first connections) stay out of the numbers
+    resilience.RESILIENCE = False
+    with contextlib.redirect_stdout(sink):
+        warm = [db.search_logs.insert_one({"query": q, "source": "bench", "status": "queued"}).inserted_id
+                for q in make_queries(args.warmup, "ip=0.5,domain=0.5", seed=8)]
+        run_pool(lambda oid: search.run_scan(str(oid)), warm, args.concurrency)
+    try:
+        for name, slow in scenarios(args.tail_rate, args.tail_ms).items():
+            if name not in args.scenarios.split(","):
+                continue
+            cfg.slow = slow
+            report[name] = {}
+            for mode in ("legacy", "resilient"):
+                resilience.RESILIENCE = mode == "resilient"
+                search.SCAN_DEADLINE_SECONDS = args.deadline if mode == "resilient" else 0
+                resilience.providers.clear()
+                # both modes start from cold DNS and registration caches
+                dns_stage.cache.entries.clear()
+                domain_registration.results.items.clear()
+                for c in (resilience.UPSTREAM_REQUESTS, resilience.UPSTREAM_HEDGES, resilience.DEADLINE_EXCEEDED):
+                    c.values.clear()
+                cfg.requests.clear()
+                coll = db.search_logs
+                coll.drop()
+                ids = [coll.insert_one({"query": q, "source": "bench", "status": "queued"}).inserted_id
+                       for q in queries]
+                with contextlib.redirect_stdout(sink):
+                    lat, wall = run_pool(lambda oid: search.run_scan(str(oid)), ids, args.concurrency)
+                    mongo_writer.flush()
+                partial = coll.count_documents({"results.partial": {"$exists": True}})
+                report[name][mode] = {
+                    "p50_ms": round(percentile(lat, 50) * 1000, 1),
+                    "p95_ms": round(percentile(lat, 95) * 1000, 1),
+                    "p99_ms": round(percentile(lat, 99) * 1000, 1),
+                    "max_ms": round(max(lat) * 1000, 1),
+                    "scans_per_sec": round(len(lat) / wall, 1),
+                    "done": coll.count_documents({"status": "done"}),
+                    "partial": partial,
+                    "upstream_requests": {k: v for k, v in sorted(cfg.requests.items())
+                                          if k in ("vt", "abuseipdb", "shodan", "crtsh")},
+                    "hedges": {"/".join(k): v for k, v in resilience.UPSTREAM_HEDGES.values.items()},
+                    "rejected": {k[0]: v for k, v in resilience.UPSTREAM_REQUESTS.values.items() if k[1] == "rejected"},
+                    "deadline_cut": {k[0]: v for k, v in resilience.DEADLINE_EXCEEDED.values.items()},
+                    "breakers": {k: v["state"] for k, v in resilience.stats().items()},
+                }
+            legacy, res = report[name]["legacy"], report[name]["resilient"]
+            report[name]["p99_speedup"] = round(legacy["p99_ms"] / res["p99_ms"], 2)
+            print(f"{name:8} legacy p99 {legacy['p99_ms']:>9} ms   resilient p99 {res['p99_ms']:>9} ms", flush=True)
+            # let abandoned slow requests drain before the next scenario
+            time.sleep(args.tail_ms / 1000 if name == "tail" else 10 if name == "outage" else 0)
+    finally:
+        server.shutdown()
+        dns_proc.terminate()
+        shutil.rmtree(rdap_dir, ignore_errors=True)
+        shutil.rmtree(blob_dir, ignore_errors=True)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
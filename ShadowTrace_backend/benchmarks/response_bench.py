@@ -0,0 +1,199 @@
+"""
+Bytes on the wire and CPU per request for the polled read endpoints.
+
+    python -m benchmarks.response_bench --requests 300 --entities 5000 --history 2000
+
+Seeds mongomock with one finished IP scan carrying full-size Shodan and
+VirusTotal payloads, one SpiderFoot case with --entities entities and
+--history scan records, then requests
+
+    /search/status/{id}   /osint/entities/{case_id}   /history/
+
+--requests times each, in-process through Starlette's TestClient, as:
+
+    legacy     the handlers as they were: dicts through jsonable_encoder and
+               the stdlib encoder, uncompressed
+    orjson     the current app, Accept-Encoding: identity
+    gzip, br   the current app with that Accept-Encoding
+    304        the current app, If-None-Match set to the ETag of the
+               previous response (a client polling an unchanged document)
+
+Reports wire bytes per response and process CPU per request (all threads,
+so the ASGI portal and the handler thread are both counted). mongomock
+deep-copies every document it returns, which real Mongo does not, so each
+body is also encoded on its own (`encode`): jsonable_encoder + stdlib json
+vs orjson, and orjson + gzip / brotli.
+"""
+import argparse
+import contextlib
+import io
+import json
+import random
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+
+from benchmarks.scan_bench import _mongomock_compat
+
+
+def shodan_payload(rnd, services):
+    return {"ip_str": "203.0.113.7", "org": "Example Hosting", "isp": "Example", "asn": "AS64500",
+            "ports": [s * 7 + 21 for s in range(services)], "hostnames": [f"h{i}.example.net" for i in range(8)],
+            "data": [{"port": s * 7 + 21, "transport": "tcp", "product": rnd.choice(["nginx", "OpenSSH", "Apache"]),
+                      "timestamp": datetime(2026, 1, 1) + timedelta(minutes=s),
+                      "data": "HTTP/1.1 200 OK\r\nServer: nginx\r\n" + "X-Header: " + "a" * rnd.randint(200, 1200),
+                      "ssl": {"cert": {"subject": {"CN": f"svc{s}.example.net"}, "fingerprint": "%040x" % s}}}
+                     for s in range(services)]}
+
+
+def vt_payload(rnd):
+    engines = [f"Engine{i:02}" for i in range(90)]
+    return {"data": {"id": "203.0.113.7", "type": "ip_address", "attributes": {
+        "last_analysis_stats": {"malicious": 3, "suspicious": 1, "harmless": 60, "undetected": 26},
+        "last_analysis_results": {e: {"category": rnd.choice(["harmless", "undetected", "malicious"]),
+                                      "result": rnd.choice(["clean", "unrated", "malware"]),
+                                      "method": "blacklist", "engine_name": e} for e in engines},
+        "whois": "NetRange: 203.0.113.0 - 203.0.113.255\n" * 40}}}
+
+
+def seed(db, args):
+    rnd = random.Random(args.seed)
+    now = datetime(2026, 10, 1)
+    scan_id = db.search_logs.insert_one({
+        "query": "203.0.113.7", "source": "bench", "status": "done", "created_at": now, "updated_at": now,
+        "results": {"meta": {"query": "203.0.113.7", "entity": "ip"},
+                    "shodan": shodan_payload(rnd, args.services), "vt": vt_payload(rnd),
+                    "abuseipdb": {"data": {"abuseConfidenceScore": 40, "totalReports": 12}},
+                    "threat_score": {"score": 61, "risk_level": "medium"}},
+    }).inserted_id
+    db.osint_cases.insert_one({
+        "case_id": "case-bench", "scan_id": "sf-1", "target": "example.net", "source": "spiderfoot",
+        "timestamp": now, "entity_count": args.entities,
+        "entities": [{"type": rnd.choice(["ip_address", "internet_name", "emailaddr", "url"]),
+                      "value": f"value-{i}.example.net", "module": "sfp_dns", "severity": None,
+                      "timestamp": now} for i in range(args.entities)],
+    })
+    db.scans.insert_many([{"scan_id": str(ObjectId()), "query": f"host{i}.example.net", "status": "done",
+                           "risk_level": rnd.choice(["low", "medium", "high"]), "score": rnd.randint(0, 100),
+                           "created_at": now - timedelta(minutes=i), "updated_at": now - timedelta(minutes=i)}
+                          for i in range(args.history)])
+    return str(scan_id)
+
+
+def legacy_app(db):
+    """The three handlers as they were before ETags and the orjson response class."""
+    from fastapi import FastAPI
+    from app.database.blobs import store as blob_store, SCAN_BLOB_FIELDS
+    app = FastAPI()
+
+    @app.get("/search/status/{id}")
+    async def status(id, raw: bool = True):
+        d = db.search_logs.find_one({"_id": ObjectId(id)})
+        d["id"] = id
+        d.pop("_id")
+        if raw and d.get("results"):
+            d["results"] = blob_store.hydrate(d["results"], SCAN_BLOB_FIELDS)
+        return d
+
+    @app.get("/osint/entities/{case_id}")
+    def entities(case_id: str):
+        case = db.osint_cases.find_one({"case_id": case_id}, {"_id": 0, "entities": 1})
+        grouped = {}
+        for ent in case.get("entities", []):
+            grouped.setdefault(ent.get("type", "unknown"), []).append(ent["value"])
+        return grouped
+
+    @app.get("/history/")
+    async def history():
+        data = list(db.scans.find({}, {"_id": 0}).sort("_id", -1))
+        return {"count": len(data), "data": data}
+
+    return app
+
+
+def measure(client, path, n, headers=None, conditional=False):
+    first = client.get(path, headers=headers or {})
+    assert first.status_code == 200, (path, first.status_code, first.text[:200])
+    if conditional:
+        headers = {**(headers or {}), "If-None-Match": first.headers["etag"]}
+    wire = []
+    t0, c0 = time.perf_counter(), time.process_time()
+    for _ in range(n):
+        r = client.get(path, headers=headers or {})
+        wire.append(r.num_bytes_downloaded)
+    cpu, wall = time.process_time() - c0, time.perf_counter() - t0
+    return {"status": r.status_code, "wire_bytes": round(sum(wire) / n), "json_bytes": len(first.content),
+            "encoding": first.headers.get("content-encoding", "identity"),
+            "cpu_ms_per_req": round(cpu / n * 1000, 3), "wall_ms_per_req": round(wall / n * 1000, 3)}
+
+
+def encode_cost(body, n):
+    """CPU ms per body for each encoding step, without the app or the database."""
+    import zlib
+    import brotli
+    from fastapi.encoders import jsonable_encoder
+    from fastapi.responses import JSONResponse
+    from app.utils import responses
+    raw = responses.dumps(body)
+    steps = {
+        "jsonable_encoder+json": lambda: JSONResponse(jsonable_encoder(body)).body,
+        "orjson": lambda: responses.dumps(body),
+        "orjson+gzip": lambda: zlib.compress(responses.dumps(body), responses.COMPRESS_GZIP_LEVEL),
+        "orjson+br": lambda: brotli.compress(responses.dumps(body), quality=responses.COMPRESS_BROTLI_QUALITY),
+    }
+    out = {"json_bytes": len(raw)}
+    for name, fn in steps.items():
+        c0 = time.process_time()
+        for _ in range(n):
+            fn()
+        out[name + "_ms"] = round((time.process_time() - c0) / n * 1000, 3)
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--requests", type=int, default=300)
+    ap.add_argument("--services", type=int, default=40, help="Shodan services on the scanned host")
+    ap.add_argument("--entities", type=int, default=5000)
+    ap.add_argument("--history", type=int, default=2000)
+    ap.add_argument("--seed", type=int, default=5)
+    args = ap.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app.main
+        from app.api import search, history
+        from app.routers import osint
+    from fastapi.testclient import TestClient
+    import mongomock
+    _mongomock_compat(mongomock)
+    db = mongomock.MongoClient()["shadowtrace_bench"]
+    search.db = osint.db = db
+    history.scans_collection = db.scans
+    scan_id = seed(db, args)
+
+    paths = {"status": f"/search/status/{scan_id}", "entities": "/osint/entities/case-bench", "history": "/history/"}
+    legacy = TestClient(legacy_app(db))
+    current = TestClient(app.main.app)
+    report = {"config": vars(args)}
+    for name, path in paths.items():
+        out = report[name] = {
+            "legacy": measure(legacy, path, args.requests, {"Accept-Encoding": "identity"}),
+            "orjson": measure(current, path, args.requests, {"Accept-Encoding": "identity"}),
+            "gzip": measure(current, path, args.requests, {"Accept-Encoding": "gzip"}),
+            "br": measure(current, path, args.requests, {"Accept-Encoding": "br"}),
+            "304": measure(current, path, args.requests, {"Accept-Encoding": "br, gzip"}, conditional=True),
+        }
+        out["encode"] = encode_cost(current.get(path, headers={"Accept-Encoding": "identity"}).json(), args.requests)
+        base = out["legacy"]
+        for mode in ("orjson", "gzip", "br", "304"):
+            out[mode]["wire_ratio"] = round(out[mode]["wire_bytes"] / base["wire_bytes"], 4)
+            out[mode]["cpu_speedup"] = round(base["cpu_ms_per_req"] / max(out[mode]["cpu_ms_per_req"], 1e-3), 1)
+        print(f"{name:9} " + "  ".join(f"{m} {out[m]['wire_bytes']}B {out[m]['cpu_ms_per_req']}ms" for m in out
+                                     if m != "encode"),
+              flush=True)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+"""
+Reproducible end-to-end scan benchmark against the local mock OSINT universe.
+
+    python -m benchmarks.scan_bench --scans 200 --concurrency 16 --latency-ms 50 \
+        --out benchmarks/results/current.json --baseline benchmarks/baseline.json
+
+Starts benchmarks.mock_upstreams and the stub DNS server, points the app at
+them through its base-URL settings, and drives three paths:
+
+  search   POST /search/start, timed until the scheduler has run the scan
+  store    POST /osint/store  (SpiderFoot export -> entity extraction -> Mongo)
+  engine   app.services.osint_engine.run_scan
+
+Storage is mongomock by default, or a real server with --mongo-uri. Reports
+p50/p99 latency, scans/sec and tracemalloc peak memory per scan, writes the
+result JSON and, with --baseline, fails if any path regressed by more than
+--max-regression.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import shutil
+import tempfile
+import threading
+import time
+import tracemalloc
+import concurrent.futures
+
+from benchmarks.mock_upstreams import MockConfig, serve, env_for
+from benchmarks.dns_bench import start_stub
+
+DEFAULT_MIX = "ip=0.3,domain=0.3,email=0.2,username=0.2"
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    s = sorted(values)
+    k = min(len(s) - 1, max(0, int(round(p / 100 * (len(s) - 1)))))
+    return s[k]
+
+
+def summarize(latencies, wall, mem_peaks):
+    return {
+        "count": len(latencies),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "mean_ms": round(sum(latencies) / len(latencies) * 1000, 2),
+        "scans_per_sec": round(len(latencies) / wall, 2),
+        "mem_peak_kb_per_scan": round(sum(mem_peaks) / len(mem_peaks) / 1024, 1) if mem_peaks else None,
+    }
+
+
+def make_queries(n, mix, seed=7):
+    rnd = random.Random(seed)
+    kinds, weights = zip(*[(k, float(w)) for k, w in (p.split("=") for p in mix.split(","))])
+    out = []
+    for i in range(n):
+        kind = rnd.choices(kinds, weights)[0]
+        if kind == "ip":
+            out.append(f"{rnd.randint(1, 99)}.{rnd.randint(0, 255)}.{rnd.randint(0, 255)}.{rnd.randint(1, 254)}")
+        elif kind == "domain":
+            out.append(f"site{i}.bench.test")
+        elif kind == "email":
+            out.append(f"user{i}@bench.test")
+        else:
+            out.append(f"analyst_{i}")
+    return out
+
+
+def run_pool(fn, items, concurrency):
+    latencies = []
+
+    def one(item):
+        t0 = time.perf_counter()
+        fn(item)
+        return time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as ex:
+        latencies = list(ex.map(one, items))
+    return latencies, time.perf_counter() - t0
+
+
+def measure_memory(fn, items):
+    """Peak traced allocation per call, run sequentially."""
+    peaks = []
+    tracemalloc.start()
+    for item in items:
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        fn(item)
+        peaks.append(tracemalloc.get_traced_memory()[1] - base)
+    tracemalloc.stop()
+    return peaks
+
+
+def avg_doc_bytes(collection):
+    """Mean BSON size of a collection's documents: what each one costs the working set."""
+    import bson
+    sizes = [len(bson.encode(d)) for d in collection.find()]
+    return round(sum(sizes) / len(sizes)) if sizes else 0
+
+
+def _mongomock_compat(mongomock):
+    """pymongo 4.9+ passes `sort` to bulk update ops; older mongomock rejects it."""
+    builder = mongomock.collection.BulkOperationBuilder
+    add_update = builder.add_update
+
+    def patched(self, *args, sort=None, **kwargs):
+        return add_update(self, *args, **kwargs)
+    builder.add_update = patched
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return None
+
+
+def compare(current, baseline, max_regression):
+    """Print deltas; return the list of regressions beyond max_regression."""
+    regressions = []
+    for name, cur in current["results"].items():
+        base = baseline.get("results", {}).get(name)
+        if not base or "error" in cur or "error" in base:
+            continue
+        for key, higher_is_worse in (("p50_ms", True), ("p99_ms", True), ("scans_per_sec", False),
+                                     ("mem_peak_kb_per_scan", True)):
+            b, c = base.get(key), cur.get(key)
+            if not b or c is None:
+                continue
+            delta = (c - b) / b
+            worse = delta if higher_is_worse else -delta
+            flag = "REGRESSION" if worse > max_regression else ""
+            print(f"{name:8} {key:22} {b:>10} -> {c:>10} ({delta:+.1%}) {flag}")
+            if flag:
+                regressions.append((name, key, b, c))
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--scans", type=int, default=200)
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--mix", default=DEFAULT_MIX)
+    ap.add_argument("--latency-ms", type=float, default=50)
+    ap.add_argument("--jitter-ms", type=float, default=20)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--payload-kb", type=int, default=8)
+    ap.add_argument("--spiderfoot-events", type=int, default=2000)
+    ap.add_argument("--mem-scans", type=int, default=20, help="sequential scans traced for memory")
+    ap.add_argument("--mongo-uri", help="use a real MongoDB instead of mongomock")
+    ap.add_argument("--paths", default="search,store,engine")
+    ap.add_argument("--out", default="benchmarks/results/latest.json")
+    ap.add_argument("--baseline")
+    ap.add_argument("--max-regression", type=float, default=0.2)
+    args = ap.parse_args()
+
+    cfg = MockConfig(args.latency_ms, args.jitter_ms, args.error_rate, args.payload_kb,
+                     spiderfoot_events=args.spiderfoot_events)
+    server, base = serve(config=cfg)
+    dns_port, dns_proc = start_stub(args.latency_ms / 1000)
+
+    # settings are read at import time, so configure before importing the app
+    os.environ.update(env_for(base))
+    rdap_dir = tempfile.mkdtemp(prefix="shadowtrace_rdap_")
+    os.environ.update({"DNS_NAMESERVERS": "127.0.0.1", "DNS_PORT": str(dns_port), "ELASTIC_URL": "",
+                       "RDAP_DIR": rdap_dir})
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        import app.main  # noqa: F401
+        from app.api import search
+        from app.routers import osint
+        from app.services import osint_processor
+        from app.database.write_behind import writer as mongo_writer
+        from fastapi.testclient import TestClient
+
+    if args.mongo_uri:
+        from pymongo import MongoClient
+        db = MongoClient(args.mongo_uri)["shadowtrace_bench"]
+        db.client.drop_database("shadowtrace_bench")
+    else:
+        import mongomock
+        _mongomock_compat(mongomock)
+        db = mongomock.MongoClient()["shadowtrace_bench"]
+    for mod in (app.main, search, osint, osint_processor):
+        mod.db = db
+
+    # raw payloads: GridFS on a real server (built by the store itself, as in the
+    # app), a scratch directory with mongomock
+    from app.database import blobs, mongo
+    blob_dir = tempfile.mkdtemp(prefix="shadowtrace_blobs_")
+    if args.mongo_uri:
+        mongo._database = db
+        blobs.store._backend = None
+    else:
+        blobs.store._backend = blobs.FileBackend(blob_dir)
+
+    # dns_stage was already imported (via dns_bench) before the env was set
+    from app.services.dns_stage import dns_stage
+    dns_stage.nameservers = ["127.0.0.1"]
+    dns_stage.port = dns_port
+
+    # probes that talk to fixed endpoints (IP RDAP via ipwhois, plain HTTP to the
+    # target) are routed to the mock's equivalents; domain RDAP follows the
+    # mock's bootstrap file
+    from app.utils.http import session
+
+    def mock_json(path):
+        r = session.get(f"{base}{path}", timeout=10)
+        return {"ok": r.ok, "data": r.json() if r.ok else r.text}
+
+    search.rdap_ip = lambda ip: {"ok": True, "source": "rdap", "rir": mock_json(f"/rdap/ip/{ip}")["data"]}
+    search.http_head = lambda t: {"status": session.head(f"{base}/http/{t}", timeout=10).status_code}
+    search.SOCIAL_URLS = {site: f"{base}/social/{site}/{{username}}" for site in search.SOCIAL_URLS}
+
+    client = TestClient(app.main.app)
+    paths = set(args.paths.split(","))
+    results = {}
+    queries = make_queries(args.scans, args.mix)
+    mem_queries = make_queries(args.mem_scans, args.mix, seed=8)
+
+    # scans run on the scheduler's workers; each request waits for its own scan
+    finished = {}
+    run_scan = search.run_scan
+
+    def tracked_run_scan(id):
+        try:
+            run_scan(id)
+        finally:
+            finished.setdefault(id, threading.Event()).set()
+    search.run_scan = tracked_run_scan
+
+    def search_one(q):
+        r = client.post("/search/start", json={"query": q, "source": "bench"})
+        r.raise_for_status()
+        id = r.json()["id"]
+        finished.setdefault(id, threading.Event()).wait()
+        finished.pop(id, None)
+
+    def store_one(i):
+        r = client.post("/osint/store", json={"case_id": f"case{i % 50}", "scan_id": f"SCAN{i}", "target": "bench.test"})
+        r.raise_for_status()
+
+    sink = io.StringIO()
+    if "search" in paths:
+        with contextlib.redirect_stdout(sink):
+            lat, wall = run_pool(search_one, queries, args.concurrency)
+            mem = measure_memory(search_one, mem_queries)
+            # scan results are written behind; land them before counting
+            mongo_writer.flush()
+        res = summarize(lat, wall, mem)
+        res["status_counts"] = {s: db.search_logs.count_documents({"status": s}) for s in ("done", "failed")}
+        res["avg_doc_bytes"] = avg_doc_bytes(db.search_logs)
+        failed = db.search_logs.find_one({"status": "failed"})
+        if failed:
+            res["first_error"] = (failed.get("error") or "").strip().splitlines()[-1]
+        results["search"] = res
+
+    if "store" in paths:
+        with contextlib.redirect_stdout(sink):
+            lat, wall = run_pool(store_one, range(args.scans), args.concurrency)
+            mem = measure_memory(store_one, range(args.mem_scans))
+        results["store"] = summarize(lat, wall, mem)
+        results["store"]["avg_doc_bytes"] = avg_doc_bytes(db.osint_cases)
+
+    if "engine" in paths:
+        try:
+            with contextlib.redirect_stdout(sink):
+                from app.services import osint_engine
+
+            def engine_one(q):
+                asyncio.run(osint_engine.run_scan(f"bench-{q}", q))
+
+            engine_queries = [q for q in queries if "@" in q or q.startswith("analyst_")] or queries
+            with contextlib.redirect_stdout(sink):
+                lat, wall = run_pool(engine_one, engine_queries, args.concurrency)
+                mem = measure_memory(engine_one, [q for q in mem_queries if "@" in q or q.startswith("analyst_")] or mem_queries)
+            results["engine"] = summarize(lat, wall, mem)
+        except Exception as e:
+            results["engine"] = {"error": f"{e.__class__.__name__}: {e}"}
+
+    server.shutdown()
+    dns_proc.terminate()
+    results["blobs"] = {
+        "puts": {k[0]: v for k, v in blobs.BLOB_PUTS.values.items()},
+        "bytes": {k[0]: v for k, v in blobs.BLOB_BYTES.values.items()},
+        "codec": blobs.CODEC,
+    }
+    shutil.rmtree(blob_dir, ignore_errors=True)
+    shutil.rmtree(rdap_dir, ignore_errors=True)
+
+    out = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "storage": "mongod" if args.mongo_uri else "mongomock",
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "baseline")},
+        "upstream_requests": cfg.requests,
+        "results": results,
+    }
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w") as f:
+        json.dump(out, f, indent=2)
+    print(json.dumps(out["results"], indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if compare(out, baseline, args.max_regression):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Queue-wait simulation: one FIFO (what BackgroundTasks gave us) vs the
+fair-share scan scheduler.
+
+    python -m benchmarks.scheduler_sim --bulk 5000 --analysts 5 --rate 10 --seconds 5
+
+Drives app.services.scan_scheduler.FairScheduler with stand-in scans that
+sleep for a lognormal service time (--service-ms mean), on real threads:
+
+    bulk-a      --bulk batch scans submitted at t=0 (the 50k-indicator import)
+    bulk-b      --bulk/5 batch scans submitted at t=1s (a second import)
+    analyst-N   --analysts tenants issuing interactive single scans,
+                Poisson at --rate per second each, for --seconds
+
+The same arrivals go through a FIFO pool with the same number of workers.
+Reports per tenant: queue wait p50/p95/p99/max, scans run, the most scans
+it had running at once (must stay within --tenant-limit), and how bulk-a
+and bulk-b shared the batch lane while both were queued.
+"""
+import argparse
+import concurrent.futures
+import json
+import random
+import threading
+import time
+
+from app.services.scan_scheduler import FairScheduler, parse_weights
+
+
+def percentile(values, p):
+    s = sorted(values)
+    return s[min(len(s) - 1, int(len(s) * p / 100))] if s else None
+
+
+class Recorder:
+    """The stand-in scan: records queue wait and per-tenant concurrency, then sleeps."""
+
+    def __init__(self, service_ms, seed):
+        self.lock = threading.Lock()
+        self.waits = {}
+        self.running = {}
+        self.peak = {}
+        self.starts = []  # (time, tenant)
+        self.rnd = random.Random(seed)
+        self.mu = service_ms / 1000
+        self.t0 = None
+
+    def scan(self, tenant, queued_at):
+        now = time.monotonic()
+        with self.lock:
+            self.waits.setdefault(tenant, []).append(now - queued_at)
+            self.running[tenant] = self.running.get(tenant, 0) + 1
+            self.peak[tenant] = max(self.peak.get(tenant, 0), self.running[tenant])
+            self.starts.append((now - self.t0, tenant))
+            # lognormal with the requested mean, sigma 0.5
+            d = self.rnd.lognormvariate(0, 0.5) * self.mu / 1.133
+        time.sleep(d)
+        with self.lock:
+            self.running[tenant] -= 1
+
+
+def arrivals(args):
+    """[(offset s, tenant, lane, count)] sorted by offset."""
+    rnd = random.Random(args.seed)
+    out = [(0.0, "bulk-a", "batch", args.bulk), (1.0, "bulk-b", "batch", args.bulk // 5)]
+    for a in range(args.analysts):
+        t = rnd.expovariate(args.rate)
+        while t < args.seconds:
+            out.append((t, f"analyst-{a}", "interactive", 1))
+            t += rnd.expovariate(args.rate)
+    return sorted(out)
+
+
+def drive(args, submit, rec):
+    rec.t0 = time.monotonic()
+    for offset, tenant, lane, count in arrivals(args):
+        delay = rec.t0 + offset - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        now = time.monotonic()
+        submit(tenant, lane, [(tenant, now)] * count)
+
+
+def report(rec, wall, limit=None):
+    out = {"wall_s": round(wall, 2), "tenants": {}}
+    for tenant in sorted(rec.waits):
+        w = rec.waits[tenant]
+        out["tenants"][tenant] = {
+            "scans": len(w),
+            "wait_ms": {k: round(percentile(w, p) * 1000, 1) for k, p in (("p50", 50), ("p95", 95), ("p99", 99))}
+            | {"max": round(max(w) * 1000, 1)},
+            "peak_running": rec.peak[tenant],
+        }
+    analysts = [x for t, ws in rec.waits.items() if t.startswith("analyst") for x in ws]
+    out["interactive_wait_ms"] = {"p50": round(percentile(analysts, 50) * 1000, 1),
+                                  "p99": round(percentile(analysts, 99) * 1000, 1)}
+    # batch-lane share while both imports were queued: from bulk-b's first start to bulk-b's last
+    b = [t for t, tenant in rec.starts if tenant == "bulk-b"]
+    if b:
+        window = [tenant for t, tenant in rec.starts if b[0] <= t <= b[-1] and tenant.startswith("bulk")]
+        out["bulk_share_while_both_queued"] = {k: round(window.count(k) / len(window), 3) for k in ("bulk-a", "bulk-b")}
+    if limit is not None:
+        out["tenant_limit_respected"] = all(p <= limit for p in rec.peak.values())
+    return out
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--bulk", type=int, default=5000)
+    ap.add_argument("--analysts", type=int, default=5)
+    ap.add_argument("--rate", type=float, default=10, help="interactive scans/sec per analyst")
+    ap.add_argument("--seconds", type=float, default=5)
+    ap.add_argument("--service-ms", type=float, default=20)
+    ap.add_argument("--workers", type=int, default=16)
+    ap.add_argument("--tenant-limit", type=int, default=12)
+    ap.add_argument("--batch-every", type=int, default=10)
+    ap.add_argument("--weights", default="", help="e.g. bulk-b=2")
+    ap.add_argument("--seed", type=int, default=3)
+    args = ap.parse_args()
+
+    result = {"config": vars(args)}
+
+    # FIFO: one queue, same workers
+    rec = Recorder(args.service_ms, args.seed)
+    pool = concurrent.futures.ThreadPoolExecutor(args.workers)
+    t0 = time.perf_counter()
+    drive(args, lambda tenant, lane, jobs: [pool.submit(rec.scan, *j) for j in jobs], rec)
+    pool.shutdown(wait=True)
+    result["fifo"] = report(rec, time.perf_counter() - t0)
+
+    # fair-share scheduler
+    rec = Recorder(args.service_ms, args.seed)
+    weights = parse_weights(args.weights)
+    sched = FairScheduler(workers=args.workers, tenant_limit=args.tenant_limit, batch_every=args.batch_every,
+                          weights=weights)
+    done = threading.Semaphore(0)
+    total = [0]
+
+    def job(tenant, queued_at):
+        try:
+            rec.scan(tenant, queued_at)
+        finally:
+            done.release()
+
+    def submit(tenant, lane, jobs):
+        total[0] += len(jobs)
+        if len(jobs) == 1:
+            sched.submit(job, *jobs[0], tenant=tenant, lane=lane)
+        else:
+            sched.submit_many(job, jobs, tenant=tenant, lane=lane)
+
+    t0 = time.perf_counter()
+    drive(args, submit, rec)
+    for _ in range(total[0]):
+        done.acquire()
+    result["fair"] = report(rec, time.perf_counter() - t0, args.tenant_limit)
+    result["fair"]["scheduler"] = {k: v for k, v in sched.stats().items() if k != "tenants"}
+    sched.close()
+
+    fifo, fair = result["fifo"]["interactive_wait_ms"], result["fair"]["interactive_wait_ms"]
+    result["interactive_p99_speedup"] = round(fifo["p99"] / max(fair["p99"], 0.1), 1)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Scoring throughput: per-result score() vs batched score_many(), and an
+end-to-end history rescore (mongomock by default; its updates are linear
+scans, so use --mongo-uri for realistic rescore numbers).
+
+    python -m benchmarks.scoring_bench --results 100000 --history 2000
+"""
+import argparse
+import json
+import random
+import time
+
+from app.services.scoring import ScoringModel, DEFAULT_RULES, evidence_from_scan, rescore
+
+
+def synthetic_result(rnd):
+    res = {}
+    if rnd.random() < 0.5:
+        res["vt"] = {"ok": True, "data": {"data": {"attributes": {"last_analysis_stats": {"malicious": rnd.randint(0, 20)}}}}}
+        res["abuseipdb"] = {"ok": True, "data": {"abuseConfidenceScore": rnd.randint(0, 100)}}
+        res["shodan"] = {"ok": True, "host": {"ports": list(range(rnd.randint(0, 15)))}}
+    else:
+        res["hibp"] = {"ok": True, "data": [{"Name": "x"}] * rnd.randint(0, 8)}
+        res["social_profile"] = {"links_found": ["github"] * rnd.randint(0, 4), "confidence": rnd.randint(0, 95)}
+    return res
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--results", type=int, default=100000)
+    ap.add_argument("--history", type=int, default=2000)
+    ap.add_argument("--mongo-uri")
+    args = ap.parse_args()
+
+    rnd = random.Random(11)
+    results = [synthetic_result(rnd) for _ in range(args.results)]
+    model = ScoringModel()
+
+    t0 = time.perf_counter()
+    evs = [evidence_from_scan(r) for r in results]
+    extract_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    single = [model.score(e) for e in evs]
+    single_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    batch = model.score_many(evs)
+    batch_s = time.perf_counter() - t0
+    assert single == batch
+
+    report = {
+        "results": args.results,
+        "extract_per_sec": round(args.results / extract_s),
+        "score_per_sec": round(args.results / single_s),
+        "score_many_per_sec": round(args.results / batch_s),
+    }
+
+    if args.history:
+        if args.mongo_uri:
+            from pymongo import MongoClient
+            coll = MongoClient(args.mongo_uri)["shadowtrace_bench"]["search_logs"]
+            coll.drop()
+        else:
+            import mongomock
+            from benchmarks.scan_bench import _mongomock_compat
+            _mongomock_compat(mongomock)
+            coll = mongomock.MongoClient()["bench"]["search_logs"]
+        coll.insert_many([{"status": "done", "results": r, "threat_model": "old"} for r in results[:args.history]])
+        reweighted = ScoringModel([{**r, "weight": r["weight"] * 0.9} for r in DEFAULT_RULES])
+        t0 = time.perf_counter()
+        out = rescore(coll, reweighted)
+        report["rescore_history"] = {**out, "per_sec": round(out["updated"] / (time.perf_counter() - t0))}
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+/search/query latency against a local Elasticsearch holding --docs scans
+(and a tenth as many alerts).
+
+    python -m benchmarks.search_bench --elastic-url http://localhost:9200 --docs 10000000
+    python -m benchmarks.search_bench --elastic-url http://localhost:9200 --skip-load
+
+Loads synthetic documents into shadowtrace-bench-* indexes created with the
+production mappings (replicas 0, refresh off while loading), then reports
+p50/p95/p99 in ms for: uncached first pages with facets, cached first pages,
+and deep pages walked through the search_after/PIT cursor. Queries mix
+full-text, entity/risk filters and date ranges; --pages deep pages are read
+per walk.
+"""
+import argparse
+import datetime
+import json
+import random
+import statistics
+import time
+
+from elasticsearch import Elasticsearch, helpers
+
+from app.database import elastic
+from app.database.es_mapping import MAPPING as SCAN_MAPPING
+from app.database.alerts_mapping import ALERT_MAPPING
+from app.services import scan_search
+
+SCANS, ALERTS = "shadowtrace-bench-scans", "shadowtrace-bench-alerts"
+ENTITIES = ("domain", "ip", "email", "username", "url", "hash", "phone", "wallet")
+LEVELS = ("low", "low", "low", "medium", "high")
+WORDS = ("acme", "globex", "initech", "umbrella", "hooli", "stark", "wayne", "tyrell", "cyberdyne", "soylent")
+
+
+def scan_docs(n, rnd, start):
+    for i in range(n):
+        entity = ENTITIES[i % len(ENTITIES)]
+        word = rnd.choice(WORDS)
+        ts = start + datetime.timedelta(seconds=i * 3)
+        yield {"_index": SCANS, "_id": f"s{i}", "_source": {
+            "scan_id": f"s{i}", "query": f"{word}-{i}.example.com" if entity == "domain" else f"{word} {i}",
+            "type": entity, "source": "auto", "status": "done", "risk_level": rnd.choice(LEVELS),
+            "score": rnd.randrange(100), "summary": f"{word} {entity} scan", "created_at": ts.isoformat(),
+            "updated_at": ts.isoformat(),
+        }}
+
+
+def alert_docs(n, rnd, start):
+    for i in range(n):
+        word = rnd.choice(WORDS)
+        yield {"_index": ALERTS, "_id": f"a{i}", "_source": {
+            "alert_id": f"a{i}", "title": f"High risk domain: {word}-{i}.example.com",
+            "severity": rnd.choice(("medium", "high")), "entity": rnd.choice(ENTITIES),
+            "description": f"{word} alert", "timestamp": (start + datetime.timedelta(seconds=i * 30)).isoformat(),
+        }}
+
+
+def load(es, docs, alerts, chunk, threads):
+    start = datetime.datetime(2023, 1, 1)
+    rnd = random.Random(7)
+    for index, mapping in ((SCANS, SCAN_MAPPING), (ALERTS, ALERT_MAPPING)):
+        es.indices.delete(index=index, ignore_unavailable=True)
+        es.indices.create(index=index, mappings=mapping,
+                          settings={"number_of_replicas": 0, "refresh_interval": "-1"})
+    t0 = time.perf_counter()
+    for gen in (scan_docs(docs, rnd, start), alert_docs(alerts, rnd, start)):
+        for ok, item in helpers.parallel_bulk(es, gen, chunk_size=chunk, thread_count=threads):
+            if not ok:
+                raise RuntimeError(item)
+    for index in (SCANS, ALERTS):
+        es.indices.put_settings(index=index, settings={"refresh_interval": "1s"})
+        es.indices.refresh(index=index)
+        es.indices.forcemerge(index=index, max_num_segments=1)
+    return time.perf_counter() - t0
+
+
+def queries(rnd, n):
+    out = []
+    for _ in range(n):
+        p = {"q": None, "index": rnd.choice(("scans", "scans", "all")), "entity": None, "risk": None,
+             "status": None, "since": None, "until": None, "size": 20, "facets": True}
+        if rnd.random() < 0.6:
+            p["q"] = rnd.choice(WORDS)
+        if rnd.random() < 0.5:
+            p["entity"] = [rnd.choice(ENTITIES)]
+        if rnd.random() < 0.5:
+            p["risk"] = ["high"] if rnd.random() < 0.5 else ["medium", "high"]
+        if rnd.random() < 0.4:
+            p["since"] = f"2023-0{rnd.randrange(1, 10)}-01"
+        out.append(p)
+    return out
+
+
+def pct(values):
+    values = sorted(values)
+    at = lambda q: round(values[min(len(values) - 1, int(q * len(values)))], 2)
+    return {"n": len(values), "p50": round(statistics.median(values), 2), "p95": at(0.95), "p99": at(0.99)}
+
+
+def timed(fn, *args, **kw):
+    t0 = time.perf_counter()
+    out = fn(*args, **kw)
+    return out, (time.perf_counter() - t0) * 1000
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--elastic-url", default="http://localhost:9200")
+    ap.add_argument("--docs", type=int, default=10_000_000)
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("--walks", type=int, default=20)
+    ap.add_argument("--pages", type=int, default=50)
+    ap.add_argument("--chunk", type=int, default=5000)
+    ap.add_argument("--threads", type=int, default=4)
+    ap.add_argument("--skip-load", action="store_true")
+    args = ap.parse_args()
+
+    es = Elasticsearch(args.elastic_url, request_timeout=120)
+    elastic.es_client = es
+    scan_search.INDEXES.update({"scans": SCANS, "alerts": ALERTS, "all": f"{SCANS},{ALERTS}"})
+
+    report = {"docs": args.docs}
+    if not args.skip_load:
+        report["load_s"] = round(load(es, args.docs, args.docs // 10, args.chunk, args.threads), 1)
+    report["indexed"] = {i: es.count(index=i)["count"] for i in (SCANS, ALERTS)}
+
+    rnd = random.Random(11)
+    qs = queries(rnd, args.queries)
+    cold, warm = [], []
+    for p in qs:
+        scan_search.cache.clear()
+        _, ms = timed(scan_search.search, dict(p))
+        cold.append(ms)
+        _, ms = timed(scan_search.search, dict(p))
+        warm.append(ms)
+
+    deep, depth = [], []
+    for p in qs[:args.walks]:
+        page = scan_search.search(dict(p))
+        pages = 0
+        while page["cursor"] and pages < args.pages:
+            page, ms = timed(scan_search.search, cursor=page["cursor"])
+            deep.append(ms)
+            pages += 1
+        depth.append(pages)
+
+    report.update({
+        "first_page_ms": pct(cold),
+        "cached_first_page_ms": pct(warm),
+        "search_after_page_ms": pct(deep) if deep else None,
+        "deepest_page": max(depth) + 1 if depth else 0,
+        "cache": scan_search.cache.stats(),
+    })
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
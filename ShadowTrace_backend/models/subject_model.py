@@ -0,0 +1,184 @@
+# models/subject_model.py
+"""
+Typed records for what a scan finds about a subject.
+
+    Evidence   one source hit: a profile page, a breach, a dark-web feed line
+    Indicator  one normalized entity (a SpiderFoot event, an IP, a domain ...)
+    Profile    one platform checked by the social probe
+    Subject    what a scan is about, with the evidence found for it
+
+All are slotted dataclasses, so there is no per-instance __dict__, and the
+strings that repeat across thousands of records (entity types, modules,
+platforms) are interned. to_doc()/from_doc() map to the document shapes
+already stored in Mongo (BSON-ready, datetimes kept as datetimes);
+dumps()/loads() handle JSON, through orjson when it is installed.
+"""
+import sys
+import json
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Any, List, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def _intern(s):
+    return sys.intern(s) if type(s) is str else s
+
+
+@dataclass(slots=True)
+class Evidence:
+    platform: str
+    url: str
+    title: str = ""
+
+    def __post_init__(self):
+        self.platform = _intern(self.platform)
+
+    def to_doc(self) -> dict:
+        return {"platform": self.platform, "url": self.url, "title": self.title}
+
+    @classmethod
+    def from_doc(cls, d: dict) -> "Evidence":
+        return cls(d.get("platform") or "", d.get("url") or "", d.get("title") or "")
+
+
+@dataclass(slots=True)
+class Indicator:
+    type: str
+    value: Any
+    module: Optional[str] = None
+    severity: Any = None
+    timestamp: Optional[datetime] = None
+    # (container key, index) of the source item in the raw export
+    raw_at: Optional[Tuple[Optional[str], int]] = None
+
+    def __post_init__(self):
+        self.type = _intern(self.type)
+        self.module = _intern(self.module)
+
+    def to_doc(self) -> dict:
+        return {
+            "type": self.type,
+            "value": self.value,
+            "module": self.module,
+            "severity": self.severity,
+            "timestamp": self.timestamp,
+            "raw_at": list(self.raw_at) if self.raw_at is not None else None,
+        }
+
+    @classmethod
+    def from_doc(cls, d: dict) -> "Indicator":
+        raw_at = d.get("raw_at")
+        return cls(d.get("type") or "", d.get("value"), d.get("module"), d.get("severity"),
+                   d.get("timestamp"), tuple(raw_at) if raw_at is not None else None)
+
+
+@dataclass(slots=True)
+class Profile:
+    url: str
+    exists: bool = False
+    status: Optional[int] = None
+    display_name: Optional[str] = None
+    bio: Optional[str] = None
+    location: Optional[str] = None
+    avatar: Optional[str] = None
+    title: Optional[str] = None
+    evidence: Optional[List[str]] = None
+    # avatar analysis
+    hash: Optional[str] = None
+    description: Optional[str] = None
+    likely_face: Optional[bool] = None
+    face_count: Optional[int] = None
+    # identity match
+    match_score: Optional[int] = None
+    match_evidence: Optional[List[str]] = None
+    error: Optional[str] = None
+
+    def update(self, values: dict):
+        for k, v in values.items():
+            setattr(self, k, v)
+
+    def to_doc(self) -> dict:
+        doc = {"exists": self.exists, "status": self.status, "url": self.url}
+        for k in _PROFILE_OPTIONAL:
+            v = getattr(self, k)
+            if v is not None:
+                doc[k] = v
+        return doc
+
+    @classmethod
+    def from_doc(cls, d: dict) -> "Profile":
+        return cls(**{k: d[k] for k in _PROFILE_FIELDS if k in d})
+
+
+_PROFILE_FIELDS = Profile.__slots__
+_PROFILE_OPTIONAL = tuple(k for k in _PROFILE_FIELDS if k not in ("exists", "status", "url"))
+
+
+@dataclass(slots=True)
+class Subject:
+    # field names follow the stored document, so JSON and to_doc() agree
+    indicator: str
+    type: str
+    sources: List[Evidence] = field(default_factory=list)
+    entities: List[Indicator] = field(default_factory=list)
+    confidence: int = 0
+    links: int = 0
+    status: str = "completed"
+
+    def to_doc(self) -> dict:
+        return {
+            "indicator": self.indicator,
+            "type": self.type,
+            "sources": [e.to_doc() for e in self.sources],
+            "entities": [i.to_doc() for i in self.entities],
+            "confidence": self.confidence,
+            "links": self.links,
+            "status": self.status,
+        }
+
+    @classmethod
+    def from_doc(cls, d: dict) -> "Subject":
+        return cls(
+            d.get("indicator") or "", d.get("type") or "",
+            [Evidence.from_doc(e) for e in d.get("sources") or []],
+            [Indicator.from_doc(i) for i in d.get("entities") or []],
+            d.get("confidence", 0), d.get("links", 0), d.get("status", "completed"),
+        )
+
+
+############################################
+# JSON
+############################################
+def _default(obj):
+    if hasattr(obj, "to_doc"):
+        return obj.to_doc()
+    if isinstance(obj, datetime):
+        return obj.isoformat()
+    if isinstance(obj, tuple):
+        return list(obj)
+    return str(obj)
+
+
+def dumps(obj) -> bytes:
+    """JSON for a record, a list of records or any document containing them."""
+    if orjson is not None:
+        # records go through to_doc either way (it drops unset Profile fields), so
+        # the JSON does not depend on orjson being installed
+        return orjson.dumps(obj, default=_default,
+                            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATACLASS)
+    return json.dumps(obj, default=_default).encode()
+
+
+def loads(data, cls=None):
+    """Parse JSON; with cls, turn a document (or list of documents) into records."""
+    doc = orjson.loads(data) if orjson is not None else json.loads(data)
+    if cls is None:
+        return doc
+    if isinstance(doc, list):
+        return [cls.from_doc(d) for d in doc]
+    return cls.from_doc(doc)
@@ -0,0 +1,53 @@
+import asyncio
+
+from app.utils.alerts import AlertDispatcher
+
+
+def hanging(dispatcher, seen):
+    async def send(url, batch):
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            seen.append(("cancelled", dispatcher.http.is_closed))
+            raise
+    return send
+
+
+def test_destination_buffers_are_bounded():
+    async def scenario():
+        d = AlertDispatcher(webhooks=["http://dead.invalid/hook"], batch_size=1, concurrency=1,
+                            dest_queue_size=3, retry_base=0)
+        await d.start()
+        d._send_webhook = hanging(d, [])
+        for i in range(10):
+            assert d.enqueue({"alert_id": i, "severity": "high"})
+        await asyncio.sleep(0.05)
+        dest = d.destinations[0]
+        assert dest.queue.qsize() <= 3
+        assert dest.dropped == 7 and d.stats()["destinations"][0]["dropped"] == 7
+        await d.stop(drain_timeout=0.01)
+
+    asyncio.run(scenario())
+
+
+def test_stop_cancels_deliveries_before_closing_the_client():
+    seen = []
+
+    async def scenario():
+        d = AlertDispatcher(webhooks=["http://dead.invalid/hook"], batch_size=2, batch_window=0.01)
+        await d.start()
+        d._send_webhook = hanging(d, seen)
+        d.enqueue({"alert_id": 1, "severity": "high"})
+        d.enqueue({"alert_id": 2, "severity": "high"})
+        await asyncio.sleep(0.05)
+        dest = d.destinations[0]
+        assert len(dest.in_flight) == 1
+        await d.stop(drain_timeout=0.05)
+        return d, dest
+
+    d, dest = asyncio.run(scenario())
+    # the post was cancelled while the client was still open, and the digest kept for replay
+    assert seen == [("cancelled", False)]
+    assert not dest.in_flight and dest.dead_lettered == 2
+    assert d.dead_letters[-1]["error"] == "cancelled at shutdown"
+    assert [a["alert_id"] for a in d.dead_letters[-1]["alerts"]] == [1, 2]
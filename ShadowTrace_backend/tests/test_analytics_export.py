@@ -0,0 +1,26 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+pytest.importorskip("pyarrow")
+mongomock = pytest.importorskip("mongomock")
+
+from app.services import analytics_export
+
+
+def scan(minutes_ago, status="done"):
+    stamp = datetime.utcnow() - timedelta(minutes=minutes_ago)
+    return {"query": "example.net", "status": status, "created_at": stamp, "updated_at": stamp,
+            "results": {"meta": {"entity": "domain"}}}
+
+
+def test_recent_writes_wait_for_the_next_run(tmp_path):
+    db = mongomock.MongoClient()["export_test"]
+    db.search_logs.insert_many([scan(10), scan(0.5)])
+
+    first = analytics_export.export_parquet(db, str(tmp_path), ["search_logs"], lag=120)
+    assert first["search_logs"]["rows"]["scans"] == 1
+
+    # the scan stamped inside the lag window is picked up once the window has passed
+    second = analytics_export.export_parquet(db, str(tmp_path), ["search_logs"], lag=0)
+    assert second["search_logs"]["rows"]["scans"] == 1
@@ -0,0 +1,60 @@
+import pytest
+from pymongo import MongoClient
+
+from app.database import blobs, mongo
+
+
+@pytest.fixture
+def unconnected(monkeypatch):
+    # a real pymongo Database; nothing here talks to the server
+    client = MongoClient("mongodb://127.0.0.1:1", connect=False, serverSelectionTimeoutMS=200)
+    monkeypatch.setattr(mongo, "_database", client["shadowtrace_test"])
+    monkeypatch.setattr(blobs, "BLOB_BACKEND", "gridfs")
+    yield client
+    client.close()
+
+
+def test_default_backend_is_gridfs_on_the_connected_database(unconnected):
+    backend = blobs.BlobStore().backend
+    assert isinstance(backend, blobs.GridFSBackend)
+    assert backend.files.full_name == "shadowtrace_test.blobs.files"
+
+
+def test_backend_not_cached_before_connect(monkeypatch):
+    monkeypatch.setattr(mongo, "_database", None)
+    monkeypatch.setattr(blobs, "BLOB_BACKEND", "gridfs")
+    s = blobs.BlobStore()
+    with pytest.raises(RuntimeError, match="not connected"):
+        s.backend
+    assert s._backend is None
+
+
+@pytest.fixture
+def migrated_db(tmp_path):
+    import mongomock
+    from benchmarks.scan_bench import _mongomock_compat
+    _mongomock_compat(mongomock)
+    db = mongomock.MongoClient()["shadowtrace_test"]
+    big = {"data": ["x" * 100] * 50}
+    crtsh = [{"name_value": f"h{i}.example.com", "issuer_name": "C=US, O=Example CA"} for i in range(40)]
+    db.search_logs.insert_many([
+        {"_id": 1, "results": {"shodan": big, "crtsh": crtsh}},
+        {"_id": 2, "results": {"crtsh": [], "vt": {"small": True}}},
+        {"_id": 3, "results": {"vt": {"_blob": "k", "bytes": 9000}, "meta": {"query": "x"}}},
+    ])
+    return db, blobs.BlobStore(blobs.FileBackend(str(tmp_path)), min_bytes=1024)
+
+
+def test_migrate_externalizes_lists_and_skips_checked_documents(migrated_db):
+    db, store = migrated_db
+    report = blobs.migrate(db, store)
+    assert report["search_logs"] == {"scanned": 2, "rewritten": 1}
+    results = db.search_logs.find_one({"_id": 1})["results"]
+    assert blobs.is_ref(results["crtsh"]) and blobs.is_ref(results["shodan"])
+    assert store.get(results["crtsh"])[3]["name_value"] == "h3.example.com"
+    # small inline payloads stay, but are not read again
+    assert db.search_logs.find_one({"_id": 2})["results"]["vt"] == {"small": True}
+    assert blobs.migrate(db, store)["search_logs"] == {"scanned": 0, "rewritten": 0}
+    # a lower threshold is a reason to look again
+    store.min_bytes = 8
+    assert blobs.migrate(db, store)["search_logs"] == {"scanned": 1, "rewritten": 1}
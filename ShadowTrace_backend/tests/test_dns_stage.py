@@ -0,0 +1,173 @@
+"""DNS stage against a local stub DNS server (UDP, one thread per query)."""
+import asyncio
+import socketserver
+import threading
+import time
+from collections import Counter
+
+import pytest
+
+dns = pytest.importorskip("dns")
+import dns.message
+import dns.rcode
+import dns.rdatatype
+import dns.rrset
+
+from app.services import dns_stage as dns_stage_module
+from app.services.dns_stage import DNSStage
+
+ZONE = "stub.test."
+SOA = "ns1.stub.test. admin.stub.test. 1 3600 600 86400 {minimum}"
+
+
+class StubDNS(socketserver.ThreadingUDPServer):
+    """
+    Answers by the first label's prefix:
+        nx-*        NXDOMAIN, SOA TTL 300 / MINIMUM 60
+        nxshort-*   NXDOMAIN, SOA TTL 20 / MINIMUM 60
+        noans-*     NOERROR without an answer, SOA TTL 300 / MINIMUM 45
+        ttl1-*      A with TTL 1
+        servfail-*  SERVFAIL
+        anything else  A 192.0.2.10, TTL 300
+    after `latency` seconds. Counts queries per name and the most answered at once.
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.latency = 0.0
+        self.lock = threading.Lock()
+        self.queries = Counter()
+        self.active = 0
+        self.peak = 0
+
+    def answer(self, q):
+        resp = dns.message.make_response(q)
+        question = q.question[0]
+        name = question.name.to_text()
+        label = name.split(".")[0]
+        if label.startswith("servfail-"):
+            resp.set_rcode(dns.rcode.SERVFAIL)
+        elif label.startswith("nxshort-"):
+            resp.set_rcode(dns.rcode.NXDOMAIN)
+            resp.authority.append(dns.rrset.from_text(ZONE, 20, "IN", "SOA", SOA.format(minimum=60)))
+        elif label.startswith("nx-"):
+            resp.set_rcode(dns.rcode.NXDOMAIN)
+            resp.authority.append(dns.rrset.from_text(ZONE, 300, "IN", "SOA", SOA.format(minimum=60)))
+        elif label.startswith("noans-"):
+            resp.authority.append(dns.rrset.from_text(ZONE, 300, "IN", "SOA", SOA.format(minimum=45)))
+        else:
+            ttl = 1 if label.startswith("ttl1-") else 300
+            resp.answer.append(dns.rrset.from_text(name, ttl, "IN", "A", "192.0.2.10"))
+        return resp.to_wire()
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        data, sock = self.request
+        server = self.server
+        q = dns.message.from_wire(data)
+        with server.lock:
+            server.queries[q.question[0].name.to_text().rstrip(".")] += 1
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+        try:
+            time.sleep(server.latency)
+            sock.sendto(server.answer(q), self.client_address)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+
+@pytest.fixture
+def stub():
+    server = StubDNS()
+    t = threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True)
+    t.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def stage_for(stub, **kw):
+    return DNSStage(nameservers=["127.0.0.1"], port=stub.server_address[1], timeout=2, **kw)
+
+
+def ttl_left(stage, name, rtype="A"):
+    expires, _, _ = stage.cache.entries[(name, rtype)]
+    return expires - time.monotonic()
+
+
+def test_positive_answers_are_cached_for_their_ttl(stub):
+    stage = stage_for(stub)
+    assert stage.resolve_sync("www.stub.test") == ["192.0.2.10"]
+    assert stage.resolve_sync("WWW.stub.test.") == ["192.0.2.10"]
+    assert stub.queries["www.stub.test"] == 1
+    assert 295 < ttl_left(stage, "www.stub.test") <= 300
+    assert stage.cache.stats()["hits"] == 1
+
+
+def test_negative_ttl_comes_from_the_soa(stub):
+    stage = stage_for(stub)
+    assert "error" in stage.resolve_sync("nx-a.stub.test")
+    assert "error" in stage.resolve_sync("nxshort-a.stub.test")
+    assert "error" in stage.resolve_sync("noans-a.stub.test")
+    # RFC 2308: min(SOA TTL, SOA MINIMUM)
+    assert 55 < ttl_left(stage, "nx-a.stub.test") <= 60
+    assert 15 < ttl_left(stage, "nxshort-a.stub.test") <= 20
+    assert 40 < ttl_left(stage, "noans-a.stub.test") <= 45
+
+    stage.resolve_sync("nx-a.stub.test")
+    assert stub.queries["nx-a.stub.test"] == 1
+    assert stage.cache.stats()["negative_hits"] == 1
+
+
+def test_servfail_is_not_cached(stub):
+    stage = stage_for(stub)
+    assert "error" in stage.resolve_sync("servfail-a.stub.test")
+    assert ("servfail-a.stub.test", "A") not in stage.cache.entries
+    stage.resolve_sync("servfail-a.stub.test")
+    assert stub.queries["servfail-a.stub.test"] == 2
+
+
+def test_entries_expire(stub, monkeypatch):
+    monkeypatch.setattr(dns_stage_module, "DNS_MIN_TTL", 0)
+    stage = stage_for(stub)
+    stage.resolve_sync("ttl1-a.stub.test")
+    stage.resolve_sync("ttl1-a.stub.test")
+    assert stub.queries["ttl1-a.stub.test"] == 1
+    time.sleep(1.1)
+    stage.resolve_sync("ttl1-a.stub.test")
+    assert stub.queries["ttl1-a.stub.test"] == 2
+
+
+def test_min_ttl_floor(stub, monkeypatch):
+    monkeypatch.setattr(dns_stage_module, "DNS_MIN_TTL", 5)
+    stage = stage_for(stub)
+    stage.resolve_sync("ttl1-b.stub.test")
+    assert 4 < ttl_left(stage, "ttl1-b.stub.test") <= 5
+
+
+def test_identical_lookups_in_flight_are_coalesced(stub):
+    stub.latency = 0.2
+    stage = stage_for(stub)
+
+    async def many():
+        return await asyncio.gather(*(stage.resolve("same.stub.test") for _ in range(20)))
+
+    results = asyncio.run_coroutine_threadsafe(many(), stage._ensure_loop()).result()
+    assert results == [["192.0.2.10"]] * 20
+    assert stub.queries["same.stub.test"] == 1
+    assert stage.queries == 1
+    assert not stage.pending
+
+
+def test_in_flight_queries_are_bounded(stub):
+    stub.latency = 0.1
+    stage = stage_for(stub, max_in_flight=4)
+    names = [f"h{i}.stub.test" for i in range(20)]
+    out = stage.resolve_many_sync(names)
+    assert all(out[n]["A"] == ["192.0.2.10"] for n in names)
+    assert stub.peak == 4
+    assert stage.in_flight == 0
@@ -0,0 +1,304 @@
+"""Domain registration lookups against a local fake RDAP server and a fake port-43 whois server."""
+import json
+import os
+import socket
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.services import domain_rdap
+from app.services.domain_rdap import DomainRegistration, parse_domain, _related, _merge
+
+
+def vcard(*props):
+    return ["vcard", [["version", {}, "text", "4.0"], *props]]
+
+
+def registry_obj(name, base):
+    """Thin registry answer: registrar and name servers, no registrant, links to the registrar."""
+    return {
+        "objectClassName": "domain",
+        "ldhName": name.upper(),
+        "status": ["client transfer prohibited"],
+        "events": [{"eventAction": "registration", "eventDate": "2001-02-03T04:05:06Z"},
+                   {"eventAction": "expiration", "eventDate": "2030-02-03T04:05:06Z"},
+                   {"eventAction": "last changed", "eventDate": "2024-01-01T00:00:00Z"},
+                   {"eventAction": "last update of RDAP database", "eventDate": "2026-01-01T00:00:00Z"}],
+        "nameservers": [{"ldhName": "NS2.FAKEDNS.TEST."}, {"ldhName": "ns1.fakedns.test"}],
+        "secureDNS": {"delegationSigned": True},
+        "entities": [{
+            "roles": ["registrar"],
+            "publicIds": [{"type": "IANA Registrar ID", "identifier": "9999"}],
+            "vcardArray": vcard(["fn", {}, "text", "Fake Registrar, Inc."]),
+            "entities": [{"roles": ["abuse"], "vcardArray": vcard(["email", {}, "text", "Abuse@FakeRegistrar.test"])}],
+        }],
+        "links": [
+            {"rel": "self", "href": f"{base}/rdap/domain/{name}", "type": "application/rdap+json"},
+            {"rel": "related", "href": f"{base}/registrar/domain/{name}", "type": "application/rdap+json"},
+        ],
+    }
+
+
+def registrar_obj(name):
+    """Thick registrar answer: adds the registrant, disagrees on the registrar name."""
+    return {
+        "objectClassName": "domain",
+        "ldhName": name,
+        "entities": [
+            {"roles": ["registrar"], "vcardArray": vcard(["fn", {}, "text", "Registrar's own name"])},
+            {"roles": ["registrant"], "vcardArray": vcard(
+                ["fn", {}, "text", "REDACTED FOR PRIVACY"], ["org", {}, "text", "Example Holdings"],
+                ["email", {}, "text", "owner@example.test"],
+                ["adr", {}, "text", ["", "", "1 Main St", "Springfield", "", "", "GB"]])},
+        ],
+    }
+
+
+class FakeRDAP(ThreadingHTTPServer):
+    """
+    /dns.json                 IANA bootstrap: .test -> /rdap/, .broken -> /broken/ (503 while bootstrap_down)
+    /rdap/domain/<name>       registry answer for names in `domains`, 404 otherwise
+    /registrar/domain/<name>  registrar answer
+    /broken/...               500
+    """
+
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _RDAPHandler)
+        self.base = f"http://127.0.0.1:{self.server_address[1]}"
+        self.domains = {"example.test"}
+        self.bootstrap_down = False
+        self.paths = []
+
+
+class _RDAPHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def send(self, status, body=None):
+        data = json.dumps(body or {}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/rdap+json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        srv = self.server
+        srv.paths.append(self.path)
+        segs = self.path.strip("/").split("/")
+        if self.path == "/dns.json":
+            if srv.bootstrap_down:
+                return self.send(503)
+            return self.send(200, {"version": "1.0", "publication": "2026-01-01T00:00:00Z", "services": [
+                [["test"], [f"{srv.base}/rdap/"]], [["broken"], [f"{srv.base}/broken/"]]]})
+        if segs[0] == "broken":
+            return self.send(500, {"errorCode": 500})
+        if segs[:2] == ["rdap", "domain"] and segs[2] in srv.domains:
+            return self.send(200, registry_obj(segs[2], srv.base))
+        if segs[:2] == ["registrar", "domain"] and segs[2] in srv.domains:
+            return self.send(200, registrar_obj(segs[2]))
+        self.send(404, {"errorCode": 404, "title": "Not Found"})
+
+
+class FakeWhois(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _WhoisHandler)
+        self.queries = []
+
+
+class _WhoisHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        query = self.rfile.readline().decode().strip()
+        self.server.queries.append(query)
+        self.wfile.write((f"Domain Name: {query.upper()}\r\nRegistrar: Port43 Registrar\r\n"
+                          "Creation Date: 1999-09-09T00:00:00Z\r\n").encode())
+
+
+def serve(server):
+    threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+    return server
+
+
+@pytest.fixture
+def rdap():
+    server = serve(FakeRDAP())
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def whois_port(monkeypatch):
+    """A fake whois server; python-whois always dials port 43, so its sockets are sent here instead."""
+    from whois import NICClient
+    server = serve(FakeWhois())
+    port = server.server_address[1]
+
+    class Redirected(socket.socket):
+        def connect(self, address):
+            super().connect((address[0], port) if address[1] == 43 else address)
+
+    monkeypatch.setattr(NICClient, "get_socket", lambda self: Redirected(socket.AF_INET, socket.SOCK_STREAM))
+    monkeypatch.setattr(domain_rdap, "WHOIS_SERVER", "127.0.0.1")
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def registration(rdap, tmp_path):
+    return DomainRegistration(path=str(tmp_path), bootstrap_url=f"{rdap.base}/dns.json")
+
+
+############################################
+# Parsing
+############################################
+def test_parse_domain_maps_whois_field_names():
+    data = parse_domain(registry_obj("example.test", "http://rdap.invalid"))
+    assert data["domain_name"] == "example.test"
+    assert data["registrar"] == "Fake Registrar, Inc."
+    assert data["registrar_iana_id"] == "9999"
+    assert data["name_servers"] == ["ns1.fakedns.test", "ns2.fakedns.test"]
+    assert data["status"] == ["client transfer prohibited"]
+    assert data["dnssec"] is True
+    # nested abuse contact of the registrar
+    assert data["emails"] == ["abuse@fakeregistrar.test"]
+    assert data["creation_date"] == "2001-02-03T04:05:06Z"
+    assert data["expiration_date"] == "2030-02-03T04:05:06Z"
+    assert data["updated_date"] == "2024-01-01T00:00:00Z"
+    assert data["name"] is None and data["org"] is None and data["country"] is None
+
+    thick = parse_domain(registrar_obj("example.test"))
+    assert (thick["name"], thick["org"], thick["country"]) == ("REDACTED FOR PRIVACY", "Example Holdings", "GB")
+
+
+def test_related_only_follows_other_rdap_domain_links():
+    base = "http://rdap.invalid"
+    obj = registry_obj("example.test", base)
+    assert _related(obj, f"{base}/rdap/domain/example.test") == f"{base}/registrar/domain/example.test"
+    # the related link pointing back at the same URL, or at something that is not RDAP
+    assert _related(obj, f"{base}/registrar/domain/example.test/") is None
+    obj["links"][1]["type"] = "text/html"
+    assert _related(obj, f"{base}/rdap/domain/example.test") is None
+
+
+def test_merge_fills_gaps_without_overriding_the_registry():
+    merged = _merge({"registrar": "Registry says", "org": None, "emails": []},
+                    {"registrar": "Registrar says", "org": "Example Holdings", "emails": ["a@b.test"]})
+    assert merged == {"registrar": "Registry says", "org": "Example Holdings", "emails": ["a@b.test"]}
+
+
+############################################
+# Lookups
+############################################
+def test_lookup_merges_the_registrar_referral(registration, rdap):
+    res = registration.lookup("Example.TEST.")
+    assert res["ok"] and res["source"] == "rdap" and res["server"] == f"{rdap.base}/rdap/"
+    assert res["data"]["registrar"] == "Fake Registrar, Inc."
+    assert res["data"]["org"] == "Example Holdings"
+    assert res["data"]["country"] == "GB"
+    # gaps only: the registry's own non-empty fields are kept
+    assert res["data"]["emails"] == ["abuse@fakeregistrar.test"]
+    assert "/registrar/domain/example.test" in rdap.paths
+
+
+def test_host_names_walk_up_to_the_registered_domain(registration, rdap):
+    res = registration.lookup("www.mail.example.test")
+    assert res["ok"] and res["data"]["domain_name"] == "example.test"
+    assert [p for p in rdap.paths if p.startswith("/rdap/")] == [
+        "/rdap/domain/www.mail.example.test", "/rdap/domain/mail.example.test", "/rdap/domain/example.test"]
+
+
+def test_not_found_is_cached(registration, rdap, whois_port):
+    res = registration.lookup("unregistered.test")
+    assert res == {"ok": False, "source": "rdap", "server": f"{rdap.base}/rdap/", "status": 404,
+                   "error": "domain not found"}
+    seen = len(rdap.paths)
+    assert registration.lookup("unregistered.test") == res
+    assert len(rdap.paths) == seen
+    assert registration.counts == {("rdap", "not_found"): 1, ("rdap", "cached"): 1}
+    # a definite "no such domain" from RDAP does not go on to port 43
+    assert not whois_port.queries
+
+
+############################################
+# Bootstrap
+############################################
+def write_bootstrap(registration, rdap, age):
+    os.makedirs(registration.path, exist_ok=True)
+    with open(registration.bootstrap_file, "w") as f:
+        json.dump({"publication": "2020-01-01T00:00:00Z", "services": [[["test"], [f"{rdap.base}/rdap/"]]]}, f)
+    old = time.time() - age
+    os.utime(registration.bootstrap_file, (old, old))
+
+
+def test_fresh_bootstrap_file_is_used_without_asking_iana(registration, rdap):
+    write_bootstrap(registration, rdap, age=60)
+    assert registration.ready()
+    assert registration.published == "2020-01-01T00:00:00Z"
+    assert "/dns.json" not in rdap.paths
+
+
+def test_stale_bootstrap_keeps_serving_when_iana_is_down(registration, rdap):
+    write_bootstrap(registration, rdap, age=domain_rdap.RDAP_BOOTSTRAP_TTL + 3600)
+    rdap.bootstrap_down = True
+    assert registration.ready()
+    assert rdap.paths == ["/dns.json"]
+    assert registration.published == "2020-01-01T00:00:00Z"
+    # IANA is asked again in about a minute, not on every lookup
+    assert 0 < registration.loaded_at + domain_rdap.RDAP_BOOTSTRAP_TTL - time.time() <= 60
+    assert registration.ready()
+    assert rdap.paths == ["/dns.json"]
+    assert registration.lookup("example.test")["ok"]
+
+
+def test_stale_bootstrap_is_replaced_when_iana_answers(registration, rdap):
+    write_bootstrap(registration, rdap, age=domain_rdap.RDAP_BOOTSTRAP_TTL + 3600)
+    assert registration.ready()
+    assert registration.published == "2026-01-01T00:00:00Z"
+    assert registration.server_for("x.broken") == f"{rdap.base}/broken/"
+
+
+def test_no_bootstrap_at_all_falls_back_to_whois(registration, rdap, whois_port):
+    rdap.bootstrap_down = True
+    res = registration.lookup("example.test")
+    assert res["ok"] and res["source"] == "whois" and "rdap_error" not in res
+
+
+############################################
+# Port-43 fallback
+############################################
+def test_failing_rdap_server_falls_back_to_whois(registration, rdap, whois_port):
+    res = registration.lookup("example.broken")
+    assert res["ok"] and res["source"] == "whois" and res["server"] == "127.0.0.1"
+    assert "500" in res["rdap_error"]
+    assert res["data"]["registrar"] == "Port43 Registrar"
+    assert whois_port.queries == ["example.broken"]
+    # whois answers are cached per registrar server
+    registration.lookup("example.broken")
+    assert whois_port.queries == ["example.broken"]
+    assert registration.counts[("whois", "cached")] == 1
+
+
+def test_tld_without_rdap_goes_to_whois(registration, rdap, whois_port):
+    res = registration.lookup("example.nordap")
+    assert res["ok"] and res["source"] == "whois" and "rdap_error" not in res
+
+
+def test_whois_failure_keeps_the_rdap_error(registration, rdap, monkeypatch):
+    def refuse(self, *a, **kw):
+        raise OSError("connection refused")
+    monkeypatch.setattr(DomainRegistration, "whois", refuse)
+    res = registration.lookup("example.broken")
+    assert res["ok"] is False and res["source"] == "whois"
+    assert res["error"] == "connection refused"
+    assert "500" in res["rdap_error"]
+    assert registration.counts[("rdap", "error")] == 1 and registration.counts[("whois", "error")] == 1
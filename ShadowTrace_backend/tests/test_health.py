@@ -0,0 +1,49 @@
+import asyncio
+import threading
+
+from app.utils.health import Check, HealthMonitor
+
+
+def test_hung_check_is_skipped_until_its_thread_returns():
+    release = threading.Event()
+    calls = []
+
+    def hangs():
+        calls.append(1)
+        release.wait(5)
+        return {"late": True}
+
+    async def scenario():
+        monitor = HealthMonitor()
+        check = monitor.add(Check("slow", hangs, timeout=0.05))
+        await monitor.run()
+        assert check.last["status"] == "timeout" and check.running
+        # a second round while the first thread is still blocked starts no new thread
+        await monitor.run()
+        assert len(calls) == 1
+        release.set()
+        for _ in range(100):
+            if not check.running:
+                break
+            await asyncio.sleep(0.01)
+        assert not check.running
+        await monitor.run()
+        assert len(calls) == 2 and check.last["status"] == "ok"
+
+    asyncio.run(scenario())
+
+
+def test_failures_are_recorded_and_clear_running():
+    def boom():
+        raise RuntimeError("down")
+
+    async def scenario():
+        monitor = HealthMonitor()
+        check = monitor.add(Check("boom", boom, timeout=1))
+        await monitor.run()
+        await asyncio.sleep(0)
+        return check
+
+    check = asyncio.run(scenario())
+    assert check.last["status"] == "fail" and check.last["error"] == "down"
+    assert not check.running
@@ -0,0 +1,41 @@
+import difflib
+import random
+import string
+
+from app.services.identity_match import display_similarity, score_platforms
+from benchmarks.identity_match_bench import legacy_score, synthetic_platforms
+from models.subject_model import Profile
+
+
+def legacy_similarity(a, b):
+    if not a or not b:
+        return 0
+    return int(difflib.SequenceMatcher(None, a.lower(), b.lower()).ratio() * 100)
+
+
+def test_display_similarity_matches_difflib():
+    rnd = random.Random(11)
+    letters = "johnsmiaxe_"
+    pairs = [("ohsomxixnss", "johnsmith"), ("", "johnsmith"), ("johnsmith", "johnsmith")]
+    for _ in range(2000):
+        a = "".join(rnd.choice(letters) for _ in range(rnd.randint(1, 16)))
+        b = "".join(rnd.choice(letters) for _ in range(rnd.randint(1, 12)))
+        pairs.append((a, b))
+    for display, username in pairs:
+        assert display_similarity(username, [display])[display] == legacy_similarity(display, username), \
+            (display, username)
+
+
+def test_scores_match_the_per_platform_scorer():
+    rnd = random.Random(3)
+    username = "jdoe_sec"
+    platforms = synthetic_platforms(200, username)
+    for entry in platforms.values():
+        if entry.get("display_name") and rnd.random() < 0.5:
+            # names near the username, where the 50/80 thresholds are decided
+            name = list(username + "".join(rnd.choice(string.ascii_lowercase) for _ in range(rnd.randint(0, 6))))
+            rnd.shuffle(name)
+            entry["display_name"] = "".join(name)
+    profiles = {k: Profile.from_doc(e) for k, e in platforms.items()}
+    new = score_platforms(username, profiles)["scores"]
+    assert {k: legacy_score(username, e, platforms) for k, e in platforms.items()} == new
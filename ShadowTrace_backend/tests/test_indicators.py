@@ -0,0 +1,33 @@
+import pytest
+
+from app.utils.indicators import classify, classify_many
+
+
+@pytest.mark.parametrize("value", [
+    "1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNa",  # P2PKH
+    "3J98t1WpEZ73CNmQviecrnyiWrnqRhWNLy",  # P2SH
+    "bc1qw508d6qejxtdg4y5r3zarvary0c5xw7kv8f3t4",  # P2WPKH, bech32
+    "bc1p0xlxvlhemja6c4dqv22uapctqupfhlxm9h8z3k2e72q4k9hcz7vqzk5jj0",  # taproot, bech32m
+])
+def test_valid_bitcoin_addresses_are_wallets(value):
+    assert classify(value) == (value, "wallet")
+
+
+def test_uppercase_bech32_is_lowercased():
+    assert classify("BC1QW508D6QEJXTDG4Y5R3ZARVARY0C5XW7KV8F3T4") == (
+        "bc1qw508d6qejxtdg4y5r3zarvary0c5xw7kv8f3t4", "wallet")
+
+
+@pytest.mark.parametrize("value", [
+    "1usernamewithlotsofcharsxyz",
+    "3rdPartyDeveloperAccount2024",
+    "1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNb",  # last character changed
+    "bc1qw508d6qejxtdg4y5r3zarvary0c5xw7kv8f3t5",  # bad bech32 checksum
+])
+def test_checksum_failures_are_not_wallets(value):
+    assert classify(value) == (value.lower(), "username")
+
+
+def test_batch_matches_single():
+    values = ["1usernamewithlotsofcharsxyz", "1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNa", "1usernamewithlotsofcharsxyz"]
+    assert classify_many(values) == [classify(v) for v in values]
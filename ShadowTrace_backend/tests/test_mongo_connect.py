@@ -0,0 +1,30 @@
+from app.config import Settings
+from app.database import mongo
+
+
+def test_tls_defaults_on_for_every_uri():
+    assert Settings({"MONGO_URI": "mongodb://db.internal:27017"}).MONGO_TLS is True
+    assert Settings({"MONGO_URI": "mongodb+srv://cluster.example.net"}).MONGO_TLS is True
+    assert Settings({"MONGO_URI": "mongodb://localhost", "MONGO_TLS": "0"}).MONGO_TLS is False
+
+
+class _Admin:
+    def command(self, name):
+        raise ConnectionError("no servers available")
+
+
+class _UnreachableClient:
+    admin = _Admin()
+
+    def __getitem__(self, name):
+        return object()
+
+
+def test_db_stays_unset_when_ping_fails(monkeypatch):
+    monkeypatch.setattr(mongo.settings, "MONGO_URI", "mongodb://unreachable:27017")
+    monkeypatch.setattr(mongo.registry, "mongo_client", lambda: _UnreachableClient())
+    for name in ("client", "_database", "db_status"):
+        monkeypatch.setattr(mongo, name, getattr(mongo, name))
+    status = mongo.connect()
+    assert status["db_status"] == "failed"
+    assert mongo._database is None and not mongo.db
@@ -0,0 +1,18 @@
+import pytest
+
+from app.utils.normalization import normalize
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("john.doe", ("john.doe", "username")),
+    ("John.Doe ", ("john.doe", "username")),
+    ("jane_doe", ("jane_doe", "username")),
+    ("example.com", ("example.com", "username")),
+    ("Jane@Example.com", ("jane@example.com", "email")),
+])
+def test_everything_but_email_and_phone_is_a_username(value, expected):
+    assert normalize(value) == expected
+
+
+def test_phone():
+    assert normalize("+1 415 555 2671")[1] == "phone"
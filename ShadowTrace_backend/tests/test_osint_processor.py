@@ -0,0 +1,26 @@
+import mongomock
+
+from app.services.osint_processor import copy_legacy_cases
+
+
+def dbs():
+    client = mongomock.MongoClient()
+    source, dest = client["shadowtrace"], client["ShadowTrace"]
+    source.osint_cases.insert_many([{"case_id": f"c{i}", "entities": [{"type": "ip", "value": f"10.0.0.{i}"}]}
+                                    for i in range(5)])
+    dest.osint_cases.insert_one({"case_id": "new"})
+    return source, dest
+
+
+def test_copy_legacy_cases_is_idempotent():
+    source, dest = dbs()
+    assert copy_legacy_cases(source, dest, batch_size=2) == {"scanned": 5, "copied": 5}
+    assert copy_legacy_cases(source, dest, batch_size=2) == {"scanned": 5, "copied": 0}
+    assert dest.osint_cases.count_documents({}) == 6
+    assert dest.osint_cases.find_one({"case_id": "c3"})["entities"][0]["value"] == "10.0.0.3"
+
+
+def test_dry_run_writes_nothing():
+    source, dest = dbs()
+    assert copy_legacy_cases(source, dest, dry_run=True) == {"scanned": 5, "copied": 5}
+    assert dest.osint_cases.count_documents({}) == 1
@@ -0,0 +1,58 @@
+import json
+
+import pytest
+
+from app.utils import profile_html
+from app.utils.profile_html import parse_profile_html, read_head_chunks, scan_head
+
+PAGE = (
+    "<!DOCTYPE html><html><head><meta charset=\"utf-8\">"
+    "<title> Jane &amp; Co - Profile </title>"
+    "<meta property=\"og:title\" content=\"Jane Doe\">"
+    "<meta property=\"OG:TITLE\" content=\"second, ignored\">"
+    "<meta name=\"twitter:title\" content=\"jane\">"
+    "<meta name=\"description\" content=\"Builds things\">"
+    "<meta property=\"og:image\" content=\"https://cdn.example.com/jane.png\">"
+    "<meta name=\"empty\" content=\"\">"
+    "<script type=\"application/ld+json\">"
+    + json.dumps([{"@type": "Person", "name": "Jane D.", "description": "From JSON-LD"}])
+    + "</script></head><body><div>" + "x" * 50000 + "</div></body></html>"
+)
+
+needs_selectolax = pytest.mark.skipif(profile_html._SelectolaxParser is None, reason="selectolax not installed")
+
+
+@needs_selectolax
+def test_selectolax_is_the_default_parser():
+    assert profile_html.PARSER == "selectolax"
+
+
+@needs_selectolax
+def test_selectolax_and_bs4_extract_the_same():
+    fast, slow = scan_head(PAGE, "selectolax"), scan_head(PAGE, "bs4")
+    assert fast == slow
+    title, metas, ld = fast
+    assert title == "Jane & Co - Profile"
+    assert metas["og:title"] == "Jane Doe" and "empty" not in metas
+    assert json.loads(ld[0])[0]["name"] == "Jane D."
+
+
+@pytest.mark.parametrize("parser", [pytest.param("selectolax", marks=needs_selectolax), "bs4"])
+def test_profile_fields(parser):
+    out = parse_profile_html(PAGE, parser)
+    assert out["display_name"] == "Jane D." and out["bio"] == "From JSON-LD"
+    assert out["avatar"] == "https://cdn.example.com/jane.png"
+
+
+def test_falls_back_to_bs4_when_the_parser_fails(monkeypatch):
+    def broken(html):
+        raise ValueError("parser error")
+    monkeypatch.setitem(profile_html._SCANNERS, "selectolax", broken)
+    assert scan_head(PAGE, "selectolax") == scan_head(PAGE, "bs4")
+
+
+def test_head_reader_stops_at_the_body():
+    data = PAGE.encode()
+    head, read = read_head_chunks(data[i:i + 1024] for i in range(0, len(data), 1024))
+    assert head.endswith(b"</head>") and read < 4096
+    assert parse_profile_html(head.decode(), "bs4") == parse_profile_html(PAGE, "bs4")
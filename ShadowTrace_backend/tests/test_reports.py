@@ -0,0 +1,26 @@
+import pytest
+from pymongo import MongoClient
+
+from app.database import blobs, mongo
+from app.services import reports
+
+
+@pytest.fixture
+def unconnected(monkeypatch):
+    # a real pymongo Database; nothing here talks to the server
+    client = MongoClient("mongodb://127.0.0.1:1", connect=False, serverSelectionTimeoutMS=200)
+    monkeypatch.setattr(mongo, "_database", client["shadowtrace_test"])
+    monkeypatch.setattr(blobs, "BLOB_BACKEND", "gridfs")
+    yield client
+    client.close()
+
+
+def test_default_cache_is_gridfs_on_the_connected_database(unconnected):
+    cache = reports.ReportService().cache
+    assert isinstance(cache, blobs.GridFSBackend)
+    assert cache.files.full_name == f"shadowtrace_test.{reports.REPORT_BUCKET}.files"
+
+
+def test_cache_uses_the_injected_database(unconnected):
+    cache = reports.ReportService(database=unconnected["other"]).cache
+    assert cache.files.full_name == f"other.{reports.REPORT_BUCKET}.files"
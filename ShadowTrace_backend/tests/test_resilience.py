@@ -0,0 +1,45 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.utils import resilience
+
+
+@pytest.fixture
+def half_open(monkeypatch):
+    """A fresh provider whose breaker has just gone half-open."""
+    monkeypatch.setattr(resilience, "RESILIENCE", True)
+    resilience.providers.pop("test-upstream", None)
+    p = resilience.provider("test-upstream")
+    p.breaker.state = "open"
+    p.breaker.opened_at = time.monotonic() - resilience.BREAKER_OPEN_SECONDS - 1
+    yield p
+    resilience.providers.pop("test-upstream", None)
+
+
+def test_expired_budget_does_not_use_up_half_open_trials(half_open, monkeypatch):
+    sent = []
+    monkeypatch.setattr(resilience.session, "request",
+                        lambda *a, **kw: sent.append(a) or SimpleNamespace(status_code=200, close=lambda: None))
+
+    with resilience.deadline(0.01):
+        time.sleep(0.02)
+        for _ in range(resilience.BREAKER_HALF_OPEN_CALLS + 2):
+            with pytest.raises(resilience.DeadlineExceeded):
+                resilience.get("test-upstream", "http://upstream.invalid/")
+    assert not sent
+    assert half_open.breaker.trials == 0
+
+    # with budget again the trial calls go out and close the breaker
+    for _ in range(resilience.BREAKER_HALF_OPEN_CALLS):
+        assert resilience.get("test-upstream", "http://upstream.invalid/", hedge=False).status_code == 200
+    assert len(sent) == resilience.BREAKER_HALF_OPEN_CALLS
+    assert half_open.breaker.state == "closed"
+
+
+def test_open_breaker_rejects_without_sending(half_open, monkeypatch):
+    half_open.breaker.opened_at = time.monotonic()
+    monkeypatch.setattr(resilience.session, "request", lambda *a, **kw: pytest.fail("request sent"))
+    with pytest.raises(resilience.CircuitOpen):
+        resilience.get("test-upstream", "http://upstream.invalid/")
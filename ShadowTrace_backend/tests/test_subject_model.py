@@ -0,0 +1,36 @@
+from datetime import datetime
+
+import pytest
+
+from models import subject_model
+from models.subject_model import Evidence, Indicator, Profile, Subject, dumps, loads
+
+
+def records():
+    return {
+        "profile": Profile(exists=True, status=200, url="https://example.test/u"),
+        "subject": Subject("alice", "username", [Evidence("github", "https://github.com/alice")],
+                           [Indicator("ip", "192.0.2.1", "sfp_dns", None, datetime(2026, 1, 2, 3, 4, 5), ("events", 3))]),
+        "profiles": [Profile(exists=False, status=404, url="https://example.test/v", error="gone")],
+    }
+
+
+def test_records_serialize_through_to_doc():
+    doc = loads(dumps(records()))
+    # unset optional Profile fields are left out, as to_doc stores them
+    assert doc["profile"] == {"exists": True, "status": 200, "url": "https://example.test/u"}
+    assert doc["profiles"][0]["error"] == "gone" and "bio" not in doc["profiles"][0]
+    assert doc["subject"]["entities"][0]["raw_at"] == ["events", 3]
+
+
+def test_same_json_with_and_without_orjson(monkeypatch):
+    if subject_model.orjson is None:
+        pytest.skip("orjson not installed")
+    fast = subject_model.loads(dumps(records()))
+    monkeypatch.setattr(subject_model, "orjson", None)
+    assert subject_model.loads(dumps(records())) == fast
+
+
+def test_round_trip():
+    p = Profile(exists=True, status=200, url="https://example.test/u", match_score=40)
+    assert loads(dumps(p), Profile) == p
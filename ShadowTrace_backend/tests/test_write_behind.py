@@ -0,0 +1,75 @@
+import pytest
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+from app.database.write_behind import WriteBehind
+
+
+class FlakyCollection:
+    """Stands in for a pymongo collection: bulk_write raises the queued errors first, then applies."""
+
+    full_name = "test.search_logs"
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.docs = {}
+        self.calls = 0
+
+    def with_options(self, **kw):
+        return self
+
+    def bulk_write(self, ops, ordered=True):
+        self.calls += 1
+        error = self.errors.pop(0) if self.errors else None
+        if isinstance(error, BulkWriteError):
+            ops = ops[:error.details["writeErrors"][0]["index"]]
+        elif error is not None:
+            raise error
+        for op in ops:
+            self.docs.setdefault(op._filter["_id"], {}).update(op._doc["$set"])
+        if error is not None:
+            raise error
+
+
+@pytest.fixture
+def writer():
+    w = WriteBehind(batch=100, interval_ms=5)
+    yield w
+    w.close()
+
+
+def test_transient_failure_is_retried(writer):
+    coll = FlakyCollection([AutoReconnect("stepdown")])
+    ticket = writer.update(coll, {"_id": 1}, {"$set": {"status": "done"}})
+    assert ticket.wait(5)
+    assert coll.docs[1] == {"status": "done"}
+    assert writer.stats()["requeued"] == 1
+
+
+def test_write_error_fails_only_the_refused_update(writer):
+    coll = FlakyCollection([BulkWriteError({"writeErrors": [{"index": 1, "code": 10334, "errmsg": "too large"}]})])
+    tickets = [writer.update(coll, {"_id": i}, {"$set": {"status": "done"}}) for i in range(3)]
+    assert tickets[0].wait(5)
+    with pytest.raises(BulkWriteError):
+        tickets[1].wait(5)
+    assert tickets[2].wait(5)
+    assert set(coll.docs) == {0, 2}
+
+
+def test_gives_up_after_retries(writer, monkeypatch):
+    from app.database import write_behind
+    monkeypatch.setattr(write_behind, "WRITE_BEHIND_RETRIES", 2)
+    coll = FlakyCollection([AutoReconnect("down")] * 5)
+    ticket = writer.update(coll, {"_id": 1}, {"$set": {"status": "done"}})
+    with pytest.raises(AutoReconnect):
+        ticket.wait(5)
+    assert coll.calls == 2
+
+
+def test_requeued_update_stays_ahead_of_newer_ones(writer):
+    coll = FlakyCollection([AutoReconnect("stepdown")])
+    first = writer.update(coll, {"_id": 1}, {"$set": {"status": "running"}})
+    writer.flush()
+    # queued after the failed flush; must not be overwritten by the retried older update
+    writer.update(coll, {"_id": 1}, {"$set": {"status": "done"}}).wait(5)
+    assert first.wait(5)
+    assert coll.docs[1]["status"] == "done"